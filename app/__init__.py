@@ -1,7 +1,7 @@
 # app/__init__.py
-from flask import Flask, request, g, jsonify
+from flask import Flask, request, g, jsonify, url_for
 from app.config import Config
-from app.extensions import db, migrate, login_manager, csrf, mail, moment, cache, limiter, monitor, scheduler
+from app.extensions import db, migrate, login_manager, csrf, mail, moment, cache, limiter, monitor, scheduler, push_dispatcher
 from app.utils.security import configure_security
 import os
 import logging
@@ -25,6 +25,15 @@ def configure_jinja_filters(app):
         text = text.replace('\n', Markup('<br>'))
         return Markup(text)
 
+    @app.template_global('photo_url')
+    def photo_url(photo, size=None):
+        """URL of a project photo, or of one of its derivatives (e.g. 'thumb', 'medium_webp')."""
+        # Served by an access-checked route: uploads are not in the public static folder
+        return url_for('projects_field.photo_file', project_id=photo.project_id, photo_id=photo.id, size=size)
+
+    from app.utils.pdf_generator import pdf_photo_src
+    app.add_template_global(pdf_photo_src, 'pdf_photo_src')
+
 def create_app(config_class=None):
     if config_class is None:
         from app.config_factory import get_config
@@ -58,6 +67,12 @@ def create_app(config_class=None):
     # Initialize task scheduler
     scheduler.init_app(app)
     
+    # Push notifications are sent from a background thread
+    push_dispatcher.init_app(app)
+
+    # Register model event listeners that keep derived data in sync
+    register_model_listeners(app)
+
     # Configure security middleware
     configure_security(app)
     
@@ -83,6 +98,10 @@ def create_app(config_class=None):
     # Register shell context processor
     register_shell_context(app)
     
+    # Register CLI command groups
+    from app.cli import register_commands
+    register_commands(app)
+    
     # Run startup tasks
     run_startup_tasks(app)
     configure_jinja_filters(app)
@@ -123,6 +142,23 @@ def register_middleware(app):
         # Continue with normal error handling
         raise e
 
+def register_model_listeners(app):
+    """Register SQLAlchemy event listeners for caches and rollups"""
+    from app.utils.dashboard_snapshot import register_snapshot_invalidation
+    from app.utils.cost_rollup import register_cost_rollup_listeners
+    from app.utils.access_cache import register_access_cache_invalidation
+    from app.utils.photo_derivatives import register_photo_derivative_listeners
+    from app.utils.blob_store import register_blob_store_listeners
+    from app.utils.ifc_cache import register_ifc_cache_listeners
+    from app.utils.sync import register_sync_listeners
+    register_snapshot_invalidation()
+    register_cost_rollup_listeners()
+    register_access_cache_invalidation()
+    register_photo_derivative_listeners()
+    register_blob_store_listeners()
+    register_ifc_cache_listeners()
+    register_sync_listeners()
+
 def register_blueprints(app):
     """Register all application blueprints in an organized way"""
     
@@ -137,6 +173,12 @@ def register_blueprints(app):
     app.register_blueprint(dashboard_bp) 
     app.register_blueprint(admin_bp, url_prefix='/admin')
     app.register_blueprint(api_bp, url_prefix='/api')
+    # Token-authenticated; a CSRF token would only break non-browser clients
+    csrf.exempt(api_bp)
+    
+    from app.api.mobile_routes import mobile_bp
+    app.register_blueprint(mobile_bp, url_prefix='/api/mobile')
+    csrf.exempt(mobile_bp)
     
     # API Documentation
     from app.api.swagger import swagger_bp, swagger_ui_bp
@@ -353,7 +395,12 @@ def collect_db_stats(app):
         app.logger.error(f"Error collecting DB stats: {str(e)}")
 
 def run_startup_tasks(app):
-    """Run tasks at application startup"""
+    """
+    Run tasks at application startup
+
+    Periodic maintenance (temp files, DB stats) is not started here: it runs
+    as background jobs on ``flask jobs worker``, once across the cluster.
+    """
     with app.app_context():
         # Check and create required database tables
         if app.config.get('AUTO_MIGRATE', False):
@@ -383,43 +430,6 @@ def run_startup_tasks(app):
             app.logger.info('Feature flags loaded')
         except ImportError:
             app.logger.info('Feature flags module not found, skipping')
-        
-        # Use threading for background tasks
-        import threading
-        
-        # Cleanup task
-        def periodic_cleanup():
-            while True:
-                try:
-                    with app.app_context():
-                        clean_temp_files(app)
-                except Exception as e:
-                    app.logger.error(f"Error in periodic cleanup: {e}")
-                
-                # Sleep for 24 hours
-                import time
-                time.sleep(24 * 60 * 60)
-        
-        # DB stats collection task
-        def periodic_db_stats():
-            while True:
-                try:
-                    with app.app_context():
-                        collect_db_stats(app)
-                except Exception as e:
-                    app.logger.error(f"Error in periodic DB stats: {e}")
-                
-                # Sleep for 6 hours
-                import time
-                time.sleep(6 * 60 * 60)
-        
-        # Start background threads
-        if not app.testing:
-            cleanup_thread = threading.Thread(target=periodic_cleanup, daemon=True)
-            db_stats_thread = threading.Thread(target=periodic_db_stats, daemon=True)
-            
-            cleanup_thread.start()
-            db_stats_thread.start()
     
     return app
 
@@ -1,12 +1,14 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, abort, current_app, Response
 from flask_login import login_required, current_user
 from app.models.user import User
 from app.models.settings import Company
-from app.extensions import db
-from app.utils.access_control import role_required
+from app.extensions import db, monitor, push_dispatcher, scheduler
+from app.utils.access_control import role_required, is_admin_user
+from app.utils.metrics import render_prometheus
 from app.admin.forms import UserForm, CompanyForm
 from werkzeug.security import generate_password_hash
 from datetime import datetime
+import hmac
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -204,4 +206,56 @@ def update_settings():
     
     db.session.commit()
     
-    return jsonify({'success': True})
\ No newline at end of file
+    return jsonify({'success': True})
+
+# Monitoring
+def _require_admin_or_api_key():
+    """Allow a logged-in admin, or a scraper sending ``X-API-Key: ADMIN_API_KEY``"""
+    api_key = current_app.config.get('ADMIN_API_KEY')
+    provided = request.headers.get('X-API-Key')
+    if api_key and provided and hmac.compare_digest(provided, api_key):
+        return
+    if not (current_user.is_authenticated and is_admin_user(current_user)):
+        abort(403)
+
+@admin_bp.route('/monitoring')
+def monitoring():
+    """Request metrics (merged across workers when METRICS_MULTIPROC_DIR is set)"""
+    _require_admin_or_api_key()
+    return jsonify({
+        'status': 'success',
+        'data': monitor.get_stats()
+    })
+
+@admin_bp.route('/monitoring/reset', methods=['POST'])
+@login_required
+def reset_monitoring():
+    """Reset request metrics in every worker"""
+    if not is_admin_user(current_user):
+        abort(403)
+    return jsonify(monitor.reset_stats())
+
+@admin_bp.route('/monitoring/scheduler')
+def scheduler_stats():
+    """Scheduled task run counts, durations and lag in this worker"""
+    _require_admin_or_api_key()
+    return jsonify({
+        'status': 'success',
+        'data': scheduler.task_stats()
+    })
+
+@admin_bp.route('/monitoring/push')
+def push_stats():
+    """Push notification queue, throughput and provider latency in this worker"""
+    _require_admin_or_api_key()
+    return jsonify({
+        'status': 'success',
+        'data': push_dispatcher.stats()
+    })
+
+@admin_bp.route('/metrics')
+def metrics():
+    """Request metrics in the Prometheus text format"""
+    _require_admin_or_api_key()
+    snapshot, _ = monitor.snapshot()
+    return Response(render_prometheus(snapshot), mimetype='text/plain; version=0.0.4')
@@ -3,7 +3,21 @@ from app.extensions import db, limiter
 from flask_login import current_user
 from app.models.user import User
 from app.models.project import Project
+from app.api.serializers import ColumnSerializer, ProjectSerializer
+from app.utils.access_control import has_project_access
+from app.utils.chunked_upload import UploadError
+from app.utils.direct_upload import (
+    check_idempotency_key, find_replay, spool_multipart, spool_stream, store_direct_upload
+)
+from app.utils.mobile_integration import (
+    get_user_notification_preferences, register_device_token, update_user_notification_preferences
+)
+from app.utils.offline_reports import process_offline_daily_reports
+from app.utils.payload_encoding import negotiated
+from app.utils.sync import changes_since, sync_entities
+from app.utils.visible_projects import filter_visible, load_visible_projects, visible_project_ids
 from datetime import datetime, timedelta
+import json
 import jwt
 
 mobile_bp = Blueprint('mobile_api', __name__)
@@ -78,6 +92,7 @@ def login():
     })
 
 @mobile_bp.route('/projects', methods=['GET'])
+@negotiated
 def get_projects():
     """Get projects accessible to the user"""
     user = verify_api_key() or verify_token(request.headers.get('Authorization', '').replace('Bearer ', ''))
@@ -86,69 +101,183 @@ def get_projects():
         return jsonify({'error': 'Unauthorized'}), 401
     
     # Get user's projects
-    user_projects = [pu.project.to_dict() for pu in user.projects.all()]
+    projects = filter_visible(ProjectSerializer.query(), user, Project.id).order_by(Project.id)
     
-    return jsonify({
-        'projects': user_projects,
+    return {
+        'projects': ProjectSerializer.dump_many(projects),
         'timestamp': datetime.utcnow().isoformat()
-    })
+    }
 
 @mobile_bp.route('/sync', methods=['POST'])
+@negotiated
 def sync_data():
-    """Synchronize data between mobile app and server"""
+    """
+    Send the changes to the user's projects since the client's last sync
+    
+    The body is ``{"watermarks": {"<project_id>": <change_seq>}, "limit": n}``;
+    projects missing from ``watermarks`` are sent in full. The response carries
+    the changed rows per entity, the IDs deleted per entity and the watermarks
+    to send next time. While ``has_more`` is true the client should call again
+    at once; projects listed in ``reset`` or missing from ``project_ids`` must be
+    dropped from the device first.
+    """
     user = verify_api_key() or verify_token(request.headers.get('Authorization', '').replace('Bearer ', ''))
     
     if not user:
         return jsonify({'error': 'Unauthorized'}), 401
     
-    data = request.get_json() or {}
-    
-    # Process incoming sync data (implementation needed)
-    
-    # Return updated data
-    max_days = current_app.config.get('MOBILE_SYNC_MAX_DAYS', 30)
-    since_date = datetime.utcnow() - timedelta(days=max_days)
-    
-    # Get data to sync (implementation needed)
-    sync_data = {
-        'projects': [],
-        'daily_reports': [],
-        'safety_observations': [],
+    data = request.get_json(silent=True) or {}
+    page_size = current_app.config.get('MOBILE_SYNC_PAGE_SIZE', 500)
+    try:
+        known = {int(project_id): int(watermark) for project_id, watermark in (data.get('watermarks') or {}).items()}
+        limit = min(int(data.get('limit') or page_size), page_size)
+    except (AttributeError, TypeError, ValueError):
+        return jsonify({'error': 'Invalid watermarks'}), 400
+    
+    # Admins see every project but sync only those they are members of
+    visible = visible_project_ids(user)
+    project_ids = list(visible if visible is not None else load_visible_projects(user.id))
+    watermarks = {project_id: max(known.get(project_id, 0), 0) for project_id in project_ids}
+    result = changes_since(watermarks, max(limit, 1))
+    
+    sync_data = {entity: ColumnSerializer.dump_many(result['changes'].get(entity, []))
+                 for entity in sync_entities()}
+    sync_data.update({
+        'deleted': result['deleted'],
+        'project_ids': project_ids,
+        'watermarks': {str(project_id): watermark for project_id, watermark in result['watermarks'].items()},
+        'has_more': result['has_more'],
+        'reset': result['reset'],
         'timestamp': datetime.utcnow().isoformat()
-    }
+    })
     
-    return jsonify(sync_data)
+    return sync_data
 
 @mobile_bp.route('/upload-photo', methods=['POST'])
 @limiter.limit("10 per minute")
 def upload_photo():
-    """Upload photo from mobile app"""
+    """
+    Upload photos from the mobile app; the body is streamed to disk and hashed as it arrives
+    
+    Either one image as the raw body (``image/*`` or ``application/octet-stream``)
+    with ``?project_id=&filename=``, optional ``title``, ``description``,
+    ``location`` and ``daily_report_id`` arguments and an ``Idempotency-Key``
+    header; or a ``multipart/form-data`` batch with a ``project_id`` field, one
+    file part per photo named by its idempotency key and an optional ``metadata``
+    field holding a JSON object of options per part name. A retry with a key
+    that was already stored returns the original photo instead of a new one.
+    """
     user = verify_api_key() or verify_token(request.headers.get('Authorization', '').replace('Bearer ', ''))
     
     if not user:
         return jsonify({'error': 'Unauthorized'}), 401
     
-    data = request.get_json()
-    
-    if not data or not data.get('image') or not data.get('project_id'):
+    max_size = current_app.config.get('MOBILE_UPLOAD_MAX_SIZE', 10 * 1024 * 1024)
+    if request.mimetype == 'multipart/form-data':
+        # project_id may come in the query string so a bad one is refused before the body is read
+        if 'project_id' in request.args:
+            project_error = _photo_project_error(user, request.args.get('project_id', type=int))
+            if project_error:
+                return project_error
+        try:
+            form, parts = spool_multipart(request.environ, max_size,
+                                          current_app.config.get('MOBILE_UPLOAD_MAX_PHOTOS', 20))
+        except UploadError as e:
+            return jsonify({'success': False, 'error': str(e)}), e.status
+        return _store_photo_batch(user, form, parts)
+    
+    if not (request.mimetype.startswith('image/') or request.mimetype == 'application/octet-stream'):
         return jsonify({
             'success': False,
-            'error': 'Missing required parameters'
-        }), 400
-    
-    result = save_mobile_photo(
-        data.get('image'), 
-        data.get('project_id'),
-        data.get('record_type'),
-        data.get('record_id')
-    )
-    
-    return jsonify(result)
+            'error': 'Send the image as the request body or as multipart/form-data'
+        }), 415
+    project_error = _photo_project_error(user, request.args.get('project_id', type=int))
+    if project_error:
+        return project_error
+    key = request.headers.get('Idempotency-Key')
+    try:
+        check_idempotency_key(key)
+        # A retry of a stored upload is answered without reading the body again
+        replay = find_replay(user, key)
+        if replay is not None:
+            return jsonify(_photo_result(key, replay, False))
+        if request.content_length and request.content_length > max_size:
+            raise UploadError(f'File is larger than the {max_size} byte limit', status=413)
+        spooled = spool_stream(request.stream, max_size)
+        upload, created = store_direct_upload(
+            user, request.args.get('project_id', type=int), 'photo', spooled, request.args.get('filename'),
+            content_type=request.mimetype, options=_photo_options(request.args), idempotency_key=key)
+    except UploadError as e:
+        return jsonify({'success': False, 'error': str(e)}), e.status
+    return jsonify(_photo_result(key, upload, created)), 201 if created else 200
+
+PHOTO_OPTIONS = ('title', 'description', 'location', 'daily_report_id')
+
+def _photo_options(values):
+    return {name: values[name] for name in PHOTO_OPTIONS if values.get(name)}
+
+def _photo_result(key, upload, created):
+    return {
+        'key': key,
+        'success': True,
+        'duplicate': not created,
+        'photo_id': upload.record_id,
+        'sha256': upload.sha256,
+        'size': upload.total_size
+    }
+
+def _photo_project_error(user, project_id):
+    if not project_id or db.session.get(Project, project_id) is None:
+        return jsonify({'success': False, 'error': 'A valid project_id is required'}), 400
+    if not has_project_access(user, project_id):
+        return jsonify({'success': False, 'error': 'You do not have access to this project'}), 403
+    return None
+
+def _store_photo_batch(user, form, parts):
+    """Store each spooled part; one bad photo does not fail the others"""
+    project_id = request.args.get('project_id', type=int) or form.get('project_id', type=int)
+    error = _photo_project_error(user, project_id)
+    try:
+        metadata = json.loads(form.get('metadata') or '{}')
+    except ValueError:
+        metadata = None
+    if not error and not isinstance(metadata, dict):
+        error = jsonify({'success': False, 'error': 'metadata must be a JSON object'}), 400
+    if error:
+        for _, _, _, spooled in parts:
+            spooled.discard()
+        return error
+    
+    results = []
+    try:
+        for key, filename, content_type, spooled in parts:
+            options = metadata.get(key) if isinstance(metadata.get(key), dict) else {}
+            try:
+                upload, created = store_direct_upload(
+                    user, project_id, 'photo', spooled, filename,
+                    content_type=content_type, options=_photo_options(options), idempotency_key=key)
+                results.append(_photo_result(key, upload, created))
+            except UploadError as e:
+                results.append({'key': key, 'success': False, 'error': str(e)})
+    finally:
+        # Parts not reached because of an unexpected error
+        for _, _, _, spooled in parts:
+            spooled.discard()
+    return jsonify({
+        'success': all(result['success'] for result in results),
+        'results': results
+    })
 
 @mobile_bp.route('/sync-reports', methods=['POST'])
 @limiter.limit("10 per minute")
+@negotiated
 def sync_reports():
-    """Sync offline daily reports"""
+    """
+    Store daily reports written offline, in one transaction
+    
+    Takes ``{"reports": [...]}`` (see ``process_offline_daily_reports``);
+    every report carries a ``client_uuid``, so resending a batch is safe.
+    """
     user = verify_api_key() or verify_token(request.headers.get('Authorization', '').replace('Bearer ', ''))
     
     if not user:
@@ -161,12 +290,18 @@ def sync_reports():
             'success': False,
             'error': 'Invalid data format'
         }), 400
+    max_reports = current_app.config.get('MOBILE_SYNC_MAX_REPORTS', 200)
+    if len(data['reports']) > max_reports:
+        return jsonify({
+            'success': False,
+            'error': f'At most {max_reports} reports can be sent at once'
+        }), 413
     
-    results = process_offline_daily_reports(data.get('reports'), user.id)
-    return jsonify(results)
+    return process_offline_daily_reports(data['reports'], user.id)
 
 @mobile_bp.route('/notification-preferences', methods=['GET'])
 @limiter.limit("10 per minute")
+@negotiated
 def get_notifications():
     """Get user notification preferences"""
     user = verify_api_key() or verify_token(request.headers.get('Authorization', '').replace('Bearer ', ''))
@@ -175,10 +310,11 @@ def get_notifications():
         return jsonify({'error': 'Unauthorized'}), 401
     
     preferences = get_user_notification_preferences(user.id)
-    return jsonify(preferences)
+    return preferences
 
 @mobile_bp.route('/notification-preferences', methods=['POST'])
 @limiter.limit("10 per minute")
+@negotiated
 def update_notifications():
     """Update user notification preferences"""
     user = verify_api_key() or verify_token(request.headers.get('Authorization', '').replace('Bearer ', ''))
@@ -195,7 +331,7 @@ def update_notifications():
         }), 400
     
     result = update_user_notification_preferences(user.id, data)
-    return jsonify(result)
+    return result
 
 @mobile_bp.route('/register-device', methods=['POST'])
 @limiter.limit("10 per minute")
@@ -215,4 +351,4 @@ def register_device():
         }), 400
     
     result = register_device_token(user.id, data.get('token'), data.get('platform'))
-    return jsonify(result)
\ No newline at end of file
+    return jsonify(result), 200 if result['success'] else 400
\ No newline at end of file
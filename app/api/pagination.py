@@ -0,0 +1,112 @@
+"""Keyset (cursor) pagination for API list endpoints.
+
+Lists are ordered by ``(date DESC NULLS FIRST, id DESC)`` and each page
+continues strictly after the last row of the previous one, so the database
+seeks straight to the page through a ``(project_id, date, id)`` index instead
+of counting past an OFFSET. The cursor is an opaque URL-safe token.
+"""
+import base64
+import json
+from datetime import date, datetime
+
+from sqlalchemy import and_, or_, tuple_
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+
+class CursorError(ValueError):
+    """Raised for malformed or mismatched cursors and limits"""
+
+
+def encode_cursor(sort_key, value, row_id):
+    """
+    Build an opaque cursor pointing just after a row
+
+    Args:
+        sort_key: Name of the date attribute the list is ordered by
+        value: The row's date value (may be None)
+        row_id: The row's primary key
+    """
+    payload = {'k': sort_key, 'v': value.isoformat() if value is not None else None, 'i': row_id}
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, sort_column):
+    """
+    Decode a cursor produced by ``encode_cursor`` for the same sort column
+
+    Returns:
+        tuple: (date value or None, row id)
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        payload = json.loads(raw)
+        if payload['k'] != sort_column.key:
+            raise CursorError('Cursor does not belong to this list')
+        row_id = int(payload['i'])
+        value = payload['v']
+        if value is not None:
+            if sort_column.type.python_type is datetime:
+                value = datetime.fromisoformat(value)
+            else:
+                value = date.fromisoformat(value)
+        return value, row_id
+    except CursorError:
+        raise
+    except (ValueError, TypeError, KeyError, NotImplementedError):
+        raise CursorError('Invalid cursor')
+
+
+def page_args(args):
+    """
+    Read ``limit`` and ``cursor`` from request arguments
+
+    Returns:
+        tuple: (limit, cursor token or None)
+    """
+    try:
+        limit = int(args.get('limit', DEFAULT_LIMIT))
+    except (TypeError, ValueError):
+        raise CursorError('limit must be an integer')
+    if limit < 1:
+        raise CursorError('limit must be at least 1')
+    return min(limit, MAX_LIMIT), args.get('cursor') or None
+
+
+def keyset_page(query, sort_column, id_column, limit, cursor=None):
+    """
+    Fetch one page of a query ordered by ``(sort_column DESC, id DESC)``
+
+    Args:
+        query: Filtered SQLAlchemy query (without ORDER BY)
+        sort_column: Date/DateTime model attribute to page on
+        id_column: Primary key attribute used as tie-breaker
+        limit: Page size
+        cursor: Token from the previous page's ``next_cursor``
+
+    Returns:
+        tuple: (rows, next_cursor or None)
+    """
+    if cursor:
+        value, row_id = decode_cursor(cursor, sort_column)
+        if value is None:
+            # Still inside the leading NULL group
+            query = query.filter(or_(
+                and_(sort_column.is_(None), id_column < row_id),
+                sort_column.isnot(None)
+            ))
+        else:
+            # A row-value comparison is one index range; the equivalent OR is not
+            # turned into a seek by PostgreSQL. NULL dates compare as NULL and
+            # are excluded, which is right since they came first.
+            query = query.filter(tuple_(sort_column, id_column) < tuple_(value, row_id))
+
+    rows = query.order_by(sort_column.desc().nulls_first(), id_column.desc()).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(sort_column.key, getattr(last, sort_column.key), getattr(last, id_column.key))
@@ -1,14 +1,25 @@
-from flask import Blueprint, jsonify, request, abort
+from flask import Blueprint, jsonify, request, abort, Response, stream_with_context, current_app
 from flask_login import login_required, current_user
 from app.models.project import Project
 from app.models.engineering import RFI, Submittal
-from app.models.field import DailyReport, Punchlist, Photo
+from app.models.field import DailyReport, Punchlist
 from app.models.safety import SafetyObservation, IncidentReport
 from app.models.cost import Invoice, ChangeOrder
 from app.extensions import db
-from app.utils.access_control import role_required
+from app.utils.access_control import role_required, is_admin_user
+from app.utils.visible_projects import filter_visible, visible_project_ids
 from app.auth.routes import token_auth
-from app.models.user import User
+from app.models.base import UploadSession
+from app.api.serializers import (
+    ProjectSerializer, ProjectDetailSerializer, RFISerializer, SubmittalSerializer,
+    DailyReportSerializer, DailyReportDetailSerializer, SafetyObservationSerializer,
+    ChangeOrderSerializer
+)
+from app.api.pagination import CursorError, keyset_page, page_args
+from app.utils.streaming_export import EXPORT_FORMATS, MIMETYPES, iter_export
+from app.utils.chunked_upload import (
+    UploadError, create_upload, discard_upload, finalize_upload, upload_offset, write_chunk
+)
 from datetime import datetime, timedelta
 import hashlib
 import json
@@ -26,33 +37,57 @@ def before_api_request():
     # Validate auth/API key here if needed
     pass
 
+COST_ROLES = ['Admin', 'Owner', 'Owners Representative', 'General Contractor']
+
+def _role_name(user):
+    return user.role.name if getattr(user, 'role', None) is not None else None
+
+def _can_access_project(user, project_id):
+    """Admins see every project; others need a membership in their visible set"""
+    visible = visible_project_ids(user)
+    return visible is None or project_id in visible
+
+def _forbidden(message='You do not have permission to access this project'):
+    return jsonify({
+        'status': 'error',
+        'message': message
+    }), 403
+
+def _list_response(results):
+    return jsonify({
+        'status': 'success',
+        'data': results,
+        'count': len(results)
+    })
+
+def _paginated_response(serializer, query, sort_column):
+    """One keyset page of ``query`` (``?limit=N&cursor=...``), newest first"""
+    try:
+        limit, cursor = page_args(request.args)
+        rows, next_cursor = keyset_page(query, sort_column, serializer.model.id, limit, cursor)
+    except CursorError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+    
+    return jsonify({
+        'status': 'success',
+        'data': serializer.dump_many(rows),
+        'count': len(rows),
+        'limit': limit,
+        'next_cursor': next_cursor
+    })
+
 @api_bp.route('/projects')
 @token_auth.login_required
 def get_projects():
     """API endpoint to get projects list"""
     user = token_auth.current_user()
     
-    if user.role == 'Admin':
-        projects = Project.query.all()
-    else:
-        projects = Project.query.join(Project.users).filter(User.id == user.id).all()
-    
-    results = []
-    for project in projects:
-        results.append({
-            'id': project.id,
-            'name': project.name,
-            'number': project.number,
-            'status': project.status,
-            'start_date': project.start_date.isoformat() if project.start_date else None,
-            'end_date': project.end_date.isoformat() if project.end_date else None
-        })
+    projects = filter_visible(ProjectSerializer.query(), user, Project.id).all()
     
-    return jsonify({
-        'status': 'success',
-        'data': results,
-        'count': len(results)
-    })
+    return _list_response(ProjectSerializer.dump_many(projects))
 
 @api_bp.route('/projects/<int:id>')
 @token_auth.login_required
@@ -62,40 +97,12 @@ def get_project(id):
     project = Project.query.get_or_404(id)
     
     # Check if user has access
-    if user.role != 'Admin' and user not in project.users:
-        return jsonify({
-            'status': 'error',
-            'message': 'You do not have permission to access this project'
-        }), 403
-    
-    # Get summary counts
-    rfi_count = RFI.query.filter_by(project_id=id).count()
-    submittal_count = Submittal.query.filter_by(project_id=id).count()
-    daily_report_count = DailyReport.query.filter_by(project_id=id).count()
-    
-    result = {
-        'id': project.id,
-        'name': project.name,
-        'number': project.number if hasattr(project, 'number') else '',
-        'description': project.description,
-        'address': project.address if hasattr(project, 'address') else '',
-        'city': project.city if hasattr(project, 'city') else '',
-        'state': project.state if hasattr(project, 'state') else '',
-        'zip_code': project.zip_code if hasattr(project, 'zip_code') else '',
-        'status': project.status,
-        'start_date': project.start_date.isoformat() if project.start_date else None,
-        'end_date': project.end_date.isoformat() if project.end_date else None,
-        'owner': project.owner.name if hasattr(project, 'owner') and project.owner else None,
-        'summary': {
-            'rfi_count': rfi_count,
-            'submittal_count': submittal_count,
-            'daily_report_count': daily_report_count
-        }
-    }
+    if not _can_access_project(user, id):
+        return _forbidden()
     
     return jsonify({
         'status': 'success',
-        'data': result
+        'data': ProjectDetailSerializer.dump(project)
     })
 
 @api_bp.route('/projects/<int:id>/rfis')
@@ -103,160 +110,57 @@ def get_project(id):
 def get_project_rfis(id):
     """API endpoint to get RFIs for a project"""
     user = token_auth.current_user()
-    project = Project.query.get_or_404(id)
+    Project.query.get_or_404(id)
     
     # Check if user has access
-    if user.role != 'Admin' and user not in project.users:
-        return jsonify({
-            'status': 'error',
-            'message': 'You do not have permission to access this project'
-        }), 403
-    
-    rfis = RFI.query.filter_by(project_id=id).order_by(RFI.date_submitted.desc()).all()
-    
-    results = []
-    for rfi in rfis:
-        results.append({
-            'id': rfi.id,
-            'number': rfi.number,
-            'subject': rfi.subject,
-            'status': rfi.status,
-            'date_submitted': rfi.date_submitted.isoformat(),
-            'date_required': rfi.date_required.isoformat() if rfi.date_required else None,
-            'date_answered': rfi.date_answered.isoformat() if rfi.date_answered else None,
-            'has_answer': bool(rfi.answer and rfi.answer.strip())
-        })
+    if not _can_access_project(user, id):
+        return _forbidden()
     
-    return jsonify({
-        'status': 'success',
-        'data': results,
-        'count': len(results)
-    })
+    return _paginated_response(RFISerializer, RFISerializer.query(RFI.project_id == id),
+                               RFI.date_submitted)
 
 @api_bp.route('/projects/<int:id>/submittals')
 @token_auth.login_required
 def get_project_submittals(id):
     """API endpoint to get submittals for a project"""
     user = token_auth.current_user()
-    project = Project.query.get_or_404(id)
+    Project.query.get_or_404(id)
     
     # Check if user has access
-    if user.role != 'Admin' and user not in project.users:
-        return jsonify({
-            'status': 'error',
-            'message': 'You do not have permission to access this project'
-        }), 403
-    
-    submittals = Submittal.query.filter_by(project_id=id).order_by(Submittal.date_submitted.desc()).all()
-    
-    results = []
-    for submittal in submittals:
-        results.append({
-            'id': submittal.id,
-            'number': submittal.number,
-            'title': submittal.title,
-            'status': submittal.status,
-            'specification_section': submittal.specification_section,
-            'date_submitted': submittal.date_submitted.isoformat(),
-            'date_required': submittal.date_required.isoformat() if submittal.date_required else None,
-            'date_returned': submittal.date_returned.isoformat() if submittal.date_returned else None
-        })
+    if not _can_access_project(user, id):
+        return _forbidden()
     
-    return jsonify({
-        'status': 'success',
-        'data': results,
-        'count': len(results)
-    })
+    return _paginated_response(SubmittalSerializer, SubmittalSerializer.query(Submittal.project_id == id),
+                               Submittal.date_submitted)
 
 @api_bp.route('/projects/<int:id>/daily-reports')
 @token_auth.login_required
 def get_project_daily_reports(id):
     """API endpoint to get daily reports for a project"""
     user = token_auth.current_user()
-    project = Project.query.get_or_404(id)
+    Project.query.get_or_404(id)
     
     # Check if user has access
-    if user.role != 'Admin' and user not in project.users:
-        return jsonify({
-            'status': 'error',
-            'message': 'You do not have permission to access this project'
-        }), 403
-    
-    reports = DailyReport.query.filter_by(project_id=id).order_by(DailyReport.report_date.desc()).all()
-    
-    results = []
-    for report in reports:
-        results.append({
-            'id': report.id,
-            'report_number': report.report_number,
-            'report_date': report.report_date.isoformat(),
-            'weather_conditions': report.weather_condition,  # Changed from weather_conditions to match model
-            'temperature_high': report.temperature_high,
-            'temperature_low': report.temperature_low,
-            'manpower_count': report.labor_count,  # Changed from manpower_count to match model
-            'delays': hasattr(report, 'delays') and report.delays
-        })
+    if not _can_access_project(user, id):
+        return _forbidden()
     
-    return jsonify({
-        'status': 'success',
-        'data': results,
-        'count': len(results)
-    })
+    return _paginated_response(DailyReportSerializer, DailyReportSerializer.query(DailyReport.project_id == id),
+                               DailyReport.report_date)
 
 @api_bp.route('/daily-reports/<int:id>')
 @token_auth.login_required
 def get_daily_report(id):
     """API endpoint to get a specific daily report"""
     user = token_auth.current_user()
-    report = DailyReport.query.get_or_404(id)
-    project = Project.query.get(report.project_id)
+    report = DailyReportDetailSerializer.query(DailyReport.id == id).first_or_404()
     
     # Check if user has access
-    if user.role != 'Admin' and user not in project.users:
-        return jsonify({
-            'status': 'error',
-            'message': 'You do not have permission to access this report'
-        }), 403
-    
-    # Get photos for this report
-    photos = Photo.query.filter_by(daily_report_id=id).all()
-    photos_data = []
-    
-    for photo in photos:
-        photos_data.append({
-            'id': photo.id,
-            'title': photo.title,
-            'description': photo.description,
-            'file_path': photo.file_path,
-            'taken_at': photo.taken_at.isoformat() if hasattr(photo, 'taken_at') and photo.taken_at else None
-        })
-    
-    report_data = {
-        'id': report.id,
-        'report_number': report.report_number,
-        'report_date': report.report_date.isoformat(),
-        'weather_condition': report.weather_condition,
-        'temperature_high': report.temperature_high,
-        'temperature_low': report.temperature_low,
-        'precipitation': report.precipitation,
-        'wind_speed': report.wind_speed,
-        'labor_count': report.labor_count,
-        'delays': hasattr(report, 'delays') and report.delays,
-        'delay_reason': report.delay_reason if hasattr(report, 'delay_reason') else '',
-        'work_performed': report.work_performed if hasattr(report, 'work_performed') else '',
-        'materials_received': report.materials_received,
-        'equipment_used': '',  # This field might not exist in your model
-        'visitors': '',  # This field might not exist in your model
-        'safety_incidents': '',  # This field might not exist in your model
-        'quality_issues': '',  # This field might not exist in your model
-        'created_by': report.author.full_name if hasattr(report, 'author') and report.author else 'Unknown',
-        'created_at': report.created_at.isoformat() if report.created_at else None,
-        'photos': photos_data
-    }
+    if not _can_access_project(user, report.project_id):
+        return _forbidden('You do not have permission to access this report')
     
     return jsonify({
         'status': 'success',
-        'data': report_data
+        'data': DailyReportDetailSerializer.dump(report)
     })
 
 @api_bp.route('/projects/<int:id>/safety/observations')
@@ -264,72 +168,69 @@ def get_daily_report(id):
 def get_project_safety_observations(id):
     """API endpoint to get safety observations for a project"""
     user = token_auth.current_user()
-    project = Project.query.get_or_404(id)
+    Project.query.get_or_404(id)
     
     # Check if user has access
-    if user.role != 'Admin' and user not in project.users:
-        return jsonify({
-            'status': 'error',
-            'message': 'You do not have permission to access this project'
-        }), 403
-    
-    observations = SafetyObservation.query.filter_by(project_id=id).order_by(
-        SafetyObservation.observation_date.desc()).all()
-    
-    results = []
-    for obs in observations:
-        observer_name = User.query.get(obs.observed_by).name if obs.observed_by else "Unknown"
-        results.append({
-            'id': obs.id,
-            'title': obs.title,
-            'category': obs.category,
-            'severity': obs.severity,
-            'observation_date': obs.observation_date.isoformat(),
-            'location': obs.location,
-            'status': obs.status,
-            'observed_by': observer_name
-        })
+    if not _can_access_project(user, id):
+        return _forbidden()
     
-    return jsonify({
-        'status': 'success',
-        'data': results,
-        'count': len(results)
-    })
+    return _paginated_response(SafetyObservationSerializer,
+                               SafetyObservationSerializer.query(SafetyObservation.project_id == id),
+                               SafetyObservation.observation_date)
 
 @api_bp.route('/projects/<int:id>/cost/change-orders')
 @token_auth.login_required
 def get_project_change_orders(id):
     """API endpoint to get change orders for a project"""
     user = token_auth.current_user()
-    project = Project.query.get_or_404(id)
+    Project.query.get_or_404(id)
     
     # Check if user has access and proper role for cost data
-    if user.role not in ['Admin', 'Owner', 'Owners Representative', 'General Contractor'] or (user.role != 'Admin' and user not in project.users):
+    if (_role_name(user) not in COST_ROLES and not is_admin_user(user)) or not _can_access_project(user, id):
+        return _forbidden('You do not have permission to access this cost data')
+    
+    return _paginated_response(ChangeOrderSerializer, ChangeOrderSerializer.query(ChangeOrder.project_id == id),
+                               ChangeOrder.created_at)
+
+PROJECT_EXPORTS = ('rfis', 'submittals', 'daily-reports', 'safety-observations', 'change-orders')
+
+def _stream_export(name, project_ids=None):
+    """Stream an export as ``?format=ndjson|csv|json`` (defaults to NDJSON)"""
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
         return jsonify({
             'status': 'error',
-            'message': 'You do not have permission to access this cost data'
-        }), 403
-    
-    change_orders = ChangeOrder.query.filter_by(project_id=id).order_by(
-        ChangeOrder.change_order_number).all()  # Changed from number to change_order_number
-    
-    results = []
-    for co in change_orders:
-        results.append({
-            'id': co.id,
-            'number': co.change_order_number,  # Changed from number to change_order_number
-            'title': co.title,
-            'amount': float(co.amount),
-            'status': co.status,
-            'date_issued': co.date_submitted.isoformat() if hasattr(co, 'date_submitted') else None,  # Changed from date_issued
-            'date_approved': co.date_approved.isoformat() if co.date_approved else None
-        })
+            'message': f"format must be one of: {', '.join(EXPORT_FORMATS)}"
+        }), 400
     
-    return jsonify({
-        'status': 'success',
-        'data': results,
-        'count': len(results)
-    })
+    response = Response(
+        stream_with_context(iter_export(name, export_format, project_ids)),
+        mimetype=MIMETYPES[export_format]
+    )
+    response.headers['Content-Disposition'] = f'attachment; filename={name}.{export_format}'
+    return response
+
+@api_bp.route('/export/projects')
+@token_auth.login_required
+def export_projects():
+    """Stream every project the user can access"""
+    return _stream_export('projects', visible_project_ids(token_auth.current_user()))
+
+@api_bp.route('/projects/<int:id>/export/<module>')
+@token_auth.login_required
+def export_project_module(id, module):
+    """Stream one module's records for a project"""
+    user = token_auth.current_user()
+    if module not in PROJECT_EXPORTS:
+        abort(404)
+    Project.query.get_or_404(id)
+    
+    if not _can_access_project(user, id):
+        return _forbidden()
+    if module == 'change-orders' and _role_name(user) not in COST_ROLES and not is_admin_user(user):
+        return _forbidden('You do not have permission to access this cost data')
+    
+    return _stream_export(module, [id])
 
 @api_bp.route('/verify-document', methods=['POST'])
 @token_auth.login_required
@@ -388,14 +289,11 @@ def create_daily_report():
         }), 400
     
     project_id = data.get('project_id')
-    project = Project.query.get_or_404(project_id)
+    Project.query.get_or_404(project_id)
     
     # Check if user has access
-    if user.role != 'Admin' and user not in project.users:
-        return jsonify({
-            'status': 'error',
-            'message': 'You do not have permission to access this project'
-        }), 403
+    if not _can_access_project(user, project_id):
+        return _forbidden()
     
     # Check if a report already exists for today
     today = datetime.now().date()
@@ -439,4 +337,136 @@ def create_daily_report():
         'status': 'success',
         'message': 'Daily report created successfully',
         'report_id': report.id
-    })
\ No newline at end of file
+    })
+
+
+def _upload_error(e):
+    return jsonify({
+        'status': 'error',
+        'message': str(e)
+    }), e.status
+
+def _upload_data(upload):
+    return {
+        'id': upload.id,
+        'project_id': upload.project_id,
+        'target': upload.target,
+        'filename': upload.filename,
+        'size': upload.total_size,
+        'offset': upload_offset(upload) if upload.status == 'pending' else upload.total_size,
+        'status': upload.status,
+        'sha256': upload.sha256,
+        'record_id': upload.record_id,
+        'chunk_size': current_app.config.get('UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024)
+    }
+
+def _get_upload(upload_id, user):
+    upload = db.session.get(UploadSession, upload_id)
+    if upload is None or upload.user_id != user.id:
+        abort(404)
+    return upload
+
+def _chunk_offset():
+    """Start offset from ``Content-Range: bytes start-end/total`` or ``?offset=``"""
+    content_range = request.headers.get('Content-Range', '')
+    if content_range.startswith('bytes ') and '-' in content_range:
+        return int(content_range[6:].split('-', 1)[0])
+    return int(request.args.get('offset', 0))
+
+@api_bp.route('/uploads', methods=['POST'])
+@token_auth.login_required
+def create_upload_session():
+    """Open a resumable upload: ``{project_id, target, filename, size, sha256?, options?}``"""
+    user = token_auth.current_user()
+    data = request.get_json(silent=True) or {}
+    project_id = data.get('project_id')
+    if not isinstance(project_id, int) or db.session.get(Project, project_id) is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'A valid project_id is required'
+        }), 400
+    if not _can_access_project(user, project_id):
+        return _forbidden()
+
+    try:
+        upload = create_upload(user, project_id, data.get('target'), data.get('filename'), data.get('size'),
+                               sha256=data.get('sha256'), content_type=data.get('content_type'),
+                               options=data.get('options'))
+    except UploadError as e:
+        return _upload_error(e)
+
+    return jsonify({
+        'status': 'success',
+        'data': _upload_data(upload)
+    }), 201
+
+@api_bp.route('/uploads/<upload_id>')
+@token_auth.login_required
+def get_upload_session(upload_id):
+    """Upload state; ``offset`` is where a resumed upload continues"""
+    upload = _get_upload(upload_id, token_auth.current_user())
+    return jsonify({
+        'status': 'success',
+        'data': _upload_data(upload)
+    })
+
+@api_bp.route('/uploads/<upload_id>', methods=['PUT'])
+@token_auth.login_required
+def put_upload_chunk(upload_id):
+    """Append the request body at the given offset"""
+    upload = _get_upload(upload_id, token_auth.current_user())
+    try:
+        offset = _chunk_offset()
+    except ValueError:
+        return jsonify({
+            'status': 'error',
+            'message': 'Invalid offset'
+        }), 400
+
+    try:
+        new_offset = write_chunk(upload, offset, request.stream, request.content_length)
+    except UploadError as e:
+        response, status = _upload_error(e)
+        response.headers['Upload-Offset'] = str(upload_offset(upload))
+        return response, status
+
+    response = jsonify({
+        'status': 'success',
+        'data': {'offset': new_offset, 'size': upload.total_size}
+    })
+    response.headers['Upload-Offset'] = str(new_offset)
+    return response
+
+@api_bp.route('/uploads/<upload_id>/finalize', methods=['POST'])
+@token_auth.login_required
+def finalize_upload_session(upload_id):
+    """Verify the checksum and attach the file to its target record"""
+    user = token_auth.current_user()
+    upload = _get_upload(upload_id, user)
+    if not _can_access_project(user, upload.project_id):
+        return _forbidden()
+
+    try:
+        finalize_upload(upload, user)
+    except UploadError as e:
+        return _upload_error(e)
+
+    return jsonify({
+        'status': 'success',
+        'data': _upload_data(upload)
+    }), 201
+
+@api_bp.route('/uploads/<upload_id>', methods=['DELETE'])
+@token_auth.login_required
+def delete_upload_session(upload_id):
+    """Abandon an upload and delete the bytes received so far"""
+    upload = _get_upload(upload_id, token_auth.current_user())
+    if upload.status != 'pending':
+        return jsonify({
+            'status': 'error',
+            'message': 'Upload is already complete'
+        }), 409
+    discard_upload(upload)
+    return jsonify({
+        'status': 'success'
+    })
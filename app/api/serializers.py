@@ -0,0 +1,239 @@
+"""Serializers for the REST API.
+
+Each serializer declares the rows it reads and the loader options needed to
+render them, so a listing runs a fixed number of statements (the base SELECT
+plus one per ``selectinload``) however many rows it returns. Relationships
+that are not declared here must not be touched in ``dump``.
+"""
+from datetime import date
+from decimal import Decimal
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import joinedload
+
+from app.extensions import db
+from app.models.project import Project
+from app.models.engineering import RFI, Submittal
+from app.models.field import DailyReport, Photo
+from app.models.safety import SafetyObservation
+from app.models.cost import ChangeOrder
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+class Serializer:
+    """Base class: subclasses set ``model`` and implement ``dump``"""
+
+    model = None
+
+    @classmethod
+    def load_options(cls):
+        """Loader options applied to every query built by ``query``"""
+        return ()
+
+    @classmethod
+    def query(cls, *criteria):
+        """Return a query for ``model`` with this serializer's loader options"""
+        return cls.model.query.options(*cls.load_options()).filter(*criteria)
+
+    @classmethod
+    def dump(cls, obj):
+        raise NotImplementedError
+
+    @classmethod
+    def dump_many(cls, objects):
+        return [cls.dump(obj) for obj in objects]
+
+
+class ColumnSerializer(Serializer):
+    """Every column of a row, for clients that keep a full copy (mobile sync)"""
+
+    @classmethod
+    def dump(cls, obj):
+        data = {}
+        for attribute in obj.__mapper__.column_attrs:
+            value = getattr(obj, attribute.key)
+            if isinstance(value, date):
+                value = value.isoformat()
+            elif isinstance(value, Decimal):
+                value = float(value)
+            data[attribute.key] = value
+        return data
+
+
+class ProjectSerializer(Serializer):
+    model = Project
+
+    @classmethod
+    def dump(cls, project):
+        return {
+            'id': project.id,
+            'name': project.name,
+            'number': project.number,
+            'status': project.status,
+            'start_date': _iso(project.start_date),
+            'end_date': _iso(project.end_date)
+        }
+
+
+class ProjectDetailSerializer(ProjectSerializer):
+    @classmethod
+    def summary_counts(cls, project_id):
+        """RFI, submittal and daily report counts in a single statement"""
+        row = db.session.execute(select(
+            select(func.count(RFI.id)).where(RFI.project_id == project_id)
+            .scalar_subquery().label('rfi_count'),
+            select(func.count(Submittal.id)).where(Submittal.project_id == project_id)
+            .scalar_subquery().label('submittal_count'),
+            select(func.count(DailyReport.id)).where(DailyReport.project_id == project_id)
+            .scalar_subquery().label('daily_report_count'),
+        )).one()
+        return dict(row._mapping)
+
+    @classmethod
+    def dump(cls, project):
+        data = super().dump(project)
+        data.update({
+            'description': project.description,
+            'address': project.address or '',
+            'city': project.city or '',
+            'state': project.state or '',
+            'zip_code': project.zip_code or '',
+            'owner': project.client_name,
+            'summary': cls.summary_counts(project.id)
+        })
+        return data
+
+
+class RFISerializer(Serializer):
+    model = RFI
+
+    @classmethod
+    def dump(cls, rfi):
+        return {
+            'id': rfi.id,
+            'number': rfi.number,
+            'subject': rfi.subject,
+            'status': rfi.status,
+            'date_submitted': _iso(rfi.date_submitted),
+            'date_required': _iso(rfi.date_required),
+            'date_answered': _iso(rfi.date_answered),
+            'has_answer': bool(rfi.answer and rfi.answer.strip())
+        }
+
+
+class SubmittalSerializer(Serializer):
+    model = Submittal
+
+    @classmethod
+    def dump(cls, submittal):
+        return {
+            'id': submittal.id,
+            'number': submittal.number,
+            'title': submittal.title,
+            'status': submittal.status,
+            'specification_section': submittal.specification_section,
+            'date_submitted': _iso(submittal.date_submitted),
+            'date_required': _iso(submittal.date_required),
+            'date_returned': _iso(submittal.date_returned)
+        }
+
+
+class DailyReportSerializer(Serializer):
+    model = DailyReport
+
+    @classmethod
+    def dump(cls, report):
+        return {
+            'id': report.id,
+            'report_number': report.report_number,
+            'report_date': _iso(report.report_date),
+            'weather_conditions': report.weather_condition,
+            'temperature_high': report.temperature_high,
+            'temperature_low': report.temperature_low,
+            'manpower_count': report.labor_count,
+            'delays': report.work_status == 'delayed'
+        }
+
+
+class DailyReportDetailSerializer(Serializer):
+    model = DailyReport
+
+    @classmethod
+    def load_options(cls):
+        return (joinedload(DailyReport.author),)
+
+    @classmethod
+    def photos(cls, report_id):
+        return Photo.query.filter_by(daily_report_id=report_id).all()
+
+    @classmethod
+    def dump(cls, report, photos=None):
+        photos = cls.photos(report.id) if photos is None else photos
+        return {
+            'id': report.id,
+            'report_number': report.report_number,
+            'report_date': _iso(report.report_date),
+            'weather_condition': report.weather_condition,
+            'temperature_high': report.temperature_high,
+            'temperature_low': report.temperature_low,
+            'precipitation': report.precipitation,
+            'wind_speed': report.wind_speed,
+            'labor_count': report.labor_count,
+            'delays': report.work_status == 'delayed',
+            'delay_reason': report.delay_reason or '',
+            'work_performed': report.work_performed or '',
+            'materials_received': report.materials_received,
+            'equipment_used': '',  # This field might not exist in your model
+            'visitors': '',  # This field might not exist in your model
+            'safety_incidents': '',  # This field might not exist in your model
+            'quality_issues': '',  # This field might not exist in your model
+            'created_by': report.author.name if report.author else 'Unknown',
+            'created_at': _iso(report.created_at),
+            'photos': [{
+                'id': photo.id,
+                'title': photo.title,
+                'description': photo.description,
+                'file_path': photo.filename,
+                'taken_at': _iso(photo.created_at)
+            } for photo in photos]
+        }
+
+
+class SafetyObservationSerializer(Serializer):
+    model = SafetyObservation
+
+    @classmethod
+    def load_options(cls):
+        return (joinedload(SafetyObservation.observer),)
+
+    @classmethod
+    def dump(cls, obs):
+        return {
+            'id': obs.id,
+            'title': obs.title,
+            'category': obs.category,
+            'severity': obs.severity,
+            'observation_date': _iso(obs.observation_date),
+            'location': obs.location,
+            'status': obs.status,
+            'observed_by': obs.observer.name if obs.observer else 'Unknown'
+        }
+
+
+class ChangeOrderSerializer(Serializer):
+    model = ChangeOrder
+
+    @classmethod
+    def dump(cls, co):
+        return {
+            'id': co.id,
+            'number': co.change_order_number,
+            'title': co.title,
+            'amount': float(co.amount or 0),
+            'status': co.status,
+            'date_issued': _iso(co.date_submitted),
+            'date_approved': _iso(co.date_approved)
+        }
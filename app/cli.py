@@ -162,13 +162,31 @@ def register_commands(app):
         
         click.echo(f"Removed {count} old temporary files/directories")
     
+    @maintenance.command()
+    @click.option('--days', default=2, help='Remove pending uploads idle for this many days')
+    def clean_uploads(days):
+        """Remove abandoned chunked uploads"""
+        from datetime import timedelta
+        from app.utils.chunked_upload import purge_stale_uploads
+        
+        count = purge_stale_uploads(timedelta(days=days))
+        click.echo(f"Removed {count} abandoned uploads")
+    
+    @maintenance.command()
+    def clean_blobs():
+        """Remove stored files that no upload record refers to"""
+        from app.utils.blob_store import collect_orphans
+        
+        count = collect_orphans()
+        click.echo(f"Removed {count} unreferenced files")
+    
     @app.cli.group()
     def backup():
         """Database backup commands"""
         pass
         
-    @backup.command()
-    def db():
+    @backup.command('db')
+    def database():
         """Backup database to file"""
         with app.app_context():
             if backup_database():
@@ -377,78 +395,113 @@ def register_commands(app):
     
     @export.command()
     @click.argument('output_file')
-    @click.option('--type', default='json', type=click.Choice(['json', 'csv']), 
-                help='Export format (json or csv)')
+    @click.option('--type', default='json', type=click.Choice(['json', 'ndjson', 'csv']), 
+                help='Export format (json, ndjson or csv)')
     def projects(output_file, type):
         """Export projects data to file"""
-        from app.models.project import Project
-        import json
-        import csv
-        
-        projects = Project.query.all()
-        if not projects:
-            click.echo("No projects to export.")
-            return
+        from app.utils.streaming_export import write_export
         
-        if type == 'json':
-            with open(output_file, 'w') as f:
-                json_data = [project.to_dict() for project in projects]
-                json.dump(json_data, f, indent=2)
-        elif type == 'csv':
-            with open(output_file, 'w', newline='') as f:
-                writer = csv.writer(f)
-                # Write header
-                writer.writerow(['id', 'number', 'name', 'description', 'status', 
-                                'start_date', 'target_completion_date', 'client_name'])
-                
-                # Write data
-                for project in projects:
-                    writer.writerow([
-                        project.id,
-                        project.number,
-                        project.name,
-                        project.description,
-                        project.status,
-                        project.start_date,
-                        project.target_completion_date,
-                        project.client_name
-                    ])
-        
-        click.echo(f"Exported {len(projects)} projects to {output_file}")
+        count = write_export('projects', output_file, type)
+        click.echo(f"Exported {count} projects to {output_file}")
     
     @export.command()
     @click.argument('output_file')
-    @click.option('--type', default='json', type=click.Choice(['json', 'csv']), 
-                help='Export format (json or csv)')
+    @click.option('--type', default='json', type=click.Choice(['json', 'ndjson', 'csv']), 
+                help='Export format (json, ndjson or csv)')
     def users(output_file, type):
         """Export users data to file"""
-        import json
-        import csv
+        from app.utils.streaming_export import write_export
         
-        users = User.query.all()
-        if not users:
-            click.echo("No users to export.")
-            return
+        count = write_export('users', output_file, type)
+        click.echo(f"Exported {count} users to {output_file}")
+    
+    @export.command()
+    @click.argument('name', type=click.Choice(['rfis', 'submittals', 'daily-reports',
+                                               'safety-observations', 'change-orders']))
+    @click.argument('output_file')
+    @click.option('--type', default='ndjson', type=click.Choice(['json', 'ndjson', 'csv']), 
+                help='Export format (json, ndjson or csv)')
+    @click.option('--project-id', type=int, multiple=True, help='Only export these projects')
+    def module(name, output_file, type, project_id):
+        """Export a module's records (RFIs, daily reports, cost, safety) to file"""
+        from app.utils.streaming_export import write_export
+        
+        count = write_export(name, output_file, type, project_id or None)
+        click.echo(f"Exported {count} {name} to {output_file}")
+    
+    @app.cli.group()
+    def cost():
+        """Cost rollup commands"""
+        pass
+    
+    @cost.command('rebuild-rollups')
+    @click.option('--project-id', type=int, multiple=True, help='Only rebuild these projects')
+    @with_appcontext
+    def rebuild_rollups(project_id):
+        """Recompute the per-project cost rollup table"""
+        from app.utils.cost_rollup import rebuild_cost_rollups
         
-        if type == 'json':
-            with open(output_file, 'w') as f:
-                json_data = [user.to_dict() for user in users]
-                json.dump(json_data, f, indent=2)
-        elif type == 'csv':
-            with open(output_file, 'w', newline='') as f:
-                writer = csv.writer(f)
-                # Write header
-                writer.writerow(['id', 'email', 'name', 'role', 'is_active', 'last_seen'])
-                
-                # Write data
-                for user in users:
-                    writer.writerow([
-                        user.id,
-                        user.email,
-                        user.name,
-                        user.role.name if user.role else 'No Role',
-                        user.is_active,
-                        user.last_seen
-                    ])
-        
-        click.echo(f"Exported {len(users)} users to {output_file}")
\ No newline at end of file
+        count = rebuild_cost_rollups(project_id or None)
+        click.echo(f"Rebuilt cost rollups for {count} projects")
+    
+    @app.cli.group()
+    def sync():
+        """Mobile sync commands"""
+        pass
+    
+    @sync.command()
+    @with_appcontext
+    def backfill():
+        """Number syncable rows written outside the ORM (bulk inserts, raw SQL)"""
+        from app.utils.sync import backfill_change_seqs
+        
+        count = backfill_change_seqs()
+        click.echo(f"Numbered {count} rows for mobile sync")
+    
+    @app.cli.group()
+    def jobs():
+        """Background job commands"""
+        pass
+    
+    @jobs.command()
+    @click.option('--queue', '-q', multiple=True, help='Only run jobs from these queues (default: all)')
+    @click.option('--concurrency', '-c', type=int, help='Jobs run at once by this worker')
+    @click.option('--burst', is_flag=True, help='Exit once no jobs are due')
+    def worker(queue, concurrency, burst):
+        """Run queued and periodic background jobs"""
+        import signal
+        from app.utils.job_queue import Worker
+        
+        job_worker = Worker(app, queues=queue, concurrency=concurrency)
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *args: job_worker.stop())
+        count = job_worker.run(burst=burst)
+        click.echo(f"Worker stopped after {count} jobs")
+    
+    @jobs.command()
+    @click.argument('name')
+    @click.option('--queue', '-q', help='Queue (default: the job\'s own)')
+    @with_appcontext
+    def enqueue(name, queue):
+        """Queue a registered job to run now"""
+        from app.utils.job_queue import JOB_HANDLERS, enqueue as enqueue_job
+        
+        if name not in JOB_HANDLERS:
+            click.echo(f"Unknown job. Registered jobs: {', '.join(sorted(JOB_HANDLERS))}")
+            exit(1)
+        background_job = enqueue_job(name, queue=queue)
+        db.session.commit()
+        click.echo(f"Queued job {background_job.id} ({name})")
+    
+    @jobs.command()
+    @with_appcontext
+    def status():
+        """Show job counts by queue and status"""
+        from app.models.base import BackgroundJob
+        
+        rows = db.session.query(BackgroundJob.queue, BackgroundJob.status, db.func.count(BackgroundJob.id)) \
+            .group_by(BackgroundJob.queue, BackgroundJob.status).order_by(BackgroundJob.queue).all()
+        if not rows:
+            click.echo("No jobs")
+        for queue, job_status, count in rows:
+            click.echo(f"{queue:<20} {job_status:<10} {count}")
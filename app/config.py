@@ -32,6 +32,16 @@ class Config:
         os.path.join(os.path.abspath(os.path.dirname(__file__)), 'uploads')
     MAX_CONTENT_LENGTH = 50 * 1024 * 1024  # 50MB max upload
     ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg', 'gif', 'doc', 'docx', 'xls', 'xlsx', 'ppt', 'pptx', 'zip', 'rar'}
+
+    # Resumable chunked uploads (/api/uploads): chunks must stay under MAX_CONTENT_LENGTH
+    UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024))
+    UPLOAD_MAX_SIZE = int(os.environ.get('UPLOAD_MAX_SIZE', 2 * 1024 ** 3))
+    UPLOAD_PARTIAL_DIR = os.environ.get('UPLOAD_PARTIAL_DIR')
+
+    # Large file downloads: "<directory>=<internal nginx location>" pairs (comma separated) hand
+    # files to nginx via X-Accel-Redirect; without a mapping they stream from Python in blocks
+    X_ACCEL_MAPPINGS = os.environ.get('X_ACCEL_MAPPINGS')
+    FILE_SERVE_BUFFER_SIZE = int(os.environ.get('FILE_SERVE_BUFFER_SIZE', 256 * 1024))
     
     # Mail settings
     MAIL_SERVER = os.environ.get('MAIL_SERVER')
@@ -50,11 +60,24 @@ class Config:
     # Push notification service
     PUSH_SERVICE_URL = os.environ.get('PUSH_SERVICE_URL')
     PUSH_API_KEY = os.environ.get('PUSH_API_KEY')
+    PUSH_BATCH_SIZE = int(os.environ.get('PUSH_BATCH_SIZE', 500))  # recipients per provider call
+    PUSH_BATCH_WINDOW = float(os.environ.get('PUSH_BATCH_WINDOW', 0.05))  # seconds to gather a burst
+    PUSH_MAX_ATTEMPTS = int(os.environ.get('PUSH_MAX_ATTEMPTS', 5))
+    PUSH_RETRY_BASE_SECONDS = float(os.environ.get('PUSH_RETRY_BASE_SECONDS', 1))
+    PUSH_QUEUE_SIZE = int(os.environ.get('PUSH_QUEUE_SIZE', 10000))  # queued notifications per process
+    PUSH_TIMEOUT = 10
+    PUSH_SHUTDOWN_TIMEOUT = 5
     
     # Mobile API settings
     MOBILE_API_ENABLED = True
-    MOBILE_SYNC_MAX_DAYS = 30  # Maximum days of history for mobile sync
+    MOBILE_SYNC_PAGE_SIZE = int(os.environ.get('MOBILE_SYNC_PAGE_SIZE', 500))  # changes per /sync response
+    SYNC_TOMBSTONE_RETENTION_DAYS = int(os.environ.get('SYNC_TOMBSTONE_RETENTION_DAYS', 90))
+    API_COMPRESS_MIN_BYTES = int(os.environ.get('API_COMPRESS_MIN_BYTES', 1024))  # smaller bodies are sent as is
+    API_GZIP_LEVEL = int(os.environ.get('API_GZIP_LEVEL', 6))
+    API_ZSTD_LEVEL = int(os.environ.get('API_ZSTD_LEVEL', 3))
     MOBILE_UPLOAD_MAX_SIZE = 10 * 1024 * 1024  # 10MB max upload for mobile
+    MOBILE_UPLOAD_MAX_PHOTOS = int(os.environ.get('MOBILE_UPLOAD_MAX_PHOTOS', 20))  # photos per batch upload
+    MOBILE_SYNC_MAX_REPORTS = int(os.environ.get('MOBILE_SYNC_MAX_REPORTS', 200))  # reports per /sync-reports batch
     MOBILE_API_VERSION = '1.0.0'
     
     # Application settings
@@ -73,6 +96,9 @@ class Config:
     SLOW_REQUEST_THRESHOLD = float(os.environ.get('SLOW_REQUEST_THRESHOLD', 0.5))  # seconds
     ADMIN_API_KEY = os.environ.get('ADMIN_API_KEY')
     MONITORING_ENABLED = os.environ.get('MONITORING_ENABLED', 'True').lower() == 'true'
+    # Shared directory (ideally tmpfs) for merging request metrics across worker processes
+    METRICS_MULTIPROC_DIR = os.environ.get('METRICS_MULTIPROC_DIR')
+    METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 1.0))  # seconds
     LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
     
     # IP restrictions for admin access (comma-separated list)
@@ -99,6 +125,38 @@ class Config:
         'reports': 1800,              # 30 minutes
     }
     
+    # Project access decision cache: 'local' (per-process LRU) or 'shared' (Flask-Caching backend)
+    ACCESS_CACHE_BACKEND = os.environ.get('ACCESS_CACHE_BACKEND', 'local')
+    ACCESS_CACHE_TTL = int(os.environ.get('ACCESS_CACHE_TTL', 300))
+    ACCESS_CACHE_MAX_ENTRIES = int(os.environ.get('ACCESS_CACHE_MAX_ENTRIES', 10000))
+    
+    # PDF rendering: process pool size (0 renders inline) and content-addressed output cache
+    PDF_RENDER_WORKERS = int(os.environ.get('PDF_RENDER_WORKERS', 2))
+    PDF_CACHE_DIR = os.environ.get('PDF_CACHE_DIR')
+    PDF_JOB_TIMEOUT = int(os.environ.get('PDF_JOB_TIMEOUT', 300))  # seconds
+
+    # In-process scheduled tasks: threads running due tasks at once
+    SCHEDULER_MAX_WORKERS = int(os.environ.get('SCHEDULER_MAX_WORKERS', 4))
+
+    # Photo thumbnails/WebP: process pool size (0 generates inline)
+    PHOTO_DERIVATIVE_WORKERS = int(os.environ.get('PHOTO_DERIVATIVE_WORKERS', 2))
+
+    # IFC element cache (index, properties, bounding boxes): process pool size (0 builds inline)
+    BIM_INGEST_WORKERS = int(os.environ.get('BIM_INGEST_WORKERS', 1))
+
+    # Background jobs (flask jobs worker): cluster-wide running limits per queue ("queue=n,..."),
+    # threads per worker, claim lease (heartbeats extend it), retry backoff and retention
+    JOB_QUEUE_CONCURRENCY = os.environ.get('JOB_QUEUE_CONCURRENCY', 'default=4')
+    JOB_WORKER_CONCURRENCY = int(os.environ.get('JOB_WORKER_CONCURRENCY', 2))
+    JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 1.0))  # seconds
+    JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS', 300))
+    JOB_RETRY_BASE_SECONDS = int(os.environ.get('JOB_RETRY_BASE_SECONDS', 30))
+    JOB_RETRY_MAX_SECONDS = int(os.environ.get('JOB_RETRY_MAX_SECONDS', 3600))
+    JOB_RETENTION_DAYS = int(os.environ.get('JOB_RETENTION_DAYS', 7))
+    
+    # Dashboard activity trends (days of history rolled up on first run)
+    ACTIVITY_ROLLUP_BACKFILL_DAYS = int(os.environ.get('ACTIVITY_ROLLUP_BACKFILL_DAYS', 365))
+    
     # Scheduled tasks
     SCHEDULER_ENABLED = os.environ.get('SCHEDULER_ENABLED', 'True').lower() == 'true'
     
@@ -1,13 +1,16 @@
 # app/dashboard/routes.py
-from flask import Blueprint, render_template, redirect, url_for, current_app, jsonify
+from flask import Blueprint, render_template, redirect, url_for, current_app, jsonify, request
 from flask_login import login_required, current_user
 from app.models.project import Project
 from app.models.user import User
 from app.models.engineering import RFI, Submittal
-from app.models.field import DailyReport, Punchlist
+from app.models.field import DailyReport
 from app.models.safety import SafetyObservation, IncidentReport
-from app.models.cost import Invoice, PotentialChangeOrder, ChangeOrder
+from app.models.cost import Invoice, PotentialChangeOrder
 from app.extensions import db, cache
+from app.utils.dashboard_snapshot import DashboardSnapshot
+from app.utils.activity_trends import ActivityTrends
+from app.utils.visible_projects import filter_visible
 from datetime import datetime, timedelta
 from sqlalchemy import func
 
@@ -20,9 +23,8 @@ dashboard_bp = Blueprint('dashboard', __name__, url_prefix='/', template_folder=
 def index():
     """Main dashboard page"""
     # Get user's projects (with fallback)
-    print("Fetching user projects...")
     try:
-        user_projects = [pu.project for pu in current_user.projects.all()] if hasattr(current_user, 'projects') else []
+        user_projects = filter_visible(Project.query, current_user, Project.id).order_by(Project.name).all()
     except Exception as e:
         current_app.logger.error(f"Error fetching user projects: {e}")
         user_projects = []
@@ -31,13 +33,13 @@ def index():
     recent_activity = []
     try:
         # Fetch recent RFIs
-        recent_rfis = RFI.query.filter(
+        recent_rfis = filter_visible(RFI.query, current_user, RFI.project_id).filter(
             RFI.created_at > datetime.utcnow() - timedelta(days=7)
         ).limit(5).all()
         recent_activity.extend(recent_rfis)
         
         # Fetch recent daily reports
-        recent_reports = DailyReport.query.filter(
+        recent_reports = filter_visible(DailyReport.query, current_user, DailyReport.project_id).filter(
             DailyReport.date > datetime.utcnow() - timedelta(days=7)
         ).limit(5).all()
         recent_activity.extend(recent_reports)
@@ -48,14 +50,16 @@ def index():
     notifications = []
     try:
         # Fetch overdue RFIs
-        overdue_rfis = RFI.query.filter(
+        overdue_rfis = filter_visible(RFI.query, current_user, RFI.project_id).filter(
             RFI.due_date < datetime.utcnow(),
             RFI.status != 'closed'
         ).limit(3).all()
         notifications.extend(overdue_rfis)
         
         # Fetch safety observations requiring attention
-        urgent_safety_obs = SafetyObservation.query.filter(
+        urgent_safety_obs = filter_visible(
+            SafetyObservation.query, current_user, SafetyObservation.project_id
+        ).filter(
             SafetyObservation.severity == 'high',
             SafetyObservation.status != 'resolved'
         ).limit(3).all()
@@ -67,7 +71,7 @@ def index():
     upcoming_deadlines = []
     try:
         # Fetch upcoming RFI deadlines
-        upcoming_rfi_deadlines = RFI.query.filter(
+        upcoming_rfi_deadlines = filter_visible(RFI.query, current_user, RFI.project_id).filter(
             RFI.due_date.between(
                 datetime.utcnow(), 
                 datetime.utcnow() + timedelta(days=30)
@@ -77,7 +81,7 @@ def index():
         upcoming_deadlines.extend(upcoming_rfi_deadlines)
         
         # Fetch upcoming submittal deadlines
-        upcoming_submittal_deadlines = Submittal.query.filter(
+        upcoming_submittal_deadlines = filter_visible(Submittal.query, current_user, Submittal.project_id).filter(
             Submittal.due_date.between(
                 datetime.utcnow(), 
                 datetime.utcnow() + timedelta(days=30)
@@ -88,49 +92,31 @@ def index():
     except Exception as e:
         current_app.logger.error(f"Error fetching upcoming deadlines: {e}")
     
-    # Calculate stats for dashboard
-    stats = {}
+    # Calculate stats for dashboard (cached, two queries on a miss)
     try:
-        # Project stats
-        stats['total_projects'] = Project.query.count()
-        stats['active_projects'] = Project.query.filter_by(status='active').count()
-        
-        # RFI stats
-        stats['rfis_open'] = RFI.query.filter_by(status='open').count()
-        
-        # Submittal stats
-        stats['submittals_pending'] = Submittal.query.filter_by(status='pending').count()
-        
-        # Punchlist stats
-        stats['punchlist_items'] = Punchlist.query.filter_by(status='open').count()
-        
-        # Change Order stats
-        from sqlalchemy import func
-        stats['change_order_value'] = db.session.query(
-            func.sum(ChangeOrder.amount)
-        ).filter_by(status='approved').scalar() or 0
+        scope = DashboardSnapshot.for_user(current_user)
+        snapshot = scope.get()
     except Exception as e:
         current_app.logger.error(f"Error calculating stats: {e}")
-        # Provide default values if error occurs
-        stats = {
-            'total_projects': 0,
-            'active_projects': 0,
-            'rfis_open': 0,
-            'submittals_pending': 0,
-            'punchlist_items': 0,
-            'change_order_value': 0
+        scope = DashboardSnapshot(project_ids=[])
+        snapshot = {
+            'stats': {
+                'total_projects': 0,
+                'active_projects': 0,
+                'rfis_open': 0,
+                'submittals_pending': 0,
+                'punchlist_items': 0,
+                'change_order_value': 0
+            },
+            'status_counts': []
         }
+    stats = snapshot['stats']
     
     # Data for charts
     try:
         # Project status chart data
-        status_query = db.session.query(
-            Project.status, 
-            func.count(Project.id)
-        ).group_by(Project.status).all()
-        
-        status_labels = [status.replace('_', ' ').title() for status, _ in status_query]
-        status_data = [count for _, count in status_query]
+        status_labels = [status.replace('_', ' ').title() for status, _ in snapshot['status_counts']]
+        status_data = [count for _, count in snapshot['status_counts']]
         chart_colors = [
             'rgba(75, 192, 192, 0.8)',
             'rgba(54, 162, 235, 0.8)',
@@ -139,25 +125,8 @@ def index():
             'rgba(153, 102, 255, 0.8)'
         ]
         
-        # Activity trend data (last 30 days)
-        today = datetime.utcnow().date()
-        date_range = [(today - timedelta(days=i)).strftime('%Y-%m-%d') for i in range(30)]
-        date_range.reverse()  # Oldest to newest
-        
-        # Sample activity data (in real app, you'd query from DB)
-        activity_data = {
-            'dates': date_range,
-            'rfis': [0] * 30,  # Placeholder data
-            'submittals': [0] * 30,  # Placeholder data
-            'reports': [0] * 30   # Placeholder data
-        }
-        
-        # Fill in with some random data for demonstration
-        import random
-        for i in range(30):
-            activity_data['rfis'][i] = random.randint(0, 5)
-            activity_data['submittals'][i] = random.randint(0, 4)
-            activity_data['reports'][i] = random.randint(0, 8)
+        # Activity trend data (last 30 days, finished days read from the rollup)
+        activity_data = ActivityTrends(scope.project_ids, days=30).series()
             
     except Exception as e:
         current_app.logger.error(f"Error preparing chart data: {e}")
@@ -169,8 +138,10 @@ def index():
     
     # Recent items for tables
     try:
-        recent_rfis = RFI.query.order_by(RFI.created_at.desc()).limit(5).all()
-        recent_reports = DailyReport.query.order_by(DailyReport.date.desc()).limit(5).all()
+        recent_rfis = filter_visible(RFI.query, current_user, RFI.project_id).order_by(
+            RFI.created_at.desc()).limit(5).all()
+        recent_reports = filter_visible(DailyReport.query, current_user, DailyReport.project_id).order_by(
+            DailyReport.date.desc()).limit(5).all()
     except Exception as e:
         current_app.logger.error(f"Error fetching recent items: {e}")
         recent_rfis = []
@@ -189,6 +160,26 @@ def index():
                           recent_rfis=recent_rfis,
                           recent_reports=recent_reports)
 
+@dashboard_bp.route('/snapshot')
+@login_required
+def snapshot():
+    """Dashboard KPIs as JSON (same numbers as the index page)"""
+    return jsonify({
+        'status': 'success',
+        'data': DashboardSnapshot.for_user(current_user).get()
+    })
+
+@dashboard_bp.route('/activity')
+@login_required
+def activity():
+    """Daily activity trend series as JSON (?days=N, up to 365)"""
+    days = min(max(request.args.get('days', 30, type=int), 1), 365)
+    scope = DashboardSnapshot.for_user(current_user)
+    return jsonify({
+        'status': 'success',
+        'data': ActivityTrends(scope.project_ids, days=days).series()
+    })
+
 @dashboard_bp.route('/my-tasks')
 @login_required
 def my_tasks():
@@ -196,8 +187,7 @@ def my_tasks():
     # Use try-except to handle potential missing columns
     try:
         # First try with assigned_to field
-        from app.models.engineering import RFI, Submittal
-        from app.models.field import Punchlist
+        from app.models.engineering import RFI
         
         assigned_rfis = RFI.query.filter_by(assigned_to=current_user.id, status='open').all()
     except Exception as e:
@@ -215,7 +205,6 @@ def my_tasks():
     except Exception:
         # Fall back to using submitted_by if assigned_to doesn't exist
         try:
-            from app.models.engineering import Submittal
             assigned_submittals = Submittal.query.filter_by(submitted_by=current_user.id, status='pending').all()
         except Exception:
             assigned_submittals = []
@@ -223,7 +212,9 @@ def my_tasks():
     # For punchlist, use a safer approach
     try:
         from app.models.field import Punchlist
-        assigned_punchlists = Punchlist.query.filter_by(status='open').all()
+        assigned_punchlists = filter_visible(
+            Punchlist.query, current_user, Punchlist.project_id
+        ).filter_by(status='open').all()
     except Exception:
         assigned_punchlists = []
     
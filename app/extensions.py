@@ -10,9 +10,12 @@ from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask import Flask
 from datetime import datetime
-import threading
+from collections import deque
 import logging
 
+from app.utils.metrics import RequestMetrics
+from app.utils.metrics_store import MultiProcessMetrics
+
 # Initialize extensions
 db = SQLAlchemy()
 migrate = Migrate()
@@ -43,18 +46,10 @@ class ApplicationMonitor:
     
     def __init__(self, app=None):
         self.app = app
-        self.stats = {
-            'requests': {
-                'total': 0,
-                'by_endpoint': {},
-                'by_method': {},
-                'by_status': {},
-            },
-            'response_times': [],
-            'errors': [],
-            'last_reset': datetime.now().isoformat()
-        }
-        self.stats_lock = threading.Lock()
+        self.metrics = RequestMetrics()
+        self.store = None
+        self.errors = deque(maxlen=100)
+        self.last_reset = datetime.now().isoformat()
         
         if app is not None:
             self.init_app(app)
@@ -62,76 +57,64 @@ class ApplicationMonitor:
     def init_app(self, app):
         """Initialize the monitor with the Flask app"""
         self.app = app
+        multiproc_dir = app.config.get('METRICS_MULTIPROC_DIR')
+        if multiproc_dir:
+            self.store = MultiProcessMetrics(multiproc_dir, app.config.get('METRICS_FLUSH_INTERVAL', 1.0))
         app.logger.info("Application monitoring initialized")
 
     def record_request(self, endpoint, method, status_code, duration):
-        """Record a request for monitoring"""
-        with self.stats_lock:
-            self.stats['requests']['total'] += 1
-            
-            # By endpoint
-            if endpoint not in self.stats['requests']['by_endpoint']:
-                self.stats['requests']['by_endpoint'][endpoint] = 0
-            self.stats['requests']['by_endpoint'][endpoint] += 1
-            
-            # By method
-            if method not in self.stats['requests']['by_method']:
-                self.stats['requests']['by_method'][method] = 0
-            self.stats['requests']['by_method'][method] += 1
-            
-            # By status
-            status_str = str(status_code)
-            if status_str not in self.stats['requests']['by_status']:
-                self.stats['requests']['by_status'][status_str] = 0
-            self.stats['requests']['by_status'][status_str] += 1
-            
-            # Response times (keep last 1000)
-            self.stats['response_times'].append({
-                'timestamp': datetime.now().isoformat(),
-                'endpoint': endpoint,
-                'duration': duration,
-                'method': method,
-                'status': status_code
-            })
-            if len(self.stats['response_times']) > 1000:
-                self.stats['response_times'] = self.stats['response_times'][-1000:]
+        """Record a request for monitoring (lock-free, per-thread counters)"""
+        self.metrics.record_request(endpoint, method, status_code, duration)
+        if self.store is not None:
+            self.store.maybe_flush(self.metrics)
+
+    def record_payload(self, endpoint, encoding, plain_bytes, sent_bytes):
+        """Record a negotiated response's plain-JSON size and the bytes actually sent"""
+        self.metrics.record_payload(endpoint, encoding, plain_bytes, sent_bytes)
 
     def record_error(self, error, endpoint, method, path):
         """Record an error for monitoring"""
-        with self.stats_lock:
-            self.stats['errors'].append({
-                'timestamp': datetime.now().isoformat(),
-                'type': error.__class__.__name__,
-                'description': str(error),
-                'endpoint': endpoint,
-                'method': method,
-                'path': path
-            })
-            # Keep last 100 errors
-            if len(self.stats['errors']) > 100:
-                self.stats['errors'] = self.stats['errors'][-100:]
+        self.metrics.record_error(error.__class__.__name__)
+        # Errors are rare, so the last 100 are kept in full
+        self.errors.append({
+            'timestamp': datetime.now().isoformat(),
+            'type': error.__class__.__name__,
+            'description': str(error),
+            'endpoint': endpoint,
+            'method': method,
+            'path': path
+        })
+
+    def snapshot(self):
+        """
+        Current metrics, merged across workers when METRICS_MULTIPROC_DIR is set
+
+        Returns:
+            tuple: (MetricsSnapshot, number of workers included)
+        """
+        if self.store is None:
+            return self.metrics.snapshot(), 1
+        self.store.flush(self.metrics)
+        return self.store.collect()
 
     def get_stats(self):
-        """Get a copy of current statistics"""
-        with self.stats_lock:
-            import copy
-            return copy.deepcopy(self.stats)
+        """Get current statistics, including p50/p95/p99 latency per endpoint"""
+        snapshot, workers = self.snapshot()
+        stats = snapshot.to_dict()
+        stats['workers'] = workers
+        # Error details are kept per worker
+        stats['errors'] = list(self.errors)
+        stats['last_reset'] = self.last_reset
+        return stats
 
     def reset_stats(self):
-        """Reset all statistics"""
-        with self.stats_lock:
-            self.stats = {
-                'requests': {
-                    'total': 0,
-                    'by_endpoint': {},
-                    'by_method': {},
-                    'by_status': {},
-                },
-                'response_times': [],
-                'errors': [],
-                'last_reset': datetime.now().isoformat()
-            }
-            return {'success': True, 'timestamp': self.stats['last_reset']}
+        """Reset all statistics (in every worker when metrics are shared)"""
+        if self.store is not None:
+            self.store.reset()
+        self.metrics.reset()
+        self.errors.clear()
+        self.last_reset = datetime.now().isoformat()
+        return {'success': True, 'timestamp': self.last_reset}
 
 # Initialize monitor
 monitor = ApplicationMonitor()
@@ -139,3 +122,7 @@ monitor = ApplicationMonitor()
 # Task scheduler for background tasks
 from app.utils.scheduler import TaskScheduler
 scheduler = TaskScheduler()
+
+# Background sender for mobile push notifications
+from app.utils.push_dispatch import PushDispatcher
+push_dispatcher = PushDispatcher()
@@ -1,6 +1,6 @@
 # app/models/__init__.py
 from app.models.user import User, Role, UserProject, NotificationPreference, DeviceToken
-from app.models.base import Comment, Attachment
+from app.models.base import Comment, Attachment, UploadSession, StoredBlob, BackgroundJob, SyncCounter, SyncTombstone
 from app.models.task import Task, TaskActivity
 from app.models.project import Project, ProjectTeamMember, ProjectUser, ProjectImage, ProjectNote
 from app.models.engineering import RFI, Submittal, Drawing, Specification, Permit, Meeting, Transmittal
@@ -8,11 +8,11 @@ from app.models.bim import BIMModel, BIMIssue, BIMIssueComment, BIMModelVersion
 from app.models.client import Client, ClientContact
 from app.models.closeout import CloseoutDocument, AsBuiltDrawing, AtticStock, OperationAndMaintenanceManual, Warranty, WarrantyType, WarrantyStatus, FinalInspection
 from app.models.contracts import Contract, CertificateOfInsurance,ContractBase,ContractChangeOrder,ContractDocument,ContractStatus,PrimeContract
-from app.models.cost import ChangeOrder,DirectCost,PotentialChangeOrder, Budget, BudgetItem, Invoice, ApprovalLetter
+from app.models.cost import ChangeOrder,DirectCost,PotentialChangeOrder, Budget, BudgetItem, Invoice, ApprovalLetter, ProjectCostRollup
 from app.models.document import Document
 from app.models.field import FieldInspection, FieldPhoto, ManpowerEntry, WeatherCondition,WorkActivity,WorkStatus, DailyReport, DailyReportPhoto, SafetyIncident,Schedule,PunchlistItem, Punchlist,Photo,ProjectPhoto,PullPlan
 from app.models.preconstruction import BidPackage, Bid,BidManual,QualifiedBidder
-from app.models.reports import ReportExecution,ReportTemplate,SavedReport
+from app.models.reports import ReportExecution,ReportTemplate,SavedReport,ActivityRollup,ActivityRollupState
 from app.models.safety import SafetyMetrics,SafetyObservation,SafetyOrientation, SafetyPhoto,SafetySeverity,SafetyStatus, PreTaskAttendee, PreTaskPlan, IncidentPhoto, JHAStep,JobHazardAnalysis, ObservationType, OrientationAttendee,IncidentReport,IncidentType
 from app.models.settings import ProjectSettings,DatabaseSettings, Company,CompanyContact,CostCode,CSIDivision,CSISubdivision,MaterialRate,LaborRate,EquipmentRate
 
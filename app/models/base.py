@@ -61,4 +61,101 @@ class Attachment(db.Model):
         return User.query.get(self.user_id)
         
     def __repr__(self):
-        return f'<Attachment {self.id}: {self.filename}>'
\ No newline at end of file
+        return f'<Attachment {self.id}: {self.filename}>'
+
+class UploadSession(db.Model):
+    """A resumable chunked upload (the received bytes live in a partial file on disk) or a completed direct upload"""
+    __tablename__ = 'upload_sessions'
+    __table_args__ = (
+        # Retried direct uploads: WHERE user_id = ? AND idempotency_key = ?
+        db.UniqueConstraint('user_id', 'idempotency_key', name='uix_upload_sessions_user_idempotency_key'),
+    )
+
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), nullable=False)
+    target = db.Column(db.String(20), nullable=False)  # bim_model, photo, attachment, om_manual
+    filename = db.Column(db.String(255), nullable=False)
+    content_type = db.Column(db.String(100))
+    total_size = db.Column(db.BigInteger, nullable=False)
+    sha256 = db.Column(db.String(64))  # expected digest if the client sent one, actual once complete
+    options = db.Column(db.JSON)  # target-specific fields (title, model_id, record_id...)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, complete
+    record_id = db.Column(db.Integer)  # ID of the created target record
+    idempotency_key = db.Column(db.String(100))  # client key of a direct upload, so retries are not stored twice
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<UploadSession {self.id}: {self.filename}>'
+
+
+class StoredBlob(db.Model):
+    """Content-addressed upload; ``refcount`` counts the records whose file_path points at it"""
+    __tablename__ = 'stored_blobs'
+
+    sha256 = db.Column(db.String(64), primary_key=True)
+    path = db.Column(db.String(255), nullable=False, unique=True)  # relative to UPLOAD_FOLDER
+    size = db.Column(db.BigInteger, nullable=False)
+    refcount = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<StoredBlob {self.sha256[:12]} x{self.refcount}>'
+
+
+class BackgroundJob(db.Model):
+    """A queued unit of work for ``flask jobs worker``; claimed by one worker at a time"""
+    __tablename__ = 'background_jobs'
+    __table_args__ = (
+        # Claiming: WHERE queue = ? AND status = 'queued' AND run_at <= now ORDER BY run_at, id
+        db.Index('ix_background_jobs_queue_status_run_at', 'queue', 'status', 'run_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)  # registered handler name
+    queue = db.Column(db.String(50), nullable=False, default='default')
+    payload = db.Column(db.JSON)  # keyword arguments for the handler
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, succeeded, failed
+    unique_key = db.Column(db.String(150), unique=True)  # at most one job per key (e.g. one per period)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # not claimed before this
+    locked_by = db.Column(db.String(100))  # worker holding the lease
+    locked_at = db.Column(db.DateTime)  # last heartbeat; the lease expires JOB_LEASE_SECONDS later
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<BackgroundJob {self.id}: {self.name} {self.status}>'
+
+
+class SyncCounter(db.Model):
+    """Named counter for mobile sync (``change_seq``: last allocated, ``tombstone_floor``: last purged)"""
+    __tablename__ = 'sync_counters'
+
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<SyncCounter {self.name}={self.value}>'
+
+
+class SyncTombstone(db.Model):
+    """Left behind by a deleted syncable row so mobile clients drop their copy"""
+    __tablename__ = 'sync_tombstones'
+    __table_args__ = (
+        # Mobile delta sync: WHERE project_id IN (...) AND change_seq > ? ORDER BY change_seq
+        db.Index('ix_sync_tombstones_project_change_seq', 'project_id', 'change_seq'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.String(50), nullable=False)  # sync entity name (daily_reports, rfis...)
+    record_id = db.Column(db.Integer, nullable=False)
+    project_id = db.Column(db.Integer, nullable=False)  # no foreign key: the project may be gone too
+    change_seq = db.Column(db.BigInteger, nullable=False)
+    deleted_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<SyncTombstone {self.entity} {self.record_id} @{self.change_seq}>'
@@ -1,6 +1,7 @@
 # app/models/bim.py
 from app.extensions import db
 from datetime import datetime
+from flask import current_app
 import os
 from sqlalchemy.ext.declarative import declared_attr
 
@@ -29,10 +30,27 @@ class BIMModel(db.Model):
     
     @property
     def open_issues_count(self):
-        """Count open issues for this model"""
+        """Count open issues for this model (preloaded by ``preload_open_issue_counts``)"""
+        preloaded = getattr(self, '_open_issues_count', None)
+        if preloaded is not None:
+            return preloaded
         from app.models.bim import BIMIssue
         return BIMIssue.query.filter_by(model_id=self.id, status='open').count()
     
+    @staticmethod
+    def preload_open_issue_counts(models):
+        """Set ``open_issues_count`` on many models with a single GROUP BY query"""
+        models = list(models)
+        if not models:
+            return models
+        counts = dict(db.session.query(BIMIssue.model_id, db.func.count(BIMIssue.id))
+                      .filter(BIMIssue.model_id.in_([model.id for model in models]),
+                              BIMIssue.status == 'open')
+                      .group_by(BIMIssue.model_id))
+        for model in models:
+            model._open_issues_count = counts.get(model.id, 0)
+        return models
+    
     def get_current_version(self):
         """Get the current version or the latest if current is not set"""
         if self.current_version:
@@ -48,8 +66,12 @@ class BIMModel(db.Model):
         total_size = 0
         for version in self.versions:
             try:
-                if os.path.exists(version.file_path):
-                    total_size += os.path.getsize(version.file_path)
+                # Blob paths are relative to UPLOAD_FOLDER
+                file_path = version.file_path
+                if not os.path.isabs(file_path):
+                    file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], file_path)
+                if os.path.exists(file_path):
+                    total_size += os.path.getsize(file_path)
             except:
                 pass
         return total_size
@@ -74,6 +96,12 @@ class BIMModelVersion(db.Model):
 
 class BIMIssue(db.Model):
     __tablename__ = 'bim_issues'
+    __table_args__ = (
+        # Open-issue counts per model: GROUP BY model_id WHERE status = 'open'
+        db.Index('ix_bim_issues_model_status', 'model_id', 'status'),
+        # Bounding-box queries: model_id = ? AND position_x BETWEEN ... (y, z filtered on the index)
+        db.Index('ix_bim_issues_model_position', 'model_id', 'position_x', 'position_y', 'position_z'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     model_id = db.Column(db.Integer, db.ForeignKey('bim_models.id'), nullable=False)
@@ -85,6 +85,10 @@ class PotentialChangeOrder(db.Model):
 
 class ChangeOrder(db.Model):
     __tablename__ = 'change_orders'
+    __table_args__ = (
+        # Keyset pagination: WHERE project_id = ? ORDER BY created_at DESC, id DESC
+        db.Index('ix_change_orders_project_created_at_id', 'project_id', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), nullable=False)
@@ -151,4 +155,22 @@ class ApprovalLetter(db.Model):
     # Relationships
     project = db.relationship('Project', backref=db.backref('approval_letters', lazy='dynamic'))
     issuer = db.relationship('User', foreign_keys=[issued_by])
-    approver = db.relationship('User', foreign_keys=[approved_by])
\ No newline at end of file
+    approver = db.relationship('User', foreign_keys=[approved_by])
+
+
+class ProjectCostRollup(db.Model):
+    """Per-project cost totals, kept current by listeners in app.utils.cost_rollup"""
+    __tablename__ = 'project_cost_rollups'
+    
+    project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), primary_key=True)
+    original_budget = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    approved_change_orders = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    pending_change_orders = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    total_invoiced = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    paid_invoiced = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    direct_costs = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Relationships
+    project = db.relationship('Project', backref=db.backref('cost_rollup', uselist=False,
+                                                            cascade='all, delete-orphan'))
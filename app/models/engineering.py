@@ -21,6 +21,12 @@ def get_attachments(self):
 
 class RFI(db.Model):
     __tablename__ = 'rfis'
+    __table_args__ = (
+        # Keyset pagination: WHERE project_id = ? ORDER BY date_submitted DESC, id DESC
+        db.Index('ix_rfis_project_date_submitted_id', 'project_id', 'date_submitted', 'id'),
+        # Mobile delta sync: WHERE project_id IN (...) AND change_seq > ? ORDER BY change_seq
+        db.Index('ix_rfis_project_change_seq', 'project_id', 'change_seq'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), nullable=False)
@@ -37,6 +43,7 @@ class RFI(db.Model):
     answered_by = db.Column(db.Integer, db.ForeignKey('users.id'))
     created_at = db.Column(db.DateTime, default=func.now())
     updated_at = db.Column(db.DateTime, default=func.now(), onupdate=func.now())
+    change_seq = db.Column(db.BigInteger, nullable=False, default=0)  # mobile sync, see app.utils.sync
     
     # Relationships
     project = db.relationship('Project', backref='rfis')
@@ -55,6 +62,10 @@ class RFI(db.Model):
 
 class Submittal(db.Model):
     __tablename__ = 'submittals'
+    __table_args__ = (
+        # Keyset pagination: WHERE project_id = ? ORDER BY date_submitted DESC, id DESC
+        db.Index('ix_submittals_project_date_submitted_id', 'project_id', 'date_submitted', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), nullable=False)
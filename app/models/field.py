@@ -27,6 +27,14 @@ class WorkStatus(str, Enum):
 class DailyReport(db.Model):
     """Daily report model for field operations"""
     __tablename__ = 'daily_reports'
+    __table_args__ = (
+        # Keyset pagination: WHERE project_id = ? ORDER BY report_date DESC, id DESC
+        db.Index('ix_daily_reports_project_report_date_id', 'project_id', 'report_date', 'id'),
+        # Mobile delta sync: WHERE project_id IN (...) AND change_seq > ? ORDER BY change_seq
+        db.Index('ix_daily_reports_project_change_seq', 'project_id', 'change_seq'),
+        # Offline reports are deduplicated by the UUID the app generated
+        db.UniqueConstraint('created_by', 'client_uuid', name='uix_daily_reports_created_by_client_uuid'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), nullable=False)
@@ -66,6 +74,8 @@ class DailyReport(db.Model):
     created_by = db.Column(db.Integer, db.ForeignKey('users.id'))
     created_at = db.Column(db.DateTime, default=func.now())
     updated_at = db.Column(db.DateTime, default=func.now(), onupdate=func.now())
+    change_seq = db.Column(db.BigInteger, nullable=False, default=0)  # mobile sync, see app.utils.sync
+    client_uuid = db.Column(db.String(36))  # set by the mobile app, see app.utils.offline_reports
     
     # Relationships
     project = db.relationship('Project', backref=db.backref('daily_reports', lazy='dynamic'))
@@ -117,6 +127,7 @@ class ProjectPhoto(db.Model):
     description = db.Column(db.Text)
     file_path = db.Column(db.String(255), nullable=False)
     file_size = db.Column(db.Integer)  # in bytes
+    derivatives = db.Column(db.JSON)  # size name -> path relative to UPLOAD_FOLDER, see utils.photo_derivatives
     location = db.Column(db.String(100))
     latitude = db.Column(db.Float)
     longitude = db.Column(db.Float)
@@ -282,9 +293,14 @@ class Punchlist(db.Model):
 class PunchlistItem(db.Model):
     """Individual item in a punchlist"""
     __tablename__ = 'punchlist_items'
+    __table_args__ = (
+        # Mobile delta sync: WHERE project_id IN (...) AND change_seq > ? ORDER BY change_seq
+        db.Index('ix_punchlist_items_project_change_seq', 'project_id', 'change_seq'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     punchlist_id = db.Column(db.Integer, db.ForeignKey('punchlists.id'), nullable=False)
+    project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), nullable=False)  # copied from the punchlist
     description = db.Column(db.Text, nullable=False)
     location = db.Column(db.String(100))
     responsible_party = db.Column(db.String(100))
@@ -299,6 +315,7 @@ class PunchlistItem(db.Model):
     created_by = db.Column(db.Integer, db.ForeignKey('users.id'))
     closed_at = db.Column(db.DateTime)
     closed_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    change_seq = db.Column(db.BigInteger, nullable=False, default=0)  # mobile sync, see app.utils.sync
     
     # Relationships
     creator = db.relationship('User', foreign_keys=[created_by])
@@ -60,6 +60,7 @@ class Project(db.Model):
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    change_seq = db.Column(db.BigInteger, nullable=False, default=0)  # mobile sync, see app.utils.sync
     
     # Relationships - keep all existing relationships
     client = relationship('Client', back_populates='projects')
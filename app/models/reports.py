@@ -58,4 +58,27 @@ class ReportExecution(db.Model):
     
     # Relationships
     saved_report = db.relationship('SavedReport', backref='executions')
-    executor = db.relationship('User', foreign_keys=[executed_by])
\ No newline at end of file
+    executor = db.relationship('User', foreign_keys=[executed_by])
+
+class ActivityRollup(db.Model):
+    """Daily activity counts per project for finished (past) days"""
+    __tablename__ = 'activity_rollups'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.String(30), nullable=False)  # rfis, submittals, reports
+    project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        db.UniqueConstraint('entity', 'project_id', 'day', name='uix_activity_rollup'),
+        db.Index('ix_activity_rollups_day_entity', 'day', 'entity'),
+    )
+
+class ActivityRollupState(db.Model):
+    """Watermark of the last day rolled up for each entity"""
+    __tablename__ = 'activity_rollup_state'
+    
+    entity = db.Column(db.String(30), primary_key=True)
+    rolled_up_through = db.Column(db.Date, nullable=False)
+    updated_at = db.Column(db.DateTime, default=func.now(), onupdate=func.now())
@@ -40,6 +40,12 @@ class ObservationType(str, Enum):
 class SafetyObservation(db.Model):
     """Safety observations recorded on site"""
     __tablename__ = 'safety_observations'
+    __table_args__ = (
+        # Keyset pagination: WHERE project_id = ? ORDER BY observation_date DESC, id DESC
+        db.Index('ix_safety_observations_project_observation_date_id', 'project_id', 'observation_date', 'id'),
+        # Mobile delta sync: WHERE project_id IN (...) AND change_seq > ? ORDER BY change_seq
+        db.Index('ix_safety_observations_project_change_seq', 'project_id', 'change_seq'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), nullable=False)
@@ -62,6 +68,7 @@ class SafetyObservation(db.Model):
     created_by = db.Column(db.Integer, db.ForeignKey('users.id'))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    change_seq = db.Column(db.BigInteger, nullable=False, default=0)  # mobile sync, see app.utils.sync
     
     # Relationships
     project = db.relationship('Project', backref=db.backref('safety_observations', lazy='dynamic'))
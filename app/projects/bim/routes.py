@@ -1,13 +1,15 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, send_file
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, jsonify
 from flask_login import login_required, current_user
 from app.models.bim import BIMModel, BIMModelVersion, BIMIssue
 from app.models.project import Project
 from app.projects.bim.forms import BIMUploadForm
 from app.extensions import db
 from app.utils.access_control import project_access_required
-from app.utils.file_upload import save_file, ensure_directory_exists
+from app.utils.file_upload import save_file
+from app.utils import blob_store
+from app.utils.file_serving import serve_file
+from app.utils import ifc_cache
 import os
-import datetime
 
 bim_bp = Blueprint('bim', __name__)
 
@@ -20,6 +22,8 @@ def index(project_id):
     
     try:
         bim_models = BIMModel.query.filter_by(project_id=project_id).all()
+        # One GROUP BY for every model's open-issue badge
+        BIMModel.preload_open_issue_counts(bim_models)
         
         # Calculate storage statistics
         storage_used = sum(model.calculate_storage_size() for model in bim_models)
@@ -50,17 +54,8 @@ def upload_model(project_id):
         try:
             file = form.file.data
             if file and file.filename.endswith('.ifc'):
-                # Use proper file path management and ensure directory exists
-                upload_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], 'bim', str(project_id))
-                ensure_directory_exists(upload_dir)
-                
-                # Generate a unique filename to avoid collisions
-                timestamp = datetime.datetime.now().strftime('%Y%m%d%H%M%S')
-                filename = f"{timestamp}_{file.filename}"
-                file_path = os.path.join(upload_dir, filename)
-                
-                # Save the file
-                file.save(file_path)
+                # Stored once per content; re-uploading an unchanged IFC writes nothing
+                file_path = save_file(file)
                 
                 # Create new BIM model with DB transaction
                 new_model = BIMModel(
@@ -134,8 +129,137 @@ def get_model_file(project_id, model_id, version_id):
     if model.project_id != int(project_id) or version.model_id != model.id:
         return "Unauthorized", 403
     
+    # Blob paths are relative to UPLOAD_FOLDER; older versions are absolute
+    file_path = blob_store.absolute_path(version.file_path)
+    
     # Check if file exists
-    if not os.path.exists(version.file_path):
+    if not file_path or not os.path.exists(file_path):
         return "File not found", 404
     
-    return send_file(version.file_path, as_attachment=False)
\ No newline at end of file
+    # Range/conditional aware, handed off to nginx when X_ACCEL_MAPPINGS covers the file;
+    # content-addressed files use their SHA-256 as a stable ETag
+    return serve_file(file_path, mimetype='application/x-step',
+                      etag=blob_store.blob_digest(version.file_path),
+                      download_name=f"{model.name}_v{version.version_number}.ifc")
+
+ELEMENT_PAGE_SIZE = 500
+MAX_ELEMENT_PAGE_SIZE = 5000
+
+
+def _bbox_arg():
+    """``bbox`` query argument as six floats, None if absent, False if malformed"""
+    if not request.args.get('bbox'):
+        return None
+    try:
+        bbox = [float(v) for v in request.args['bbox'].split(',')]
+    except ValueError:
+        return False
+    if len(bbox) != 6 or any(bbox[axis] > bbox[axis + 3] for axis in range(3)):
+        return False
+    return bbox
+
+
+def _bbox_error():
+    return jsonify({'status': 'error', 'message': 'bbox must be min_x,min_y,min_z,max_x,max_y,max_z'}), 400
+
+
+def _element_cache(project_id, model_id, version_id):
+    """(cache, None) for a version's IFC, or (None, error response) while it is missing or failed"""
+    model = BIMModel.query.get_or_404(model_id)
+    version = BIMModelVersion.query.get_or_404(version_id)
+    if model.project_id != int(project_id) or version.model_id != model.id:
+        return None, (jsonify({'status': 'error', 'message': 'Unauthorized'}), 403)
+
+    ifc_path = ifc_cache.ifc_file_path(version.file_path)
+    cache = ifc_cache.get_element_cache(ifc_path)
+    if cache is not None:
+        return cache, None
+    if not os.path.exists(ifc_path):
+        return None, (jsonify({'status': 'error', 'message': 'File not found'}), 404)
+    error = ifc_cache.ingest_error(ifc_path)
+    if error:
+        return None, (jsonify({'status': 'error', 'message': f'Model could not be indexed: {error}'}), 422)
+    # Uploaded before the cache existed, or still being built
+    ifc_cache.queue_ifc_ingest(ifc_path)
+    cache = ifc_cache.get_element_cache(ifc_path)
+    if cache is not None:
+        return cache, None
+    return None, (jsonify({'status': 'pending', 'message': 'The model is being indexed'}), 202,
+                  {'Retry-After': '5'})
+
+
+@bim_bp.route('/model/<int:model_id>/version/<int:version_id>/elements')
+@login_required
+@project_access_required
+def model_elements(project_id, model_id, version_id):
+    """Query a model's elements by type, property value and bounding box."""
+    cache, error = _element_cache(project_id, model_id, version_id)
+    if error:
+        return error
+
+    bbox = _bbox_arg()
+    if bbox is False:
+        return _bbox_error()
+    limit = min(request.args.get('limit', ELEMENT_PAGE_SIZE, type=int), MAX_ELEMENT_PAGE_SIZE)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+
+    matches = cache.select(ifc_type=request.args.get('type'), pset=request.args.get('pset'),
+                           prop=request.args.get('property'), value=request.args.get('value'),
+                           bbox=bbox, contained=request.args.get('contained') == 'true')
+    return jsonify({'status': 'success', 'data': {
+        'total': len(matches),
+        'offset': offset,
+        'elements': [cache.summary(i) for i in matches[offset:offset + max(limit, 0)]],
+    }})
+
+
+@bim_bp.route('/model/<int:model_id>/version/<int:version_id>/elements/<global_id>')
+@login_required
+@project_access_required
+def model_element(project_id, model_id, version_id, global_id):
+    """A single element with its property sets, by GlobalId."""
+    cache, error = _element_cache(project_id, model_id, version_id)
+    if error:
+        return error
+
+    i = cache.find(global_id)
+    if i is None:
+        return jsonify({'status': 'error', 'message': 'Element not found'}), 404
+    return jsonify({'status': 'success', 'data': {**cache.summary(i), 'properties': cache.properties(i)}})
+
+
+@bim_bp.route('/model/<int:model_id>/version/<int:version_id>/region')
+@login_required
+@project_access_required
+def model_region(project_id, model_id, version_id):
+    """Issues and elements inside a bounding box (``bbox`` is required)."""
+    bbox = _bbox_arg()
+    if not bbox:
+        return _bbox_error()
+    cache, error = _element_cache(project_id, model_id, version_id)
+    if error:
+        return error
+
+    # Issue pins are points: range scan on ix_bim_issues_model_position
+    issues = BIMIssue.query.filter(
+        BIMIssue.model_id == model_id,
+        BIMIssue.position_x.between(bbox[0], bbox[3]),
+        BIMIssue.position_y.between(bbox[1], bbox[4]),
+        BIMIssue.position_z.between(bbox[2], bbox[5]),
+    ).order_by(BIMIssue.id).all()
+    elements = cache.select(ifc_type=request.args.get('type'), bbox=bbox,
+                            contained=request.args.get('contained') == 'true')
+    limit = min(request.args.get('limit', ELEMENT_PAGE_SIZE, type=int), MAX_ELEMENT_PAGE_SIZE)
+
+    return jsonify({'status': 'success', 'data': {
+        'issues': [{
+            'id': issue.id,
+            'title': issue.title,
+            'status': issue.status,
+            'priority': issue.priority,
+            'element_id': issue.element_id,
+            'position': [issue.position_x, issue.position_y, issue.position_z],
+        } for issue in issues],
+        'elements_total': len(elements),
+        'elements': [cache.summary(i) for i in elements[:max(limit, 0)]],
+    }})
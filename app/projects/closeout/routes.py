@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, redirect, url_for, request, flash, current_app, send_from_directory
+from flask import Blueprint, render_template, redirect, url_for, request, flash
 from flask_login import login_required, current_user
 from app.models.project import Project
 from app.models.closeout import (
@@ -11,11 +11,12 @@ from app.projects.closeout.forms import (
 )
 from app.extensions import db
 from app.utils.access_control import project_access_required
-from app.utils.file_upload import save_file, get_file_url, delete_file
+from app.utils.file_upload import save_file, delete_file, stored_file_size
+from app.utils import blob_store
+from app.utils.file_serving import serve_file
 from sqlalchemy import func, desc
 from datetime import datetime, timedelta
 import os
-import uuid
 
 closeout_bp = Blueprint('projects_closeout', __name__)
 
@@ -206,17 +207,12 @@ def create_manual():
         
         # Handle file upload
         if form.manual_file.data:
-            filename = save_file(
-                form.manual_file.data, 
-                f'projects/{project_id}/closeout/manuals',
-                name_prefix=f'manual_{uuid.uuid4().hex}'
-            )
+            filename = save_file(form.manual_file.data)
             
             if filename:
                 manual.file_path = filename
                 manual.file_name = form.manual_file.data.filename
-                manual.file_size = len(form.manual_file.data.read())
-                form.manual_file.data.seek(0)  # Reset file pointer after reading
+                manual.file_size = stored_file_size(filename)
         
         db.session.add(manual)
         db.session.commit()
@@ -278,17 +274,12 @@ def edit_manual(manual_id):
             if manual.file_path:
                 delete_file(manual.file_path)
             
-            filename = save_file(
-                form.manual_file.data, 
-                f'projects/{project_id}/closeout/manuals',
-                name_prefix=f'manual_{uuid.uuid4().hex}'
-            )
+            filename = save_file(form.manual_file.data)
             
             if filename:
                 manual.file_path = filename
                 manual.file_name = form.manual_file.data.filename
-                manual.file_size = len(form.manual_file.data.read())
-                form.manual_file.data.seek(0)
+                manual.file_size = stored_file_size(filename)
         
         db.session.commit()
         
@@ -335,15 +326,16 @@ def download_manual(manual_id):
         flash('File not found.', 'danger')
         return redirect(url_for('projects.closeout.view_manual', project_id=project_id, manual_id=manual_id))
     
-    upload_folder = current_app.config['UPLOAD_FOLDER']
-    directory = os.path.dirname(os.path.join(upload_folder, manual.file_path))
-    filename = os.path.basename(manual.file_path)
+    file_path = blob_store.absolute_path(manual.file_path)
+    if not file_path or not os.path.exists(file_path):
+        flash('File not found.', 'danger')
+        return redirect(url_for('projects.closeout.view_manual', project_id=project_id, manual_id=manual_id))
     
-    return send_from_directory(
-        directory, 
-        filename, 
-        as_attachment=True,
-        download_name=manual.file_name or filename
+    return serve_file(
+        file_path,
+        etag=blob_store.blob_digest(manual.file_path),
+        download_name=manual.file_name or os.path.basename(manual.file_path),
+        as_attachment=True
     )
 
 # Similar routes for Warranties, Attic Stock, Final Inspections, As-Built Drawings, and Closeout Documents
@@ -432,17 +424,12 @@ def create_warranty():
         
         # Handle file upload
         if form.warranty_file.data:
-            filename = save_file(
-                form.warranty_file.data, 
-                f'projects/{project_id}/closeout/warranties',
-                name_prefix=f'warranty_{uuid.uuid4().hex}'
-            )
+            filename = save_file(form.warranty_file.data)
             
             if filename:
                 warranty.file_path = filename
                 warranty.file_name = form.warranty_file.data.filename
-                warranty.file_size = len(form.warranty_file.data.read())
-                form.warranty_file.data.seek(0)
+                warranty.file_size = stored_file_size(filename)
         
         db.session.add(warranty)
         db.session.commit()
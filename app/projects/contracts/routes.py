@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, send_file, abort
+from flask import Blueprint, render_template, request, redirect, url_for, flash, abort
 from flask_login import login_required, current_user
 from app.models.project import Project
 from app.models.contracts import (
@@ -13,7 +13,10 @@ from app.projects.contracts.forms import (
 )
 from app.extensions import db
 from app.utils.access_control import project_access_required
-from app.utils.file_upload import save_file, get_file_url, delete_file
+from app.models.base import StoredBlob
+from app.utils.file_upload import save_file, delete_file
+from app.utils import blob_store
+from app.utils.file_serving import serve_file
 from datetime import datetime, date
 import os
 import uuid
@@ -107,11 +110,7 @@ def create_contract():
         
         # Handle document upload
         if form.contract_document.data:
-            file_path = save_file(
-                form.contract_document.data,
-                f'contracts/prime/{contract.contract_number}',
-                f'contract_{uuid.uuid4().hex}'
-            )
+            file_path = save_file(form.contract_document.data)
             if file_path:
                 contract.document_path = file_path
         
@@ -162,11 +161,7 @@ def edit_contract(id):
         
         # Handle document upload
         if form.contract_document.data:
-            file_path = save_file(
-                form.contract_document.data,
-                f'contracts/prime/{contract.contract_number}',
-                f'contract_{uuid.uuid4().hex}'
-            )
+            file_path = save_file(form.contract_document.data)
             if file_path:
                 # Delete old document if exists
                 if contract.document_path:
@@ -255,11 +250,7 @@ def create_subcontract():
         
         # Handle document upload
         if form.contract_document.data:
-            file_path = save_file(
-                form.contract_document.data,
-                f'contracts/subcontracts/{subcontract.subcontract_number}',
-                f'subcontract_{uuid.uuid4().hex}'
-            )
+            file_path = save_file(form.contract_document.data)
             if file_path:
                 subcontract.document_path = file_path
         
@@ -340,11 +331,7 @@ def create_agreement():
         
         # Handle document upload
         if form.agreement_document.data:
-            file_path = save_file(
-                form.agreement_document.data,
-                f'contracts/agreements/{agreement.agreement_number}',
-                f'agreement_{uuid.uuid4().hex}'
-            )
+            file_path = save_file(form.agreement_document.data)
             if file_path:
                 agreement.document_path = file_path
         
@@ -387,11 +374,7 @@ def create_lien_waiver():
         
         # Handle document upload
         if form.waiver_document.data:
-            file_path = save_file(
-                form.waiver_document.data,
-                f'contracts/lien_waivers/{project_id}',
-                f'waiver_{uuid.uuid4().hex}'
-            )
+            file_path = save_file(form.waiver_document.data)
             if file_path:
                 waiver.document_path = file_path
         
@@ -438,11 +421,7 @@ def create_certificate_of_insurance():
         
         # Handle document upload
         if form.insurance_document.data:
-            file_path = save_file(
-                form.insurance_document.data,
-                f'contracts/insurance/{project_id}',
-                f'insurance_{uuid.uuid4().hex}'
-            )
+            file_path = save_file(form.insurance_document.data)
             if file_path:
                 certificate.document_path = file_path
         
@@ -489,11 +468,7 @@ def create_letter_of_intent():
         
         # Handle document upload
         if form.loi_document.data:
-            file_path = save_file(
-                form.loi_document.data,
-                f'contracts/loi/{project_id}',
-                f'loi_{uuid.uuid4().hex}'
-            )
+            file_path = save_file(form.loi_document.data)
             if file_path:
                 letter.document_path = file_path
         
@@ -533,11 +508,7 @@ def create_prime_change_order(contract_id):
         
         # Handle document upload
         if form.change_order_document.data:
-            file_path = save_file(
-                form.change_order_document.data,
-                f'contracts/prime/{contract.id}/change_orders',
-                f'co_{uuid.uuid4().hex}'
-            )
+            file_path = save_file(form.change_order_document.data)
             if file_path:
                 change_order.document_path = file_path
         
@@ -561,7 +532,14 @@ def create_prime_change_order(contract_id):
 @contracts_bp.route('/document/<path:document_path>')
 @login_required
 def view_document(document_path):
-    full_path = os.path.join(current_app.config['UPLOAD_FOLDER'], document_path)
-    if not os.path.exists(full_path):
+    # Only paths of stored documents resolve, so the URL cannot reach other files;
+    # documents saved before the blob store are under the (public) static uploads folder
+    if blob_store.is_blob_path(document_path):
+        if StoredBlob.query.filter_by(path=document_path).first() is None:
+            abort(404)
+    elif not document_path.startswith(blob_store.LEGACY_STATIC_PREFIX):
         abort(404)
-    return send_file(full_path)
\ No newline at end of file
+    full_path = blob_store.absolute_path(document_path)
+    if not full_path or not os.path.exists(full_path):
+        abort(404)
+    return serve_file(full_path, etag=blob_store.blob_digest(document_path))
\ No newline at end of file
@@ -1,19 +1,44 @@
-from flask import render_template, request, redirect, url_for, flash, jsonify
+from flask import render_template, request, redirect, url_for, flash, jsonify, current_app
 from flask_login import login_required, current_user
 from app.projects.cost import cost_bp
 from .forms import BudgetForm, BudgetItemForm, InvoiceForm, ChangeOrderForm, PotentialChangeOrderForm
-from app.models.cost import Budget, BudgetItem, Invoice, ChangeOrder, PotentialChangeOrder, DirectCost, ApprovalLetter
+from app.models.cost import Budget, BudgetItem, Invoice, ChangeOrder, PotentialChangeOrder, ApprovalLetter
 from app.models.base import Comment, Attachment
 from app.models.project import Project
 from app.extensions import db
 from app.utils.access_control import role_required
 from app.utils.pdf_generator import generate_pdf
 from app.utils.web3_utils import store_hash_on_blockchain, verify_document_hash
+from app.utils import blob_store
 from datetime import datetime
-import hashlib
-import os
-import uuid
 from app.utils.access_control import project_access_required
+from app.utils.cost_rollup import ROLLUP_COLUMNS, get_project_cost_rollup
+
+
+def _cost_summary(project_id):
+    """Template values for the cost dashboard, read from ProjectCostRollup"""
+    rollup = get_project_cost_rollup(project_id) if project_id is not None else None
+    values = {column: (getattr(rollup, column) or 0) if rollup else 0 for column in ROLLUP_COLUMNS}
+    
+    original_budget = values['original_budget']
+    current_budget = original_budget  # Placeholder - might be different after change orders
+    committed_cost = 0  # Placeholder
+    projected_cost = 0  # Placeholder
+    variance = current_budget - projected_cost
+    
+    return {
+        'original_budget': original_budget,
+        'current_budget': current_budget,
+        'committed_cost': committed_cost,
+        'projected_cost': projected_cost,
+        'variance': variance,
+        'variance_percent': (variance / current_budget * 100) if current_budget > 0 else 0,
+        'approved_changes': values['approved_change_orders'],
+        'pending_changes': values['pending_change_orders'],
+        'total_invoiced': values['total_invoiced'],
+        'paid_invoiced': values['paid_invoiced'],
+        'direct_costs': values['direct_costs'],
+    }
 
 
 @cost_bp.route('/<int:project_id>/cost')
@@ -29,77 +54,16 @@ def index(project_id):
         flash('You do not have permission to view cost information', 'danger')
         return redirect(url_for('projects_overview.index', project_id=project_id))
     
-    # Get budget summary
+    # Totals are read from the materialised rollup (one row per project)
     try:
-        budget = Budget.query.filter_by(project_id=project_id).first()
-        budget_items = BudgetItem.query.filter_by(project_id=project_id).all() if budget else []
-        
-        original_budget = sum(item.estimated_amount for item in budget_items)
-        current_budget = original_budget  # Placeholder - might be different after change orders
-        committed_cost = 0  # Placeholder
-        projected_cost = 0  # Placeholder
-        
-        # Calculate variance
-        variance = current_budget - projected_cost
-        variance_percent = (variance / current_budget * 100) if current_budget > 0 else 0
-    except:
-        original_budget = 0
-        current_budget = 0
-        committed_cost = 0
-        projected_cost = 0
-        variance = 0
-        variance_percent = 0
-    
-    # Get change orders summary
-    try:
-        approved_changes = db.session.query(db.func.sum(ChangeOrder.amount)).filter(
-            ChangeOrder.project_id == project_id,
-            ChangeOrder.status == 'approved'
-        ).scalar() or 0
-        
-        pending_changes = db.session.query(db.func.sum(PotentialChangeOrder.amount)).filter(
-            PotentialChangeOrder.project_id == project_id,
-            PotentialChangeOrder.status == 'submitted'
-        ).scalar() or 0
-    except:
-        approved_changes = 0
-        pending_changes = 0
-    
-    # Get invoices summary
-    try:
-        total_invoiced = db.session.query(db.func.sum(Invoice.amount)).filter(
-            Invoice.project_id == project_id
-        ).scalar() or 0
-        
-        paid_invoiced = db.session.query(db.func.sum(Invoice.amount)).filter(
-            Invoice.project_id == project_id,
-            Invoice.status == 'paid'
-        ).scalar() or 0
-    except:
-        total_invoiced = 0
-        paid_invoiced = 0
-    
-    # Get direct costs
-    try:
-        direct_costs = db.session.query(db.func.sum(DirectCost.amount)).filter(
-            DirectCost.project_id == project_id
-        ).scalar() or 0
-    except:
-        direct_costs = 0
+        summary = _cost_summary(project_id)
+    except Exception as e:
+        current_app.logger.error(f"Error loading cost rollup for project {project_id}: {str(e)}")
+        summary = _cost_summary(None)
     
     return render_template('projects/cost/dashboard.html',
                           project=project,
-                          original_budget=original_budget,
-                          current_budget=current_budget,
-                          committed_cost=committed_cost,
-                          projected_cost=projected_cost,
-                          variance=variance,
-                          variance_percent=variance_percent,
-                          approved_changes=approved_changes,
-                          pending_changes=pending_changes,
-                          total_invoiced=total_invoiced,
-                          paid_invoiced=paid_invoiced,
-                          direct_costs=direct_costs)
+                          **summary)
 
 # Cost Dashboard
 @cost_bp.route('/dashboard')
@@ -114,87 +78,12 @@ def dashboard():
         flash('You do not have permission to view cost information', 'danger')
         return redirect(url_for('projects.view_project', id=project_id))
     
-    # Get budget summary
-    budget = Budget.query.filter_by(project_id=project_id).first()
-    budget_items = BudgetItem.query.filter_by(project_id=project_id).all() if budget else []
-    
-    original_budget = sum(item.original_amount for item in budget_items)
-    current_budget = sum(item.current_amount for item in budget_items)
-    committed_cost = sum(item.committed_cost for item in budget_items)
-    projected_cost = sum(item.projected_cost for item in budget_items)
-    
-    # Calculate variance
-    variance = current_budget - projected_cost
-    variance_percent = (variance / current_budget * 100) if current_budget > 0 else 0
-    
-    # Get change orders summary
-    approved_changes = db.session.query(db.func.sum(ChangeOrder.amount)).filter(
-        ChangeOrder.project_id == project_id,
-        ChangeOrder.status == 'approved'
-    ).scalar() or 0
-    
-    pending_changes = db.session.query(db.func.sum(PotentialChangeOrder.estimated_amount)).filter(
-        PotentialChangeOrder.project_id == project_id,
-        PotentialChangeOrder.status == 'pending'
-    ).scalar() or 0
-    
-    # Get invoices summary
-    total_invoiced = db.session.query(db.func.sum(Invoice.amount)).filter(
-        Invoice.project_id == project_id
-    ).scalar() or 0
-    
-    paid_invoiced = db.session.query(db.func.sum(Invoice.amount)).filter(
-        Invoice.project_id == project_id,
-        Invoice.status == 'paid'
-    ).scalar() or 0
-    
-    # Get direct costs
-    direct_costs = db.session.query(db.func.sum(DirectCost.amount)).filter(
-        DirectCost.project_id == project_id
-    ).scalar() or 0
-    
-    # Get cost data by category for chart
-    budget_by_category = db.session.query(
-        BudgetItem.category, db.func.sum(BudgetItem.original_amount).label('original'),
-        db.func.sum(BudgetItem.current_amount).label('current'),
-        db.func.sum(BudgetItem.committed_cost).label('committed'),
-        db.func.sum(BudgetItem.projected_cost).label('projected')
-    ).filter(
-        BudgetItem.project_id == project_id
-    ).group_by(BudgetItem.category).all()
-    
-    # Format for charts
-    categories = []
-    original_data = []
-    current_data = []
-    committed_data = []
-    projected_data = []
-    
-    for category, original, current, committed, projected in budget_by_category:
-        categories.append(category)
-        original_data.append(float(original))
-        current_data.append(float(current))
-        committed_data.append(float(committed))
-        projected_data.append(float(projected))
+    summary = _cost_summary(project_id)
     
     return render_template('projects/cost/dashboard.html',
                           project=project,
-                          original_budget=original_budget,
-                          current_budget=current_budget,
-                          committed_cost=committed_cost,
-                          projected_cost=projected_cost,
-                          variance=variance,
-                          variance_percent=variance_percent,
-                          approved_changes=approved_changes,
-                          pending_changes=pending_changes,
-                          total_invoiced=total_invoiced,
-                          paid_invoiced=paid_invoiced,
-                          direct_costs=direct_costs,
-                          categories=categories,
-                          original_data=original_data,
-                          current_data=current_data,
-                          committed_data=committed_data,
-                          projected_data=projected_data)
+                          **summary)
+
 # Budget Routes
 @cost_bp.route('/<int:project_id>/budget')
 @login_required
@@ -456,29 +345,21 @@ def create_invoice():
         if 'invoice_file' in request.files and request.files['invoice_file'].filename:
             file = request.files['invoice_file']
             
-            # Create directory if it doesn't exist
-            upload_dir = os.path.join('app', 'uploads', 'invoices', str(project_id))
-            os.makedirs(upload_dir, exist_ok=True)
-            
-            # Generate unique filename
-            filename = str(uuid.uuid4()) + '_' + file.filename
-            file_path = os.path.join(upload_dir, filename)
-            file.save(file_path)
+            # Content-addressed: the blob's SHA-256 doubles as the verification hash
+            blob = blob_store.store_stream(file.stream, file.filename)
             
             # Create attachment record
             attachment = Attachment(
                 record_type='invoice',
                 record_id=invoice.id,
                 filename=file.filename,
-                file_path=file_path,
-                file_size=os.path.getsize(file_path),
+                file_path=blob.path,
+                file_size=blob.size,
                 file_type=file.content_type,
                 uploaded_by=current_user.id
             )
             
-            # Calculate file hash for blockchain verification
-            with open(file_path, 'rb') as f:
-                file_hash = hashlib.sha256(f.read()).hexdigest()
+            file_hash = blob.sha256
             
             # Store hash on blockchain if enabled
             if project.blockchain_enabled:
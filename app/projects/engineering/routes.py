@@ -1,5 +1,5 @@
 # app/projects/engineering/routes.py
-from flask import render_template, request, redirect, url_for, flash, jsonify, send_file
+from flask import render_template, request, redirect, url_for, flash, jsonify, send_file, abort
 from flask_login import login_required, current_user
 from . import engineering_bp
 from .forms import RFIForm, SubmittalForm, DrawingForm, SpecificationForm, PermitForm, MeetingForm, TransmittalForm
@@ -7,11 +7,13 @@ from app.models.engineering import RFI, Submittal, Drawing, Specification, Permi
 from app.models.base import Comment, Attachment
 from app.models.project import Project
 from app.extensions import db
-from app.utils.access_control import role_required
+from app.utils.access_control import role_required, has_project_access
 from app.utils.pdf_generator import generate_pdf
+from app.utils.file_upload import save_file, stored_file_size, delete_file
+from app.utils import blob_store
+from app.utils.file_serving import serve_file
 from datetime import datetime
 import os
-import uuid
 
 # Engineering Dashboard
 @engineering_bp.route('/<int:project_id>/engineering/dashboard')
@@ -153,11 +155,10 @@ def delete_rfi(id):
     # Delete related comments and attachments - use module_name
     Comment.query.filter_by(module_name='rfi', record_id=id).delete()
     
-    # Delete attachment files before deleting records
+    # Release attachment files; shared blobs are only removed once nothing else uses them
     attachments = Attachment.query.filter_by(module_name='rfi', record_id=id).all()
     for attachment in attachments:
-        if os.path.exists(attachment.file_path):
-            os.remove(attachment.file_path)
+        delete_file(attachment.file_path)
     
     Attachment.query.filter_by(module_name='rfi', record_id=id).delete()
     
@@ -207,22 +208,18 @@ def add_rfi_attachment(id):
         return redirect(url_for('projects_engineering.view_rfi', id=id))
     
     if file:
-        filename = str(uuid.uuid4()) + '_' + file.filename
-        upload_dir = os.path.join('app', 'static', 'uploads', 'rfis', str(rfi.project_id))
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        file_path = os.path.join(upload_dir, filename)
-        file.save(file_path)
-        
-        # Store relative path for database
-        relative_path = os.path.join('uploads', 'rfis', str(rfi.project_id), filename)
+        # Path relative to UPLOAD_FOLDER, shared with identical uploads
+        relative_path = save_file(file)
+        if not relative_path:
+            flash('The file could not be saved', 'danger')
+            return redirect(url_for('projects_engineering.view_rfi', id=id))
         
         attachment = Attachment(
             module_name='rfi',  # Use module_name instead of record_type
             record_id=id,
             filename=file.filename,
             file_path=relative_path,  # Store relative path
-            file_size=os.path.getsize(file_path),
+            file_size=stored_file_size(relative_path),
             file_type=file.content_type,
             uploader_id=current_user.id  # Make sure field matches model
         )
@@ -233,6 +230,21 @@ def add_rfi_attachment(id):
         flash('Attachment added successfully!', 'success')
     
     return redirect(url_for('projects_engineering.view_rfi', id=id))
+@engineering_bp.route('/<int:id>/engineering/rfis/attachments/<int:attachment_id>')
+@login_required
+def download_rfi_attachment(id, attachment_id):
+    """Download an RFI attachment"""
+    rfi = RFI.query.get_or_404(id)
+    if not has_project_access(current_user, rfi.project_id):
+        abort(403)
+    
+    attachment = Attachment.query.filter_by(id=attachment_id, module_name='rfi', record_id=id).first_or_404()
+    file_path = blob_store.absolute_path(attachment.file_path)
+    if not file_path or not os.path.exists(file_path):
+        abort(404)
+    
+    return serve_file(file_path, mimetype=attachment.file_type, etag=blob_store.blob_digest(attachment.file_path),
+                      download_name=attachment.filename, as_attachment=True)
 @engineering_bp.route('/<int:id>/engineering/rfis/pdf')
 @login_required
 def rfi_pdf(id):
@@ -4,7 +4,7 @@ from . import field_bp
 from werkzeug.utils import secure_filename
 import os
 import uuid
-from flask import Blueprint, render_template, redirect, url_for, request, flash, current_app
+from flask import Blueprint, render_template, redirect, url_for, request, flash, current_app, jsonify, abort
 from flask_login import login_required, current_user
 from app.models.project import Project
 from app.models.field import (
@@ -18,8 +18,17 @@ from app.projects.field.forms import (
 )
 from app.extensions import db
 from app.utils.access_control import project_access_required, has_project_access
-from app.utils.file_upload import save_file
-from datetime import datetime, timedelta
+from app.utils.file_upload import save_file, stored_file_size
+from app.utils import blob_store
+from app.utils.file_serving import serve_file
+from app.utils.photo_derivatives import DERIVATIVE_SPECS, photo_url_path
+from app.utils.pdf_generator import (
+    pdf_cache_key, pdf_job_status, pdf_rendering_available, send_cached_pdf, submit_pdf_job
+)
+from app.utils.daily_report_binder import (
+    binder_cache_key, binder_stylesheets, iter_binder_documents, report_totals
+)
+from datetime import date, datetime, timedelta
 import os
 
 @field_bp.route('/<int:project_id>/field')
@@ -186,11 +195,10 @@ def create_daily_report(project_id):
                 photos = request.files.getlist('photos')
                 for photo in photos:
                     if photo.filename:
-                        filename = save_file(photo, folder=f'projects/{project_id}/daily_reports/{report.id}')
+                        filename = save_file(photo)
                         
                         # Get file size
-                        photo.seek(0)
-                        file_size = len(photo.read())
+                        file_size = stored_file_size(filename)
                         
                         project_photo = ProjectPhoto(
                             project_id=project_id,
@@ -310,14 +318,14 @@ def edit_daily_report(project_id, report_id):
             photos = request.files.getlist('photos')
             for photo in photos:
                 if photo.filename:
-                    filename = save_file(photo, folder=f'projects/{project_id}/daily_reports/{report.id}')
+                    filename = save_file(photo)
                     
                     project_photo = ProjectPhoto(
                         project_id=project_id,
                         daily_report_id=report.id,
                         title=f"Daily Report Photo - {report.report_date}",
                         file_path=filename,
-                        file_size=len(photo.read()),
+                        file_size=stored_file_size(filename),
                         uploaded_by=current_user.id
                     )
                     db.session.add(project_photo)
@@ -403,6 +411,26 @@ def photos(project_id):
     return render_template('projects/field/photos/index.html',
                           project=project, photos=photos)
 
+@field_bp.route('/<int:project_id>/photos/<int:photo_id>/file')
+@login_required
+@project_access_required
+def photo_file(project_id, photo_id):
+    """Photo file, or one of its derivatives with ?size= (e.g. 'thumb', 'medium_webp')"""
+    photo = ProjectPhoto.query.get_or_404(photo_id)
+    if photo.project_id != project_id:
+        abort(404)
+    
+    size = request.args.get('size')
+    if size and size not in DERIVATIVE_SPECS:
+        abort(404)
+    path = photo_url_path(photo, size) if size else photo.file_path
+    file_path = blob_store.absolute_path(path)
+    if not file_path or not os.path.exists(file_path):
+        abort(404)
+    
+    # Derivatives are named after the original's digest, so the path is a stable ETag
+    return serve_file(file_path, etag=path.rsplit('/', 1)[-1])
+
 @field_bp.route('/<int:project_id>/field/photos/upload', methods=['GET', 'POST'])
 @login_required
 @project_access_required
@@ -416,12 +444,11 @@ def upload_photo(project_id):
             # Make sure to seek to the beginning of the file before saving
             form.photo.data.seek(0)
             
-            # Save file and get the path relative to static folder
-            relative_path = save_file(form.photo.data, folder=f'projects/{project_id}/photos')
+            # Save file and get the path relative to UPLOAD_FOLDER
+            relative_path = save_file(form.photo.data)
             
-            # Get file size
-            form.photo.data.seek(0)
-            file_size = len(form.photo.data.read())
+            # Get file size from the stored file rather than reading the upload into memory
+            file_size = stored_file_size(relative_path)
             
             # Create and save the photo record
             photo = ProjectPhoto(
@@ -429,7 +456,7 @@ def upload_photo(project_id):
                 title=form.title.data,
                 description=form.description.data,
                 location=form.location.data,
-                file_path=relative_path,  # This should be relative to the static folder
+                file_path=relative_path,  # Relative to UPLOAD_FOLDER
                 file_size=file_size,
                 is_featured=form.is_featured.data,
                 uploaded_by=current_user.id
@@ -447,34 +474,6 @@ def upload_photo(project_id):
     
     return render_template('projects/field/photos/upload.html',
                           project=project, form=form)
-def save_file(file, folder=''):
-    """Save a file to the uploads directory"""
-    from werkzeug.utils import secure_filename
-    import os
-    import uuid
-    from flask import current_app
-    
-    filename = secure_filename(file.filename)
-    # Generate a unique filename
-    unique_filename = f"{uuid.uuid4().hex}_{filename}"
-    
-    # Normalize the folder path to use forward slashes consistently
-    folder = folder.replace('\\', '/')
-    
-    # Create physical path for storage
-    upload_path = os.path.join(current_app.static_folder, 'uploads', folder)
-    os.makedirs(upload_path, exist_ok=True)
-    
-    # Save the file
-    file_path = os.path.join(upload_path, unique_filename)
-    file.save(file_path)
-    
-    # Create and return a web-friendly path with forward slashes
-    # This is critical for correct URL generation
-    relative_path = f"uploads/{folder}/{unique_filename}"
-    relative_path = relative_path.replace('\\', '/')
-    
-    return relative_path
 # Safety Incidents routes
 
 @field_bp.route('/<int:project_id>/safety')
@@ -533,14 +532,14 @@ def report_safety_incident(project_id):
             photos = request.files.getlist('photos')
             for photo in photos:
                 if photo.filename:
-                    filename = save_file(photo, folder=f'projects/{project_id}/safety/{incident.id}')
+                    filename = save_file(photo)
                     
                     project_photo = ProjectPhoto(
                         project_id=project_id,
                         title=f"Safety Incident - {incident.title}",
                         description=f"Photo for incident reported on {incident.incident_date}",
                         file_path=filename,
-                        file_size=len(photo.read()),
+                        file_size=stored_file_size(filename),
                         uploaded_by=current_user.id
                     )
                     db.session.add(project_photo)
@@ -623,14 +622,14 @@ def create_punchlist_item(project_id):
             photos = request.files.getlist('photos')
             for photo in photos:
                 if photo.filename:
-                    filename = save_file(photo, folder=f'projects/{project_id}/punchlist/{item.id}')
+                    filename = save_file(photo)
                     
                     project_photo = ProjectPhoto(
                         project_id=project_id,
                         title=f"Punchlist Item - {item.title}",
                         description=f"Photo for punchlist item: {item.title}",
                         file_path=filename,
-                        file_size=len(photo.read()),
+                        file_size=stored_file_size(filename),
                         uploaded_by=current_user.id
                     )
                     db.session.add(project_photo)
@@ -687,67 +686,134 @@ def update_punchlist_status(project_id, item_id):
     
     return redirect(url_for('projects.field.view_punchlist', project_id=project_id, item_id=item_id))
 
+DAILY_REPORT_PDF_TEMPLATE = 'projects/field/daily_reports/pdf_template.html'
+BINDER_MAX_DAYS = 366
+
+def _daily_report_pdf_key(report):
+    """Cache key: changes when the report or the PDF template changes"""
+    return pdf_cache_key(DAILY_REPORT_PDF_TEMPLATE, 'daily-report', report.id, report.updated_at)
+
+def _pdf_pending_response(job_url):
+    """202 pointing at the job URL (JSON for API clients, a refreshing page for browsers)"""
+    headers = {'Location': job_url, 'Retry-After': '2'}
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify({'status': 'pending', 'job_url': job_url}), 202, headers
+    return render_template('projects/field/daily_reports/pdf_pending.html', job_url=job_url), 202, headers
+
+def _serve_pdf(key, download_name, job_url, fallback_url, build_html, stylesheets=None):
+    """
+    Serve a cached PDF, or queue a render of ``build_html()`` and return 202
+    
+    ``build_html`` (and ``stylesheets``) are only called on a cache miss.
+    """
+    status, _ = pdf_job_status(key)
+    if status == 'ready':
+        return send_cached_pdf(key, download_name)
+    if status == 'pending':
+        return _pdf_pending_response(job_url)
+    
+    if not pdf_rendering_available():
+        flash('PDF generation is not available. Please install WeasyPrint.', 'warning')
+        return redirect(fallback_url)
+    
+    try:
+        # Rendering the HTML is quick; the PDF conversion runs in the render pool
+        status = submit_pdf_job(key, build_html(), base_url=request.url_root,
+                                stylesheets=stylesheets() if stylesheets else ())
+    except Exception as e:
+        current_app.logger.error(f"Error queueing PDF: {str(e)}")
+        flash(f'Error generating PDF: {str(e)}', 'danger')
+        return redirect(fallback_url)
+    
+    if status == 'ready':
+        return send_cached_pdf(key, download_name)
+    return _pdf_pending_response(job_url)
+
+def _pdf_job_response(job_id, ready_url):
+    """Poll a PDF job; redirects to ``ready_url`` once the PDF is cached"""
+    status, error = pdf_job_status(job_id)
+    if status == 'ready':
+        return redirect(ready_url, 303)
+    if status == 'pending':
+        return _pdf_pending_response(request.full_path.rstrip('?'))
+    if status == 'failed':
+        current_app.logger.error(f"PDF job {job_id} failed: {error}")
+        return jsonify({'status': 'error', 'message': error}), 500
+    return jsonify({'status': 'error', 'message': 'Unknown PDF job'}), 404
+
 @field_bp.route('/<int:project_id>/daily-reports/<int:report_id>/pdf')
 @login_required
 @project_access_required
 def daily_report_pdf(project_id, report_id):
-    """Generate PDF version of a daily report"""
-    from datetime import datetime  # Make sure this import is at the top of your file
-    
+    """Serve a daily report PDF, queueing a background render if it isn't cached yet"""
     project = Project.query.get_or_404(project_id)
     report = DailyReport.query.filter_by(id=report_id, project_id=project_id).first_or_404()
     
-    # Get photos associated with this report
-    photos = ProjectPhoto.query.filter_by(daily_report_id=report_id).all()
-    
-    # Calculate totals for labor and equipment
-    total_workers = db.session.query(db.func.sum(LaborEntry.worker_count)).filter(LaborEntry.daily_report_id == report.id).scalar() or 0
-    
-    # Calculate total man-hours
-    total_man_hours = 0
-    for entry in report.labor_entries:
-        total_man_hours += entry.worker_count * entry.hours_worked
-    
-    # Calculate equipment totals
-    total_equipment = db.session.query(db.func.sum(EquipmentEntry.count)).filter(EquipmentEntry.daily_report_id == report.id).scalar() or 0
-    total_equipment_hours = db.session.query(db.func.sum(EquipmentEntry.hours_used)).filter(EquipmentEntry.daily_report_id == report.id).scalar() or 0
-    
-    try:
-        # Import PDF generation tools
-        from flask import make_response
-        from weasyprint import HTML, CSS
-        from io import BytesIO
+    def build_html():
+        # Get photos associated with this report
+        photos = ProjectPhoto.query.filter_by(daily_report_id=report_id).all()
+        
+        # Labor and equipment totals in one grouped query
+        totals = report_totals([report.id]).get(report.id, {})
         
-        # Render the template to HTML
-        html = render_template('projects/field/daily_reports/pdf_template.html',
+        return render_template(DAILY_REPORT_PDF_TEMPLATE,
                               project=project, 
                               report=report, 
                               photos=photos,
-                              total_workers=total_workers,
-                              total_man_hours=total_man_hours,
-                              total_equipment=total_equipment,
-                              total_equipment_hours=total_equipment_hours,
-                              datetime=datetime)  # Add this line to pass the datetime module
-        
-        # Generate PDF from HTML
-        pdf_file = BytesIO()
-        HTML(string=html).write_pdf(pdf_file)
-        pdf_file.seek(0)
-        
-        # Create response
-        response = make_response(pdf_file.getvalue())
-        response.headers['Content-Type'] = 'application/pdf'
-        response.headers['Content-Disposition'] = f'inline; filename=daily_report_{report.report_number}.pdf'
-        
-        return response
-    except ImportError:
-        # If PDF generation libraries are not available, return a message
-        flash('PDF generation is not available. Please install WeasyPrint.', 'warning')
-        return redirect(url_for('projects_field.view_daily_report', project_id=project_id, report_id=report_id))
-    except Exception as e:
-        current_app.logger.error(f"Error generating PDF: {str(e)}")
-        flash(f'Error generating PDF: {str(e)}', 'danger')
-        return redirect(url_for('projects_field.view_daily_report', project_id=project_id, report_id=report_id))
+                              total_workers=totals.get('total_workers', 0),
+                              total_man_hours=totals.get('total_man_hours', 0),
+                              total_equipment=totals.get('total_equipment', 0),
+                              total_equipment_hours=totals.get('total_equipment_hours', 0),
+                              datetime=datetime)
+    
+    key = _daily_report_pdf_key(report)
+    job_url = url_for('projects_field.daily_report_pdf_job', project_id=project_id,
+                      report_id=report_id, job_id=key)
+    return _serve_pdf(key, f'daily_report_{report.report_number}.pdf', job_url,
+                      url_for('projects_field.view_daily_report', project_id=project_id, report_id=report_id),
+                      build_html)
+
+@field_bp.route('/<int:project_id>/daily-reports/<int:report_id>/pdf/jobs/<job_id>')
+@login_required
+@project_access_required
+def daily_report_pdf_job(project_id, report_id, job_id):
+    """Poll a PDF job; redirects to the PDF once it is ready"""
+    return _pdf_job_response(job_id, url_for('projects_field.daily_report_pdf',
+                                             project_id=project_id, report_id=report_id))
+
+def _binder_range():
+    """``?start=&end=`` as dates (ISO format), defaulting to the current month"""
+    today = datetime.utcnow().date()
+    start = request.args.get('start', today.replace(day=1), type=date.fromisoformat)
+    end = request.args.get('end', today, type=date.fromisoformat)
+    if end < start or (end - start).days >= BINDER_MAX_DAYS:
+        abort(400, description=f"start must be on or before end, at most {BINDER_MAX_DAYS} days apart")
+    return start, end
+
+@field_bp.route('/<int:project_id>/daily-reports/binder.pdf')
+@login_required
+@project_access_required
+def daily_report_binder(project_id):
+    """All daily reports in a date range as one PDF"""
+    project = Project.query.get_or_404(project_id)
+    start, end = _binder_range()
+    
+    key = binder_cache_key(project_id, start, end)
+    job_url = url_for('projects_field.daily_report_binder_job', project_id=project_id, job_id=key,
+                      start=start.isoformat(), end=end.isoformat())
+    return _serve_pdf(key, f'daily_reports_{project.number}_{start.isoformat()}_{end.isoformat()}.pdf',
+                      job_url, url_for('projects_field.daily_reports', project_id=project_id),
+                      lambda: list(iter_binder_documents(project, start, end)),
+                      stylesheets=binder_stylesheets)
+
+@field_bp.route('/<int:project_id>/daily-reports/binder/jobs/<job_id>')
+@login_required
+@project_access_required
+def daily_report_binder_job(project_id, job_id):
+    """Poll a binder job; redirects to the binder once it is ready"""
+    start, end = _binder_range()
+    return _pdf_job_response(job_id, url_for('projects_field.daily_report_binder', project_id=project_id,
+                                             start=start.isoformat(), end=end.isoformat()))
     
 
 @field_bp.route('/<int:project_id>/daily-reports/<int:report_id>/print')
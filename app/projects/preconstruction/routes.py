@@ -8,8 +8,8 @@ from app.models.base import Comment, Attachment
 from app.extensions import db
 from app.utils.access_control import role_required
 from app.utils.pdf_generator import generate_pdf
+from app.utils.file_upload import save_file, stored_file_size
 from datetime import datetime
-import os
 from app.models.project import Project
 from app.utils.access_control import project_access_required
 
@@ -299,14 +299,9 @@ def add_bidder_attachment(id):
     
     # If file is allowed
     if file:
-        # Create directory if it doesn't exist
-        upload_dir = os.path.join('app', 'uploads', 'bidders', str(id))
-        os.makedirs(upload_dir, exist_ok=True)
-        
         # Save file
         filename = file.filename
-        file_path = os.path.join(upload_dir, filename)
-        file.save(file_path)
+        file_path = save_file(file)
         
         # Create attachment record
         attachment = Attachment(
@@ -314,7 +309,7 @@ def add_bidder_attachment(id):
             record_id=id,
             filename=filename,
             file_path=file_path,
-            file_size=os.path.getsize(file_path),
+            file_size=stored_file_size(file_path),
             file_type=file.content_type,
             uploaded_by=current_user.id
         )
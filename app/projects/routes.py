@@ -8,6 +8,7 @@ from app.models.user import Role
 from app.models.client import Client
 from app.extensions import db, cache
 from app.utils.access_control import role_required, has_project_access, clear_access_cache
+from app.utils.visible_projects import filter_visible
 from sqlalchemy import or_
 from werkzeug.utils import secure_filename
 from datetime import datetime
@@ -27,13 +28,8 @@ def index():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 10, type=int)
     
-    # Base query - get projects the user is part of
-    if hasattr(current_user, 'is_admin') and current_user.is_admin:
-        # Admins see all projects
-        query = Project.query
-    else:
-        # Regular users see only projects they're members of
-        query = Project.query.join(ProjectTeamMember).filter(ProjectTeamMember.user_id == current_user.id)
+    # Base query - admins see all projects, everyone else their memberships
+    query = filter_visible(Project.query, current_user, Project.id)
     
     # Apply filters if provided
     if form.validate():
@@ -225,13 +221,8 @@ def api_projects():
     """API endpoint for getting project data (for select2, etc.)"""
     search = request.args.get('search', '', type=str)
     
-    # Base query - get projects the user is part of
-    if hasattr(current_user, 'is_admin') and current_user.is_admin:
-        # Admins see all projects
-        query = Project.query
-    else:
-        # Regular users see only projects they're members of
-        query = Project.query.join(ProjectTeamMember).filter(ProjectTeamMember.user_id == current_user.id)
+    # Base query - admins see all projects, everyone else their memberships
+    query = filter_visible(Project.query, current_user, Project.id)
     
     # Apply search filter
     if search:
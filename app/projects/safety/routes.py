@@ -14,7 +14,7 @@ from app.projects.safety.forms import (
 )
 from app.extensions import db
 from app.utils.access_control import project_access_required
-from app.utils.file_upload import save_file, get_file_url, delete_file
+from app.utils.file_upload import save_file, delete_file
 from sqlalchemy import func, extract
 from datetime import datetime, date, timedelta
 import calendar
@@ -217,7 +217,7 @@ def create_observation():
             photos = request.files.getlist('photos')
             for photo in photos:
                 if photo.filename:
-                    filename = save_file(photo, folder=f'projects/{project_id}/safety/observations/{observation.id}')
+                    filename = save_file(photo)
                     
                     safety_photo = SafetyPhoto(
                         record_type='observation',
@@ -285,7 +285,7 @@ def edit_observation(observation_id):
             photos = request.files.getlist('photos')
             for photo in photos:
                 if photo.filename:
-                    filename = save_file(photo, folder=f'projects/{project_id}/safety/observations/{observation.id}')
+                    filename = save_file(photo)
                     
                     safety_photo = SafetyPhoto(
                         record_type='observation',
@@ -415,7 +415,7 @@ def create_incident():
             photos = request.files.getlist('photos')
             for photo in photos:
                 if photo.filename:
-                    filename = save_file(photo, folder=f'projects/{project_id}/safety/incidents/{incident.id}')
+                    filename = save_file(photo)
                     
                     incident_photo = IncidentPhoto(
                         incident_id=incident.id,
@@ -524,7 +524,7 @@ def create_jha():
             photos = request.files.getlist('photos')
             for photo in photos:
                 if photo.filename:
-                    filename = save_file(photo, folder=f'projects/{project_id}/safety/jha/{jha.id}')
+                    filename = save_file(photo)
                     
                     safety_photo = SafetyPhoto(
                         record_type='jha',
@@ -628,7 +628,7 @@ def create_pretask():
             photos = request.files.getlist('photos')
             for photo in photos:
                 if photo.filename:
-                    filename = save_file(photo, folder=f'projects/{project_id}/safety/pretask/{plan.id}')
+                    filename = save_file(photo)
                     
                     safety_photo = SafetyPhoto(
                         record_type='pretask',
@@ -724,7 +724,7 @@ def create_orientation():
             photos = request.files.getlist('photos')
             for photo in photos:
                 if photo.filename:
-                    filename = save_file(photo, folder=f'projects/{project_id}/safety/orientations/{orientation.id}')
+                    filename = save_file(photo)
                     
                     safety_photo = SafetyPhoto(
                         record_type='orientation',
@@ -0,0 +1,216 @@
+"""Bounded, expiring cache for project access decisions.
+
+Decisions are keyed by ``(user, project)`` plus three generations: one per
+user, one per project and a global one. Invalidating a user, a project or
+everything bumps a generation in O(1); entries under the old generation are
+never read again and age out through the LRU bound or TTL. Committed
+membership changes (``ProjectTeamMember``, ``UserProject`` and
+``ProjectUser``) invalidate the affected user and project.
+
+Two backends are available (``ACCESS_CACHE_BACKEND``):
+
+* ``local`` - in-process LRU dict; invalidations reach other workers only
+  through the TTL
+* ``shared`` - the app's Flask-Caching backend (Redis in production), so
+  decisions and generations are shared by every worker
+"""
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+
+from app.extensions import cache
+
+logger = logging.getLogger(__name__)
+
+_GLOBAL = ('all', 0)
+_SESSION_CHANGES_KEY = 'access_cache_changes'
+_listeners_registered = False
+
+
+class LocalAccessCache:
+    """Thread-safe in-process LRU cache with per-entry TTL"""
+
+    def __init__(self, max_entries=10000, ttl=300, clock=time.monotonic):
+        """
+        Args:
+            max_entries: Maximum cached decisions before the oldest is evicted
+            ttl: Seconds a decision stays valid
+            clock: Monotonic time source (overridable for tests)
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def _key(self, user_id, project_id):
+        generations = self._generations
+        return (user_id, generations.get(('user', user_id), 0),
+                project_id, generations.get(('project', project_id), 0),
+                generations.get(_GLOBAL, 0))
+
+    def get(self, user_id, project_id):
+        """Return the cached decision, or None on a miss"""
+        with self._lock:
+            key = self._key(user_id, project_id)
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, allowed = entry
+            if expires_at <= self._clock():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return allowed
+
+    def user_generation(self, user_id):
+        """Token that changes whenever the user (or everything) is invalidated"""
+        with self._lock:
+            return (f"{self._generations.get(('user', user_id), 0)}."
+                    f"{self._generations.get(_GLOBAL, 0)}")
+
+    def set(self, user_id, project_id, allowed):
+        with self._lock:
+            key = self._key(user_id, project_id)
+            self._entries[key] = (self._clock() + self.ttl, allowed)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id=None, project_id=None):
+        """Invalidate a user, a project, both, or (with no arguments) everything"""
+        with self._lock:
+            if user_id is None and project_id is None:
+                self._bump(_GLOBAL)
+                self._entries.clear()
+                return
+            if user_id is not None:
+                self._bump(('user', user_id))
+            if project_id is not None:
+                self._bump(('project', project_id))
+
+    def _bump(self, scope):
+        self._generations[scope] = self._generations.get(scope, 0) + 1
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SharedAccessCache:
+    """Access cache stored in the Flask-Caching backend"""
+
+    prefix = 'access'
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+
+    def _generation_keys(self, user_id, project_id):
+        return (f'{self.prefix}:gen:user:{user_id}',
+                f'{self.prefix}:gen:project:{project_id}',
+                f'{self.prefix}:gen:all')
+
+    def _key(self, user_id, project_id):
+        generations = cache.get_many(*self._generation_keys(user_id, project_id))
+        user_gen, project_gen, global_gen = (generation or 0 for generation in generations)
+        return f'{self.prefix}:{user_id}:{user_gen}:{project_id}:{project_gen}:{global_gen}'
+
+    def get(self, user_id, project_id):
+        """Return the cached decision, or None on a miss"""
+        return cache.get(self._key(user_id, project_id))
+
+    def user_generation(self, user_id):
+        """Token that changes whenever the user (or everything) is invalidated"""
+        user_key, _, global_key = self._generation_keys(user_id, None)
+        user_gen, global_gen = (generation or 0 for generation in cache.get_many(user_key, global_key))
+        return f'{user_gen}.{global_gen}'
+
+    def set(self, user_id, project_id, allowed):
+        cache.set(self._key(user_id, project_id), allowed, timeout=self.ttl)
+
+    def invalidate(self, user_id=None, project_id=None):
+        """Invalidate a user, a project, both, or (with no arguments) everything"""
+        user_key, project_key, global_key = self._generation_keys(user_id, project_id)
+        if user_id is None and project_id is None:
+            self._bump(global_key)
+            return
+        if user_id is not None:
+            self._bump(user_key)
+        if project_id is not None:
+            self._bump(project_key)
+
+    def _bump(self, key):
+        # A fresh random token is as good as an increment and needs no atomic inc
+        cache.set(key, uuid.uuid4().hex, timeout=0)
+
+
+def create_access_cache(config):
+    """Build the access cache configured for an app"""
+    backend = config.get('ACCESS_CACHE_BACKEND', 'local')
+    ttl = config.get('ACCESS_CACHE_TTL', 300)
+    if backend == 'shared':
+        return SharedAccessCache(ttl=ttl)
+    return LocalAccessCache(max_entries=config.get('ACCESS_CACHE_MAX_ENTRIES', 10000), ttl=ttl)
+
+
+def get_access_cache():
+    """Return the current app's access cache, creating it on first use"""
+    access_cache = current_app.extensions.get('access_cache')
+    if access_cache is None:
+        access_cache = current_app.extensions.setdefault('access_cache', create_access_cache(current_app.config))
+    return access_cache
+
+
+def _record_membership_change(mapper, connection, target):
+    session = object_session(target)
+    if session is None:
+        return
+    changes = session.info.setdefault(_SESSION_CHANGES_KEY, set())
+    changes.add((target.user_id, target.project_id))
+    # A membership moved to another user or project invalidates the old pair too
+    state = inspect(target)
+    for user_id in state.attrs.user_id.history.deleted:
+        changes.add((user_id, target.project_id))
+    for project_id in state.attrs.project_id.history.deleted:
+        changes.add((target.user_id, project_id))
+
+
+def _after_commit(session):
+    changes = session.info.pop(_SESSION_CHANGES_KEY, None)
+    if not changes or not has_app_context():
+        return
+    from app.utils.visible_projects import invalidate_visible_projects
+    try:
+        access_cache = get_access_cache()
+        for user_id, project_id in changes:
+            access_cache.invalidate(user_id=user_id, project_id=project_id)
+        invalidate_visible_projects({user_id for user_id, _ in changes})
+    except Exception as e:
+        logger.error(f"Error invalidating access cache: {str(e)}")
+
+
+def _after_rollback(session):
+    session.info.pop(_SESSION_CHANGES_KEY, None)
+
+
+def register_access_cache_invalidation():
+    """Invalidate cached decisions when project memberships change (idempotent)"""
+    global _listeners_registered
+    if _listeners_registered:
+        return
+
+    from app.models.project import ProjectTeamMember, ProjectUser
+    from app.models.user import UserProject
+
+    for model in (ProjectTeamMember, UserProject, ProjectUser):
+        for event_name in ('after_insert', 'after_update', 'after_delete'):
+            event.listen(model, event_name, _record_membership_change)
+    event.listen(Session, 'after_commit', _after_commit)
+    event.listen(Session, 'after_rollback', _after_rollback)
+    _listeners_registered = True
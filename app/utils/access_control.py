@@ -6,8 +6,21 @@ from flask import flash, redirect, url_for, abort, request, current_app
 from flask_login import current_user
 import functools
 
-# Cache for project access to reduce database queries
-_project_access_cache = {}
+from app.utils.access_cache import get_access_cache
+from app.utils.visible_projects import invalidate_visible_projects
+
+def is_admin_user(user):
+    """
+    Check whether a user has the admin permission
+
+    Args:
+        user: User object (``User.is_admin`` is a method, so it is called if needed)
+
+    Returns:
+        bool: True if the user is an admin
+    """
+    is_admin = getattr(user, 'is_admin', False)
+    return bool(is_admin() if callable(is_admin) else is_admin)
 
 def role_required(roles):
     """
@@ -73,28 +86,16 @@ def clear_access_cache(user_id=None, project_id=None):
     """
     Clear the project access cache, either completely or for a specific user/project
     
+    Each case is O(1): it bumps a generation in the access cache rather than
+    scanning entries.
+    
     Args:
         user_id: Optional user ID to clear cache for specific user
         project_id: Optional project ID to clear cache for specific project
     """
-    global _project_access_cache
-    
-    if user_id is None and project_id is None:
-        # Clear entire cache
-        _project_access_cache = {}
-    elif user_id is not None and project_id is not None:
-        # Clear specific user-project combination
-        _project_access_cache.pop(f"{user_id}:{project_id}", None)
-    elif user_id is not None:
-        # Clear all entries for this user
-        keys_to_remove = [k for k in _project_access_cache if k.startswith(f"{user_id}:")]
-        for key in keys_to_remove:
-            _project_access_cache.pop(key, None)
-    elif project_id is not None:
-        # Clear all entries for this project
-        keys_to_remove = [k for k in _project_access_cache if k.endswith(f":{project_id}")]
-        for key in keys_to_remove:
-            _project_access_cache.pop(key, None)
+    get_access_cache().invalidate(user_id=user_id, project_id=project_id)
+    # A project's members are not known here, so clearing one invalidates every user's set
+    invalidate_visible_projects([user_id] if user_id is not None else None)
 
 def has_project_access(user, project_id):
     """
@@ -110,28 +111,23 @@ def has_project_access(user, project_id):
     if not user or not user.is_authenticated:
         return False
         
-    # Check cache first
-    cache_key = f"{user.id}:{project_id}"
-    if cache_key in _project_access_cache:
-        return _project_access_cache[cache_key]
-    
     # Admin users have access to all projects
-    if hasattr(user, 'is_admin') and user.is_admin:
-        _project_access_cache[cache_key] = True
+    if is_admin_user(user):
         return True
     
+    # Check cache first
+    access_cache = get_access_cache()
+    cached = access_cache.get(user.id, project_id)
+    if cached is not None:
+        return cached
+    
     try:
-        # Check if user is a team member of the project
-        from app.models.project import ProjectTeamMember
-        member = ProjectTeamMember.query.filter_by(
-            project_id=project_id, 
-            user_id=user.id
-        ).first()
-        
-        result = member is not None
+        # Check the user's membership set (resolved at most once per request)
+        from app.utils.visible_projects import visible_project_ids
+        result = project_id in visible_project_ids(user)
         
         # Cache the result to avoid repeated database queries
-        _project_access_cache[cache_key] = result
+        access_cache.set(user.id, project_id, result)
         return result
         
     except Exception as e:
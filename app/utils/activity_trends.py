@@ -0,0 +1,175 @@
+"""Time-bucketed activity counts for dashboard trend charts.
+
+Each tracked entity is counted with one ``GROUP BY date`` query. Finished
+days are folded into the ``activity_rollups`` table once, so a request only
+aggregates today's rows live and reads everything older from the rollup.
+Rows deleted after their day has been rolled up keep being counted.
+"""
+import logging
+from datetime import date, datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+
+from app.extensions import db, cache
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_WATERMARK_KEY = 'activity_rollup:through'
+
+
+def _tracked_entities():
+    """Map of series name -> (project_id column, timestamp column)"""
+    from app.models.engineering import RFI, Submittal
+    from app.models.field import DailyReport
+
+    return {
+        'rfis': (RFI.project_id, RFI.created_at),
+        'submittals': (Submittal.project_id, Submittal.created_at),
+        'reports': (DailyReport.project_id, DailyReport.created_at),
+    }
+
+
+def _as_date(value):
+    """Normalise a DB ``date()`` result (SQLite returns ISO strings)"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def daily_counts(project_column, timestamp_column, start, end, project_ids=None, by_project=False):
+    """
+    Count rows per day with a single GROUP BY query
+
+    Args:
+        project_column: Column holding the project ID
+        timestamp_column: DateTime column to bucket on
+        start: First day (inclusive)
+        end: Last day (inclusive)
+        project_ids: Optional iterable of project IDs to restrict to
+        by_project: Also group by project, returning {(day, project_id): count}
+
+    Returns:
+        dict: {day: count} or {(day, project_id): count}
+    """
+    day = func.date(timestamp_column).label('day')
+    columns = [day, project_column] if by_project else [day]
+    stmt = select(*columns, func.count().label('count')).where(
+        timestamp_column >= datetime.combine(start, datetime.min.time()),
+        timestamp_column < datetime.combine(end + timedelta(days=1), datetime.min.time())
+    ).group_by(*columns)
+    if project_ids is not None:
+        stmt = stmt.where(project_column.in_(list(project_ids)))
+
+    counts = {}
+    for row in db.session.execute(stmt):
+        key = (_as_date(row[0]), row[1]) if by_project else _as_date(row[0])
+        counts[key] = row[-1]
+    return counts
+
+
+def densify(counts, start, days):
+    """Expand a sparse {day: count} dict into a list covering every day"""
+    return [counts.get(start + timedelta(days=offset), 0) for offset in range(days)]
+
+
+def refresh_rollups(through=None):
+    """
+    Roll up every finished day not yet stored in ``activity_rollups``
+
+    Args:
+        through: Last day to roll up (defaults to yesterday, UTC)
+    """
+    from app.models.reports import ActivityRollup, ActivityRollupState
+
+    through = through or datetime.utcnow().date() - timedelta(days=1)
+    if cache.get(ROLLUP_WATERMARK_KEY) == through.isoformat():
+        return
+
+    backfill_days = current_app.config.get('ACTIVITY_ROLLUP_BACKFILL_DAYS', 365)
+    states = {state.entity: state for state in ActivityRollupState.query.all()}
+
+    for entity, (project_column, timestamp_column) in _tracked_entities().items():
+        state = states.get(entity)
+        if state is not None:
+            start = state.rolled_up_through + timedelta(days=1)
+        else:
+            start = through - timedelta(days=backfill_days - 1)
+        if start > through:
+            continue
+
+        counts = daily_counts(project_column, timestamp_column, start, through, by_project=True)
+        try:
+            db.session.bulk_insert_mappings(ActivityRollup, [
+                {'entity': entity, 'project_id': project_id, 'day': day, 'count': count}
+                for (day, project_id), count in counts.items()
+            ])
+            if state is None:
+                state = ActivityRollupState(entity=entity, rolled_up_through=through)
+                db.session.add(state)
+            else:
+                state.rolled_up_through = through
+            db.session.commit()
+        except IntegrityError:
+            # Another worker rolled up the same days first
+            db.session.rollback()
+            logger.info(f"Activity rollup for {entity} already written by another worker")
+            return
+
+    cache.set(ROLLUP_WATERMARK_KEY, through.isoformat(), timeout=3600)
+
+
+class ActivityTrends:
+    """Daily RFI/Submittal/DailyReport counts for the last N days"""
+
+    def __init__(self, project_ids=None, days=30):
+        """
+        Args:
+            project_ids: Iterable of visible project IDs, or None for all projects
+            days: Number of days in the window, ending today
+        """
+        self.project_ids = None if project_ids is None else list(project_ids)
+        self.days = days
+
+    def series(self):
+        """
+        Return the chart series, densified to one value per day
+
+        Returns:
+            dict: {'dates': [...], 'rfis': [...], 'submittals': [...], 'reports': [...]}
+        """
+        from app.models.reports import ActivityRollup
+
+        today = datetime.utcnow().date()
+        start = today - timedelta(days=self.days - 1)
+        refresh_rollups(through=today - timedelta(days=1))
+
+        # Finished days come from the rollup in one grouped query
+        stmt = select(
+            ActivityRollup.entity, ActivityRollup.day, func.sum(ActivityRollup.count)
+        ).where(
+            ActivityRollup.day >= start,
+            ActivityRollup.day < today
+        ).group_by(ActivityRollup.entity, ActivityRollup.day)
+        if self.project_ids is not None:
+            stmt = stmt.where(ActivityRollup.project_id.in_(self.project_ids))
+
+        counts = {entity: {} for entity in _tracked_entities()}
+        for entity, day, count in db.session.execute(stmt):
+            counts.setdefault(entity, {})[_as_date(day)] = int(count or 0)
+
+        # Only today is aggregated live
+        for entity, (project_column, timestamp_column) in _tracked_entities().items():
+            counts[entity].update(
+                daily_counts(project_column, timestamp_column, today, today, self.project_ids)
+            )
+
+        result = {
+            'dates': [(start + timedelta(days=offset)).strftime('%Y-%m-%d') for offset in range(self.days)]
+        }
+        for entity, entity_counts in counts.items():
+            result[entity] = densify(entity_counts, start, self.days)
+        return result
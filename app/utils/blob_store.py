@@ -0,0 +1,276 @@
+"""Content-addressed, deduplicating store for uploaded files.
+
+Files are named by their SHA-256 and sharded two levels deep under the
+private ``UPLOAD_FOLDER`` (``blobs/ab/cd/abcd...ef.pdf``), so the same spec
+book or IFC uploaded to many projects is kept once. Nothing in the store is
+publicly reachable: routes serve blobs after their own access checks,
+through ``absolute_path`` and ``app.utils.file_serving.serve_file``. ``StoredBlob.refcount`` counts the
+records pointing at each file; a blob whose last reference is released is
+deleted once the transaction commits. Uploads of content that is already
+stored are hashed and never written a second time.
+"""
+import hashlib
+import logging
+import os
+import shutil
+import uuid
+from datetime import datetime, timedelta
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from werkzeug.security import safe_join
+from werkzeug.utils import secure_filename
+
+from app.extensions import db
+
+logger = logging.getLogger(__name__)
+
+BLOB_PREFIX = 'blobs/'
+# Files saved before the blob store, relative to the static folder
+LEGACY_STATIC_PREFIX = 'uploads/'
+COPY_BUFFER_SIZE = 1024 * 1024
+
+_SESSION_RELEASED_KEY = 'released_blobs'
+_listeners_registered = False
+
+
+def is_blob_path(path):
+    return bool(path) and path.replace('\\', '/').startswith(BLOB_PREFIX)
+
+
+def blob_digest(path):
+    """SHA-256 a blob path is named by, or None for other paths"""
+    if not is_blob_path(path):
+        return None
+    return os.path.basename(path).split('.', 1)[0]
+
+
+def absolute_path(path):
+    """
+    Filesystem path of a stored file
+
+    Paths are relative to ``UPLOAD_FOLDER``, except for files saved before
+    the blob store, which keep their old form: absolute, or ``uploads/...``
+    under the static folder.
+
+    Returns:
+        str: The path, or None if a relative path would leave its folder
+    """
+    path = path.replace('\\', '/')
+    if os.path.isabs(path):
+        return path
+    if path.startswith(LEGACY_STATIC_PREFIX):
+        return safe_join(current_app.static_folder, path)
+    return safe_join(current_app.config['UPLOAD_FOLDER'], path)
+
+
+def blob_path(sha256, filename):
+    """Path of a blob relative to ``UPLOAD_FOLDER``; the extension keeps the served MIME type right"""
+    extension = secure_filename(filename or '').rsplit('.', 1)
+    suffix = f'.{extension[1].lower()}' if len(extension) == 2 else ''
+    return f'{BLOB_PREFIX}{sha256[:2]}/{sha256[2:4]}/{sha256}{suffix}'
+
+
+def _hash_stream(stream):
+    hasher = hashlib.sha256()
+    size = 0
+    for block in iter(lambda: stream.read(COPY_BUFFER_SIZE), b''):
+        hasher.update(block)
+        size += len(block)
+    return hasher.hexdigest(), size
+
+
+def _known_blob(sha256):
+    """The blob row for a digest, if its file is still on disk"""
+    from app.models.base import StoredBlob
+
+    blob = db.session.get(StoredBlob, sha256)
+    if blob is not None and not os.path.exists(absolute_path(blob.path)):
+        logger.warning(f"Blob {sha256} is missing on disk; it will be rewritten")
+        return None, blob
+    return blob, blob
+
+
+def _add_reference(sha256, size, path):
+    """Count one more reference, creating the row on first use (safe against concurrent inserts)"""
+    from app.models.base import StoredBlob
+
+    increment = update(StoredBlob).where(StoredBlob.sha256 == sha256) \
+        .values(refcount=StoredBlob.refcount + 1).execution_options(synchronize_session=False)
+    if db.session.execute(increment).rowcount:
+        return db.session.get(StoredBlob, sha256, populate_existing=True)
+    try:
+        with db.session.begin_nested():
+            blob = StoredBlob(sha256=sha256, path=path, size=size, refcount=1)
+            db.session.add(blob)
+        return blob
+    except IntegrityError:
+        db.session.execute(increment)
+        return db.session.get(StoredBlob, sha256, populate_existing=True)
+
+
+def _write_blob(path, write):
+    """Write a new blob through a temp file so readers never see a partial file"""
+    target = absolute_path(path)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp_path = f'{target}.{uuid.uuid4().hex}.tmp'
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, target)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def store_stream(stream, filename):
+    """
+    Store a seekable binary stream, adding one reference to its blob
+
+    The reference is part of the caller's transaction; commit it along with
+    the record that stores the returned path.
+
+    Args:
+        stream: Seekable file-like object (e.g. ``FileStorage.stream``)
+        filename: Original file name (only its extension is kept)
+
+    Returns:
+        StoredBlob: The blob (``path``, ``size``, ``sha256``)
+    """
+    stream.seek(0)
+    sha256, size = _hash_stream(stream)
+    blob, row = _known_blob(sha256)
+    if blob is None:
+        path = row.path if row is not None else blob_path(sha256, filename)
+
+        def write(tmp_path):
+            stream.seek(0)
+            with open(tmp_path, 'wb') as f:
+                shutil.copyfileobj(stream, f, COPY_BUFFER_SIZE)
+
+        _write_blob(path, write)
+    else:
+        path = blob.path
+    return _add_reference(sha256, size, path)
+
+
+def store_local_file(source, filename, sha256=None):
+    """
+    Store a file that is already on local disk, consuming ``source``
+
+    The file is moved into place if its content is new and simply deleted
+    otherwise. Pass ``sha256`` when it is already known to skip hashing.
+
+    Returns:
+        StoredBlob: The blob, with one reference added
+    """
+    if sha256 is None:
+        with open(source, 'rb') as f:
+            sha256, _ = _hash_stream(f)
+    size = os.path.getsize(source)
+    blob, row = _known_blob(sha256)
+    if blob is None:
+        path = row.path if row is not None else blob_path(sha256, filename)
+        _write_blob(path, lambda tmp_path: shutil.move(source, tmp_path))
+    else:
+        os.remove(source)
+        path = blob.path
+    return _add_reference(sha256, size, path)
+
+
+def release(path):
+    """
+    Drop one reference to the blob at ``path``
+
+    The file is deleted after commit once nothing refers to it. Paths that
+    are not blobs are ignored.
+
+    Returns:
+        bool: True if ``path`` was a known blob
+    """
+    from app.models.base import StoredBlob
+
+    if not is_blob_path(path):
+        return False
+    path = path.replace('\\', '/')
+    decrement = update(StoredBlob).where(StoredBlob.path == path) \
+        .values(refcount=StoredBlob.refcount - 1).execution_options(synchronize_session=False)
+    if not db.session.execute(decrement).rowcount:
+        return False
+    blob = StoredBlob.query.filter_by(path=path).populate_existing().one()
+    if blob.refcount <= 0:
+        db.session.delete(blob)
+        db.session.info.setdefault(_SESSION_RELEASED_KEY, set()).add(blob.path)
+    return True
+
+
+def _remove_blob_files(path):
+    target = absolute_path(path)
+    base, _ = os.path.splitext(target)
+    directory = os.path.dirname(target)
+    prefix = os.path.basename(base) + '.'
+    # The blob and anything derived from it (e.g. photo thumbnails)
+    for name in os.listdir(directory) if os.path.isdir(directory) else ():
+        if name == os.path.basename(target) or name.startswith(prefix):
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError as e:
+                logger.error(f"Error removing blob file {name}: {str(e)}")
+
+
+def _after_commit(session):
+    from app.models.base import StoredBlob
+
+    released = session.info.pop(_SESSION_RELEASED_KEY, None)
+    if not released or not has_app_context():
+        return
+    # The committed session can't emit SQL; check on a separate connection
+    # that no upload has re-stored the same content in the meantime
+    with db.engine.connect() as connection:
+        restored = set(connection.execute(
+            select(StoredBlob.path).where(StoredBlob.path.in_(released))
+        ).scalars())
+    for path in released - restored:
+        _remove_blob_files(path)
+
+
+def _after_rollback(session):
+    session.info.pop(_SESSION_RELEASED_KEY, None)
+
+
+def register_blob_store_listeners():
+    """Delete unreferenced blob files once their release is committed (idempotent)"""
+    global _listeners_registered
+    if _listeners_registered:
+        return
+    event.listen(Session, 'after_commit', _after_commit)
+    event.listen(Session, 'after_rollback', _after_rollback)
+    _listeners_registered = True
+
+
+def collect_orphans(min_age=timedelta(days=1)):
+    """
+    Delete blob files that no row refers to (writes whose transaction rolled back)
+
+    Files newer than ``min_age`` are kept, as their upload may still commit.
+
+    Returns:
+        int: Number of files removed
+    """
+    from app.models.base import StoredBlob
+
+    root = absolute_path(BLOB_PREFIX.rstrip('/'))
+    if not os.path.isdir(root):
+        return 0
+    known = {sha256 for sha256, in db.session.query(StoredBlob.sha256)}
+    cutoff = (datetime.now() - min_age).timestamp()
+    removed = 0
+    for directory, _, names in os.walk(root):
+        for name in names:
+            file_path = os.path.join(directory, name)
+            if name.split('.', 1)[0] in known or os.path.getmtime(file_path) > cutoff:
+                continue
+            os.remove(file_path)
+            removed += 1
+    return removed
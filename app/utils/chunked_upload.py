@@ -0,0 +1,388 @@
+"""Resumable chunked uploads for large files (IFC models, manuals, photos).
+
+A client opens an upload session with the final size, PUTs the file in
+chunks at increasing offsets, and finalizes it. Chunks are streamed from the
+request straight into a partial file, whose size on disk is the resume
+offset, and the SHA-256 is updated as each chunk arrives. The offset check
+and the append happen under an exclusive lock on the partial file, so a
+retried chunk racing the original cannot be appended twice. Finalizing hands
+the file to the blob store (content that is already stored is not written
+again) and creates the target record (a BIM model version, a project photo,
+an attachment or an O&M manual).
+"""
+import fcntl
+import hashlib
+import logging
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from flask import current_app
+from werkzeug.utils import secure_filename
+
+from app.extensions import db
+from app.utils import blob_store
+
+logger = logging.getLogger(__name__)
+
+COPY_BUFFER_SIZE = 1024 * 1024
+IMAGE_EXTENSIONS = {'jpg', 'jpeg', 'png', 'gif', 'webp', 'heic'}
+
+# Running digests of partial files in this process: upload ID -> (offset, sha256)
+_hashers = {}
+_hashers_lock = threading.Lock()
+
+
+class UploadError(ValueError):
+    """Rejected upload request; ``status`` is the HTTP status to answer with"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def partial_dir():
+    """Directory holding in-progress uploads"""
+    directory = current_app.config.get('UPLOAD_PARTIAL_DIR') or \
+        os.path.join(current_app.config['UPLOAD_FOLDER'], 'partial')
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def partial_path(upload):
+    return os.path.join(partial_dir(), f'{upload.id}.part')
+
+
+def upload_offset(upload):
+    """Bytes received so far (the offset the next chunk must start at)"""
+    try:
+        return os.path.getsize(partial_path(upload))
+    except OSError:
+        return 0
+
+
+def _option_id(options, name):
+    """An ID from the target options (the client sends it as a number or numeric string)"""
+    try:
+        return int(options[name])
+    except (TypeError, ValueError):
+        raise UploadError(f'{name} must be an ID')
+
+
+def _extension(filename):
+    return filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+
+
+def _check_extension(target, filename):
+    extension = _extension(filename)
+    if target == 'bim_model':
+        allowed = {'ifc'}
+    elif target == 'photo':
+        allowed = IMAGE_EXTENSIONS
+    else:
+        allowed = current_app.config.get('ALLOWED_EXTENSIONS') or set()
+    if extension not in allowed:
+        raise UploadError(f"File extension not allowed. Allowed types: {', '.join(sorted(allowed))}")
+
+
+def create_upload(user, project_id, target, filename, size, sha256=None, content_type=None, options=None):
+    """
+    Open an upload session and its empty partial file
+
+    Args:
+        user: Uploading user
+        project_id: Project the file will belong to
+        target: One of UPLOAD_TARGETS
+        filename: Original file name
+        size: Final size in bytes
+        sha256: Optional expected hex digest, checked on finalize
+        content_type: MIME type reported by the client
+        options: Target-specific fields (see the ``_attach_*`` functions)
+
+    Returns:
+        UploadSession: The new (committed) session
+    """
+    from app.models.base import UploadSession
+
+    if target not in UPLOAD_TARGETS:
+        raise UploadError(f"Unknown upload target. Expected one of: {', '.join(sorted(UPLOAD_TARGETS))}")
+    filename = secure_filename(filename or '')
+    if not filename:
+        raise UploadError('A file name is required')
+    _check_extension(target, filename)
+    if not isinstance(size, int) or size <= 0:
+        raise UploadError('size must be a positive number of bytes')
+    max_size = current_app.config.get('UPLOAD_MAX_SIZE', 2 * 1024 ** 3)
+    if size > max_size:
+        raise UploadError(f'File is larger than the {max_size} byte limit', status=413)
+    if sha256 is not None and (len(sha256) != 64 or any(c not in '0123456789abcdef' for c in sha256.lower())):
+        raise UploadError('sha256 must be a hex SHA-256 digest')
+    if options is not None and not isinstance(options, dict):
+        raise UploadError('options must be an object')
+    # Reject bad target fields now rather than after the whole file has been sent
+    check, _ = UPLOAD_TARGETS[target]
+    check(project_id, options or {})
+
+    upload = UploadSession(
+        id=uuid.uuid4().hex,
+        user_id=user.id,
+        project_id=project_id,
+        target=target,
+        filename=filename,
+        content_type=content_type,
+        total_size=size,
+        sha256=sha256.lower() if sha256 else None,
+        options=options or {},
+    )
+    open(partial_path(upload), 'wb').close()
+    db.session.add(upload)
+    db.session.commit()
+    return upload
+
+
+def write_chunk(upload, offset, stream, length=None):
+    """
+    Append a chunk read from ``stream`` at ``offset``
+
+    The offset must equal the bytes already received, so a retried or
+    out-of-order chunk is rejected with a 409 and the client resumes from
+    ``upload_offset``. A chunk that fails part-way is discarded entirely.
+
+    Returns:
+        int: The new offset
+    """
+    if upload.status != 'pending':
+        raise UploadError('Upload is already complete', status=409)
+    if length is not None and offset + length > upload.total_size:
+        raise UploadError('Chunk extends past the declared file size', status=413)
+
+    written = 0
+    with open(partial_path(upload), 'ab') as f:
+        # Held until the file is closed: a concurrent chunk for this upload,
+        # in any worker, waits here and then sees the new offset
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        current = os.fstat(f.fileno()).st_size
+        if offset != current:
+            raise UploadError(f'Expected offset {current}', status=409)
+
+        with _hashers_lock:
+            hashed_to, hasher = _hashers.pop(upload.id, (0, hashlib.sha256()))
+        if hashed_to != offset:
+            hasher = None
+
+        remaining = upload.total_size - offset
+        try:
+            while True:
+                block = stream.read(COPY_BUFFER_SIZE)
+                if not block:
+                    break
+                written += len(block)
+                if written > remaining:
+                    raise UploadError('Chunk extends past the declared file size', status=413)
+                f.write(block)
+                if hasher is not None:
+                    hasher.update(block)
+        except BaseException:
+            f.truncate(offset)
+            raise
+
+        if hasher is not None:
+            with _hashers_lock:
+                _hashers[upload.id] = (offset + written, hasher)
+    return offset + written
+
+
+def _file_digest(upload):
+    """SHA-256 of the complete partial file, reusing the running digest when it is current"""
+    size = upload_offset(upload)
+    with _hashers_lock:
+        hashed_to, hasher = _hashers.pop(upload.id, (None, None))
+    if hashed_to == size:
+        return hasher.hexdigest()
+
+    # Chunks went to other workers (or this one restarted): hash the file
+    hasher = hashlib.sha256()
+    with open(partial_path(upload), 'rb') as f:
+        for block in iter(lambda: f.read(COPY_BUFFER_SIZE), b''):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def _check_bim_model(project_id, options):
+    """New model (``name``, ``model_type``) or a new version of ``model_id``"""
+    from app.models.bim import BIMModel
+
+    if options.get('model_id'):
+        model = db.session.get(BIMModel, _option_id(options, 'model_id'))
+        if model is None or model.project_id != project_id:
+            raise UploadError('BIM model not found', status=404)
+        return model
+    if not (options.get('name') and options.get('model_type')):
+        raise UploadError('Either model_id or name and model_type are required')
+    return None
+
+
+def _attach_bim_model(upload, blob, user):
+    from app.models.bim import BIMModel, BIMModelVersion
+
+    options = upload.options or {}
+    model = _check_bim_model(upload.project_id, options)
+    if model is None:
+        model = BIMModel(name=options['name'], model_type=options['model_type'],
+                         project_id=upload.project_id, user_id=user.id)
+        db.session.add(model)
+        db.session.flush()
+
+    last_version = db.session.query(db.func.max(BIMModelVersion.version_number)) \
+        .filter(BIMModelVersion.model_id == model.id).scalar() or 0
+    version = BIMModelVersion(model_id=model.id, version_number=last_version + 1, file_path=blob.path,
+                              notes=options.get('notes') or ('Initial version' if not last_version else None),
+                              user_id=user.id)
+    db.session.add(version)
+    db.session.flush()
+    model.current_version_id = version.id
+    return version
+
+
+def _check_photo(project_id, options):
+    """Project photo (``title``, ``description``, ``location``, ``daily_report_id``)"""
+    from app.models.field import DailyReport
+
+    if options.get('daily_report_id'):
+        report = db.session.get(DailyReport, _option_id(options, 'daily_report_id'))
+        if report is None or report.project_id != project_id:
+            raise UploadError('Daily report not found', status=404)
+
+
+def _attach_photo(upload, blob, user):
+    from app.models.field import ProjectPhoto
+
+    options = upload.options or {}
+    _check_photo(upload.project_id, options)
+    photo = ProjectPhoto(project_id=upload.project_id, daily_report_id=options.get('daily_report_id'),
+                         title=options.get('title') or upload.filename,
+                         description=options.get('description'), location=options.get('location'),
+                         file_path=blob.path, file_size=blob.size, uploaded_by=user.id)
+    db.session.add(photo)
+    return photo
+
+
+def _check_attachment(project_id, options):
+    """Attachment on a module record (``module_name``, ``record_id``)"""
+    if not secure_filename(str(options.get('module_name') or '')) or not options.get('record_id'):
+        raise UploadError('module_name and record_id are required')
+    _option_id(options, 'record_id')
+
+
+def _attach_attachment(upload, blob, user):
+    from app.models.base import Attachment
+
+    options = upload.options or {}
+    _check_attachment(upload.project_id, options)
+    module_name = secure_filename(str(options['module_name']))
+    attachment = Attachment(filename=upload.filename, file_path=blob.path, file_size=blob.size,
+                            file_type=upload.content_type, record_id=_option_id(options, 'record_id'),
+                            module_name=module_name, user_id=user.id)
+    db.session.add(attachment)
+    return attachment
+
+
+def _check_om_manual(project_id, options):
+    """Operation and maintenance manual (``title`` plus the optional manual fields)"""
+
+
+def _attach_om_manual(upload, blob, user):
+    from app.models.closeout import OperationAndMaintenanceManual
+
+    options = upload.options or {}
+    manual = OperationAndMaintenanceManual(
+        project_id=upload.project_id, title=options.get('title') or upload.filename,
+        file_path=blob.path, file_name=upload.filename, file_size=blob.size,
+        created_by=user.id,
+        **{field: options.get(field) for field in
+           ('description', 'equipment_category', 'manufacturer', 'model_number', 'location', 'notes')}
+    )
+    db.session.add(manual)
+    return manual
+
+
+# target -> (option check run when the upload is opened, attach run on finalize)
+UPLOAD_TARGETS = {
+    'bim_model': (_check_bim_model, _attach_bim_model),
+    'photo': (_check_photo, _attach_photo),
+    'attachment': (_check_attachment, _attach_attachment),
+    'om_manual': (_check_om_manual, _attach_om_manual),
+}
+
+
+def finalize_upload(upload, user):
+    """
+    Verify a fully received upload and attach it to its target record
+
+    Returns:
+        The created record (BIMModelVersion, ProjectPhoto, Attachment or
+        OperationAndMaintenanceManual)
+    """
+    if upload.status != 'pending':
+        raise UploadError('Upload is already complete', status=409)
+    received = upload_offset(upload)
+    if received != upload.total_size:
+        raise UploadError(f'Upload is incomplete: {received} of {upload.total_size} bytes received', status=409)
+
+    digest = _file_digest(upload)
+    if upload.sha256 and digest != upload.sha256:
+        # Corrupt upload: start over rather than keep bytes that can never verify
+        discard_upload(upload)
+        raise UploadError('SHA-256 mismatch; the upload has been discarded', status=422)
+
+    try:
+        # The partial file is consumed here: moved into the store, or dropped if the content is known
+        blob = blob_store.store_local_file(partial_path(upload), upload.filename, sha256=digest)
+        _, attach = UPLOAD_TARGETS[upload.target]
+        record = attach(upload, blob, user)
+        db.session.flush()
+        upload.sha256 = digest
+        upload.status = 'complete'
+        upload.record_id = record.id
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return record
+
+
+def discard_upload(upload):
+    """Delete an upload session and its partial file"""
+    with _hashers_lock:
+        _hashers.pop(upload.id, None)
+    try:
+        os.remove(partial_path(upload))
+    except OSError:
+        pass
+    db.session.delete(upload)
+    db.session.commit()
+
+
+def purge_stale_uploads(max_age=timedelta(days=2)):
+    """
+    Remove pending uploads that have not received a chunk in ``max_age``
+
+    Returns:
+        int: Number of sessions removed
+    """
+    from app.models.base import UploadSession
+
+    cutoff = datetime.utcnow() - max_age
+    removed = 0
+    for upload in UploadSession.query.filter(UploadSession.status == 'pending',
+                                             UploadSession.created_at < cutoff).all():
+        # Chunks only touch the partial file, so its mtime is the last activity
+        try:
+            last_chunk = datetime.utcfromtimestamp(os.path.getmtime(partial_path(upload)))
+        except OSError:
+            last_chunk = upload.created_at
+        if last_chunk < cutoff:
+            discard_upload(upload)
+            removed += 1
+    return removed
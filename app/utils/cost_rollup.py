@@ -0,0 +1,302 @@
+"""Materialised per-project cost totals (``project_cost_rollups``).
+
+Mapper listeners on the cost models collect the change in each row's
+contribution; once the flush completes the deltas are applied as relative
+``UPDATE ... SET col = col + delta`` statements in the same transaction, so
+the rollup commits or rolls back with the write that caused it. When a
+previous value is unknown (the attribute was expired before it was changed)
+or the project has no rollup row yet, that project's totals are recomputed
+from the source tables instead.
+
+Bulk ``query.update()``/``delete()`` calls and raw SQL bypass the mapper
+events; run ``flask cost rebuild-rollups`` after those.
+"""
+import logging
+from decimal import Decimal
+
+from sqlalchemy import case, delete, event, func, inspect, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, object_session
+
+from app.extensions import db
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_COLUMNS = (
+    'original_budget',
+    'approved_change_orders',
+    'pending_change_orders',
+    'total_invoiced',
+    'paid_invoiced',
+    'direct_costs',
+)
+
+_PENDING_KEY = 'cost_rollup_pending'
+_listeners_registered = False
+
+
+def _amount(value):
+    return Decimal(str(value)) if value is not None else Decimal('0')
+
+
+def _rollup_sources():
+    """Map of model -> (fields read, function returning its rollup contribution)"""
+    from app.models.cost import BudgetItem, ChangeOrder, DirectCost, Invoice, PotentialChangeOrder
+
+    return {
+        ChangeOrder: (
+            ('project_id', 'status', 'amount'),
+            lambda v: {'approved_change_orders': _amount(v['amount']) if v['status'] == 'approved' else 0},
+        ),
+        PotentialChangeOrder: (
+            ('project_id', 'status', 'amount'),
+            lambda v: {'pending_change_orders': _amount(v['amount']) if v['status'] == 'submitted' else 0},
+        ),
+        Invoice: (
+            ('project_id', 'status', 'amount'),
+            lambda v: {
+                'total_invoiced': _amount(v['amount']),
+                'paid_invoiced': _amount(v['amount']) if v['status'] == 'paid' else 0,
+            },
+        ),
+        DirectCost: (
+            ('project_id', 'amount'),
+            lambda v: {'direct_costs': _amount(v['amount'])},
+        ),
+        BudgetItem: (
+            ('budget_id', 'estimated_amount'),
+            lambda v: {'original_budget': _amount(v['estimated_amount'])},
+        ),
+    }
+
+
+def compute_cost_totals(connection, project_ids=None):
+    """
+    Aggregate cost totals from the source tables, one GROUP BY per table
+
+    Args:
+        connection: SQLAlchemy connection to query with
+        project_ids: Optional iterable of project IDs to restrict to
+
+    Returns:
+        dict: {project_id: {column: Decimal}}
+    """
+    from app.models.cost import Budget, BudgetItem, ChangeOrder, DirectCost, Invoice, PotentialChangeOrder
+
+    project_ids = None if project_ids is None else list(project_ids)
+
+    def grouped(project_column, *columns, where=None, join=None):
+        stmt = select(project_column, *columns)
+        if join is not None:
+            stmt = stmt.select_from(join)
+        if where is not None:
+            stmt = stmt.where(where)
+        if project_ids is not None:
+            stmt = stmt.where(project_column.in_(project_ids))
+        return connection.execute(stmt.group_by(project_column)).all()
+
+    totals = {}
+
+    def add(rows, *names):
+        for row in rows:
+            entry = totals.setdefault(row[0], {column: Decimal('0') for column in ROLLUP_COLUMNS})
+            for name, value in zip(names, row[1:]):
+                entry[name] = _amount(value)
+
+    add(grouped(Budget.project_id, func.sum(BudgetItem.estimated_amount),
+                join=BudgetItem.__table__.join(Budget.__table__, BudgetItem.budget_id == Budget.id)),
+        'original_budget')
+    add(grouped(ChangeOrder.project_id, func.sum(ChangeOrder.amount),
+                where=ChangeOrder.status == 'approved'),
+        'approved_change_orders')
+    add(grouped(PotentialChangeOrder.project_id, func.sum(PotentialChangeOrder.amount),
+                where=PotentialChangeOrder.status == 'submitted'),
+        'pending_change_orders')
+    add(grouped(Invoice.project_id, func.sum(Invoice.amount),
+                func.sum(case((Invoice.status == 'paid', Invoice.amount), else_=0))),
+        'total_invoiced', 'paid_invoiced')
+    add(grouped(DirectCost.project_id, func.sum(DirectCost.amount)),
+        'direct_costs')
+    return totals
+
+
+def _write_totals(connection, project_ids=None):
+    """Replace rollup rows with freshly computed totals"""
+    from app.models.cost import ProjectCostRollup
+
+    table = ProjectCostRollup.__table__
+    totals = compute_cost_totals(connection, project_ids)
+
+    stmt = delete(table)
+    if project_ids is not None:
+        stmt = stmt.where(table.c.project_id.in_(list(project_ids)))
+        # Projects without any cost rows still get a zero row
+        for project_id in project_ids:
+            totals.setdefault(project_id, {column: Decimal('0') for column in ROLLUP_COLUMNS})
+    connection.execute(stmt)
+
+    if not totals:
+        return 0
+    try:
+        with connection.begin_nested():
+            connection.execute(table.insert(), [
+                dict(values, project_id=project_id) for project_id, values in totals.items()
+            ])
+    except IntegrityError:
+        # A concurrent transaction created some of these rows after our delete.
+        # Recompute now that its changes are committed, and overwrite.
+        fresh = compute_cost_totals(connection, list(totals))
+        for project_id in totals:
+            values = fresh.get(project_id, {column: Decimal('0') for column in ROLLUP_COLUMNS})
+            if not connection.execute(
+                    update(table).where(table.c.project_id == project_id).values(values)).rowcount:
+                connection.execute(table.insert().values(values, project_id=project_id))
+    return len(totals)
+
+
+def rebuild_cost_rollups(project_ids=None):
+    """
+    Recompute rollup rows from scratch and commit
+
+    Args:
+        project_ids: Optional iterable of project IDs (defaults to every project)
+
+    Returns:
+        int: Number of rollup rows written
+    """
+    project_ids = None if project_ids is None else list(project_ids)
+    try:
+        count = _write_totals(db.session.connection(), project_ids)
+        db.session.commit()
+        return count
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error rebuilding cost rollups: {str(e)}")
+        raise
+
+
+def get_project_cost_rollup(project_id):
+    """Return the rollup row for a project, building it on first access"""
+    from app.models.cost import ProjectCostRollup
+
+    rollup = db.session.get(ProjectCostRollup, project_id)
+    if rollup is None:
+        rebuild_cost_rollups([project_id])
+        rollup = db.session.get(ProjectCostRollup, project_id)
+    return rollup
+
+
+def _project_for(connection, values):
+    if 'project_id' in values:
+        return values['project_id']
+    if values.get('budget_id') is None:
+        return None
+    from app.models.cost import Budget
+    return connection.execute(
+        select(Budget.project_id).where(Budget.id == values['budget_id'])
+    ).scalar()
+
+
+def _previous_values(target, fields):
+    """Values as they were before this flush, or None if any was never loaded"""
+    state = inspect(target)
+    values = {}
+    for field in fields:
+        history = state.attrs[field].history
+        if history.deleted:
+            values[field] = history.deleted[0]
+        elif history.unchanged:
+            values[field] = history.unchanged[0]
+        else:
+            return None
+    return values
+
+
+def _apply_delta(connection, project_id, deltas):
+    from app.models.cost import ProjectCostRollup
+
+    deltas = {column: value for column, value in deltas.items() if value}
+    if project_id is None or not deltas:
+        return
+
+    table = ProjectCostRollup.__table__
+    result = connection.execute(
+        update(table)
+        .where(table.c.project_id == project_id)
+        .values({column: table.c[column] + value for column, value in deltas.items()})
+    )
+    if result.rowcount == 0:
+        # No row yet; the flushed state already includes these changes
+        _write_totals(connection, [project_id])
+
+
+def _pending(session):
+    return session.info.setdefault(_PENDING_KEY, {'deltas': {}, 'recompute': set()})
+
+
+def _make_listener(operation):
+    def listener(mapper, connection, target):
+        fields, contribution = _rollup_sources()[mapper.class_]
+        state = inspect(target)
+        if operation == 'update' and not any(state.attrs[f].history.has_changes() for f in fields):
+            return
+        session = object_session(target)
+        if session is None:
+            return
+        pending = _pending(session)
+
+        if operation != 'insert':
+            previous = _previous_values(target, fields)
+            if previous is None:
+                pending['recompute'].add(
+                    _project_for(connection, {f: getattr(target, f) for f in fields})
+                )
+                pending['recompute'].update(
+                    _project_for(connection, {fields[0]: key})
+                    for key in state.attrs[fields[0]].history.deleted
+                )
+                return
+            deltas = pending['deltas'].setdefault(_project_for(connection, previous), {})
+            for column, value in contribution(previous).items():
+                deltas[column] = deltas.get(column, 0) - value
+
+        if operation != 'delete':
+            current = {field: getattr(target, field) for field in fields}
+            deltas = pending['deltas'].setdefault(_project_for(connection, current), {})
+            for column, value in contribution(current).items():
+                deltas[column] = deltas.get(column, 0) + value
+
+    return listener
+
+
+def _after_flush(session, flush_context):
+    # Applied once per flush: mapper events for a batch of rows fire only
+    # after the whole batch is written, so recomputing per row would double count
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending:
+        return
+    connection = session.connection()
+    recompute = {project_id for project_id in pending['recompute'] if project_id is not None}
+    if recompute:
+        _write_totals(connection, recompute)
+    for project_id, deltas in pending['deltas'].items():
+        if project_id not in recompute:
+            _apply_delta(connection, project_id, deltas)
+
+
+def _after_rollback(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def register_cost_rollup_listeners():
+    """Attach the listeners that keep ``project_cost_rollups`` current (idempotent)"""
+    global _listeners_registered
+    if _listeners_registered:
+        return
+
+    for model in _rollup_sources():
+        for operation in ('insert', 'update', 'delete'):
+            event.listen(model, f'after_{operation}', _make_listener(operation))
+    event.listen(Session, 'after_flush', _after_flush)
+    event.listen(Session, 'after_rollback', _after_rollback)
+    _listeners_registered = True
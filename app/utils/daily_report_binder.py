@@ -0,0 +1,139 @@
+"""Project binder: a date range of daily reports as a single PDF.
+
+Everything the reports need is loaded in a fixed number of queries (reports,
+one grouped query for labor/equipment totals, entries and photos), each
+report is rendered with the shared ``_pdf_report.html`` body, and the whole
+set is handed to one renderer that parses the stylesheet and fonts once.
+"""
+import logging
+from collections import defaultdict
+from datetime import datetime
+
+from flask import render_template
+from sqlalchemy import func, literal, select, union_all
+from sqlalchemy.orm import joinedload
+
+from app.extensions import db
+from app.utils.pdf_generator import pdf_cache_key, template_hash
+
+logger = logging.getLogger(__name__)
+
+COVER_TEMPLATE = 'projects/field/daily_reports/binder_cover.html'
+REPORT_TEMPLATE = 'projects/field/daily_reports/binder_report.html'
+STYLES_TEMPLATE = 'projects/field/daily_reports/_pdf_styles.css'
+
+_EMPTY_TOTALS = {'total_workers': 0, 'total_man_hours': 0, 'total_equipment': 0, 'total_equipment_hours': 0}
+
+
+def _range_filter(project_id, start, end):
+    from app.models.field import DailyReport
+    return (DailyReport.project_id == project_id,
+            DailyReport.report_date >= start,
+            DailyReport.report_date <= end)
+
+
+def binder_cache_key(project_id, start, end):
+    """Cache key that changes when any report in the range is added, removed or edited"""
+    from app.models.field import DailyReport
+
+    count, last_updated = db.session.execute(
+        select(func.count(DailyReport.id), func.max(DailyReport.updated_at))
+        .where(*_range_filter(project_id, start, end))
+    ).one()
+    return pdf_cache_key(COVER_TEMPLATE, template_hash(REPORT_TEMPLATE), template_hash(STYLES_TEMPLATE),
+                         'binder', project_id, start, end, count, last_updated)
+
+
+def report_totals(report_ids):
+    """
+    Labor and equipment totals for many reports in one grouped query
+
+    Returns:
+        dict: report ID -> totals dict (same keys as the single-report PDF)
+    """
+    from app.models.field import EquipmentEntry, LaborEntry
+
+    if not report_ids:
+        return {}
+    zero = literal(0)
+    labor = select(
+        LaborEntry.daily_report_id.label('report_id'),
+        LaborEntry.worker_count.label('workers'),
+        (LaborEntry.worker_count * LaborEntry.hours_worked).label('man_hours'),
+        zero.label('equipment'),
+        zero.label('equipment_hours'),
+    ).where(LaborEntry.daily_report_id.in_(report_ids))
+    equipment = select(
+        EquipmentEntry.daily_report_id,
+        zero,
+        zero,
+        EquipmentEntry.count,
+        EquipmentEntry.hours_used,
+    ).where(EquipmentEntry.daily_report_id.in_(report_ids))
+    entries = union_all(labor, equipment).subquery()
+
+    rows = db.session.execute(
+        select(
+            entries.c.report_id,
+            func.coalesce(func.sum(entries.c.workers), 0),
+            func.coalesce(func.sum(entries.c.man_hours), 0),
+            func.coalesce(func.sum(entries.c.equipment), 0),
+            func.coalesce(func.sum(entries.c.equipment_hours), 0),
+        ).group_by(entries.c.report_id)
+    )
+    return {
+        report_id: {
+            'total_workers': workers,
+            'total_man_hours': man_hours,
+            'total_equipment': equipment_count,
+            'total_equipment_hours': equipment_hours,
+        }
+        for report_id, workers, man_hours, equipment_count, equipment_hours in rows
+    }
+
+
+def _group_by_report(model, report_ids):
+    grouped = defaultdict(list)
+    rows = model.query.filter(model.daily_report_id.in_(report_ids)).order_by(model.id)
+    for row in rows:
+        grouped[row.daily_report_id].append(row)
+    return grouped
+
+
+def iter_binder_documents(project, start, end):
+    """
+    Yield the binder's HTML documents: a cover page, then one per report
+
+    Args:
+        project: Project the reports belong to
+        start: First report date (inclusive)
+        end: Last report date (inclusive)
+    """
+    from app.models.field import DailyReport, EquipmentEntry, LaborEntry, ProjectPhoto
+
+    reports = DailyReport.query.options(joinedload(DailyReport.author)).filter(
+        *_range_filter(project.id, start, end)
+    ).order_by(DailyReport.report_date, DailyReport.id).all()
+    report_ids = [report.id for report in reports]
+    totals = report_totals(report_ids)
+
+    yield render_template(COVER_TEMPLATE, project=project, reports=reports, totals=totals,
+                          empty_totals=_EMPTY_TOTALS, start=start, end=end, datetime=datetime)
+    if not reports:
+        return
+
+    labor = _group_by_report(LaborEntry, report_ids)
+    equipment = _group_by_report(EquipmentEntry, report_ids)
+    photos = _group_by_report(ProjectPhoto, report_ids)
+    for report in reports:
+        yield render_template(REPORT_TEMPLATE, project=project, report=report,
+                              labor_entries=labor[report.id],
+                              equipment_entries=equipment[report.id],
+                              photos=photos[report.id],
+                              datetime=datetime,
+                              **totals.get(report.id, _EMPTY_TOTALS))
+
+
+def binder_stylesheets():
+    """CSS shared by every binder page, parsed once by the renderer"""
+    return [render_template(STYLES_TEMPLATE)]
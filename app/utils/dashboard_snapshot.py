@@ -0,0 +1,169 @@
+"""Aggregated KPI snapshot for the main dashboard.
+
+All headline numbers are computed in a single SELECT of scalar subqueries
+plus one GROUP BY for the project status chart, then cached per user scope.
+Writes to the tracked models bump a cache generation so stale snapshots are
+never served after a commit.
+"""
+import hashlib
+import logging
+import uuid
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session, object_session
+
+from app.extensions import db, cache
+from app.utils.visible_projects import visible_project_ids
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_GENERATION_KEY = 'dashboard_snapshot:generation'
+_SESSION_DIRTY_FLAG = 'dashboard_snapshot_dirty'
+_listeners_registered = False
+
+
+class DashboardSnapshot:
+    """Dashboard KPIs for a set of projects, computed in two queries"""
+
+    def __init__(self, project_ids=None):
+        """
+        Args:
+            project_ids: Iterable of visible project IDs, or None for all projects
+        """
+        self.project_ids = None if project_ids is None else sorted(set(project_ids))
+
+    @classmethod
+    def for_user(cls, user):
+        """Build a snapshot scoped to the projects a user can see"""
+        return cls(visible_project_ids(user))
+
+    @property
+    def scope_key(self):
+        """Stable cache key fragment for this snapshot's project scope"""
+        if self.project_ids is None:
+            return 'all'
+        joined = ','.join(str(project_id) for project_id in self.project_ids)
+        return hashlib.sha1(joined.encode('utf-8')).hexdigest()
+
+    def _scoped(self, stmt, column):
+        if self.project_ids is None:
+            return stmt
+        return stmt.where(column.in_(self.project_ids))
+
+    def compute(self):
+        """Run the aggregate queries and return a JSON-serialisable dict"""
+        from app.models.project import Project
+        from app.models.engineering import RFI, Submittal
+        from app.models.field import Punchlist, PunchlistItem
+        from app.models.cost import ChangeOrder
+
+        kpis = select(
+            self._scoped(
+                select(func.count(Project.id)), Project.id
+            ).scalar_subquery().label('total_projects'),
+            self._scoped(
+                select(func.count(Project.id)).where(Project.status == 'active'), Project.id
+            ).scalar_subquery().label('active_projects'),
+            self._scoped(
+                select(func.count(RFI.id)).where(RFI.status == 'open'), RFI.project_id
+            ).scalar_subquery().label('rfis_open'),
+            self._scoped(
+                select(func.count(Submittal.id)).where(Submittal.status == 'pending'),
+                Submittal.project_id
+            ).scalar_subquery().label('submittals_pending'),
+            self._scoped(
+                select(func.count(PunchlistItem.id))
+                .join(Punchlist, PunchlistItem.punchlist_id == Punchlist.id)
+                .where(PunchlistItem.status == 'open'),
+                Punchlist.project_id
+            ).scalar_subquery().label('punchlist_items'),
+            self._scoped(
+                select(func.coalesce(func.sum(ChangeOrder.amount), 0))
+                .where(ChangeOrder.status == 'approved'),
+                ChangeOrder.project_id
+            ).scalar_subquery().label('change_order_value'),
+        )
+        row = db.session.execute(kpis).one()
+
+        status_rows = db.session.execute(
+            self._scoped(
+                select(Project.status, func.count(Project.id)).group_by(Project.status),
+                Project.id
+            ).order_by(Project.status)
+        ).all()
+
+        return {
+            'stats': {
+                'total_projects': row.total_projects or 0,
+                'active_projects': row.active_projects or 0,
+                'rfis_open': row.rfis_open or 0,
+                'submittals_pending': row.submittals_pending or 0,
+                'punchlist_items': row.punchlist_items or 0,
+                'change_order_value': float(row.change_order_value or 0),
+            },
+            'status_counts': [[status or 'unknown', count] for status, count in status_rows],
+        }
+
+    def get(self):
+        """Return the cached snapshot, computing it on a miss"""
+        key = f'dashboard_snapshot:{get_snapshot_generation()}:{self.scope_key}'
+        data = cache.get(key)
+        if data is None:
+            data = self.compute()
+            timeout = current_app.config.get('CACHE_TIMEOUTS', {}).get('dashboard', 300)
+            cache.set(key, data, timeout=timeout)
+        return data
+
+
+def get_snapshot_generation():
+    """Return the current snapshot generation, initialising it if needed"""
+    generation = cache.get(SNAPSHOT_GENERATION_KEY)
+    if generation is None:
+        cache.add(SNAPSHOT_GENERATION_KEY, uuid.uuid4().hex, timeout=0)
+        generation = cache.get(SNAPSHOT_GENERATION_KEY)
+    return generation
+
+
+def invalidate_dashboard_snapshots():
+    """Invalidate every cached snapshot in O(1) by starting a new generation"""
+    cache.set(SNAPSHOT_GENERATION_KEY, uuid.uuid4().hex, timeout=0)
+
+
+def _mark_dirty(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info[_SESSION_DIRTY_FLAG] = True
+
+
+def _after_commit(session):
+    if session.info.pop(_SESSION_DIRTY_FLAG, False) and has_app_context():
+        try:
+            invalidate_dashboard_snapshots()
+        except Exception as e:
+            logger.error(f"Error invalidating dashboard snapshot: {str(e)}")
+
+
+def _after_rollback(session):
+    session.info.pop(_SESSION_DIRTY_FLAG, None)
+
+
+def register_snapshot_invalidation():
+    """Attach the write listeners that invalidate cached snapshots (idempotent)"""
+    global _listeners_registered
+    if _listeners_registered:
+        return
+
+    from app.models.project import Project
+    from app.models.engineering import RFI, Submittal
+    from app.models.field import PunchlistItem
+    from app.models.cost import ChangeOrder
+
+    for model in (RFI, Submittal, ChangeOrder, Project, PunchlistItem):
+        for event_name in ('after_insert', 'after_update', 'after_delete'):
+            event.listen(model, event_name, _mark_dirty)
+
+    # Invalidate only once the write is visible to other sessions
+    event.listen(Session, 'after_commit', _after_commit)
+    event.listen(Session, 'after_rollback', _after_rollback)
+    _listeners_registered = True
@@ -0,0 +1,211 @@
+"""Single-request uploads streamed straight to disk (mobile photos).
+
+The body - a raw image, or a multipart form carrying several - is written
+to files in the partial-upload directory as it arrives and hashed on the
+way, so nothing is held in memory or read back. Each stored file becomes a
+completed ``UploadSession`` attached to its target record through the same
+``UPLOAD_TARGETS`` the chunked uploads use.
+
+A client may send an idempotency key with each file. The key is stored on
+the upload session (unique per user), so a retry after a dropped connection
+gets the original result back instead of a second record.
+
+A file over the size limit is not kept: the rest of its bytes are read and
+dropped, so in a multipart batch it fails alone and the parts after it are
+still stored.
+"""
+import hashlib
+import logging
+import os
+import uuid
+
+from sqlalchemy.exc import IntegrityError
+from werkzeug.formparser import parse_form_data
+from werkzeug.utils import secure_filename
+
+from app.extensions import db
+from app.utils import blob_store
+from app.utils.chunked_upload import COPY_BUFFER_SIZE, UPLOAD_TARGETS, UploadError, _check_extension, partial_dir
+
+logger = logging.getLogger(__name__)
+
+MAX_KEY_LENGTH = 100
+
+
+class SpooledUpload:
+    """Write-only file in the partial-upload directory that hashes and counts what it is given
+
+    Past ``max_size`` it is marked ``oversized``, emptied, and accepts (and
+    drops) whatever else it is given.
+    """
+
+    def __init__(self, max_size):
+        self.path = os.path.join(partial_dir(), f'{uuid.uuid4().hex}.direct')
+        self.max_size = max_size
+        self.size = 0
+        self.oversized = False
+        self._hasher = hashlib.sha256()
+        self._file = open(self.path, 'w+b')
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.max_size and not self.oversized:
+            self.oversized = True
+            self._file.truncate(0)
+        if self.oversized:
+            return len(data)
+        self._hasher.update(data)
+        return self._file.write(data)
+
+    @property
+    def sha256(self):
+        return self._hasher.hexdigest()
+
+    def __getattr__(self, name):
+        # seek/read/close for werkzeug's FileStorage
+        return getattr(self._file, name)
+
+    def discard(self):
+        """Delete the file unless the blob store has already taken it"""
+        self._file.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def spool_stream(stream, max_size):
+    """
+    Copy a request body to disk
+
+    Returns:
+        SpooledUpload: The written (closed) file
+    """
+    spooled = SpooledUpload(max_size)
+    try:
+        for block in iter(lambda: stream.read(COPY_BUFFER_SIZE), b''):
+            spooled.write(block)
+            if spooled.oversized:
+                # The body is the one file: stop reading it
+                raise UploadError(f'File is larger than the {max_size} byte limit', status=413)
+    except BaseException:
+        spooled.discard()
+        raise
+    spooled.close()
+    return spooled
+
+
+def spool_multipart(environ, max_size, max_files):
+    """
+    Parse a multipart body, writing each file part to disk as it is read
+
+    Args:
+        environ: WSGI environment of the request (its body must be unread)
+        max_size: Byte limit per file
+        max_files: Most file parts accepted
+
+    Returns:
+        tuple: (form MultiDict, list of (field name, filename, content type,
+            SpooledUpload)); the caller must ``discard`` every SpooledUpload
+            it does not store. Parts over ``max_size`` are returned too,
+            ``oversized`` and empty, for ``store_direct_upload`` to refuse
+    """
+    spooled = []
+
+    def stream_factory(total_content_length, content_type, filename, content_length=None):
+        if len(spooled) >= max_files:
+            raise UploadError(f'At most {max_files} files can be sent at once', status=413)
+        spooled.append(SpooledUpload(max_size))
+        return spooled[-1]
+
+    try:
+        _, form, files = parse_form_data(environ, stream_factory=stream_factory, silent=False,
+                                         max_content_length=max_size * max_files + 1024 * 1024)
+    except BaseException:
+        for upload in spooled:
+            upload.discard()
+        raise
+    parts = []
+    for name, storage in files.items(multi=True):
+        storage.stream.close()
+        parts.append((name, storage.filename, storage.mimetype, storage.stream))
+    return form, parts
+
+
+def check_idempotency_key(key):
+    if key is not None and (not key or len(key) > MAX_KEY_LENGTH):
+        raise UploadError(f'Idempotency keys must be 1 to {MAX_KEY_LENGTH} characters')
+
+
+def find_replay(user, key):
+    """The completed upload a user already made with an idempotency key, if any"""
+    from app.models.base import UploadSession
+
+    if not key:
+        return None
+    return UploadSession.query.filter_by(user_id=user.id, idempotency_key=key).first()
+
+
+def store_direct_upload(user, project_id, target, spooled, filename, content_type=None, options=None,
+                        idempotency_key=None):
+    """
+    Store a spooled file and attach it to its target record
+
+    Args:
+        user: Uploading user
+        project_id: Project the file belongs to
+        target: One of UPLOAD_TARGETS
+        spooled: SpooledUpload holding the file (consumed)
+        filename: Original file name
+        content_type: MIME type reported by the client
+        options: Target-specific fields (see the ``_attach_*`` functions)
+        idempotency_key: Client key identifying this file across retries
+
+    Returns:
+        tuple: (UploadSession, True if it was created now or False if the key
+            had already been used)
+    """
+    from app.models.base import UploadSession
+
+    try:
+        check_idempotency_key(idempotency_key)
+        replay = find_replay(user, idempotency_key)
+        if replay is not None:
+            return replay, False
+        if spooled.oversized:
+            raise UploadError(f'File is larger than the {spooled.max_size} byte limit', status=413)
+
+        filename = secure_filename(filename or '')
+        if not filename:
+            raise UploadError('A file name is required')
+        _check_extension(target, filename)
+        if not spooled.size:
+            raise UploadError('The file is empty')
+        options = options or {}
+        check, attach = UPLOAD_TARGETS[target]
+        check(project_id, options)
+
+        upload = UploadSession(id=uuid.uuid4().hex, user_id=user.id, project_id=project_id, target=target,
+                               filename=filename, content_type=content_type, total_size=spooled.size,
+                               sha256=spooled.sha256, options=options, status='complete',
+                               idempotency_key=idempotency_key)
+        # The blob store moves the file into place (or drops it when the content is known)
+        blob = blob_store.store_local_file(spooled.path, filename, sha256=spooled.sha256)
+        record = attach(upload, blob, user)
+        db.session.flush()
+        upload.record_id = record.id
+        db.session.add(upload)
+        db.session.commit()
+        return upload, True
+    except IntegrityError:
+        # The same key was stored by a concurrent retry
+        db.session.rollback()
+        replay = find_replay(user, idempotency_key)
+        if replay is None:
+            raise
+        return replay, False
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        spooled.discard()
@@ -0,0 +1,124 @@
+"""Serving large files (IFC models, manuals) with Range and conditional requests.
+
+When ``X_ACCEL_MAPPINGS`` maps the file's directory to an internal nginx
+location, the response is an empty ``X-Accel-Redirect`` handoff and nginx
+sends the bytes (including Range requests) itself. Otherwise the file is
+streamed from Python in bounded blocks, honouring a single byte range.
+"""
+import logging
+import mimetypes
+import os
+from urllib.parse import quote
+
+from flask import Response, current_app, request
+from werkzeug.http import http_date
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUFFER_SIZE = 256 * 1024
+
+
+def accel_mappings(config):
+    """
+    Parse ``X_ACCEL_MAPPINGS`` (``/fs/prefix=/internal/location,...``)
+
+    Returns:
+        list: (filesystem prefix, location prefix) pairs, longest prefix first
+    """
+    mappings = []
+    for entry in (config.get('X_ACCEL_MAPPINGS') or '').split(','):
+        if '=' not in entry:
+            continue
+        directory, location = (part.strip() for part in entry.split('=', 1))
+        mappings.append((os.path.abspath(directory).rstrip(os.sep) + os.sep, location.rstrip('/') + '/'))
+    return sorted(mappings, key=lambda mapping: -len(mapping[0]))
+
+
+def accel_location(path):
+    """Internal nginx URI for ``path``, or None if no mapping covers it"""
+    path = os.path.abspath(path)
+    for directory, location in accel_mappings(current_app.config):
+        if path.startswith(directory):
+            return location + quote(path[len(directory):].replace(os.sep, '/'))
+    return None
+
+
+def _iter_file(path, start, length, buffer_size):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            block = f.read(min(buffer_size, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
+
+
+def _requested_range(etag, size):
+    """(start, end) of a satisfiable single range, None to send everything, or False if unsatisfiable"""
+    byte_range = request.range
+    if byte_range is None or byte_range.units != 'bytes' or len(byte_range.ranges) != 1:
+        # No range, or several: a full 200 response is always allowed
+        return None
+    if_range = request.if_range
+    if if_range.etag is not None and if_range.etag != etag:
+        return None
+    if if_range.date is not None:
+        return None
+    return byte_range.range_for_length(size) or False
+
+
+def serve_file(path, mimetype=None, etag=None, download_name=None, as_attachment=False):
+    """
+    Response for a file on disk, with Range, ETag/If-None-Match and X-Accel-Redirect support
+
+    Args:
+        path: Absolute path of the file
+        mimetype: Content type (guessed from the name if omitted)
+        etag: Strong ETag; defaults to one derived from size and mtime
+        download_name: File name for Content-Disposition
+        as_attachment: Ask the browser to download rather than display
+
+    Returns:
+        Response: 200, 206, 304 or 416
+    """
+    stat = os.stat(path)
+    size = stat.st_size
+    etag = etag or f'{stat.st_mtime_ns:x}-{size:x}'
+    mimetype = mimetype or mimetypes.guess_type(download_name or path)[0] or 'application/octet-stream'
+
+    headers = {
+        'ETag': f'"{etag}"',
+        'Last-Modified': http_date(stat.st_mtime),
+        'Accept-Ranges': 'bytes',
+        'Cache-Control': 'private, no-cache',
+    }
+    if download_name or as_attachment:
+        disposition = 'attachment' if as_attachment else 'inline'
+        name = (download_name or os.path.basename(path)).replace('"', '')
+        headers['Content-Disposition'] = f'{disposition}; filename="{name}"'
+
+    if request.if_none_match.contains_weak(etag):
+        return Response(status=304, headers=headers)
+
+    location = accel_location(path)
+    if location is not None:
+        # nginx answers Range requests for the internal location itself
+        headers['X-Accel-Redirect'] = location
+        return Response(status=200, headers=headers, mimetype=mimetype)
+
+    buffer_size = current_app.config.get('FILE_SERVE_BUFFER_SIZE', DEFAULT_BUFFER_SIZE)
+    byte_range = _requested_range(etag, size)
+    if byte_range is False:
+        headers['Content-Range'] = f'bytes */{size}'
+        return Response(status=416, headers=headers)
+
+    if byte_range is None:
+        start, end, status = 0, size, 200
+    else:
+        (start, end), status = byte_range, 206
+        headers['Content-Range'] = f'bytes {start}-{end - 1}/{size}'
+    headers['Content-Length'] = str(end - start)
+    return Response(_iter_file(path, start, end - start, buffer_size), status=status, headers=headers,
+                    mimetype=mimetype, direct_passthrough=True)
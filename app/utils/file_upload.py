@@ -1,72 +1,56 @@
 import os
-import uuid
-from werkzeug.utils import secure_filename
 from flask import current_app
+from app.utils import blob_store
 
 def ensure_directory_exists(directory):
     """Ensure that a directory exists, creating it if necessary"""
     if not os.path.exists(directory):
         os.makedirs(directory)
 
-def save_file(file, folder, allowed_extensions=None):
+def save_file(file, allowed_extensions=None):
     """
-    Save an uploaded file with proper validation and security
+    Save an uploaded file in the content-addressed blob store
+
+    Identical content is stored once and shared; see app.utils.blob_store.
+    The new reference is committed with the caller's transaction.
     
     Args:
         file: FileStorage object from Flask request
-        folder: Subfolder within UPLOAD_FOLDER to store the file
         allowed_extensions: Set of allowed extensions (e.g., {'pdf', 'doc'})
     
     Returns:
-        Tuple of (success, file_path or error_message)
+        Path relative to UPLOAD_FOLDER, or None if the file was rejected
     """
-    if not file:
-        return False, "No file provided"
+    if not file or not file.filename:
+        return None
     
     # Validate file extension if specified
     if allowed_extensions:
         extension = file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else ''
         if extension not in allowed_extensions:
-            return False, f"File extension not allowed. Allowed types: {', '.join(allowed_extensions)}"
-    
-    # Ensure upload directory exists
-    upload_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], folder)
-    ensure_directory_exists(upload_dir)
-    
-    # Create a secure filename with UUID to prevent collisions
-    filename = secure_filename(file.filename)
-    unique_filename = f"{uuid.uuid4().hex}_{filename}"
-    file_path = os.path.join(upload_dir, unique_filename)
+            current_app.logger.warning(f"Rejected upload with extension '{extension}'")
+            return None
     
-    # Save the file
     try:
-        file.save(file_path)
-        return True, file_path
+        return blob_store.store_stream(file.stream, file.filename).path
     except Exception as e:
-        return False, f"Error saving file: {str(e)}"
+        current_app.logger.error(f"Error saving file: {str(e)}")
+        return None
+
+def stored_file_size(file_path):
+    """Size in bytes of a file returned by ``save_file``"""
+    return os.path.getsize(blob_store.absolute_path(file_path))
 
 def delete_file(file_path):
-    """Safely delete a file if it exists"""
+    """Release a stored file; blobs are only removed once nothing else uses them"""
     try:
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        if blob_store.is_blob_path(file_path):
+            return blob_store.release(file_path)
+        # Saved before the blob store
+        legacy_path = blob_store.absolute_path(file_path)
+        if legacy_path and os.path.exists(legacy_path):
+            os.remove(legacy_path)
             return True
         return False
     except Exception:
         return False
-    
-def get_file_url(file_path):
-    """
-    Get the URL for a stored file
-    
-    Args:
-        file_path: Path to the file relative to UPLOAD_FOLDER
-        
-    Returns:
-        URL for accessing the file
-    """
-    if not file_path:
-        return None
-        
-    from flask import url_for
-    return url_for('static', filename=f'uploads/{file_path}')
\ No newline at end of file
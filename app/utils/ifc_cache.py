@@ -0,0 +1,812 @@
+"""Compact element cache for IFC models, built once per uploaded file.
+
+Each IFC is read once (by a process pool, after its ``BIMModelVersion`` is
+committed) into NumPy arrays saved next to the file as
+``<name>.elements.npz``: the element index (STEP id, GlobalId, type, name),
+every element's property and quantity values, and a world-space bounding
+box per element. The cache belongs to the file rather than the version, so
+versions sharing a content-addressed blob share one cache, and it is removed
+with the blob.
+
+Element lookups, property queries and spatial subsets are answered from the
+loaded arrays without touching the IFC again; spatial subsets go through a
+uniform grid built on first use. Bounding boxes come from the element
+placements and their Body (or Box) representation items and are in the
+model's length unit; curved and boolean geometry is approximated by the
+points that define it.
+"""
+import logging
+import math
+import os
+import re
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+CACHE_SUFFIX = '.elements.npz'
+ERROR_SUFFIX = '.elements.error'
+
+_executor = None
+_pending = set()
+_pending_lock = threading.Lock()
+_SESSION_VERSIONS_KEY = 'new_bim_model_versions'
+_listeners_registered = False
+
+
+# --- STEP (ISO 10303-21) reading ---------------------------------------------
+
+class _Ref(int):
+    """Reference to another entity (``#123``)"""
+
+
+class _Enum(str):
+    """Enumeration value (``.T.``, ``.UNION.``)"""
+
+
+_RECORD = re.compile(r"#(\d+)\s*=\s*([A-Za-z0-9_]+)\s*\((.*)\)\s*;\s*$", re.S)
+_TOKEN = re.compile(r"""\s*(?:
+    (?P<str>'(?:[^']|'')*')
+  | (?P<ref>\#\d+)
+  | (?P<enum>\.[A-Za-z0-9_]+\.)
+  | (?P<typed>[A-Za-z][A-Za-z0-9_]*)\s*\(
+  | (?P<num>[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<open>\()
+  | (?P<close>\))
+  | (?P<null>[$*])
+  | (?P<bin>"[0-9A-Fa-f]*")
+  | (?P<comma>,)
+)""", re.X)
+_ENCODED = re.compile(r"\\X2\\((?:[0-9A-F]{4})+)\\X0\\|\\X\\([0-9A-F]{2})|\\S\\(.)")
+
+
+def _decode_string(token):
+    text = token[1:-1].replace("''", "'")
+    if '\\' not in text:
+        return text
+
+    def decode(match):
+        wide, byte, shifted = match.groups()
+        if wide:
+            return bytes.fromhex(wide).decode('utf-16-be', errors='replace')
+        if byte:
+            return bytes.fromhex(byte).decode('latin-1')
+        return chr(ord(shifted) + 128)
+
+    return _ENCODED.sub(decode, text).replace('\\\\', '\\')
+
+
+def _parse_args(text):
+    """Attribute list of one record; typed values become (TYPE, [args]) tuples"""
+    stack = [[]]
+    typed = []
+    pos = 0
+    while pos < len(text):
+        match = _TOKEN.match(text, pos)
+        if match is None:
+            if text[pos:].strip():
+                raise ValueError(f'Unexpected STEP token at {text[pos:pos + 20]!r}')
+            break
+        pos = match.end()
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == 'str':
+            stack[-1].append(_decode_string(value))
+        elif kind == 'ref':
+            stack[-1].append(_Ref(value[1:]))
+        elif kind == 'enum':
+            stack[-1].append(_Enum(value[1:-1].upper()))
+        elif kind == 'num':
+            stack[-1].append(float(value) if any(c in value for c in '.eE') else int(value))
+        elif kind == 'typed':
+            stack.append([])
+            typed.append(value.upper())
+        elif kind == 'open':
+            stack.append([])
+            typed.append(None)
+        elif kind == 'close':
+            items = stack.pop()
+            type_name = typed.pop()
+            stack[-1].append((type_name, items) if type_name else items)
+        elif kind == 'null':
+            stack[-1].append(None)
+    return stack[0]
+
+
+def _iter_records(f):
+    """(id, TYPE, raw attribute text) for every entity in the DATA section"""
+    in_data = False
+    buffer = []
+    quotes = 0
+    for line in f:
+        if not in_data:
+            in_data = line.strip().upper().startswith('DATA;')
+            continue
+        buffer.append(line)
+        quotes += line.count("'")
+        # A record ends at a ';' outside any string (an even number of quotes so far)
+        if quotes % 2 or not line.rstrip().endswith(';'):
+            continue
+        record = ''.join(buffer).strip()
+        buffer, quotes = [], 0
+        if record.upper().startswith('ENDSEC'):
+            break
+        match = _RECORD.match(record)
+        if match:
+            yield int(match.group(1)), match.group(2).upper(), match.group(3)
+
+
+def read_step(path):
+    """
+    Parse an IFC (STEP physical file) into ``{id: (TYPE, [attributes])}``
+
+    References are ``_Ref`` ints, enumerations ``_Enum`` strings and ``$``/``*``
+    are None.
+    """
+    entities = {}
+    with open(path, 'r', encoding='latin-1') as f:
+        for entity_id, type_name, args in _iter_records(f):
+            try:
+                entities[entity_id] = (type_name, _parse_args(args))
+            except ValueError as e:
+                logger.warning(f"Skipping unreadable IFC entity #{entity_id}: {str(e)}")
+    return entities
+
+
+# --- Geometry -----------------------------------------------------------------
+
+_NO_POINTS = np.empty((0, 3))
+
+
+class _Geometry:
+    """World placements and local-space points of representation items"""
+
+    def __init__(self, entities):
+        self.entities = entities
+        self._placements = {}
+        self._items = {}
+
+    def _entity(self, ref):
+        return self.entities.get(ref, (None, None)) if ref is not None else (None, None)
+
+    def _vector(self, ref, default):
+        type_name, args = self._entity(ref)
+        if type_name not in ('IFCCARTESIANPOINT', 'IFCDIRECTION') or not args or not args[0]:
+            return np.array(default, dtype=float)
+        values = [float(v) for v in args[0]][:3]
+        return np.array(values + [0.0] * (3 - len(values)))
+
+    def _frame(self, origin, x_axis, z_axis, scale=(1.0, 1.0, 1.0)):
+        z_axis = z_axis / (np.linalg.norm(z_axis) or 1.0)
+        x_axis = x_axis - np.dot(x_axis, z_axis) * z_axis
+        norm = np.linalg.norm(x_axis)
+        x_axis = x_axis / norm if norm else np.array([1.0, 0.0, 0.0])
+        matrix = np.eye(4)
+        matrix[:3, 0] = x_axis * scale[0]
+        matrix[:3, 1] = np.cross(z_axis, x_axis) * scale[1]
+        matrix[:3, 2] = z_axis * scale[2]
+        matrix[:3, 3] = origin
+        return matrix
+
+    def axis_placement(self, ref):
+        """Matrix of an IfcAxis2Placement2D/3D (identity when absent)"""
+        type_name, args = self._entity(ref)
+        if type_name == 'IFCAXIS2PLACEMENT3D':
+            return self._frame(self._vector(args[0], (0, 0, 0)),
+                               self._vector(args[2] if len(args) > 2 else None, (1, 0, 0)),
+                               self._vector(args[1] if len(args) > 1 else None, (0, 0, 1)))
+        if type_name == 'IFCAXIS2PLACEMENT2D':
+            return self._frame(self._vector(args[0], (0, 0, 0)),
+                               self._vector(args[1] if len(args) > 1 else None, (1, 0, 0)),
+                               np.array([0.0, 0.0, 1.0]))
+        return np.eye(4)
+
+    def _operator(self, ref):
+        """Matrix of an IfcCartesianTransformationOperator (mapped item target)"""
+        type_name, args = self._entity(ref)
+        if not type_name or not type_name.startswith('IFCCARTESIANTRANSFORMATIONOPERATOR'):
+            return np.eye(4)
+        scale = float(args[3]) if len(args) > 3 and args[3] is not None else 1.0
+        scales = [scale, scale, scale]
+        if type_name.endswith('NONUNIFORM3D') and len(args) > 6:
+            scales[1] = float(args[5]) if args[5] is not None else scale
+            scales[2] = float(args[6]) if args[6] is not None else scale
+        z_axis = self._vector(args[4] if len(args) > 4 else None, (0, 0, 1))
+        return self._frame(self._vector(args[2], (0, 0, 0)), self._vector(args[0], (1, 0, 0)), z_axis, scales)
+
+    def world_placement(self, ref):
+        """World matrix of an IfcLocalPlacement, following PlacementRelTo"""
+        if ref in self._placements:
+            return self._placements[ref]
+        type_name, args = self._entity(ref)
+        # Placement chains can be long; walk them iteratively
+        chain = []
+        while type_name == 'IFCLOCALPLACEMENT' and ref not in self._placements and ref not in chain:
+            chain.append(ref)
+            ref = args[0]
+            type_name, args = self._entity(ref)
+        matrix = self._placements.get(ref, np.eye(4))
+        for placement in reversed(chain):
+            matrix = matrix @ self.axis_placement(self.entities[placement][1][1])
+            self._placements[placement] = matrix
+        return matrix
+
+    @staticmethod
+    def _transform(matrix, points):
+        if not len(points):
+            return points
+        return points @ matrix[:3, :3].T + matrix[:3, 3]
+
+    def _profile_points(self, ref):
+        type_name, args = self._entity(ref)
+        if type_name is None:
+            return _NO_POINTS
+        if type_name in ('IFCARBITRARYCLOSEDPROFILEDEF', 'IFCARBITRARYPROFILEDEFWITHVOIDS',
+                         'IFCARBITRARYOPENPROFILEDEF'):
+            return self._collect_points(args[2])
+        if type_name.endswith('PROFILEDEF') and len(args) > 3:
+            if type_name.startswith('IFCCIRCLE'):
+                half_x = half_y = float(args[3] or 0)
+            elif type_name.startswith('IFCELLIPSE') and len(args) > 4:
+                half_x, half_y = float(args[3] or 0), float(args[4] or 0)
+            elif len(args) > 4 and all(isinstance(v, (int, float)) for v in args[3:5]):
+                # Rectangles and I/L/T/U/C/Z sections: overall width and depth about the position
+                half_x, half_y = float(args[3]) / 2, float(args[4]) / 2
+            else:
+                return _NO_POINTS
+            corners = np.array([[-half_x, -half_y, 0], [half_x, -half_y, 0],
+                                [half_x, half_y, 0], [-half_x, half_y, 0]], dtype=float)
+            return self._transform(self.axis_placement(args[2]), corners)
+        return self._collect_points(ref)
+
+    def _collect_points(self, ref):
+        """Every point an item is built from (breps, polylines, tessellations...)"""
+        points = []
+        seen = set()
+        stack = [ref]
+        while stack:
+            current = stack.pop()
+            if current in seen or current not in self.entities:
+                continue
+            seen.add(current)
+            type_name, args = self.entities[current]
+            if type_name == 'IFCCARTESIANPOINT':
+                points.append(self._vector(current, (0, 0, 0)))
+                continue
+            if type_name in ('IFCCARTESIANPOINTLIST2D', 'IFCCARTESIANPOINTLIST3D'):
+                for coordinates in args[0] or ():
+                    values = [float(v) for v in coordinates][:3]
+                    points.append(np.array(values + [0.0] * (3 - len(values))))
+                continue
+            if type_name in ('IFCDIRECTION', 'IFCAXIS2PLACEMENT2D', 'IFCAXIS2PLACEMENT3D'):
+                continue
+            stack.extend(_refs(args))
+        return np.array(points) if points else _NO_POINTS
+
+    def item_points(self, ref):
+        """Corner points of a representation item in its representation's space"""
+        if ref in self._items:
+            return self._items[ref]
+        type_name, args = self._entity(ref)
+        points = _NO_POINTS
+        if type_name == 'IFCBOUNDINGBOX':
+            corner = self._vector(args[0], (0, 0, 0))
+            size = np.array([float(v or 0) for v in args[1:4]])
+            points = corner + np.array([[x, y, z] for x in (0, 1) for y in (0, 1) for z in (0, 1)]) * size
+        elif type_name and type_name.startswith('IFCEXTRUDEDAREASOLID'):
+            profile = self._profile_points(args[0])
+            if len(profile):
+                direction = self._vector(args[2], (0, 0, 1))
+                direction = direction / (np.linalg.norm(direction) or 1.0)
+                solid = np.vstack([profile, profile + direction * float(args[3] or 0)])
+                points = self._transform(self.axis_placement(args[1]), solid)
+        elif type_name == 'IFCMAPPEDITEM':
+            _, source = self._entity(args[0])
+            if source:
+                _, representation = self._entity(source[1])
+                mapped = [self.item_points(item) for item in (representation or [None] * 4)[3] or ()]
+                mapped = [p for p in mapped if len(p)]
+                if mapped:
+                    matrix = self._operator(args[1]) @ self.axis_placement(source[0])
+                    points = self._transform(matrix, np.vstack(mapped))
+        elif type_name in ('IFCBOOLEANRESULT', 'IFCBOOLEANCLIPPINGRESULT'):
+            # Differences and intersections lie within the first operand
+            operands = args[1:3] if args[0] == 'UNION' else args[1:2]
+            parts = [p for p in (self.item_points(operand) for operand in operands) if len(p)]
+            points = np.vstack(parts) if parts else _NO_POINTS
+        elif type_name in ('IFCHALFSPACESOLID', 'IFCPOLYGONALBOUNDEDHALFSPACE'):
+            # Unbounded; only ever clips something else
+            points = _NO_POINTS
+        elif type_name is not None:
+            points = self._collect_points(ref)
+        self._items[ref] = points
+        return points
+
+    def bounding_box(self, placement, representation):
+        """World-space (min x, min y, min z, max x, max y, max z) of a product"""
+        matrix = self.world_placement(placement) if placement is not None else np.eye(4)
+        parts = []
+        type_name, args = self._entity(representation)
+        if type_name == 'IFCPRODUCTDEFINITIONSHAPE':
+            shapes = [self._entity(ref)[1] for ref in args[2] or ()]
+            shapes = [shape for shape in shapes if shape and len(shape) > 3]
+            for identifier in ('BODY', 'BOX', None):
+                chosen = [shape for shape in shapes
+                          if identifier is None or str(shape[1] or '').upper() == identifier]
+                parts = [p for shape in chosen for p in map(self.item_points, shape[3] or ()) if len(p)]
+                if parts:
+                    break
+        if not parts:
+            if placement is None:
+                return [math.nan] * 6
+            origin = matrix[:3, 3]
+            return list(origin) + list(origin)
+        points = self._transform(matrix, np.vstack(parts))
+        return list(points.min(axis=0)) + list(points.max(axis=0))
+
+
+def _refs(value):
+    if isinstance(value, _Ref):
+        yield value
+    elif isinstance(value, tuple):
+        yield from _refs(value[1])
+    elif isinstance(value, list):
+        for item in value:
+            yield from _refs(item)
+
+
+# --- Building the cache -------------------------------------------------------
+
+_PLACEMENTS = ('IFCLOCALPLACEMENT', 'IFCGRIDPLACEMENT')
+_QUANTITY_VALUE_INDEX = 3
+
+
+def _is_product(entities, args):
+    """IfcProduct layout: GlobalId, OwnerHistory, Name, Description, ObjectType, ObjectPlacement, Representation"""
+    if len(args) < 7 or not isinstance(args[0], str) or len(args[0]) != 22:
+        return False
+    placement, representation = args[5], args[6]
+    if isinstance(placement, _Ref):
+        return entities.get(placement, (None,))[0] in _PLACEMENTS
+    return placement is None and isinstance(representation, _Ref) and \
+        entities.get(representation, (None,))[0] == 'IFCPRODUCTDEFINITIONSHAPE'
+
+
+def _value_text(value):
+    if isinstance(value, tuple):
+        value = value[1][0] if value[1] else None
+    if isinstance(value, list):
+        return ', '.join(filter(None, map(_value_text, value)))
+    if isinstance(value, _Enum):
+        return {'T': 'true', 'F': 'false', 'U': 'unknown'}.get(value, value)
+    if value is None:
+        return None
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def _property_values(entities, definition):
+    """(set name, property name, value) rows of a property set or element quantity"""
+    type_name, args = entities.get(definition, (None, None))
+    if type_name == 'IFCPROPERTYSET':
+        set_name, members = args[2], args[4]
+    elif type_name == 'IFCELEMENTQUANTITY':
+        set_name, members = args[2], args[5]
+    else:
+        return
+    for member in members or ():
+        member_type, member_args = entities.get(member, (None, None))
+        if member_type is None or not member_args:
+            continue
+        if member_type in ('IFCPROPERTYSINGLEVALUE', 'IFCPROPERTYENUMERATEDVALUE'):
+            value = member_args[2]
+        elif member_type.startswith('IFCQUANTITY') and len(member_args) > _QUANTITY_VALUE_INDEX:
+            value = member_args[_QUANTITY_VALUE_INDEX]
+        else:
+            continue
+        yield set_name or '', member_args[0] or '', _value_text(value)
+
+
+class _Strings:
+    """Interned string table stored as UTF-8 bytes plus offsets"""
+
+    def __init__(self):
+        self.index = {}
+
+    def __call__(self, text):
+        if text is None:
+            return -1
+        return self.index.setdefault(text, len(self.index))
+
+    def arrays(self):
+        encoded = [text.encode('utf-8') for text in self.index]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+
+def build_element_cache(ifc_path, cache_path):
+    """
+    Read an IFC once and write its element cache (process-pool entry point)
+
+    A failure is recorded next to the IFC (``.elements.error``) so it is not
+    retried on every request.
+
+    Returns:
+        int: Number of elements indexed
+    """
+    base = cache_path[:-len(CACHE_SUFFIX)]
+    try:
+        count = _write_cache(ifc_path, cache_path)
+    except Exception as e:
+        with open(base + ERROR_SUFFIX, 'w') as f:
+            f.write(str(e) or e.__class__.__name__)
+        raise
+    if os.path.exists(base + ERROR_SUFFIX):
+        os.remove(base + ERROR_SUFFIX)
+    return count
+
+
+def _write_cache(ifc_path, cache_path):
+    entities = read_step(ifc_path)
+    geometry = _Geometry(entities)
+    strings = _Strings()
+
+    product_ids = sorted(entity_id for entity_id, (_, args) in entities.items() if _is_product(entities, args))
+    position = {entity_id: i for i, entity_id in enumerate(product_ids)}
+    global_ids, types, names, boxes = [], [], [], []
+    for entity_id in product_ids:
+        type_name, args = entities[entity_id]
+        global_ids.append(args[0])
+        types.append(strings(type_name))
+        names.append(strings(args[2] if isinstance(args[2], str) else None))
+        try:
+            boxes.append(geometry.bounding_box(args[5], args[6]))
+        except Exception as e:
+            logger.warning(f"No bounding box for IFC entity #{entity_id}: {str(e)}")
+            boxes.append([math.nan] * 6)
+
+    rows = []
+    for type_name, args in entities.values():
+        if type_name != 'IFCRELDEFINESBYPROPERTIES' or len(args) < 6:
+            continue
+        values = [(strings(s), strings(n), strings(v)) for s, n, v in _property_values(entities, args[5])]
+        for related in args[4] or ():
+            if related in position:
+                rows.extend((position[related],) + value for value in values)
+    rows.sort()
+
+    string_data, string_offsets = strings.arrays()
+    properties = np.array(rows, dtype=np.int32).reshape(-1, 4)
+    arrays = {
+        'format_version': np.array(FORMAT_VERSION),
+        'express_ids': np.array(product_ids, dtype=np.int64),
+        'global_ids': np.array(global_ids, dtype='S22'),
+        'types': np.array(types, dtype=np.int32),
+        'names': np.array(names, dtype=np.int32),
+        'bboxes': np.array(boxes, dtype=np.float64).reshape(-1, 6),
+        'prop_element': properties[:, 0],
+        'prop_set': properties[:, 1],
+        'prop_name': properties[:, 2],
+        'prop_value': properties[:, 3],
+        'string_data': string_data,
+        'string_offsets': string_offsets,
+    }
+    tmp_path = f'{cache_path}.{os.getpid()}.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, cache_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return len(product_ids)
+
+
+# --- Reading the cache --------------------------------------------------------
+
+class SpatialGrid:
+    """
+    Uniform grid over element bounding boxes in plan (x, y)
+
+    Each element is listed in every cell its box overlaps; elements spanning
+    more than ``MAX_CELLS_PER_ELEMENT`` cells (sites, storeys, large slabs)
+    are kept apart and returned by every query. Heights are left to the
+    exact test, as buildings are far wider than they are tall per cell.
+    """
+
+    MAX_CELLS_PER_ELEMENT = 64
+    MAX_CELLS_PER_AXIS = 1024
+
+    def __init__(self, bboxes):
+        valid = np.flatnonzero(~np.isnan(bboxes).any(axis=1))
+        self.entries = None
+        self.large = valid
+        if not len(valid):
+            return
+        boxes = bboxes[valid]
+        self.cells_per_axis = int(min(max(math.sqrt(len(valid)), 1), self.MAX_CELLS_PER_AXIS))
+        self.origin = boxes[:, :2].min(axis=0)
+        self.end = boxes[:, 3:5].max(axis=0)
+        self.cell_size = np.maximum(self.end - self.origin, 1e-9) / self.cells_per_axis
+
+        low, high = self._cell(boxes[:, :2]), self._cell(boxes[:, 3:5])
+        spans = high - low + 1
+        counts = spans[:, 0] * spans[:, 1]
+        small = counts <= self.MAX_CELLS_PER_ELEMENT
+        self.large = valid[~small]
+        ids, low, spans, counts = valid[small], low[small], spans[small], counts[small]
+
+        # One entry per (element, covered cell), grouped by cell
+        owner = np.repeat(np.arange(len(ids)), counts)
+        within = np.arange(int(counts.sum())) - np.repeat(np.cumsum(counts) - counts, counts)
+        cell_x = low[owner, 0] + within % spans[owner, 0]
+        cell_y = low[owner, 1] + within // spans[owner, 0]
+        keys = cell_y * self.cells_per_axis + cell_x
+        self.entries = ids[owner[np.argsort(keys, kind='stable')]]
+        self.cell_start = np.zeros(self.cells_per_axis ** 2 + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys, minlength=self.cells_per_axis ** 2), out=self.cell_start[1:])
+
+    def _cell(self, xy):
+        cells = np.floor((xy - self.origin) / self.cell_size).astype(np.int64)
+        return np.clip(cells, 0, self.cells_per_axis - 1)
+
+    def candidates(self, low, high):
+        """
+        Sorted indices of elements that may overlap a box in plan
+
+        Returns None when the box covers so much of the grid that a full
+        scan is cheaper.
+        """
+        if self.entries is None:
+            return self.large
+        if np.any(high[:2] < self.origin) or np.any(low[:2] > self.end):
+            return np.empty(0, dtype=np.int64)
+        (x0, y0), (x1, y1) = self._cell(low[:2]), self._cell(high[:2])
+        if (x1 - x0 + 1) * (y1 - y0 + 1) * 4 > self.cells_per_axis ** 2:
+            return None
+        row = self.cells_per_axis
+        parts = [self.entries[self.cell_start[y * row + x0]:self.cell_start[y * row + x1 + 1]]
+                 for y in range(y0, y1 + 1)]
+        parts.append(self.large)
+        return np.unique(np.concatenate(parts))
+
+
+class ElementCache:
+    """Loaded element arrays with lookup, property and spatial queries"""
+
+    def __init__(self, arrays):
+        self.express_ids = arrays['express_ids']
+        self.global_ids = arrays['global_ids']
+        self.types = arrays['types']
+        self.names = arrays['names']
+        self.bboxes = arrays['bboxes']
+        self.prop_element = arrays['prop_element']
+        self.prop_set = arrays['prop_set']
+        self.prop_name = arrays['prop_name']
+        self.prop_value = arrays['prop_value']
+
+        data = arrays['string_data'].tobytes()
+        offsets = arrays['string_offsets']
+        self.strings = [data[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(len(offsets) - 1)]
+        self._string_ids = {text: i for i, text in enumerate(self.strings)}
+        self._guid_order = np.argsort(self.global_ids, kind='stable')
+        self._sorted_guids = self.global_ids[self._guid_order]
+        # Column per bound: comparisons run over contiguous memory
+        self._bounds = np.ascontiguousarray(self.bboxes.T)
+        self._grid = None
+
+    def __len__(self):
+        return len(self.express_ids)
+
+    def _string_id(self, text, upper=False):
+        return self._string_ids.get(text.upper() if upper else text, -2)
+
+    def find(self, global_id):
+        """Index of the element with a GlobalId, or None"""
+        if len(global_id) != 22:
+            return None
+        try:
+            key = np.array(global_id, dtype='S22')
+        except UnicodeEncodeError:
+            return None
+        i = int(np.searchsorted(self._sorted_guids, key))
+        if i < len(self._sorted_guids) and self._sorted_guids[i] == key:
+            return int(self._guid_order[i])
+        return None
+
+    def select(self, ifc_type=None, pset=None, prop=None, value=None, bbox=None, contained=False):
+        """
+        Indices of the elements matching every given filter
+
+        Args:
+            ifc_type: Entity type, any case (``IfcWall``)
+            pset: Property or quantity set name
+            prop: Property name
+            value: Property value, as text (booleans are ``true``/``false``)
+            bbox: (min x, min y, min z, max x, max y, max z) in model units
+            contained: Require elements to lie inside ``bbox`` rather than touch it
+
+        Returns:
+            numpy.ndarray: Element indices in STEP id order
+        """
+        candidates = None
+        if bbox is not None:
+            low, high = np.asarray(bbox[:3], dtype=float), np.asarray(bbox[3:], dtype=float)
+            if self._grid is None:
+                self._grid = SpatialGrid(self.bboxes)
+            candidates = self._grid.candidates(low, high)
+        if candidates is None:
+            candidates, bounds = np.arange(len(self)), self._bounds
+        else:
+            bounds = self._bounds[:, candidates]
+
+        mask = np.ones(len(candidates), dtype=bool)
+        if bbox is not None:
+            for axis in range(3):
+                if contained:
+                    mask &= (bounds[axis] >= low[axis]) & (bounds[axis + 3] <= high[axis])
+                else:
+                    mask &= (bounds[axis] <= high[axis]) & (bounds[axis + 3] >= low[axis])
+        if ifc_type:
+            mask &= self.types[candidates] == self._string_id(ifc_type, upper=True)
+        if pset or prop or value is not None:
+            rows = np.ones(len(self.prop_element), dtype=bool)
+            if pset:
+                rows &= self.prop_set == self._string_id(pset)
+            if prop:
+                rows &= self.prop_name == self._string_id(prop)
+            if value is not None:
+                rows &= self.prop_value == self._string_id(value)
+            matched = np.zeros(len(self), dtype=bool)
+            matched[self.prop_element[rows]] = True
+            mask &= matched[candidates]
+        return candidates[mask]
+
+    def summary(self, i):
+        """Index entry of an element"""
+        bbox = self.bboxes[i]
+        name = int(self.names[i])
+        return {
+            'express_id': int(self.express_ids[i]),
+            'global_id': self.global_ids[i].decode('ascii'),
+            'type': self.strings[self.types[i]],
+            'name': self.strings[name] if name >= 0 else None,
+            'bbox': None if np.isnan(bbox).any() else [float(v) for v in bbox],
+        }
+
+    def properties(self, i):
+        """``{set name: {property name: value}}`` of an element"""
+        start, end = np.searchsorted(self.prop_element, [i, i + 1])
+        result = {}
+        for row in range(start, end):
+            value = int(self.prop_value[row])
+            result.setdefault(self.strings[self.prop_set[row]], {})[self.strings[self.prop_name[row]]] = \
+                self.strings[value] if value >= 0 else None
+        return result
+
+
+@lru_cache(maxsize=8)
+def _load(cache_path, mtime_ns):
+    with np.load(cache_path) as arrays:
+        if int(arrays['format_version']) != FORMAT_VERSION:
+            return None
+        return ElementCache({name: arrays[name] for name in arrays.files})
+
+
+def ifc_file_path(file_path):
+    """Absolute path of a BIM version's file (blob paths are relative to UPLOAD_FOLDER)"""
+    from app.utils import blob_store
+    return blob_store.absolute_path(file_path)
+
+
+def cache_path_for(ifc_path):
+    return os.path.splitext(ifc_path)[0] + CACHE_SUFFIX
+
+
+def ingest_error(ifc_path):
+    """Why the last ingest of a file failed, or None"""
+    try:
+        with open(os.path.splitext(ifc_path)[0] + ERROR_SUFFIX) as f:
+            return f.read() or 'Unknown error'
+    except OSError:
+        return None
+
+
+def get_element_cache(ifc_path):
+    """
+    The loaded element cache of an IFC, or None if it is not built (yet)
+
+    Loaded caches are kept per process, so repeated queries cost no I/O.
+    """
+    cache_path = cache_path_for(ifc_path)
+    try:
+        mtime_ns = os.stat(cache_path).st_mtime_ns
+    except OSError:
+        return None
+    return _load(cache_path, mtime_ns)
+
+
+def _finished(ifc_path, future):
+    with _pending_lock:
+        _pending.discard(ifc_path)
+    try:
+        count = future.result()
+        logger.info(f"Indexed {count} IFC elements from {os.path.basename(ifc_path)}")
+    except Exception as e:
+        logger.error(f"Error indexing IFC model {ifc_path}: {str(e)}")
+
+
+def queue_ifc_ingest(ifc_path):
+    """
+    Build an IFC's element cache off the request path
+
+    Runs inline when ``BIM_INGEST_WORKERS`` is 0. Files already queued in
+    this process are ignored.
+    """
+    global _executor
+    with _pending_lock:
+        if ifc_path in _pending:
+            return
+        _pending.add(ifc_path)
+
+    args = (ifc_path, cache_path_for(ifc_path))
+    workers = current_app.config.get('BIM_INGEST_WORKERS', 1)
+    if workers <= 0:
+        future = Future()
+        try:
+            future.set_result(build_element_cache(*args))
+        except Exception as e:
+            future.set_exception(e)
+        _finished(ifc_path, future)
+        return
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=workers)
+    future = _executor.submit(build_element_cache, *args)
+    future.add_done_callback(lambda done: _finished(ifc_path, done))
+
+
+def _record_new_version(mapper, connection, target):
+    session = object_session(target)
+    if session is not None and target.file_path:
+        session.info.setdefault(_SESSION_VERSIONS_KEY, []).append(target.file_path)
+
+
+def _after_commit(session):
+    file_paths = session.info.pop(_SESSION_VERSIONS_KEY, None)
+    if not file_paths or not has_app_context():
+        return
+    for file_path in file_paths:
+        try:
+            ifc_path = ifc_file_path(file_path)
+            # Versions sharing a blob share its cache
+            if get_element_cache(ifc_path) is None:
+                queue_ifc_ingest(ifc_path)
+        except Exception as e:
+            logger.error(f"Error queueing IFC ingest for {file_path}: {str(e)}")
+
+
+def _after_rollback(session):
+    session.info.pop(_SESSION_VERSIONS_KEY, None)
+
+
+def register_ifc_cache_listeners():
+    """Index every newly committed BIM model version's IFC (idempotent)"""
+    global _listeners_registered
+    if _listeners_registered:
+        return
+
+    from app.models.bim import BIMModelVersion
+
+    event.listen(BIMModelVersion, 'after_insert', _record_new_version)
+    event.listen(Session, 'after_commit', _after_commit)
+    event.listen(Session, 'after_rollback', _after_rollback)
+    _listeners_registered = True
@@ -0,0 +1,374 @@
+"""Persistent background jobs that run once cluster-wide.
+
+Jobs are rows in ``background_jobs``; any process can enqueue one as part of
+its own transaction. ``flask jobs worker`` processes claim due jobs with a
+compare-and-set UPDATE (after ``SELECT ... FOR UPDATE SKIP LOCKED`` where the
+database supports it), so each job runs in exactly one worker however many
+web and worker processes share the database. A claim is a lease: workers
+heartbeat their running jobs, and a job whose worker died is claimed again
+once ``JOB_LEASE_SECONDS`` pass without a heartbeat.
+
+Failed jobs are retried with exponential backoff up to their
+``max_attempts``. ``JOB_QUEUE_CONCURRENCY`` caps how many jobs of a queue run
+at once across all workers. Periodic jobs are enqueued by every worker with
+a ``unique_key`` per period, and the unique constraint lets one through.
+"""
+import logging
+import os
+import random
+import socket
+import threading
+import uuid
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.exc import IntegrityError
+
+from app.extensions import db
+from app.models.base import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+JobHandler = namedtuple('JobHandler', 'func queue max_attempts every')
+
+# name -> JobHandler, filled by the @job decorator
+JOB_HANDLERS = {}
+
+# Periods this process has already enqueued: name -> period number
+_scheduled = {}
+_scheduled_lock = threading.Lock()
+
+
+def job(name, queue='default', max_attempts=5, every=None):
+    """
+    Register a function as a job handler
+
+    Args:
+        name: Name jobs are enqueued under
+        queue: Default queue
+        max_attempts: Runs before a failing job is given up
+        every: timedelta to run the job periodically (workers enqueue it)
+    """
+    def decorator(func):
+        JOB_HANDLERS[name] = JobHandler(func, queue, max_attempts, every)
+        return func
+    return decorator
+
+
+def enqueue(name, payload=None, queue=None, run_at=None, unique_key=None, max_attempts=None):
+    """
+    Add a job in the caller's transaction (it is claimable once committed)
+
+    Args:
+        name: Registered handler name
+        payload: Keyword arguments for the handler (JSON-serialisable)
+        queue: Queue, defaulting to the handler's
+        run_at: Earliest start time (UTC), defaulting to now
+        unique_key: Skip the job if one with this key already exists
+
+    Returns:
+        BackgroundJob: The job, or None if ``unique_key`` is taken
+    """
+    handler = JOB_HANDLERS.get(name)
+    if handler is None:
+        raise KeyError(f'Unknown job: {name}')
+    background_job = BackgroundJob(
+        name=name,
+        queue=queue or handler.queue,
+        payload=payload or {},
+        unique_key=unique_key,
+        max_attempts=max_attempts or handler.max_attempts,
+        run_at=run_at or datetime.utcnow(),
+    )
+    if unique_key is None:
+        db.session.add(background_job)
+        return background_job
+    try:
+        with db.session.begin_nested():
+            db.session.add(background_job)
+        return background_job
+    except IntegrityError:
+        return None
+
+
+def queue_limits(config):
+    """
+    Parse ``JOB_QUEUE_CONCURRENCY`` (``queue=n,...``)
+
+    Returns:
+        dict: Queue name -> maximum running jobs (queues not listed are unlimited)
+    """
+    limits = {}
+    for entry in (config.get('JOB_QUEUE_CONCURRENCY') or '').split(','):
+        if '=' in entry:
+            queue, limit = (part.strip() for part in entry.split('=', 1))
+            limits[queue] = int(limit)
+    return limits
+
+
+def retry_delay(attempts):
+    """Backoff before the next attempt: doubling from JOB_RETRY_BASE_SECONDS, with jitter"""
+    base = current_app.config.get('JOB_RETRY_BASE_SECONDS', 30)
+    ceiling = current_app.config.get('JOB_RETRY_MAX_SECONDS', 3600)
+    seconds = min(base * 2 ** max(attempts - 1, 0), ceiling)
+    return timedelta(seconds=seconds * random.uniform(0.8, 1.2))
+
+
+def _lease_expiry(now):
+    return now - timedelta(seconds=current_app.config.get('JOB_LEASE_SECONDS', 300))
+
+
+def _due(now, expired):
+    """Queued and due, or running under a lease that has expired"""
+    return or_(
+        and_(BackgroundJob.status == 'queued', BackgroundJob.run_at <= now),
+        and_(BackgroundJob.status == 'running', BackgroundJob.locked_at < expired,
+             BackgroundJob.attempts < BackgroundJob.max_attempts),
+    )
+
+
+def claim_jobs(worker_id, queues=None, limit=1):
+    """
+    Claim up to ``limit`` due jobs for a worker
+
+    Each claim is a conditional UPDATE that only one worker can win. Queue
+    limits are checked against the jobs running cluster-wide; workers
+    claiming concurrently on a read-committed database can overshoot a
+    limit by the number of racing claims.
+
+    Returns:
+        list: IDs of the claimed jobs
+    """
+    now = datetime.utcnow()
+    expired = _lease_expiry(now)
+    # Jobs whose worker died during their last allowed attempt
+    db.session.execute(
+        update(BackgroundJob)
+        .where(BackgroundJob.status == 'running', BackgroundJob.locked_at < expired,
+               BackgroundJob.attempts >= BackgroundJob.max_attempts)
+        .values(status='failed', locked_by=None, finished_at=now, last_error='Worker lease expired')
+        .execution_options(synchronize_session=False)
+    )
+
+    limits = queue_limits(current_app.config)
+    running = dict(
+        db.session.query(BackgroundJob.queue, db.func.count(BackgroundJob.id))
+        .filter(BackgroundJob.status == 'running', BackgroundJob.locked_at >= expired)
+        .group_by(BackgroundJob.queue)
+    )
+    full = [queue for queue, cap in limits.items() if running.get(queue, 0) >= cap]
+
+    candidates = select(BackgroundJob.id, BackgroundJob.queue).where(_due(now, expired))
+    if queues:
+        candidates = candidates.where(BackgroundJob.queue.in_(queues))
+    if full:
+        candidates = candidates.where(BackgroundJob.queue.notin_(full))
+    candidates = candidates.order_by(BackgroundJob.run_at, BackgroundJob.id) \
+        .limit(limit * 4).with_for_update(skip_locked=True)
+
+    claimed = []
+    for job_id, queue in db.session.execute(candidates).all():
+        if len(claimed) >= limit:
+            break
+        if queue in limits and running.get(queue, 0) >= limits[queue]:
+            continue
+        result = db.session.execute(
+            update(BackgroundJob)
+            .where(BackgroundJob.id == job_id, _due(now, expired))
+            .values(status='running', locked_by=worker_id, locked_at=now, attempts=BackgroundJob.attempts + 1)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount:
+            claimed.append(job_id)
+            running[queue] = running.get(queue, 0) + 1
+    db.session.commit()
+    return claimed
+
+
+def heartbeat(worker_id, job_ids):
+    """Extend the lease on a worker's running jobs"""
+    if not job_ids:
+        return
+    db.session.execute(
+        update(BackgroundJob)
+        .where(BackgroundJob.id.in_(job_ids), BackgroundJob.locked_by == worker_id)
+        .values(locked_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+
+def run_job(job_id, worker_id):
+    """
+    Run a claimed job and record the outcome
+
+    A successful handler's uncommitted changes are committed together with
+    the job's completion. A failure is rolled back and the job requeued
+    with backoff, or marked failed after its last attempt.
+    """
+    background_job = db.session.get(BackgroundJob, job_id)
+    if background_job is None or background_job.locked_by != worker_id:
+        return
+    name, payload = background_job.name, background_job.payload or {}
+    attempts, max_attempts = background_job.attempts, background_job.max_attempts
+    handler = JOB_HANDLERS.get(name)
+
+    try:
+        if handler is None:
+            raise LookupError(f'No handler registered for job {name}')
+        handler.func(**payload)
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Job {job_id} ({name}) failed on attempt {attempts} of {max_attempts}: {str(e)}")
+        values = {'locked_by': None, 'last_error': f'{e.__class__.__name__}: {e}'[:2000]}
+        if handler is not None and attempts < max_attempts:
+            values.update(status='queued', run_at=datetime.utcnow() + retry_delay(attempts))
+        else:
+            values.update(status='failed', finished_at=datetime.utcnow())
+    else:
+        values = {'status': 'succeeded', 'locked_by': None, 'last_error': None, 'finished_at': datetime.utcnow()}
+
+    # Only the lease holder records the outcome (an expired lease may have been re-claimed)
+    db.session.execute(
+        update(BackgroundJob)
+        .where(BackgroundJob.id == job_id, BackgroundJob.locked_by == worker_id)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+
+def schedule_periodic(now=None):
+    """
+    Enqueue this period's run of every periodic job (once cluster-wide)
+
+    Returns:
+        int: Jobs enqueued by this call
+    """
+    now = now or datetime.utcnow()
+    enqueued = 0
+    for name, handler in JOB_HANDLERS.items():
+        if handler.every is None:
+            continue
+        period = int(now.timestamp() // handler.every.total_seconds())
+        with _scheduled_lock:
+            if _scheduled.get(name) == period:
+                continue
+        if enqueue(name, unique_key=f'{name}@{period}') is not None:
+            enqueued += 1
+        db.session.commit()
+        with _scheduled_lock:
+            _scheduled[name] = period
+    return enqueued
+
+
+class Worker:
+    """Claims and runs jobs in a thread pool until stopped"""
+
+    def __init__(self, app, queues=None, concurrency=None, worker_id=None, schedule=True):
+        self.app = app
+        self.queues = list(queues or ()) or None
+        self.concurrency = concurrency or app.config.get('JOB_WORKER_CONCURRENCY', 2)
+        self.worker_id = worker_id or f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}'
+        self.schedule = schedule
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        """Stop claiming jobs; running jobs are finished first"""
+        self._stop_event.set()
+
+    def _execute(self, job_id):
+        with self.app.app_context():
+            try:
+                run_job(job_id, self.worker_id)
+            except Exception as e:
+                logger.error(f"Error recording job {job_id}: {str(e)}")
+            finally:
+                db.session.remove()
+
+    def _poll(self, running):
+        with self.app.app_context():
+            try:
+                if self.schedule:
+                    schedule_periodic()
+                heartbeat(self.worker_id, list(running))
+                free = self.concurrency - len(running)
+                return claim_jobs(self.worker_id, self.queues, free) if free > 0 else []
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Error polling for jobs: {str(e)}")
+                return []
+            finally:
+                db.session.remove()
+
+    def run(self, burst=False):
+        """
+        Process jobs until ``stop()``; with ``burst``, until none are due
+
+        Returns:
+            int: Number of jobs run
+        """
+        poll_interval = self.app.config.get('JOB_POLL_INTERVAL', 1.0)
+        running = {}
+        completed = 0
+        logger.info(f"Job worker {self.worker_id} started (queues: {self.queues or 'all'})")
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='job') as pool:
+            while not self._stop_event.is_set():
+                for job_id in self._poll(running):
+                    running[job_id] = pool.submit(self._execute, job_id)
+                if not running:
+                    if burst:
+                        break
+                    self._stop_event.wait(poll_interval)
+                    continue
+                wait(running.values(), timeout=poll_interval, return_when=FIRST_COMPLETED)
+                for job_id, future in list(running.items()):
+                    if future.done():
+                        del running[job_id]
+                        completed += 1
+        logger.info(f"Job worker {self.worker_id} stopped after {completed} jobs")
+        return completed + len(running)
+
+
+# --- Built-in jobs ------------------------------------------------------------
+
+@job('maintenance.clean_temp_files', every=timedelta(days=1))
+def clean_temp_files_job():
+    from app import clean_temp_files
+    clean_temp_files(current_app._get_current_object())
+
+
+@job('maintenance.collect_db_stats', every=timedelta(hours=6))
+def collect_db_stats_job():
+    from app import collect_db_stats
+    collect_db_stats(current_app._get_current_object())
+
+
+@job('maintenance.clean_uploads', every=timedelta(days=1))
+def clean_uploads_job():
+    from app.utils.chunked_upload import purge_stale_uploads
+    purge_stale_uploads()
+
+
+@job('maintenance.clean_blobs', every=timedelta(days=1))
+def clean_blobs_job():
+    from app.utils.blob_store import collect_orphans
+    collect_orphans()
+
+
+@job('sync.purge_tombstones', every=timedelta(days=1))
+def purge_sync_tombstones_job():
+    from app.utils.sync import purge_tombstones
+    purge_tombstones()
+
+
+@job('jobs.purge_finished', every=timedelta(days=1))
+def purge_finished_jobs(days=None):
+    """Delete succeeded and failed jobs older than JOB_RETENTION_DAYS"""
+    days = days or current_app.config.get('JOB_RETENTION_DAYS', 7)
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    BackgroundJob.query.filter(BackgroundJob.status.in_(['succeeded', 'failed']),
+                               BackgroundJob.finished_at < cutoff).delete(synchronize_session=False)
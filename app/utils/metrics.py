@@ -0,0 +1,283 @@
+"""Request metrics with per-thread shards and fixed-bucket latency histograms.
+
+Each thread records into its own shard, so the request path takes no lock and
+only bumps counters in preallocated structures. When a thread exits its shard
+is folded into one retired total, so thread-per-request servers do not grow
+the shard list. Latencies go into a fixed set
+of log-spaced buckets (four per power of two, about 19% relative error), the
+same layout in every shard and every process, so snapshots merge by adding
+bucket counts. Percentiles are read from the merged histogram.
+"""
+import logging
+import threading
+import weakref
+from bisect import bisect_left
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds: 0.5ms .. ~2 minutes, plus one overflow bucket
+LATENCY_BOUNDS = tuple(0.0005 * 2 ** (index / 4) for index in range(72))
+PERCENTILES = (0.5, 0.95, 0.99)
+
+
+class EndpointStats:
+    """Counters and latency histogram for one endpoint"""
+
+    __slots__ = ('count', 'total', 'max', 'buckets', 'by_status', 'by_method')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(LATENCY_BOUNDS) + 1)
+        self.by_status = {}
+        self.by_method = {}
+
+    def record(self, method, status, duration):
+        self.count += 1
+        self.total += duration
+        if duration > self.max:
+            self.max = duration
+        self.buckets[bisect_left(LATENCY_BOUNDS, duration)] += 1
+        self.by_status[status] = self.by_status.get(status, 0) + 1
+        self.by_method[method] = self.by_method.get(method, 0) + 1
+
+    def merge(self, other):
+        """Add another EndpointStats into this one"""
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        buckets = self.buckets
+        for index, value in enumerate(other.buckets):
+            if value:
+                buckets[index] += value
+        for status, value in list(other.by_status.items()):
+            self.by_status[status] = self.by_status.get(status, 0) + value
+        for method, value in list(other.by_method.items()):
+            self.by_method[method] = self.by_method.get(method, 0) + value
+        return self
+
+    def percentile(self, q):
+        """
+        Latency at quantile ``q`` (0-1), as the upper bound of its bucket
+
+        Returns:
+            float: Seconds, or None if nothing was recorded
+        """
+        if not self.count:
+            return None
+        rank = max(1, int(q * self.count + 0.999999))
+        seen = 0
+        for index, value in enumerate(self.buckets):
+            seen += value
+            if seen >= rank:
+                upper = LATENCY_BOUNDS[index] if index < len(LATENCY_BOUNDS) else self.max
+                return min(upper, self.max)
+        return self.max
+
+    def summary(self):
+        summary = {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else None,
+            'max': self.max,
+        }
+        for q in PERCENTILES:
+            summary[f'p{int(q * 100)}'] = self.percentile(q)
+        return summary
+
+
+class MetricsSnapshot:
+    """Point-in-time metrics; snapshots from threads or processes merge by addition"""
+
+    def __init__(self, endpoints=None, errors=None, payloads=None):
+        self.endpoints = endpoints if endpoints is not None else {}
+        self.errors = errors if errors is not None else {}
+        # (endpoint, encoding) -> [responses, plain JSON bytes, bytes sent]
+        self.payloads = payloads if payloads is not None else {}
+
+    def merge(self, other):
+        """Add another snapshot (or a live shard) into this one"""
+        for endpoint, stats in list(other.endpoints.items()):
+            mine = self.endpoints.get(endpoint)
+            if mine is None:
+                mine = self.endpoints[endpoint] = EndpointStats()
+            mine.merge(stats)
+        for error_type, value in list(other.errors.items()):
+            self.errors[error_type] = self.errors.get(error_type, 0) + value
+        for key, values in list(other.payloads.items()):
+            mine = self.payloads.get(key)
+            if mine is None:
+                mine = self.payloads[key] = [0, 0, 0]
+            for index, value in enumerate(values):
+                mine[index] += value
+        return self
+
+    @property
+    def total(self):
+        return sum(stats.count for stats in self.endpoints.values())
+
+    def to_dict(self):
+        by_method, by_status = {}, {}
+        for stats in self.endpoints.values():
+            for method, value in stats.by_method.items():
+                by_method[method] = by_method.get(method, 0) + value
+            for status, value in stats.by_status.items():
+                by_status[str(status)] = by_status.get(str(status), 0) + value
+        payloads = {}
+        for (endpoint, encoding), (responses, plain, sent) in self.payloads.items():
+            payloads.setdefault(endpoint, {})[encoding] = {
+                'responses': responses,
+                'json_bytes': plain,
+                'sent_bytes': sent,
+                'saved_ratio': 1 - sent / plain if plain else 0.0,
+            }
+        return {
+            'requests': {
+                'total': self.total,
+                'by_endpoint': {endpoint: stats.count for endpoint, stats in self.endpoints.items()},
+                'by_method': by_method,
+                'by_status': by_status,
+            },
+            'latency': {endpoint: stats.summary() for endpoint, stats in self.endpoints.items()},
+            'errors_by_type': dict(self.errors),
+            'payloads': payloads,
+        }
+
+
+class _Shard(MetricsSnapshot):
+    """Metrics written by a single thread"""
+
+    def __init__(self, epoch):
+        super().__init__()
+        self.epoch = epoch
+
+
+class _ThreadToken:
+    """Held only by a thread's local storage; collected when the thread exits"""
+
+
+class RequestMetrics:
+    """Lock-free request metrics; writers only touch their own thread's shard"""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = []
+        self._retired = MetricsSnapshot()
+        self._shards_lock = threading.Lock()
+        self._epoch = 0
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None or shard.epoch != self._epoch:
+            # First request on this thread, or the first since a reset
+            shard = _Shard(self._epoch)
+            with self._shards_lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+            self._local.token = token = _ThreadToken()
+            weakref.finalize(token, self._retire, shard)
+        return shard
+
+    def _retire(self, shard):
+        """Fold the shard of an exited thread (or a replaced one) into the retired total"""
+        with self._shards_lock:
+            try:
+                self._shards.remove(shard)
+            except ValueError:
+                return  # dropped by a reset
+            if shard.epoch == self._epoch:
+                self._retired.merge(shard)
+
+    def record_request(self, endpoint, method, status, duration):
+        endpoints = self._shard().endpoints
+        stats = endpoints.get(endpoint)
+        if stats is None:
+            stats = endpoints[endpoint] = EndpointStats()
+        stats.record(method, status, duration)
+
+    def record_error(self, error_type):
+        errors = self._shard().errors
+        errors[error_type] = errors.get(error_type, 0) + 1
+
+    def record_payload(self, endpoint, encoding, plain_bytes, sent_bytes):
+        payloads = self._shard().payloads
+        values = payloads.get((endpoint, encoding))
+        if values is None:
+            values = payloads[(endpoint, encoding)] = [0, 0, 0]
+        values[0] += 1
+        values[1] += plain_bytes
+        values[2] += sent_bytes
+
+    def snapshot(self):
+        """Merge every thread's shard into a new MetricsSnapshot"""
+        # A shard retired after the copy is still merged once, from the copied list
+        with self._shards_lock:
+            epoch = self._epoch
+            snapshot = MetricsSnapshot().merge(self._retired)
+            shards = list(self._shards)
+        for shard in shards:
+            if shard.epoch == epoch:
+                snapshot.merge(shard)
+        return snapshot
+
+    def reset(self):
+        """Start a new epoch; each thread opens a fresh shard on its next request"""
+        with self._shards_lock:
+            self._epoch += 1
+            self._shards = []
+            self._retired = MetricsSnapshot()
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_prometheus(snapshot):
+    """
+    Render a snapshot in the Prometheus text exposition format
+
+    Args:
+        snapshot: MetricsSnapshot (one worker or merged across workers)
+
+    Returns:
+        str: text/plain; version=0.0.4 body
+    """
+    lines = [
+        '# HELP http_requests_total Requests handled, by endpoint and status code.',
+        '# TYPE http_requests_total counter',
+    ]
+    endpoints = sorted(snapshot.endpoints.items())
+    for endpoint, stats in endpoints:
+        for status, value in sorted(stats.by_status.items()):
+            lines.append(f'http_requests_total{{endpoint="{_label(endpoint)}",status="{status}"}} {value}')
+
+    lines += [
+        '# HELP http_request_duration_seconds Request latency, by endpoint.',
+        '# TYPE http_request_duration_seconds histogram',
+    ]
+    for endpoint, stats in endpoints:
+        label = _label(endpoint)
+        cumulative = 0
+        for bound, value in zip(LATENCY_BOUNDS, stats.buckets):
+            cumulative += value
+            lines.append(f'http_request_duration_seconds_bucket{{endpoint="{label}",le="{bound:.6g}"}} {cumulative}')
+        lines.append(f'http_request_duration_seconds_bucket{{endpoint="{label}",le="+Inf"}} {stats.count}')
+        lines.append(f'http_request_duration_seconds_sum{{endpoint="{label}"}} {stats.total:.6f}')
+        lines.append(f'http_request_duration_seconds_count{{endpoint="{label}"}} {stats.count}')
+
+    lines += [
+        '# HELP http_request_errors_total Unhandled exceptions, by type.',
+        '# TYPE http_request_errors_total counter',
+    ]
+    for error_type, value in sorted(snapshot.errors.items()):
+        lines.append(f'http_request_errors_total{{type="{_label(error_type)}"}} {value}')
+
+    payloads = sorted(snapshot.payloads.items())
+    for name, index, help_text in (
+            ('http_response_json_bytes_total', 1, 'Size of negotiated responses as plain JSON.'),
+            ('http_response_sent_bytes_total', 2, 'Bytes sent for negotiated responses, after encoding.')):
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+        for (endpoint, encoding), values in payloads:
+            lines.append(f'{name}{{endpoint="{_label(endpoint)}",encoding="{_label(encoding)}"}} {values[index]}')
+
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,292 @@
+"""Cross-worker metrics through per-process mmap'd files.
+
+With several gunicorn workers each process only sees its own requests. When
+``METRICS_MULTIPROC_DIR`` is set, every worker periodically copies its
+in-memory ``RequestMetrics`` into ``worker-<pid>.metrics`` in that directory,
+and any worker can merge all the files into one cluster-wide snapshot.
+
+File layout (little-endian)::
+
+    header: magic b'CDM1', version u32, epoch u64, pid u64, used u64
+    record: key length u32, value count u32, key (padded to 8), float64 values
+
+Records are only ever appended and then overwritten in place, and ``used`` is
+bumped after a record is complete, so readers never see a partial record.
+Resets bump a shared epoch (the ``epoch`` file); files from an older epoch are
+ignored until their worker notices and starts over.
+
+Files of workers that have exited are deleted: by the gunicorn ``child_exit``
+hook (``mark_process_dead``), and by ``collect`` for any file whose PID is no
+longer running. ``on_starting`` calls ``start_fresh``, so a restart does not
+merge files left by the previous master. The directory must therefore be
+private to one host, since PIDs are only meaningful there.
+"""
+import glob
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+
+from app.utils.metrics import LATENCY_BOUNDS, EndpointStats, MetricsSnapshot
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'CDM1'
+VERSION = 1
+HEADER = struct.Struct('<4sIQQQ')
+RECORD = struct.Struct('<II')
+SEPARATOR = '\x1f'
+
+_REQUEST_VALUES = 3 + len(LATENCY_BOUNDS) + 1  # count, total, max, buckets
+
+
+def _padded(length):
+    return (length + 7) & ~7
+
+
+def _pid_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _worker_path(directory, pid):
+    return os.path.join(directory, f'worker-{pid}.metrics')
+
+
+class WorkerMetricsFile:
+    """Single-writer mmap'd metrics file for one worker process"""
+
+    def __init__(self, path, epoch=0, initial_size=64 * 1024):
+        self.path = path
+        self._file = open(path, 'w+b')
+        self._size = max(initial_size, HEADER.size)
+        self._file.truncate(self._size)
+        self._map = mmap.mmap(self._file.fileno(), self._size)
+        self._offsets = {}
+        self._used = 0
+        self.epoch = epoch
+        self._write_header()
+
+    def _write_header(self):
+        HEADER.pack_into(self._map, 0, MAGIC, VERSION, self.epoch, os.getpid(), self._used)
+
+    def _grow(self, needed):
+        size = self._size
+        while size < needed:
+            size *= 2
+        self._map.close()
+        self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), size)
+        self._size = size
+
+    def _put(self, key, values):
+        offset = self._offsets.get(key)
+        if offset is None:
+            encoded = key.encode('utf-8')
+            start = HEADER.size + self._used
+            offset = start + RECORD.size + _padded(len(encoded))
+            end = offset + 8 * len(values)
+            if end > self._size:
+                self._grow(end)
+            RECORD.pack_into(self._map, start, len(encoded), len(values))
+            self._map[start + RECORD.size:start + RECORD.size + len(encoded)] = encoded
+            struct.pack_into(f'<{len(values)}d', self._map, offset, *values)
+            self._offsets[key] = offset
+            self._used = end - HEADER.size
+            self._write_header()
+            return
+        struct.pack_into(f'<{len(values)}d', self._map, offset, *values)
+
+    def write_snapshot(self, snapshot, epoch):
+        """Write a worker's cumulative snapshot, starting over on a new epoch"""
+        if epoch != self.epoch:
+            self.epoch = epoch
+            self._offsets.clear()
+            self._used = 0
+            self._write_header()
+
+        for endpoint, stats in list(snapshot.endpoints.items()):
+            self._put(f'req{SEPARATOR}{endpoint}', (stats.count, stats.total, stats.max, *stats.buckets))
+            for status, value in list(stats.by_status.items()):
+                self._put(f'status{SEPARATOR}{endpoint}{SEPARATOR}{status}', (value,))
+            for method, value in list(stats.by_method.items()):
+                self._put(f'method{SEPARATOR}{endpoint}{SEPARATOR}{method}', (value,))
+        for error_type, value in list(snapshot.errors.items()):
+            self._put(f'error{SEPARATOR}{error_type}', (value,))
+        for (endpoint, encoding), values in list(snapshot.payloads.items()):
+            self._put(f'payload{SEPARATOR}{endpoint}{SEPARATOR}{encoding}', tuple(values))
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+def read_metrics_file(path):
+    """
+    Parse a worker metrics file
+
+    Returns:
+        tuple: (epoch, pid, MetricsSnapshot)
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, version, epoch, pid, used = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Not a metrics file: {path}")
+
+    snapshot = MetricsSnapshot()
+
+    def endpoint_stats(endpoint):
+        stats = snapshot.endpoints.get(endpoint)
+        if stats is None:
+            stats = snapshot.endpoints[endpoint] = EndpointStats()
+        return stats
+
+    position, end = HEADER.size, min(HEADER.size + used, len(data))
+    while position + RECORD.size <= end:
+        key_length, count = RECORD.unpack_from(data, position)
+        key_start = position + RECORD.size
+        offset = key_start + _padded(key_length)
+        if offset + 8 * count > end:
+            break
+        kind, _, name = data[key_start:key_start + key_length].decode('utf-8').partition(SEPARATOR)
+        values = struct.unpack_from(f'<{count}d', data, offset)
+        position = offset + 8 * count
+
+        if kind == 'req' and count == _REQUEST_VALUES:
+            stats = endpoint_stats(name)
+            stats.count, stats.total, stats.max = int(values[0]), values[1], values[2]
+            stats.buckets = [int(value) for value in values[3:]]
+        elif kind == 'status':
+            endpoint, _, status = name.rpartition(SEPARATOR)
+            endpoint_stats(endpoint).by_status[int(status)] = int(values[0])
+        elif kind == 'method':
+            endpoint, _, method = name.rpartition(SEPARATOR)
+            endpoint_stats(endpoint).by_method[method] = int(values[0])
+        elif kind == 'error':
+            snapshot.errors[name] = int(values[0])
+        elif kind == 'payload' and count == 3:
+            endpoint, _, encoding = name.rpartition(SEPARATOR)
+            snapshot.payloads[(endpoint, encoding)] = [int(value) for value in values]
+
+    return epoch, pid, snapshot
+
+
+class MultiProcessMetrics:
+    """Publishes this worker's metrics to a shared directory and merges all workers"""
+
+    def __init__(self, directory, flush_interval=1.0):
+        """
+        Args:
+            directory: Directory shared by every worker (e.g. on tmpfs)
+            flush_interval: Minimum seconds between flushes on the request path
+        """
+        self.directory = directory
+        self.flush_interval = flush_interval
+        os.makedirs(directory, exist_ok=True)
+        self._file = None
+        self._pid = None
+        self._epoch = None
+        self._last_flush = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def epoch_path(self):
+        return os.path.join(self.directory, 'epoch')
+
+    def read_epoch(self):
+        try:
+            with open(self.epoch_path) as f:
+                return int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _worker_file(self, epoch):
+        pid = os.getpid()
+        if self._file is None or self._pid != pid:
+            # First flush, or we were forked from a process that already had a file
+            self._file = WorkerMetricsFile(_worker_path(self.directory, pid), epoch)
+            self._pid = pid
+        return self._file
+
+    def maybe_flush(self, metrics):
+        """Flush if ``flush_interval`` has passed; cheap enough for every request"""
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush(metrics)
+
+    def flush(self, metrics):
+        """Copy a RequestMetrics into this worker's file (skipped if another thread is flushing)"""
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._last_flush = time.monotonic()
+            epoch = self.read_epoch()
+            if self._epoch is not None and epoch != self._epoch:
+                metrics.reset()
+            self._epoch = epoch
+            self._worker_file(epoch).write_snapshot(metrics.snapshot(), epoch)
+        except Exception as e:
+            logger.error(f"Error flushing metrics: {str(e)}")
+        finally:
+            self._lock.release()
+
+    def collect(self):
+        """
+        Merge the files of every running worker for the current epoch
+
+        Returns:
+            tuple: (MetricsSnapshot, number of worker files merged)
+        """
+        epoch = self.read_epoch()
+        merged, workers = MetricsSnapshot(), 0
+        for path in glob.glob(os.path.join(self.directory, 'worker-*.metrics')):
+            try:
+                file_epoch, pid, snapshot = read_metrics_file(path)
+            except (OSError, ValueError, struct.error) as e:
+                logger.warning(f"Skipping metrics file {path}: {str(e)}")
+                continue
+            if not _pid_running(pid):
+                # Left by a worker that exited without the child_exit hook running
+                _remove(path)
+                continue
+            if file_epoch == epoch:
+                merged.merge(snapshot)
+                workers += 1
+        return merged, workers
+
+    def reset(self):
+        """Start a new epoch for every worker"""
+        epoch = self.read_epoch() + 1
+        tmp_path = f'{self.epoch_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(str(epoch))
+        os.replace(tmp_path, self.epoch_path)
+        # The caller resets its own RequestMetrics; don't reset it again on the next flush
+        self._epoch = epoch
+
+
+def mark_process_dead(directory, pid):
+    """Delete an exited worker's file (gunicorn ``child_exit`` hook)"""
+    _remove(_worker_path(directory, pid))
+
+
+def start_fresh(directory):
+    """Delete every worker file and start a new epoch (gunicorn ``on_starting`` hook)"""
+    os.makedirs(directory, exist_ok=True)
+    for path in glob.glob(os.path.join(directory, 'worker-*.metrics')):
+        _remove(path)
+    MultiProcessMetrics(directory).reset()
@@ -1,63 +1,79 @@
-from flask import current_app
-import requests
-import json
 import os
 import base64
 from datetime import datetime, timedelta
 from werkzeug.utils import secure_filename
 
-def send_push_notification(user_ids, title, message, data=None):
-    """Send push notification to mobile app users
+def send_push_notification(user_ids, title, message, data=None, collapse_key=None):
+    """Queue a push notification to mobile app users
+    
+    Delivery happens in the background (see ``app.utils.push_dispatch``).
     
     Args:
         user_ids (list): List of user IDs to notify
         title (str): Notification title
         message (str): Notification message
         data (dict, optional): Additional data to send
+        collapse_key (str, optional): Merge with a queued notification that has the same key
     
     Returns:
-        bool: Success status
+        bool: True if the notification was queued
     """
-    try:
-        # Configure your push notification service (Firebase, OneSignal, etc.)
-        push_service_url = current_app.config.get('PUSH_SERVICE_URL')
-        api_key = current_app.config.get('PUSH_API_KEY')
-        
-        if not push_service_url or not api_key:
-            current_app.logger.error("Push notification service not configured")
-            return False
-        
-        headers = {
-            'Authorization': f'Bearer {api_key}',
-            'Content-Type': 'application/json'
-        }
-        
-        payload = {
-            'user_ids': user_ids,
-            'notification': {
-                'title': title,
-                'body': message
-            }
-        }
-        
-        if data:
-            payload['data'] = data
-        
-        response = requests.post(
-            push_service_url,
-            headers=headers,
-            data=json.dumps(payload)
-        )
-        
-        if response.status_code == 200:
-            return True
-        else:
-            current_app.logger.error(f"Push notification failed: {response.text}")
-            return False
-            
-    except Exception as e:
-        current_app.logger.error(f"Error sending push notification: {str(e)}")
-        return False
+    from app.extensions import push_dispatcher
+    
+    return push_dispatcher.send(user_ids, title, message, data, collapse_key=collapse_key)
+
+NOTIFICATION_PREFERENCE_FIELDS = (
+    'daily_reports', 'rfis', 'submittals', 'safety_incidents', 'punchlist_items',
+    'change_orders', 'project_updates', 'push_enabled', 'email_enabled'
+)
+
+def get_user_notification_preferences(user_id):
+    """Return a user's notification settings (all enabled until they change one)"""
+    from app.models.user import NotificationPreference
+    
+    preferences = NotificationPreference.query.filter_by(user_id=user_id).first()
+    return {
+        'success': True,
+        'preferences': {field: getattr(preferences, field) if preferences else True
+                        for field in NOTIFICATION_PREFERENCE_FIELDS}
+    }
+
+def update_user_notification_preferences(user_id, data):
+    """Update the notification settings present in ``data`` (unknown keys are ignored)"""
+    from app.extensions import db
+    from app.models.user import NotificationPreference
+    
+    preferences = NotificationPreference.query.filter_by(user_id=user_id).first()
+    if preferences is None:
+        preferences = NotificationPreference(user_id=user_id)
+        db.session.add(preferences)
+    for field in NOTIFICATION_PREFERENCE_FIELDS:
+        if field in data:
+            setattr(preferences, field, bool(data[field]))
+    db.session.commit()
+    return get_user_notification_preferences(user_id)
+
+DEVICE_PLATFORMS = ('ios', 'android')
+
+def register_device_token(user_id, token, platform):
+    """Record the push token of a user's device (a token seen on another account moves to this one)"""
+    from app.extensions import db
+    from app.models.user import DeviceToken
+    
+    if platform not in DEVICE_PLATFORMS:
+        return {'success': False, 'error': f"platform must be one of: {', '.join(DEVICE_PLATFORMS)}"}
+    if not isinstance(token, str) or len(token) > DeviceToken.__table__.c.token.type.length:
+        return {'success': False, 'error': 'Invalid device token'}
+    
+    device = DeviceToken.query.filter_by(token=token).first()
+    if device is None:
+        device = DeviceToken(token=token)
+        db.session.add(device)
+    device.user_id = user_id
+    device.platform = platform
+    device.last_seen = datetime.utcnow()
+    db.session.commit()
+    return {'success': True, 'device_id': device.id}
 
 def notify_rfi_assigned(rfi_id, assigned_user_id):
     """Notify user when RFI is assigned to them"""
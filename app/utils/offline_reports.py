@@ -0,0 +1,237 @@
+"""Batch ingest of daily reports written offline on the mobile app.
+
+A crew back in coverage sends every queued report at once, each with its
+labor and equipment entries and a ``client_uuid`` generated on the device.
+The whole batch is checked before anything is written: a report that fails
+validation, names a project the user cannot see or repeats a UUID already
+in the batch gets its own result and does not stop the others.
+
+The valid reports are then written in one transaction with a fixed number
+of statements - one multi-row INSERT per table plus the lookups around
+them - instead of an INSERT and commit per row. The UUID is stored on the
+report (unique per user), so a batch resent after a dropped response
+returns the reports it already created rather than duplicating them.
+Photos follow separately through ``/upload-photo`` with the returned
+``report_id`` as ``daily_report_id``.
+
+The rows bypass the session events, so the reports are inserted with
+``change_seq`` 0 and numbered here as the last step before the commit (see
+``app.utils.sync``).
+"""
+import logging
+import uuid
+from datetime import date, datetime
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+
+from app.extensions import db
+from app.utils.sync import stamp_change_seqs
+
+logger = logging.getLogger(__name__)
+
+REPORT_FIELDS = (
+    'report_number', 'report_date', 'weather_condition', 'temperature_low', 'temperature_high',
+    'precipitation', 'wind_speed', 'site_conditions', 'work_status', 'delay_reason', 'labor_count',
+    'labor_hours', 'equipment_count', 'work_performed', 'materials_received', 'issues', 'notes',
+    'is_submitted'
+)
+LABOR_FIELDS = ('company', 'work_description', 'worker_count', 'hours_worked')
+EQUIPMENT_FIELDS = ('equipment_type', 'count', 'hours_used', 'notes')
+MAX_ENTRIES = 100
+
+
+class ReportError(ValueError):
+    """A report in the batch that cannot be stored"""
+
+
+def _value(model, name, value):
+    """Check a client value against the column it is stored in"""
+    if value is None:
+        return None
+    column_type = model.__table__.c[name].type
+    kind = column_type.python_type
+    if kind is str:
+        if not isinstance(value, str):
+            raise ReportError(f'{name} must be a string')
+        if column_type.length and len(value) > column_type.length:
+            raise ReportError(f'{name} must be at most {column_type.length} characters')
+    elif kind is bool:
+        if not isinstance(value, bool):
+            raise ReportError(f'{name} must be true or false')
+    elif kind in (int, float):
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or (kind is int and not float(value).is_integer()):
+            raise ReportError(f'{name} must be a number')
+        value = kind(value)
+    elif kind is date:
+        try:
+            value = date.fromisoformat(value)
+        except (TypeError, ValueError):
+            raise ReportError(f'{name} must be a date (YYYY-MM-DD)')
+    return value
+
+
+def _defaults(model, fields):
+    """Column defaults for fields the client left out (every row needs the same keys)"""
+    defaults = {}
+    for name in fields:
+        default = model.__table__.c[name].default
+        defaults[name] = default.arg if default is not None and default.is_scalar else None
+    return defaults
+
+
+def _entries(model, item, key, fields):
+    entries = item.get(key) or []
+    if not isinstance(entries, list) or not all(isinstance(entry, dict) for entry in entries):
+        raise ReportError(f'{key} must be a list of objects')
+    if len(entries) > MAX_ENTRIES:
+        raise ReportError(f'At most {MAX_ENTRIES} {key} are allowed per report')
+    return [{name: _value(model, name, entry.get(name)) for name in fields} for entry in entries]
+
+
+def _parse(item):
+    """Validate one report of the batch"""
+    from app.models.field import DailyReport, EquipmentEntry, LaborEntry, WorkStatus
+
+    if not isinstance(item, dict):
+        raise ReportError('Each report must be an object')
+    try:
+        client_uuid = str(uuid.UUID(str(item.get('client_uuid'))))
+    except ValueError:
+        raise ReportError('client_uuid must be a UUID')
+    if not isinstance(item.get('project_id'), int) or isinstance(item.get('project_id'), bool):
+        raise ReportError('project_id is required')
+    if not item.get('report_date'):
+        raise ReportError('report_date is required')
+
+    fields = {name: _value(DailyReport, name, item.get(name)) for name in REPORT_FIELDS if item.get(name) is not None}
+    if fields.get('work_status') not in (None, *(status.value for status in WorkStatus)):
+        raise ReportError(f"Unknown work_status '{fields['work_status']}'")
+    labor = _entries(LaborEntry, item, 'labor_entries', LABOR_FIELDS)
+    equipment = _entries(EquipmentEntry, item, 'equipment_entries', EQUIPMENT_FIELDS)
+    # Totals the client did not send are taken from its entries
+    if labor:
+        fields.setdefault('labor_count', sum(entry['worker_count'] or 0 for entry in labor))
+        fields.setdefault('labor_hours', sum(entry['hours_worked'] or 0 for entry in labor))
+    if equipment:
+        fields.setdefault('equipment_count', sum(entry['count'] or 0 for entry in equipment))
+    return {'client_uuid': client_uuid, 'project_id': item['project_id'], 'fields': fields,
+            'labor': labor, 'equipment': equipment}
+
+
+def _stored_ids(user_id, client_uuids):
+    """client_uuid -> report ID of the user's reports already stored under those UUIDs"""
+    from app.models.field import DailyReport
+
+    if not client_uuids:
+        return {}
+    rows = db.session.execute(select(DailyReport.client_uuid, DailyReport.id).where(
+        DailyReport.created_by == user_id, DailyReport.client_uuid.in_(client_uuids)))
+    return dict(rows.all())
+
+
+def _insert(reports, user_id, project_numbers):
+    """
+    Insert new reports and their entries (the caller commits)
+
+    Returns:
+        dict: client_uuid -> new report ID
+    """
+    from app.models.field import DailyReport, EquipmentEntry, LaborEntry
+
+    if not reports:
+        return {}
+    now = datetime.utcnow()
+    defaults = _defaults(DailyReport, REPORT_FIELDS)
+    rows = []
+    for report in reports:
+        row = {**defaults, **report['fields']}
+        if not row['report_number']:
+            row['report_number'] = f"{project_numbers[report['project_id']]}-DR-" \
+                                   f"{row['report_date']:%Y%m%d}-{report['client_uuid'][:8].upper()}"
+        row.update(project_id=report['project_id'], client_uuid=report['client_uuid'], created_by=user_id,
+                   submitted_at=now if row['is_submitted'] else None, created_at=now, updated_at=now,
+                   change_seq=0)
+        rows.append(row)
+    db.session.execute(insert(DailyReport), rows)
+
+    report_ids = _stored_ids(user_id, [report['client_uuid'] for report in reports])
+    labor = [{**entry, 'daily_report_id': report_ids[report['client_uuid']]}
+             for report in reports for entry in report['labor']]
+    equipment = [{**entry, 'daily_report_id': report_ids[report['client_uuid']]}
+                 for report in reports for entry in report['equipment']]
+    if labor:
+        db.session.execute(insert(LaborEntry), labor)
+    if equipment:
+        db.session.execute(insert(EquipmentEntry), equipment)
+    # Last, so the sync counter is locked only until the commit
+    stamp_change_seqs(db.session, DailyReport, [report_ids[report['client_uuid']] for report in reports])
+    return report_ids
+
+
+def process_offline_daily_reports(reports, user_id):
+    """
+    Store a batch of daily reports created offline
+
+    Args:
+        reports: List of report objects, each with ``client_uuid``,
+            ``project_id``, ``report_date``, optional DailyReport fields and
+            optional ``labor_entries``/``equipment_entries`` lists
+        user_id: ID of the submitting user
+
+    Returns:
+        dict: ``success`` (every report is stored) and ``results``, one per
+            report in request order with ``report_id`` and ``duplicate``
+            (it was stored by an earlier request) or an ``error``
+    """
+    from app.models.project import Project
+    from app.models.user import User
+    from app.utils.visible_projects import visible_project_ids
+
+    results = [None] * len(reports)
+    parsed = []
+    for index, item in enumerate(reports):
+        try:
+            parsed.append((index, _parse(item)))
+        except ReportError as e:
+            client_uuid = item.get('client_uuid') if isinstance(item, dict) else None
+            results[index] = {'client_uuid': client_uuid, 'success': False, 'error': str(e)}
+
+    project_numbers = dict(db.session.execute(select(Project.id, Project.number).where(
+        Project.id.in_({report['project_id'] for _, report in parsed}))).all()) if parsed else {}
+    visible = visible_project_ids(db.session.get(User, user_id))
+    pending, repeats = {}, []
+    for index, report in parsed:
+        client_uuid = report['client_uuid']
+        if report['project_id'] not in project_numbers:
+            results[index] = {'client_uuid': client_uuid, 'success': False, 'error': 'Project not found'}
+        elif visible is not None and report['project_id'] not in visible:
+            results[index] = {'client_uuid': client_uuid, 'success': False,
+                              'error': 'You do not have access to this project'}
+        elif client_uuid in pending:
+            repeats.append((index, client_uuid))
+        else:
+            pending[client_uuid] = (index, report)
+
+    for attempt in range(2):
+        stored = _stored_ids(user_id, list(pending))
+        try:
+            created = _insert([report for client_uuid, (_, report) in pending.items() if client_uuid not in stored],
+                              user_id, project_numbers)
+            db.session.commit()
+            break
+        except IntegrityError:
+            # A concurrent resend of the same batch stored some of them first
+            db.session.rollback()
+            if attempt:
+                raise
+
+    for client_uuid, (index, _) in pending.items():
+        duplicate = client_uuid in stored
+        results[index] = {'client_uuid': client_uuid, 'success': True, 'duplicate': duplicate,
+                          'report_id': stored[client_uuid] if duplicate else created[client_uuid]}
+    for index, client_uuid in repeats:
+        results[index] = {**results[pending[client_uuid][0]], 'duplicate': True}
+    if created:
+        logger.info(f"Stored {len(created)} offline daily reports for user {user_id}")
+    return {'success': all(result['success'] for result in results), 'results': results}
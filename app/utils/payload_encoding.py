@@ -0,0 +1,170 @@
+"""Content negotiation for compact, compressed API payloads.
+
+Mobile clients on slow links can ask for a smaller body than plain JSON:
+
+* ``Accept: application/vnd.cd.columnar+json`` - columnar JSON (below)
+* ``Accept: application/msgpack`` - the same columnar document as MessagePack
+  (when the ``msgpack`` package is installed)
+* ``Accept-Encoding: zstd`` or ``gzip`` - compression of bodies of at least
+  ``API_COMPRESS_MIN_BYTES`` (zstd needs the ``zstandard`` package)
+
+Anything else gets the plain JSON it always did.
+
+In the columnar document every list of objects becomes::
+
+    {"$rows": 3, "$columns": {"id": [1, 2, 3], "status": <column>, ...}}
+
+where a column is either a plain list of values (nested lists of objects
+are converted the same way), ``{"$dict": ["open", "closed"], "$codes": [0,
+0, 1]}`` for strings that repeat (``null`` codes are null values), or
+``{"$ts": [1709251200000, null, ...]}`` for ISO timestamps sent as epoch
+milliseconds (naive timestamps are UTC). Keys missing from some objects are
+null in their column.
+
+Each response records its plain-JSON size and the bytes actually sent in
+the request metrics, so the savings show up on the monitoring endpoints.
+"""
+import gzip
+import logging
+import re
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import Response, current_app, request
+
+logger = logging.getLogger(__name__)
+
+JSON = 'application/json'
+COLUMNAR_JSON = 'application/vnd.cd.columnar+json'
+MSGPACK = 'application/msgpack'
+
+_TIMESTAMP = re.compile(r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(\.\d+)?([+-]\d{2}:\d{2})?$')
+
+
+def _msgpack():
+    try:
+        import msgpack
+    except ImportError:
+        return None
+    return msgpack
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+def _epoch_millis(value):
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp() * 1000)
+
+
+def _encode_column(values):
+    strings = [value for value in values if value is not None]
+    if not strings or not all(isinstance(value, str) for value in strings):
+        return [compact(value) for value in values]
+    if all(_TIMESTAMP.match(value) for value in strings):
+        return {'$ts': [None if value is None else _epoch_millis(value) for value in values]}
+
+    codes = {}
+    for value in strings:
+        codes.setdefault(value, len(codes))
+    # Worth it once the average string is used twice
+    if len(codes) * 2 > len(strings):
+        return values
+    return {'$dict': list(codes), '$codes': [None if value is None else codes[value] for value in values]}
+
+
+def compact(data):
+    """
+    Convert a JSON-ready value to the columnar layout
+
+    Args:
+        data: dict/list/scalar as it would be passed to jsonify
+
+    Returns:
+        The columnar equivalent (scalars are unchanged)
+    """
+    if isinstance(data, dict):
+        return {key: compact(value) for key, value in data.items()}
+    if isinstance(data, list):
+        if data and all(isinstance(item, dict) for item in data):
+            keys = {}
+            for item in data:
+                keys.update(dict.fromkeys(item))
+            return {
+                '$rows': len(data),
+                '$columns': {key: _encode_column([item.get(key) for item in data]) for key in keys},
+            }
+        return [compact(item) for item in data]
+    return data
+
+
+def _msgpack_default(value):
+    # Only reached for types the serializers left alone (e.g. Decimal)
+    return str(value)
+
+
+def _compress(body, config):
+    if len(body) < config.get('API_COMPRESS_MIN_BYTES', 1024):
+        return body, None
+    offered = ['zstd', 'gzip'] if _zstd() is not None else ['gzip']
+    coding = request.accept_encodings.best_match(offered)
+    if coding == 'zstd':
+        return _zstd().ZstdCompressor(level=config.get('API_ZSTD_LEVEL', 3)).compress(body), coding
+    if coding == 'gzip':
+        return gzip.compress(body, compresslevel=config.get('API_GZIP_LEVEL', 6)), coding
+    return body, None
+
+
+def encode_response(data, status=200):
+    """
+    Build the response for ``data`` in the format and compression the client accepts
+
+    Args:
+        data: JSON-ready dict
+        status: HTTP status code
+
+    Returns:
+        flask.Response
+    """
+    from app.extensions import monitor
+
+    app = current_app._get_current_object()
+    plain = app.json.dumps(data, separators=(',', ':')).encode('utf-8')
+    offered = [JSON, COLUMNAR_JSON] + ([MSGPACK] if _msgpack() is not None else [])
+    mimetype = request.accept_mimetypes.best_match(offered, default=JSON)
+
+    if mimetype == MSGPACK:
+        body = _msgpack().packb(compact(data), default=_msgpack_default)
+    elif mimetype == COLUMNAR_JSON:
+        body = app.json.dumps(compact(data), separators=(',', ':')).encode('utf-8')
+    else:
+        body = plain
+    body, coding = _compress(body, app.config)
+
+    response = Response(body, status=status, mimetype=mimetype)
+    response.vary.update(('Accept', 'Accept-Encoding'))
+    label = {JSON: 'json', COLUMNAR_JSON: 'columnar', MSGPACK: 'msgpack'}[mimetype]
+    if coding:
+        response.headers['Content-Encoding'] = coding
+        label = f'{label}+{coding}'
+    monitor.record_payload(request.endpoint, label, len(plain), len(body))
+    return response
+
+
+def negotiated(view):
+    """Encode a view's dict result with ``encode_response`` (other return values pass through)"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        rv = view(*args, **kwargs)
+        body, status = rv if isinstance(rv, tuple) else (rv, 200)
+        if not isinstance(body, dict):
+            return rv
+        return encode_response(body, status)
+    return wrapper
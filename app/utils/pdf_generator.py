@@ -1,28 +1,301 @@
-from flask import render_template
-#import weasyprint
+"""PDF rendering with WeasyPrint.
+
+``generate_pdf`` renders synchronously. Slow documents (daily reports with
+photos) go through the job pipeline instead: the HTML is rendered in the
+request, converted to PDF in a process pool, and stored content-addressed
+under ``PDF_CACHE_DIR`` so repeat downloads are served from disk with an ETag.
+
+Job state lives next to the output, so any worker can answer a job URL:
+
+* ``<key>.pdf``   - finished document
+* ``<key>.job``   - a render is in progress (stale after ``PDF_JOB_TIMEOUT``)
+* ``<key>.error`` - the last render failed
+"""
+import hashlib
+import importlib.util
+import logging
+import mimetypes
+import os
+import pathlib
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
 from io import BytesIO
+from urllib.parse import unquote, urlsplit
+
+from flask import current_app, render_template, send_file
+from jinja2 import meta
+from werkzeug.security import safe_join
+
+logger = logging.getLogger(__name__)
+
+_KEY_PATTERN = re.compile(r'[0-9a-f]{64}')
+_executor = None
+_template_hashes = {}
+
+
+def pdf_rendering_available():
+    """True if WeasyPrint is installed"""
+    return importlib.util.find_spec('weasyprint') is not None
+
+
+def _static_url_fetcher(static_folder):
+    """URL fetcher that reads ``/static/...`` from disk instead of over HTTP"""
+    from weasyprint import default_url_fetcher
+
+    def fetch(url):
+        path = unquote(urlsplit(url).path)
+        if static_folder and path.startswith('/static/'):
+            local_path = safe_join(static_folder, path[len('/static/'):])
+            if local_path and os.path.isfile(local_path):
+                return {
+                    'file_obj': open(local_path, 'rb'),
+                    'mime_type': mimetypes.guess_type(local_path)[0],
+                    'redirected_url': url
+                }
+        return default_url_fetcher(url)
+
+    return fetch
+
+
+def pdf_photo_src(photo, size='medium'):
+    """
+    ``file://`` URL of a project photo for a PDF
+
+    Uploads are private, so the renderer reads them from disk rather than
+    through the access-checked photo route. The PDF gets the ``size``
+    derivative, or the original until that has been generated.
+    """
+    from app.utils import blob_store
+    from app.utils.photo_derivatives import photo_url_path
+
+    file_path = blob_store.absolute_path(photo_url_path(photo, size))
+    return pathlib.Path(file_path).as_uri() if file_path else ''
 
-def generate_pdf(html):
+
+class PDFRenderer:
+    """WeasyPrint renderer; one instance shares fonts and parsed stylesheets across documents"""
+
+    def __init__(self, base_url=None, static_folder=None, stylesheets=()):
+        """
+        Args:
+            base_url: Base for relative URLs in the HTML
+            static_folder: App static folder, so static images skip HTTP
+            stylesheets: Extra CSS strings, parsed once for every document
+        """
+        from weasyprint import CSS
+        from weasyprint.text.fonts import FontConfiguration
+
+        self.base_url = base_url
+        self.font_config = FontConfiguration()
+        self.stylesheets = [CSS(string=css, font_config=self.font_config) for css in stylesheets]
+        self.url_fetcher = _static_url_fetcher(static_folder)
+
+    def render(self, html):
+        """Lay out an HTML string, returning a WeasyPrint Document"""
+        from weasyprint import HTML
+
+        document = HTML(string=html, base_url=self.base_url, url_fetcher=self.url_fetcher)
+        return document.render(stylesheets=self.stylesheets, font_config=self.font_config)
+
+    def write_pdf(self, html, target=None):
+        """Render HTML to a PDF file or file object (bytes if ``target`` is None)"""
+        return self.render(html).write_pdf(target)
+
+    def write_binder(self, documents, target=None):
+        """
+        Render several HTML documents into one PDF
+
+        Each document is laid out separately and its source dropped before
+        the next is parsed; only the laid-out pages are kept for the final
+        write, which WeasyPrint needs in one piece.
+
+        Args:
+            documents: Iterable of HTML strings
+            target: File name or file object (bytes if None)
+        """
+        first, pages = None, []
+        for html in documents:
+            document = self.render(html)
+            if first is None:
+                first = document
+            pages.extend(document.pages)
+        if first is None:
+            raise ValueError("Binder has no documents")
+        return first.copy(pages).write_pdf(target)
+
+
+def generate_pdf(html, base_url=None, static_folder=None):
     """Generate a PDF from HTML content
-    
+
     Args:
         html: HTML content to convert to PDF
-        
+        base_url: Base for relative URLs in the HTML
+        static_folder: App static folder, so static images are read from disk
+
     Returns:
         BytesIO object containing the PDF
     """
-    pass
-    # return BytesIO(pdf)
+    pdf = BytesIO()
+    PDFRenderer(base_url, static_folder).write_pdf(html, pdf)
+    pdf.seek(0)
+    return pdf
 
 def generate_pdf_from_template(template_path, **context):
     """Generate a PDF from a template
-    
+
     Args:
         template_path: Path to the template
         **context: Context variables to pass to the template
-        
+
     Returns:
         BytesIO object containing the PDF
     """
     html = render_template(template_path, **context)
-    return generate_pdf(html)
\ No newline at end of file
+    return generate_pdf(html, static_folder=current_app.static_folder)
+
+
+# Content-addressed cache
+
+def pdf_cache_dir():
+    directory = current_app.config.get('PDF_CACHE_DIR') or os.path.join(current_app.instance_path, 'pdf_cache')
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def template_hash(template_name):
+    """
+    SHA-256 of a template's source and everything it includes or extends
+
+    Memoised per process unless the app is in debug mode.
+    """
+    digest = _template_hashes.get(template_name)
+    if digest is None or current_app.debug:
+        env = current_app.jinja_env
+        sha = hashlib.sha256()
+        pending, seen = [template_name], set()
+        while pending:
+            name = pending.pop()
+            if name in seen:
+                continue
+            seen.add(name)
+            source, _, _ = env.loader.get_source(env, name)
+            sha.update(name.encode('utf-8') + b'\0' + source.encode('utf-8'))
+            if name.endswith('.html'):
+                referenced = meta.find_referenced_templates(env.parse(source))
+                pending.extend(sorted(ref for ref in referenced if ref))
+        digest = sha.hexdigest()
+        _template_hashes[template_name] = digest
+    return digest
+
+
+def pdf_cache_key(template_name, *parts):
+    """
+    Cache key for a rendered document
+
+    Args:
+        template_name: Template the HTML is rendered from
+        *parts: Values identifying the content, e.g. the record ID and its ``updated_at``
+
+    Returns:
+        str: Hex digest used as the file name, job ID and ETag
+    """
+    material = '\x1f'.join([template_name, template_hash(template_name)] + [str(part) for part in parts])
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+def _paths(directory, key):
+    base = os.path.join(directory, key)
+    return base + '.pdf', base + '.job', base + '.error'
+
+
+def pdf_job_status(key):
+    """
+    State of a PDF job
+
+    Returns:
+        tuple: (status, error) where status is 'ready', 'pending', 'failed' or 'missing'
+    """
+    if not _KEY_PATTERN.fullmatch(key):
+        return 'missing', None
+    pdf_path, job_path, error_path = _paths(pdf_cache_dir(), key)
+    if os.path.exists(pdf_path):
+        return 'ready', None
+    try:
+        started = os.path.getmtime(job_path)
+        if time.time() - started < current_app.config.get('PDF_JOB_TIMEOUT', 300):
+            return 'pending', None
+    except OSError:
+        pass
+    try:
+        with open(error_path) as f:
+            return 'failed', f.read()
+    except OSError:
+        return 'missing', None
+
+
+def _render_job(html, directory, key, base_url, static_folder, stylesheets=()):
+    """Process-pool entry point: render to a temp file, then publish atomically"""
+    pdf_path, job_path, error_path = _paths(directory, key)
+    tmp_path = f'{pdf_path}.{os.getpid()}.tmp'
+    try:
+        renderer = PDFRenderer(base_url, static_folder, stylesheets)
+        if isinstance(html, str):
+            renderer.write_pdf(html, tmp_path)
+        else:
+            renderer.write_binder(html, tmp_path)
+        os.replace(tmp_path, pdf_path)
+    except Exception as e:
+        with open(error_path, 'w') as f:
+            f.write(f'{e.__class__.__name__}: {e}')
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    finally:
+        if os.path.exists(job_path):
+            os.remove(job_path)
+
+
+def _get_executor(max_workers):
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=max_workers)
+    return _executor
+
+
+def submit_pdf_job(key, html, base_url=None, stylesheets=()):
+    """
+    Queue HTML for rendering unless the document is ready or already rendering
+
+    ``html`` may also be a list of documents, rendered into one binder PDF by
+    a single renderer that parses ``stylesheets`` (CSS strings) once.
+    With ``PDF_RENDER_WORKERS = 0`` the render runs inline (useful in development).
+
+    Returns:
+        str: The job status after submitting
+    """
+    status, _ = pdf_job_status(key)
+    if status in ('ready', 'pending'):
+        return status
+
+    directory = pdf_cache_dir()
+    _, job_path, error_path = _paths(directory, key)
+    if os.path.exists(error_path):
+        os.remove(error_path)
+    with open(job_path, 'w') as f:
+        f.write(str(os.getpid()))
+
+    args = (html, directory, key, base_url, current_app.static_folder, tuple(stylesheets))
+    workers = current_app.config.get('PDF_RENDER_WORKERS', 2)
+    if workers <= 0:
+        _render_job(*args)
+    else:
+        _get_executor(workers).submit(_render_job, *args)
+        logger.info(f"Queued PDF job {key}")
+    return pdf_job_status(key)[0]
+
+
+def send_cached_pdf(key, download_name, max_age=3600):
+    """Serve a rendered PDF with its cache key as a strong ETag (304 on If-None-Match)"""
+    pdf_path, _, _ = _paths(pdf_cache_dir(), key)
+    return send_file(pdf_path, mimetype='application/pdf', download_name=download_name,
+                     etag=key, conditional=True, max_age=max_age)
@@ -0,0 +1,205 @@
+"""Resized derivatives (thumbnails, WebP) for project photos.
+
+Derivatives are written next to the original (``<name>.thumb.jpg``,
+``<name>.medium.webp``...) by a process pool once the photo's row is
+committed, and recorded in ``ProjectPhoto.derivatives``. Templates ask for a
+size through the ``photo_url`` template global, which links to the
+access-checked photo route; that falls back to the original and queues a
+regeneration when a derivative is unknown or missing.
+A photo that cannot be resized (corrupt or unsupported file) is recorded as
+``{"$failed": "<error>"}`` and served as the original from then on, without
+being queued again.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from flask import current_app, has_app_context
+
+from app.utils import blob_store
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+logger = logging.getLogger(__name__)
+
+# name -> (longest edge in px, Pillow format, extension)
+DERIVATIVE_SPECS = {
+    'medium': (1280, 'JPEG', 'jpg'),
+    'medium_webp': (1280, 'WEBP', 'webp'),
+    'thumb': (320, 'JPEG', 'jpg'),
+    'thumb_webp': (320, 'WEBP', 'webp'),
+}
+QUALITY = 82
+FAILED_KEY = '$failed'
+
+_executor = None
+_pending = set()
+_pending_lock = threading.Lock()
+_SESSION_PHOTOS_KEY = 'new_project_photos'
+_listeners_registered = False
+
+
+def derivative_path(original_path, name):
+    """Path of a derivative, next to the original (same relative/absolute form)"""
+    _, _, extension = DERIVATIVE_SPECS[name]
+    base, _ = os.path.splitext(original_path)
+    size = name.split('_')[0]
+    return f'{base}.{size}.{extension}'
+
+
+def generate_derivatives(upload_folder, original_path):
+    """
+    Write every derivative of an image (process-pool entry point)
+
+    Args:
+        upload_folder: Directory ``original_path`` is relative to
+        original_path: Original image, relative to ``upload_folder``
+
+    Returns:
+        dict: Derivative name -> path relative to ``upload_folder``
+    """
+    from PIL import Image, ImageOps
+
+    written = {}
+    with Image.open(os.path.join(upload_folder, original_path)) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        # Largest first, so each smaller size is resampled from the previous one
+        for name, (edge, image_format, _) in sorted(DERIVATIVE_SPECS.items(), key=lambda item: -item[1][0]):
+            if max(image.size) > edge:
+                image = image.copy()
+                image.thumbnail((edge, edge), Image.LANCZOS)
+            relative_path = derivative_path(original_path, name)
+            target = os.path.join(upload_folder, relative_path)
+            tmp_path = f'{target}.{os.getpid()}.tmp'
+            image.save(tmp_path, image_format, quality=QUALITY, optimize=True)
+            os.replace(tmp_path, target)
+            written[name] = relative_path
+    return written
+
+
+def _record(app, photo_id, future):
+    with _pending_lock:
+        _pending.discard(photo_id)
+    try:
+        derivatives = future.result()
+    except Exception as e:
+        logger.error(f"Error generating derivatives for photo {photo_id}: {str(e)}")
+        derivatives = {FAILED_KEY: str(e)[:200] or e.__class__.__name__}
+
+    from app.extensions import db
+    from app.models.field import ProjectPhoto
+
+    with app.app_context():
+        try:
+            db.session.execute(
+                db.update(ProjectPhoto).where(ProjectPhoto.id == photo_id).values(derivatives=derivatives)
+            )
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error recording derivatives for photo {photo_id}: {str(e)}")
+        finally:
+            db.session.remove()
+
+
+class _Done:
+    """Completed-future stand-in for inline generation"""
+
+    def __init__(self, fn, *args):
+        try:
+            self._result, self._error = fn(*args), None
+        except Exception as e:
+            self._result, self._error = None, e
+
+    def result(self):
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+
+def queue_photo_derivatives(photo_id, file_path):
+    """
+    Generate a photo's derivatives off the request path
+
+    Runs inline when ``PHOTO_DERIVATIVE_WORKERS`` is 0. Repeated calls for a
+    photo that is already queued in this process are ignored.
+
+    Args:
+        photo_id: ProjectPhoto ID the derivatives are recorded on
+        file_path: Original image, relative to ``UPLOAD_FOLDER``
+    """
+    global _executor
+    with _pending_lock:
+        if photo_id in _pending:
+            return
+        _pending.add(photo_id)
+
+    app = current_app._get_current_object()
+    args = (app.config['UPLOAD_FOLDER'], file_path)
+    workers = app.config.get('PHOTO_DERIVATIVE_WORKERS', 2)
+    if workers <= 0:
+        _record(app, photo_id, _Done(generate_derivatives, *args))
+        return
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=workers)
+    future = _executor.submit(generate_derivatives, *args)
+    future.add_done_callback(lambda done: _record(app, photo_id, done))
+
+
+def photo_url_path(photo, name):
+    """
+    Path (relative to ``UPLOAD_FOLDER``) of a photo at a given size
+
+    Falls back to the original, queueing generation, if the derivative is
+    not recorded yet or its file has gone missing (but not if generation
+    already failed).
+    """
+    derivatives = photo.derivatives or {}
+    if FAILED_KEY in derivatives:
+        return photo.file_path
+    relative_path = derivatives.get(name)
+    if relative_path and os.path.exists(blob_store.absolute_path(relative_path)):
+        return relative_path
+    try:
+        queue_photo_derivatives(photo.id, photo.file_path)
+    except Exception as e:
+        logger.error(f"Error queueing derivatives for photo {photo.id}: {str(e)}")
+    return photo.file_path
+
+
+def _record_new_photo(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_SESSION_PHOTOS_KEY, []).append((target.id, target.file_path))
+
+
+def _after_commit(session):
+    photos = session.info.pop(_SESSION_PHOTOS_KEY, None)
+    if not photos or not has_app_context():
+        return
+    for photo_id, file_path in photos:
+        try:
+            queue_photo_derivatives(photo_id, file_path)
+        except Exception as e:
+            logger.error(f"Error queueing derivatives for photo {photo_id}: {str(e)}")
+
+
+def _after_rollback(session):
+    session.info.pop(_SESSION_PHOTOS_KEY, None)
+
+
+def register_photo_derivative_listeners():
+    """Queue derivatives for every newly committed project photo (idempotent)"""
+    global _listeners_registered
+    if _listeners_registered:
+        return
+
+    from app.models.field import ProjectPhoto
+
+    event.listen(ProjectPhoto, 'after_insert', _record_new_photo)
+    event.listen(Session, 'after_commit', _after_commit)
+    event.listen(Session, 'after_rollback', _after_rollback)
+    _listeners_registered = True
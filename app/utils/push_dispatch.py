@@ -0,0 +1,296 @@
+"""Asynchronous delivery of mobile push notifications.
+
+``PushDispatcher.send`` only queues, so the request that reported an
+incident or approved a change order no longer waits on the push provider.
+A sender thread, started by the first notification in each process, drains
+the queue through one keep-alive ``requests.Session``:
+
+* Notifications with the same content (or ``collapse_key``) that are still
+  queued are coalesced into one, sent to the union of their recipients.
+* Recipients go ``PUSH_BATCH_SIZE`` per provider call. The sender waits
+  ``PUSH_BATCH_WINDOW`` seconds after waking, so a burst goes out together.
+* Connection errors, 429 and 5xx responses are retried with exponential
+  backoff (or the provider's ``Retry-After``) up to ``PUSH_MAX_ATTEMPTS``
+  times; other responses are final.
+
+The queue lives in memory and holds at most ``PUSH_QUEUE_SIZE``
+notifications; at exit the sender gets ``PUSH_SHUTDOWN_TIMEOUT`` seconds to
+empty it. Counters, throughput and provider latency are in ``stats``.
+"""
+import atexit
+import heapq
+import itertools
+import json
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.utils.metrics import EndpointStats
+
+logger = logging.getLogger(__name__)
+
+COUNTERS = ('queued', 'coalesced', 'dropped', 'requests', 'sent', 'retried', 'failed')
+
+
+class _Push:
+    """A queued notification and the users it goes to"""
+
+    __slots__ = ('title', 'message', 'data', 'user_ids', 'attempts')
+
+    def __init__(self, title, message, data, user_ids, attempts=0):
+        self.title = title
+        self.message = message
+        self.data = data
+        self.user_ids = user_ids
+        self.attempts = attempts
+
+
+class PushDispatcher:
+    """Background sender for push notifications"""
+
+    def __init__(self, app=None):
+        self.url = None
+        self.api_key = None
+        self.batch_size = 500
+        self.batch_window = 0.05
+        self.max_attempts = 5
+        self.retry_base = 1.0
+        self.queue_size = 10000
+        self.timeout = 10
+        self.shutdown_timeout = 5
+        self._pending = OrderedDict()
+        self._retries = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._thread = None
+        self._session = None
+        self._stopping = False
+        self._started_at = None
+        self._counters = dict.fromkeys(COUNTERS, 0)
+        self._latency = EndpointStats()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Read the provider settings (the sender starts with the first notification)"""
+        config = app.config
+        self.url = config.get('PUSH_SERVICE_URL')
+        self.api_key = config.get('PUSH_API_KEY')
+        self.batch_size = config.get('PUSH_BATCH_SIZE', self.batch_size)
+        self.batch_window = config.get('PUSH_BATCH_WINDOW', self.batch_window)
+        self.max_attempts = config.get('PUSH_MAX_ATTEMPTS', self.max_attempts)
+        self.retry_base = config.get('PUSH_RETRY_BASE_SECONDS', self.retry_base)
+        self.queue_size = config.get('PUSH_QUEUE_SIZE', self.queue_size)
+        self.timeout = config.get('PUSH_TIMEOUT', self.timeout)
+        self.shutdown_timeout = config.get('PUSH_SHUTDOWN_TIMEOUT', self.shutdown_timeout)
+        atexit.register(self.stop)
+
+    def send(self, user_ids, title, message, data=None, collapse_key=None):
+        """
+        Queue a notification
+
+        Args:
+            user_ids: IDs of the users to notify
+            title: Notification title
+            message: Notification body
+            data: Extra JSON-serialisable data for the app
+            collapse_key: Queued notifications with the same key are merged,
+                the latest content winning (defaults to the content itself)
+
+        Returns:
+            bool: True if it was queued
+        """
+        if not self.url or not self.api_key:
+            logger.error("Push notification service not configured")
+            return False
+        user_ids = {user_id for user_id in user_ids if user_id is not None}
+        if not user_ids:
+            return False
+        data = json.loads(json.dumps(data, default=str)) if data else None
+        key = collapse_key or json.dumps([title, message, data], sort_keys=True)
+
+        with self._condition:
+            self._counters['queued'] += 1
+            push = self._pending.get(key)
+            if push is not None:
+                self._counters['coalesced'] += 1
+                push.user_ids |= user_ids
+                push.title, push.message, push.data = title, message, data
+                return True
+            if len(self._pending) >= self.queue_size:
+                self._counters['dropped'] += 1
+                logger.warning(f"Push queue is full, dropping notification: {title}")
+                return False
+            self._pending[key] = _Push(title, message, data, user_ids)
+            self._start()
+            self._condition.notify()
+        return True
+
+    def _start(self):
+        # Called with the lock held; started lazily so forked workers each get their own thread
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopping = False
+        self._session = requests.Session()
+        # Retries are handled here, with backoff; the pool keeps the connection open between batches
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=0)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+        self._session.headers['Authorization'] = f'Bearer {self.api_key}'
+        self._started_at = self._started_at or time.monotonic()
+        self._thread = threading.Thread(target=self._run, name='push-dispatcher', daemon=True)
+        self._thread.start()
+
+    def _take_batch(self):
+        """Wait for work, then take every queued notification and due retry"""
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                if self._pending or (self._retries and self._retries[0][0] <= now):
+                    break
+                if self._stopping and not self._retries:
+                    return None
+                self._condition.wait(self._retries[0][0] - now if self._retries else None)
+        # Let the rest of a burst arrive
+        if self.batch_window and not self._stopping:
+            time.sleep(self.batch_window)
+        with self._condition:
+            batch = list(self._pending.values())
+            self._pending.clear()
+            now = time.monotonic()
+            while self._retries and self._retries[0][0] <= now:
+                batch.append(heapq.heappop(self._retries)[2])
+            self._in_flight += len(batch)
+            return batch
+
+    def _run(self):
+        logger.info("Push dispatcher started")
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                break
+            for push in batch:
+                try:
+                    self._deliver(push)
+                except Exception as e:
+                    logger.error(f"Error sending push notification: {str(e)}")
+            with self._condition:
+                self._in_flight -= len(batch)
+                self._condition.notify_all()
+        logger.info("Push dispatcher stopped")
+
+    def _post(self, push, user_ids):
+        """
+        One provider call
+
+        Returns:
+            tuple: ('sent' | 'retry' | 'failed', seconds the provider asked to wait or None)
+        """
+        payload = {'user_ids': user_ids, 'notification': {'title': push.title, 'body': push.message}}
+        if push.data:
+            payload['data'] = push.data
+        started = time.perf_counter()
+        retry_after = None
+        try:
+            response = self._session.post(self.url, json=payload, timeout=self.timeout)
+            status, error = response.status_code, response.text[:200]
+            try:
+                retry_after = float(response.headers.get('Retry-After', ''))
+            except ValueError:
+                pass
+        except requests.RequestException as e:
+            status, error = 'error', str(e)
+
+        with self._condition:
+            self._counters['requests'] += 1
+            self._latency.record('POST', status, time.perf_counter() - started)
+        if status == 200:
+            return 'sent', None
+        logger.error(f"Push notification failed ({status}): {error}")
+        if status == 'error' or status == 429 or status >= 500:
+            return 'retry', retry_after
+        return 'failed', None
+
+    def _deliver(self, push):
+        recipients = sorted(push.user_ids)
+        retry_ids, wait = set(), 0
+        for start in range(0, len(recipients), self.batch_size):
+            chunk = recipients[start:start + self.batch_size]
+            outcome, retry_after = self._post(push, chunk)
+            if outcome == 'retry' and push.attempts + 1 < self.max_attempts:
+                retry_ids.update(chunk)
+                wait = max(wait, retry_after or 0)
+                outcome = 'retried'
+            elif outcome == 'retry':
+                outcome = 'failed'
+            with self._condition:
+                self._counters[outcome] += len(chunk)
+
+        if retry_ids:
+            attempts = push.attempts + 1
+            delay = max(wait, self.retry_base * 2 ** (attempts - 1) * random.uniform(0.8, 1.2))
+            retry = _Push(push.title, push.message, push.data, retry_ids, attempts)
+            with self._condition:
+                heapq.heappush(self._retries, (time.monotonic() + delay, next(self._sequence), retry))
+                self._condition.notify()
+
+    def flush(self, timeout=None):
+        """
+        Wait until everything queued has been sent or given up
+
+        Returns:
+            bool: False if the timeout passed first
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while self._pending or self._retries or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def stop(self, timeout=None):
+        """Stop the sender once the queue is empty (or the timeout passes)"""
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        thread.join(self.shutdown_timeout if timeout is None else timeout)
+        if not thread.is_alive():
+            self._session.close()
+            self._thread = None
+
+    def stats(self):
+        """
+        Delivery statistics for this process
+
+        Returns:
+            dict: Counters (``sent``/``retried``/``failed`` count recipients,
+                ``queued``/``coalesced``/``dropped`` notifications), queue
+                depth, throughput since the first notification and provider
+                call latency (seconds: mean, max, p50/p95/p99)
+        """
+        with self._condition:
+            counters = dict(self._counters)
+            elapsed = time.monotonic() - self._started_at if self._started_at else 0
+            stats = {
+                'running': self._thread is not None and self._thread.is_alive(),
+                'pending': len(self._pending),
+                'retrying': len(self._retries),
+                **counters,
+                'sent_per_second': counters['sent'] / elapsed if elapsed else 0.0,
+                'requests_per_second': counters['requests'] / elapsed if elapsed else 0.0,
+                'latency': self._latency.summary(),
+                'responses': {str(status): count for status, count in self._latency.by_status.items()},
+            }
+        return stats
@@ -1,134 +1,321 @@
-from flask import current_app
+"""In-process scheduler for periodic tasks.
+
+Tasks sit in a min-heap keyed by their next fire time, and the scheduler
+thread sleeps until the earliest one is due (or a task is added). Due tasks
+run in a bounded thread pool, so a slow task delays nothing else; a task
+that is still running when it next falls due skips that run. Schedules are
+fixed intervals or cron expressions. Each task keeps run-duration and lag
+(start time minus due time) histograms, see ``task_stats``.
+
+This runs in every process that starts it; work that must happen once per
+cluster belongs in a background job (``app.utils.job_queue``).
+"""
+import atexit
+import heapq
+import itertools
+import logging
+import os
 import threading
 import time
-import logging
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-import os
+
+from app.utils.metrics import EndpointStats
 
 logger = logging.getLogger(__name__)
 
+_CRON_ALIASES = {
+    '@yearly': '0 0 1 1 *',
+    '@annually': '0 0 1 1 *',
+    '@monthly': '0 0 1 * *',
+    '@weekly': '0 0 * * 0',
+    '@daily': '0 0 * * *',
+    '@midnight': '0 0 * * *',
+    '@hourly': '0 * * * *',
+}
+_MONTH_NAMES = ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec']
+_DAY_NAMES = ['sun', 'mon', 'tue', 'wed', 'thu', 'fri', 'sat']
+# (lowest, highest, names starting at lowest) for minute, hour, day of month, month, day of week
+_CRON_FIELDS = ((0, 59, None), (0, 23, None), (1, 31, None), (1, 12, _MONTH_NAMES), (0, 7, _DAY_NAMES))
+
+
+def _cron_value(text, low, names):
+    if names and text.lower() in names:
+        return names.index(text.lower()) + low
+    return int(text)
+
+
+def _parse_cron_field(field, low, high, names):
+    values = set()
+    for part in field.split(','):
+        expression, _, step = part.partition('/')
+        step = int(step) if step else 1
+        if expression == '*':
+            start, end = low, high
+        elif '-' in expression:
+            start, end = (_cron_value(value, low, names) for value in expression.split('-', 1))
+        else:
+            start = _cron_value(expression, low, names)
+            end = high if step > 1 else start
+        if not low <= start <= end <= high or step < 1:
+            raise ValueError(f'Invalid cron field: {field}')
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronExpression:
+    """Five-field cron schedule (minute hour day-of-month month day-of-week) in local time"""
+
+    def __init__(self, expression):
+        self.expression = expression
+        fields = _CRON_ALIASES.get(expression.strip().lower(), expression).split()
+        if len(fields) != 5:
+            raise ValueError(f'Cron expressions have five fields: {expression}')
+        minutes, hours, days, months, weekdays = (
+            _parse_cron_field(field, *spec) for field, spec in zip(fields, _CRON_FIELDS))
+        self.minutes, self.hours = sorted(minutes), sorted(hours)
+        self.days, self.months = days, months
+        self.weekdays = {day % 7 for day in weekdays}  # 7 is also Sunday
+        self._any_day, self._any_weekday = fields[2] == '*', fields[4] == '*'
+
+    def _day_matches(self, moment):
+        day = moment.day in self.days
+        weekday = moment.isoweekday() % 7 in self.weekdays
+        if self._any_day or self._any_weekday:
+            return day and weekday
+        # Both restricted: cron fires on either
+        return day or weekday
+
+    def next_after(self, moment):
+        """First fire time strictly after ``moment``"""
+        moment = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        give_up = moment.year + 5
+        while moment.year <= give_up:
+            if moment.month not in self.months:
+                year, month = divmod(moment.year * 12 + moment.month, 12)
+                moment = moment.replace(year=year, month=month + 1, day=1, hour=0, minute=0)
+                continue
+            if not self._day_matches(moment):
+                moment = moment.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            if moment.hour not in self.hours:
+                index = bisect_left(self.hours, moment.hour)
+                if index == len(self.hours):
+                    moment = moment.replace(hour=0, minute=0) + timedelta(days=1)
+                else:
+                    moment = moment.replace(hour=self.hours[index], minute=0)
+                continue
+            index = bisect_left(self.minutes, moment.minute)
+            if index == len(self.minutes):
+                moment = moment.replace(minute=0) + timedelta(hours=1)
+                continue
+            return moment.replace(minute=self.minutes[index])
+        raise ValueError(f'Cron expression never fires: {self.expression}')
+
+
+class _Task:
+    """A scheduled function and its run statistics"""
+
+    def __init__(self, name, func, interval=None, cron=None):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.cron = cron
+        self.next_run = None
+        self.active = False
+        self.failures = 0
+        self.skipped = 0
+        self.last_run = None
+        self.last_error = None
+        self.durations = EndpointStats()
+        self.lags = EndpointStats()
+
+    def following(self, due, now):
+        """Next fire time after a run that was due at ``due`` and started at ``now``"""
+        if self.cron is not None:
+            return self.cron.next_after(datetime.fromtimestamp(now)).timestamp()
+        following = due + self.interval
+        # Missed runs are dropped rather than fired back to back
+        return following if following > now else now + self.interval
+
+
 class TaskScheduler:
     """Scheduler for periodic tasks"""
-    
-    def __init__(self, app=None):
+
+    def __init__(self, app=None, max_workers=None):
         self.app = app
-        self._thread = None
-        self._stop_event = threading.Event()
-        self.tasks = []
+        self.max_workers = max_workers
+        self.tasks = {}
         self.running = False
-        
+        self._heap = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._stats_lock = threading.Lock()
+        self._thread = None
+        self._pool = None
+        self._stopping = False
+
         if app is not None:
             self.init_app(app)
-    
+
     def init_app(self, app):
         """Initialize scheduler with Flask app"""
         self.app = app
-        
-        # Register teardown to stop scheduler
-        @app.teardown_appcontext
-        def teardown(exception=None):
-            self.stop()
-    
+        self.max_workers = self.max_workers or app.config.get('SCHEDULER_MAX_WORKERS', 4)
+        # Stop with the process (not with each app context, which ends every request)
+        atexit.register(self.stop)
+
+    def _add(self, task, first_run):
+        with self._condition:
+            if task.name in self.tasks:
+                logger.warning(f"Replacing scheduled task: {task.name}")
+            self.tasks[task.name] = task
+            task.next_run = first_run
+            heapq.heappush(self._heap, (first_run, next(self._sequence), task))
+            self._condition.notify()
+
     def add_task(self, func, interval_seconds, name=None):
-        """Add a task to run at regular intervals
-        
+        """Add a task to run at regular intervals (first run immediately)
+
         Args:
             func: The function to execute
             interval_seconds: Time between executions in seconds
             name: Optional name for the task
         """
-        if name is None:
-            name = func.__name__
-            
-        self.tasks.append({
-            'func': func,
-            'interval': interval_seconds,
-            'last_run': None,
-            'name': name
-        })
+        name = name or func.__name__
+        self._add(_Task(name, func, interval=interval_seconds), time.time())
         logger.info(f"Task added to scheduler: {name} (every {interval_seconds} seconds)")
-        
+
+    def add_cron_task(self, func, expression, name=None):
+        """Add a task on a cron schedule
+
+        Args:
+            func: The function to execute
+            expression: Cron expression (``"30 6 * * 1-5"``) or alias (``@hourly``)
+            name: Optional name for the task
+        """
+        name = name or func.__name__
+        cron = CronExpression(expression)
+        self._add(_Task(name, func, cron=cron), cron.next_after(datetime.now()).timestamp())
+        logger.info(f"Cron task added to scheduler: {name} ({expression})")
+
     def add_daily_task(self, func, time_str, name=None):
         """Add a task to run daily at a specific time
-        
+
         Args:
             func: The function to execute
             time_str: Time to run in format HH:MM (24-hour)
             name: Optional name for the task
         """
-        if name is None:
-            name = func.__name__
-            
-        self.tasks.append({
-            'func': func,
-            'time_str': time_str,
-            'last_run': None,
-            'name': name,
-            'is_daily': True
-        })
-        logger.info(f"Daily task added to scheduler: {name} (at {time_str})")
-    
+        hour, minute = map(int, time_str.split(':'))
+        self.add_cron_task(func, f'{minute} {hour} * * *', name)
+
+    def remove_task(self, name):
+        """Unschedule a task (a run in progress finishes)"""
+        with self._condition:
+            # Its heap entry is skipped when it comes due
+            return self.tasks.pop(name, None) is not None
+
     def _run_scheduler(self):
-        """Run the scheduler in a loop"""
+        """Sleep until the earliest task is due, hand it to the pool, repeat"""
         logger.info("Scheduler thread started")
-        while not self._stop_event.is_set():
-            now = datetime.now()
-            
-            for task in self.tasks:
-                try:
-                    # Handle daily tasks
-                    if 'is_daily' in task and task['is_daily']:
-                        # Parse time string
-                        hour, minute = map(int, task['time_str'].split(':'))
-                        run_time = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
-                        
-                        # If we've passed the time today and haven't run yet today
-                        if now >= run_time and (
-                            task['last_run'] is None or 
-                            task['last_run'].date() < now.date()
-                        ):
-                            logger.info(f"Running daily task: {task['name']}")
-                            with self.app.app_context():
-                                task['func']()
-                            task['last_run'] = now
-                    
-                    # Handle interval tasks
-                    elif (
-                        task['last_run'] is None or 
-                        (now - task['last_run']).total_seconds() >= task['interval']
-                    ):
-                        logger.info(f"Running scheduled task: {task['name']}")
-                        with self.app.app_context():
-                            task['func']()
-                        task['last_run'] = now
-                        
-                except Exception as e:
-                    logger.error(f"Error in scheduled task {task['name']}: {str(e)}")
-            
-            # Sleep for a bit to avoid consuming too much CPU
-            time.sleep(1)
-    
+        with self._condition:
+            while not self._stopping:
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+                due, _, task = self._heap[0]
+                delay = due - time.time()
+                if delay > 0:
+                    self._condition.wait(delay)
+                    continue
+                heapq.heappop(self._heap)
+                if self.tasks.get(task.name) is not task:
+                    continue
+
+                now = time.time()
+                task.next_run = task.following(due, now)
+                heapq.heappush(self._heap, (task.next_run, next(self._sequence), task))
+                if task.active:
+                    task.skipped += 1
+                    logger.warning(f"Skipping scheduled task {task.name}: previous run still in progress")
+                    continue
+                task.active = True
+                self._pool.submit(self._execute, task, now - due)
+
+    def _execute(self, task, lag):
+        started = time.perf_counter()
+        error = None
+        try:
+            with self.app.app_context():
+                task.func()
+        except Exception as e:
+            error = str(e)
+            logger.error(f"Error in scheduled task {task.name}: {error}")
+        duration = time.perf_counter() - started
+        with self._stats_lock:
+            task.durations.record('run', 'error' if error else 'ok', duration)
+            task.lags.record('run', 'ok', lag)
+            task.last_run = datetime.now()
+            if error:
+                task.failures += 1
+                task.last_error = error
+        with self._condition:
+            task.active = False
+
+    def task_stats(self):
+        """
+        Run statistics per task
+
+        Returns:
+            dict: Task name -> schedule, next run, run/failure/skip counts and
+                duration and lag summaries (seconds: mean, max, p50/p95/p99)
+        """
+        with self._condition:
+            tasks = list(self.tasks.values())
+        stats = {}
+        with self._stats_lock:
+            for task in tasks:
+                stats[task.name] = {
+                    'schedule': task.cron.expression if task.cron else f'every {task.interval}s',
+                    'next_run': datetime.fromtimestamp(task.next_run).isoformat() if task.next_run else None,
+                    'last_run': task.last_run.isoformat() if task.last_run else None,
+                    'running': task.active,
+                    'runs': task.durations.count,
+                    'failures': task.failures,
+                    'skipped': task.skipped,
+                    'last_error': task.last_error,
+                    'duration': task.durations.summary(),
+                    'lag': task.lags.summary(),
+                }
+        return stats
+
     def start(self):
         """Start the scheduler in a background thread"""
         if self.running:
             logger.warning("Scheduler is already running")
             return
-            
+
         if not self.tasks:
             logger.warning("No tasks registered with scheduler")
             return
-            
-        self._stop_event.clear()
+
+        self._stopping = False
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers or 4, thread_name_prefix='scheduler')
         self._thread = threading.Thread(target=self._run_scheduler, daemon=True)
         self._thread.start()
         self.running = True
         logger.info("Task scheduler started")
-    
+
     def stop(self):
         """Stop the scheduler"""
         if self.running and self._thread and self._thread.is_alive():
-            self._stop_event.set()
+            with self._condition:
+                self._stopping = True
+                self._condition.notify_all()
             self._thread.join(timeout=5)
+            self._pool.shutdown(wait=False)
             self.running = False
             logger.info("Task scheduler stopped")
 
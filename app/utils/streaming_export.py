@@ -0,0 +1,175 @@
+"""Streaming NDJSON/CSV/JSON exports.
+
+Rows are read with ``yield_per`` (a server-side cursor on PostgreSQL) and
+encoded one at a time, so memory stays flat regardless of table size. The
+same generators back the ``/api/export`` endpoints and the ``flask export``
+CLI commands.
+"""
+import csv
+import io
+import json
+import logging
+from collections import namedtuple
+
+from sqlalchemy.orm import joinedload
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ('ndjson', 'csv', 'json')
+EXPORT_BATCH_SIZE = 1000
+
+MIMETYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+    'json': 'application/json',
+}
+
+ExportSpec = namedtuple('ExportSpec', 'model dump load_options project_column csv_fields')
+
+
+def _dump_project(project):
+    return {
+        'id': project.id,
+        'number': project.number,
+        'name': project.name,
+        'description': project.description,
+        'status': project.status,
+        'start_date': project.start_date.isoformat() if project.start_date else None,
+        'target_completion_date': (project.target_completion_date.isoformat()
+                                   if project.target_completion_date else None),
+        'client_name': project.client_name
+    }
+
+
+def export_specs():
+    """Map of export name -> ExportSpec"""
+    from app.api.serializers import (
+        ChangeOrderSerializer, DailyReportSerializer, RFISerializer,
+        SafetyObservationSerializer, SubmittalSerializer
+    )
+    from app.models.project import Project
+    from app.models.user import User
+    from app.models.engineering import RFI, Submittal
+    from app.models.field import DailyReport
+    from app.models.safety import SafetyObservation
+    from app.models.cost import ChangeOrder
+
+    def module(serializer, project_column):
+        return ExportSpec(serializer.model, serializer.dump, serializer.load_options(), project_column, None)
+
+    return {
+        'projects': ExportSpec(Project, _dump_project, (), Project.id, None),
+        'users': ExportSpec(User, User.to_dict, (joinedload(User.role),), None,
+                            ['id', 'email', 'name', 'role', 'is_active', 'last_seen']),
+        'rfis': module(RFISerializer, RFI.project_id),
+        'submittals': module(SubmittalSerializer, Submittal.project_id),
+        'daily-reports': module(DailyReportSerializer, DailyReport.project_id),
+        'safety-observations': module(SafetyObservationSerializer, SafetyObservation.project_id),
+        'change-orders': module(ChangeOrderSerializer, ChangeOrder.project_id),
+    }
+
+
+def iter_export_rows(name, project_ids=None, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Yield serialised rows for an export, fetched in batches
+
+    Args:
+        name: Key of ``export_specs()``
+        project_ids: Optional iterable of project IDs to restrict to
+        batch_size: Rows fetched per round trip
+
+    Yields:
+        dict: One serialised row
+    """
+    spec = export_specs()[name]
+    query = spec.model.query.options(*spec.load_options)
+    if project_ids is not None:
+        if spec.project_column is None:
+            raise ValueError(f"Export '{name}' cannot be filtered by project")
+        query = query.filter(spec.project_column.in_(list(project_ids)))
+
+    for obj in query.order_by(spec.model.id).yield_per(batch_size):
+        yield spec.dump(obj)
+
+
+def iter_ndjson(rows):
+    """Encode rows as newline-delimited JSON"""
+    for row in rows:
+        yield json.dumps(row, default=str) + '\n'
+
+
+def iter_json_array(rows):
+    """Encode rows as a single JSON array without materialising it"""
+    yield '['
+    separator = '\n'
+    for row in rows:
+        yield separator + json.dumps(row, default=str)
+        separator = ',\n'
+    yield '\n]\n'
+
+
+def iter_csv(rows, fields=None):
+    """
+    Encode rows as CSV, writing the header from ``fields`` or the first row
+
+    Values not listed in ``fields`` are ignored.
+    """
+    buffer = io.StringIO()
+    writer = None
+    for row in rows:
+        if writer is None:
+            writer = csv.DictWriter(buffer, fieldnames=fields or list(row), extrasaction='ignore')
+            writer.writeheader()
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    if writer is None and fields:
+        csv.writer(buffer).writerow(fields)
+        yield buffer.getvalue()
+
+
+def encode_rows(rows, export_format='ndjson', csv_fields=None):
+    """Encode a row iterator in one of EXPORT_FORMATS"""
+    if export_format == 'csv':
+        return iter_csv(rows, csv_fields)
+    if export_format == 'json':
+        return iter_json_array(rows)
+    return iter_ndjson(rows)
+
+
+def iter_export(name, export_format='ndjson', project_ids=None, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Yield encoded chunks for an export
+
+    Args:
+        name: Key of ``export_specs()``
+        export_format: One of EXPORT_FORMATS
+        project_ids: Optional iterable of project IDs to restrict to
+        batch_size: Rows fetched per round trip
+    """
+    rows = iter_export_rows(name, project_ids, batch_size)
+    return encode_rows(rows, export_format, export_specs()[name].csv_fields)
+
+
+def write_export(name, output_file, export_format='ndjson', project_ids=None):
+    """
+    Stream an export straight to a file
+
+    Returns:
+        int: Number of rows written
+    """
+    count = 0
+
+    def counted(rows):
+        nonlocal count
+        for row in rows:
+            count += 1
+            yield row
+
+    rows = counted(iter_export_rows(name, project_ids))
+    with open(output_file, 'w', newline='', encoding='utf-8') as f:
+        for chunk in encode_rows(rows, export_format, export_specs()[name].csv_fields):
+            f.write(chunk)
+    logger.info(f"Exported {count} {name} rows to {output_file}")
+    return count
@@ -0,0 +1,316 @@
+"""Change tracking for mobile delta sync.
+
+Every syncable row (see ``sync_entities``) carries a ``change_seq`` taken
+from one counter whenever the row is inserted or modified, and a deleted row
+leaves a ``SyncTombstone`` with a sequence number of its own. A client keeps
+a watermark per project - the highest sequence it has applied - and asks for
+what changed above it, which is a ``(project_id, change_seq)`` index range
+scan per table.
+
+Flushes only note which rows changed (new rows are written with
+``change_seq`` 0). The numbers are allocated in ``before_commit``, once the
+transaction's last flush is done, by incrementing the ``sync_counters`` row
+and stamping the noted rows with one UPDATE per table. The counter row stays
+locked until the transaction ends, so writers to syncable tables commit in
+sequence order and once the counter reads N every change up to N is
+visible. A sync reads the counter first and scans up to that value only, so
+a change committing mid-request cannot be skipped.
+
+Because the counter is the last lock a transaction takes and it is only held
+for the stamping and the COMMIT itself, writers in different tenants queue
+on it for milliseconds, not for the length of their transactions, and it
+cannot be part of a lock-order deadlock: a transaction holding it only
+touches rows it has already written.
+
+Tombstones older than ``SYNC_TOMBSTONE_RETENTION_DAYS`` are purged daily; a
+client whose watermark predates the purge is told to reset that project.
+
+Bulk ``query.update()``/``delete()``, ``bulk_insert_mappings`` and raw SQL
+bypass the session events. Inserted rows keep ``change_seq`` 0 and are
+invisible to sync until ``flask sync backfill`` numbers them (or call
+``stamp_change_seqs`` just before committing).
+"""
+import itertools
+import logging
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from flask import current_app
+from sqlalchemy import and_, bindparam, event, func, insert, inspect, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.extensions import db
+from app.models.base import SyncCounter, SyncTombstone
+
+logger = logging.getLogger(__name__)
+
+CHANGE_SEQ = 'change_seq'
+TOMBSTONE_FLOOR = 'tombstone_floor'
+
+_SESSION_CHANGED_KEY = 'sync_changed'
+_listeners_registered = False
+
+
+@lru_cache(maxsize=None)
+def sync_entities():
+    """Map of entity name -> (model, its project ID column) for the syncable models"""
+    from app.models.engineering import RFI
+    from app.models.field import DailyReport, PunchlistItem
+    from app.models.project import Project
+    from app.models.safety import SafetyObservation
+
+    return {
+        'projects': (Project, Project.id),
+        'daily_reports': (DailyReport, DailyReport.project_id),
+        'safety_observations': (SafetyObservation, SafetyObservation.project_id),
+        'punchlist_items': (PunchlistItem, PunchlistItem.project_id),
+        'rfis': (RFI, RFI.project_id),
+    }
+
+
+@lru_cache(maxsize=None)
+def _entity_names():
+    return {model: name for name, (model, _) in sync_entities().items()}
+
+
+def allocate_change_seqs(connection, count):
+    """
+    Reserve a block of sequence numbers
+
+    The counter row stays locked until the caller's transaction ends, so call
+    it as late as possible, right before committing.
+
+    Args:
+        connection: Connection in the writing transaction
+        count: Number of sequence numbers wanted
+
+    Returns:
+        int: The first number of the block
+    """
+    table = SyncCounter.__table__
+    bump = update(table).where(table.c.name == CHANGE_SEQ).values(value=table.c.value + count)
+    if not connection.execute(bump).rowcount:
+        try:
+            with connection.begin_nested():
+                connection.execute(insert(table).values(name=CHANGE_SEQ, value=count))
+        except IntegrityError:
+            # Another transaction created the counter first
+            connection.execute(bump)
+    last = connection.execute(select(table.c.value).where(table.c.name == CHANGE_SEQ)).scalar_one()
+    return last - count + 1
+
+
+def counter_value(name):
+    """Current value of a sync counter (0 if it was never set)"""
+    value = db.session.execute(select(SyncCounter.value).where(SyncCounter.name == name)).scalar()
+    return value or 0
+
+
+def _project_id(session, obj):
+    from app.models.field import Punchlist, PunchlistItem
+    from app.models.project import Project
+
+    if isinstance(obj, Project):
+        return obj.id
+    if isinstance(obj, PunchlistItem) and obj.project_id is None:
+        # Items created through their punchlist inherit its project
+        punchlist = obj.punchlist or session.get(Punchlist, obj.punchlist_id)
+        obj.project_id = punchlist.project_id if punchlist else None
+    return obj.project_id
+
+
+def _before_flush(session, flush_context, instances):
+    names = _entity_names()
+    changed = [obj for obj in session.new if type(obj) in names]
+    changed += [obj for obj in session.dirty
+                if type(obj) in names and session.is_modified(obj, include_collections=False)]
+    deleted = [obj for obj in session.deleted if type(obj) in names]
+    if not changed and not deleted:
+        return
+
+    # Numbered on commit; keyed by identity so a row changed by several flushes is numbered once
+    pending = session.info.setdefault(_SESSION_CHANGED_KEY, {})
+    with session.no_autoflush:
+        for obj in changed:
+            _project_id(session, obj)
+            pending[id(obj)] = obj
+        for obj in deleted:
+            tombstone = SyncTombstone(entity=names[type(obj)], record_id=obj.id,
+                                      project_id=_project_id(session, obj), change_seq=0)
+            session.add(tombstone)
+            pending[id(tombstone)] = tombstone
+
+
+def _before_commit(session):
+    if session.in_nested_transaction():
+        # Releasing a savepoint; numbering waits for the real commit
+        return
+    session.flush()
+    pending = session.info.pop(_SESSION_CHANGED_KEY, None)
+    # Rows inserted in a rolled-back savepoint, or deleted after changing, are gone
+    rows = [obj for obj in (pending or {}).values() if inspect(obj).persistent]
+    if not rows:
+        return
+
+    seqs = itertools.count(allocate_change_seqs(session.connection(), len(rows)))
+    by_table = {}
+    for obj in rows:
+        seq = next(seqs)
+        by_table.setdefault(type(obj).__table__, []).append({'row_id': obj.id, 'seq': seq})
+        set_committed_value(obj, CHANGE_SEQ, seq)
+    for table, params in by_table.items():
+        _stamp(session, table, params)
+
+
+def _stamp(session, table, params):
+    # Numbering is not an edit: columns like updated_at keep their values
+    unchanged = {column.name: column for column in table.columns if column.onupdate is not None}
+    session.execute(update(table).where(table.c.id == bindparam('row_id'))
+                    .values(change_seq=bindparam('seq'), **unchanged), params)
+
+
+def stamp_change_seqs(session, model, row_ids):
+    """
+    Number rows written outside the session events (call it right before committing)
+
+    Args:
+        session: Session whose transaction wrote the rows
+        model: Syncable model the rows belong to
+        row_ids: IDs of the rows, numbered in this order
+    """
+    if not row_ids:
+        return
+    first = allocate_change_seqs(session.connection(), len(row_ids))
+    _stamp(session, model.__table__, [{'row_id': row_id, 'seq': first + offset}
+                                      for offset, row_id in enumerate(row_ids)])
+
+
+def _after_transaction_end(session, transaction):
+    if transaction.parent is None:
+        session.info.pop(_SESSION_CHANGED_KEY, None)
+
+
+def register_sync_listeners():
+    """Number changes to syncable rows and record their deletions (idempotent)"""
+    global _listeners_registered
+    if _listeners_registered:
+        return
+
+    event.listen(Session, 'before_flush', _before_flush)
+    event.listen(Session, 'before_commit', _before_commit)
+    event.listen(Session, 'after_transaction_end', _after_transaction_end)
+    _listeners_registered = True
+
+
+def _since(project_column, seq_column, watermarks):
+    """``seq_column > watermark`` per project, grouping projects that share a watermark"""
+    groups = {}
+    for project_id, watermark in watermarks.items():
+        groups.setdefault(watermark, []).append(project_id)
+    return or_(*(and_(project_column.in_(project_ids), seq_column > watermark)
+                 for watermark, project_ids in groups.items()))
+
+
+def changes_since(watermarks, limit):
+    """
+    Changes above each project's watermark, oldest first
+
+    Args:
+        watermarks: Project ID -> highest change_seq the client has applied
+            (0 for a project it has never synced)
+        limit: Maximum changed rows plus deletions returned
+
+    Returns:
+        dict: ``changes`` (entity -> changed rows), ``deleted`` (entity ->
+            deleted IDs), ``watermarks`` to send next time, ``has_more`` (call
+            again straight away) and ``reset`` (project IDs whose watermark
+            predates purged tombstones; the client must drop its copy of them,
+            their rows are sent again from 0)
+    """
+    if not watermarks:
+        return {'changes': {}, 'deleted': {}, 'watermarks': {}, 'has_more': False, 'reset': []}
+
+    # Read first: every change up to this value has committed
+    high = counter_value(CHANGE_SEQ)
+    floor = counter_value(TOMBSTONE_FLOOR)
+    reset = sorted(project_id for project_id, watermark in watermarks.items() if 0 < watermark < floor)
+    watermarks = {project_id: 0 if project_id in reset else min(watermark, high)
+                  for project_id, watermark in watermarks.items()}
+
+    # The first ``limit`` changes overall are among each table's first ``limit + 1``
+    found = []
+    for name, (model, project_column) in sync_entities().items():
+        rows = model.query.filter(_since(project_column, model.change_seq, watermarks), model.change_seq <= high) \
+            .order_by(model.change_seq).limit(limit + 1)
+        found.extend((row.change_seq, name, row) for row in rows)
+    tombstones = SyncTombstone.query.filter(_since(SyncTombstone.project_id, SyncTombstone.change_seq, watermarks),
+                                            SyncTombstone.change_seq <= high) \
+        .order_by(SyncTombstone.change_seq).limit(limit + 1)
+    found.extend((tombstone.change_seq, tombstone.entity, tombstone.record_id) for tombstone in tombstones)
+    found.sort(key=lambda change: change[0])
+
+    has_more = len(found) > limit
+    page = found[:limit]
+    # Everything up to the last change sent has been sent, for every project
+    reached = page[-1][0] if has_more else high
+
+    changes, deleted = {}, {}
+    for _, name, row in page:
+        if isinstance(row, int):
+            deleted.setdefault(name, []).append(row)
+        else:
+            changes.setdefault(name, []).append(row)
+    return {
+        'changes': changes,
+        'deleted': deleted,
+        'watermarks': {project_id: max(watermark, reached) for project_id, watermark in watermarks.items()},
+        'has_more': has_more,
+        'reset': reset,
+    }
+
+
+def purge_tombstones(days=None):
+    """
+    Delete tombstones older than SYNC_TOMBSTONE_RETENTION_DAYS
+
+    Clients whose watermark is below the newest purged tombstone can no longer
+    be told about every deletion, so they are reset.
+
+    Returns:
+        int: Number of tombstones deleted
+    """
+    days = days or current_app.config.get('SYNC_TOMBSTONE_RETENTION_DAYS', 90)
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    floor = db.session.query(func.max(SyncTombstone.change_seq)) \
+        .filter(SyncTombstone.deleted_at < cutoff).scalar()
+    if floor is None:
+        return 0
+
+    count = SyncTombstone.query.filter(SyncTombstone.change_seq <= floor).delete(synchronize_session=False)
+    counter = db.session.get(SyncCounter, TOMBSTONE_FLOOR) or SyncCounter(name=TOMBSTONE_FLOOR, value=0)
+    counter.value = max(counter.value, floor)
+    db.session.add(counter)
+    logger.info(f"Purged {count} sync tombstones up to change {floor}")
+    return count
+
+
+def backfill_change_seqs(batch_size=1000):
+    """
+    Number syncable rows that were written outside the session events
+
+    Returns:
+        int: Number of rows numbered
+    """
+    count = 0
+    for model, _ in sync_entities().values():
+        while True:
+            ids = db.session.scalars(select(model.id).where(model.change_seq == 0)
+                                     .order_by(model.id).limit(batch_size)).all()
+            if not ids:
+                break
+            stamp_change_seqs(db.session, model, ids)
+            db.session.commit()
+            count += len(ids)
+    return count
@@ -0,0 +1,164 @@
+"""Per-user set of visible project IDs.
+
+A user sees a project through any of the three membership tables
+(``ProjectTeamMember``, ``UserProject`` and ``ProjectUser``). Rather than
+joining one of them in every listing query, the set is resolved with a single
+UNION query, held as a sorted ``array('i')`` and reused as an ``IN`` filter.
+
+It is memoised on ``flask.g`` for the rest of the request and in the app cache
+under a per-user generation token. The tokens live in the app cache beside
+the sets, whatever ``ACCESS_CACHE_BACKEND`` is, so every worker agrees on
+them. A committed membership change replaces the user's token, and the next
+request in any worker reloads the set. Admins see every project and resolve
+to None.
+"""
+import logging
+import uuid
+from array import array
+from bisect import bisect_left
+
+from flask import current_app, g, has_app_context
+from sqlalchemy import select, union
+
+from app.extensions import cache, db
+
+logger = logging.getLogger(__name__)
+
+_G_KEY = 'visible_projects'
+
+
+class VisibleProjects:
+    """Immutable sorted set of project IDs"""
+
+    __slots__ = ('ids',)
+
+    def __init__(self, project_ids=()):
+        self.ids = array('i', sorted(set(project_ids)))
+
+    @classmethod
+    def frombytes(cls, data):
+        visible = cls()
+        visible.ids.frombytes(data)
+        return visible
+
+    def tobytes(self):
+        return self.ids.tobytes()
+
+    def __contains__(self, project_id):
+        index = bisect_left(self.ids, project_id)
+        return index < len(self.ids) and self.ids[index] == project_id
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def filter(self, column):
+        """``column IN (...)`` criterion for this set (always false when empty)"""
+        return column.in_(self.ids.tolist())
+
+
+def membership_project_ids(user_id):
+    """UNION select of the project IDs a user is a member of"""
+    from app.models.project import ProjectTeamMember, ProjectUser
+    from app.models.user import UserProject
+
+    return union(*(
+        select(model.project_id).where(model.user_id == user_id)
+        for model in (ProjectTeamMember, UserProject, ProjectUser)
+    ))
+
+
+def load_visible_projects(user_id):
+    """Query the membership tables for a user's project IDs"""
+    rows = db.session.execute(membership_project_ids(user_id))
+    return VisibleProjects(project_id for project_id, in rows)
+
+
+_GLOBAL_GENERATION_KEY = 'visible_projects:gen:all'
+
+
+def _generation_key(user_id):
+    return f'visible_projects:gen:{user_id}'
+
+
+def _cache_key(user_id):
+    user_gen, global_gen = (generation or 0 for generation in
+                            cache.get_many(_generation_key(user_id), _GLOBAL_GENERATION_KEY))
+    return f'visible_projects:{user_id}:{user_gen}.{global_gen}'
+
+
+def visible_project_ids(user):
+    """
+    Return the projects a user can see
+
+    Args:
+        user: User object
+
+    Returns:
+        VisibleProjects, or None if the user can see every project
+    """
+    from app.utils.access_control import is_admin_user
+
+    if is_admin_user(user):
+        return None
+
+    memo = g.setdefault(_G_KEY, {})
+    visible = memo.get(user.id)
+    if visible is not None:
+        return visible
+
+    key = _cache_key(user.id)
+    data = cache.get(key)
+    if data is not None:
+        visible = VisibleProjects.frombytes(data)
+    else:
+        visible = load_visible_projects(user.id)
+        cache.set(key, visible.tobytes(), timeout=current_app.config.get('ACCESS_CACHE_TTL', 300))
+
+    memo[user.id] = visible
+    return visible
+
+
+def filter_visible(query, user, column):
+    """
+    Restrict a query to the projects a user can see
+
+    Args:
+        query: Query or select to filter
+        user: User object
+        column: Project ID column of the queried model
+
+    Returns:
+        The query, unchanged for admins
+    """
+    visible = visible_project_ids(user)
+    if visible is None:
+        return query
+    return query.filter(visible.filter(column))
+
+
+def invalidate_visible_projects(user_ids=None):
+    """Make every worker reload the sets of some users (everyone when ``user_ids`` is None)"""
+    if not has_app_context():
+        return
+    # A fresh random token is as good as an increment and needs no atomic inc
+    keys = [_GLOBAL_GENERATION_KEY] if user_ids is None else [_generation_key(user_id) for user_id in user_ids]
+    for key in keys:
+        cache.set(key, uuid.uuid4().hex, timeout=0)
+    forget_visible_projects(user_ids)
+
+
+def forget_visible_projects(user_ids=None):
+    """Drop request-memoised sets (all of them when ``user_ids`` is None)"""
+    if not has_app_context():
+        return
+    memo = g.get(_G_KEY)
+    if not memo:
+        return
+    if user_ids is None:
+        memo.clear()
+        return
+    for user_id in user_ids:
+        memo.pop(user_id, None)
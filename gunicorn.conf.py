@@ -0,0 +1,17 @@
+"""Gunicorn server hooks (gunicorn loads this file from the working directory)"""
+import os
+
+from app.utils.metrics_store import mark_process_dead, start_fresh
+
+
+def on_starting(server):
+    # Files and counts left by the previous master are not merged into the new totals
+    directory = os.environ.get('METRICS_MULTIPROC_DIR')
+    if directory:
+        start_fresh(directory)
+
+
+def child_exit(server, worker):
+    directory = os.environ.get('METRICS_MULTIPROC_DIR')
+    if directory:
+        mark_process_dead(directory, worker.pid)
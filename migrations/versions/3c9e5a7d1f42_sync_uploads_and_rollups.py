@@ -0,0 +1,267 @@
+"""Mobile sync, upload store, background jobs and rollup tables
+
+Adds the ``change_seq`` sync columns and indexes, ``punchlist_items.project_id``
+(copied from the punchlist), ``project_photos.derivatives``,
+``daily_reports.client_uuid``, the keyset pagination indexes and the new
+tables. Databases built with ``AUTO_MIGRATE`` may already have some of the
+new tables, so each step checks the live schema first.
+
+Existing rows get ``change_seq`` 0; run ``flask sync backfill`` once after
+upgrading so mobile clients receive them.
+
+Revision ID: 3c9e5a7d1f42
+Revises: 07b1f374b5c8
+Create Date: 2026-10-18 15:02:11.482913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c9e5a7d1f42'
+down_revision = '07b1f374b5c8'
+branch_labels = None
+depends_on = None
+
+SYNC_TABLES = ('projects', 'daily_reports', 'safety_observations', 'punchlist_items', 'rfis')
+
+# table -> [(index name, columns)]
+INDEXES = {
+    'daily_reports': [
+        ('ix_daily_reports_project_report_date_id', ['project_id', 'report_date', 'id']),
+        ('ix_daily_reports_project_change_seq', ['project_id', 'change_seq']),
+    ],
+    'safety_observations': [
+        ('ix_safety_observations_project_observation_date_id', ['project_id', 'observation_date', 'id']),
+        ('ix_safety_observations_project_change_seq', ['project_id', 'change_seq']),
+    ],
+    'punchlist_items': [
+        ('ix_punchlist_items_project_change_seq', ['project_id', 'change_seq']),
+    ],
+    'rfis': [
+        ('ix_rfis_project_date_submitted_id', ['project_id', 'date_submitted', 'id']),
+        ('ix_rfis_project_change_seq', ['project_id', 'change_seq']),
+    ],
+    'submittals': [
+        ('ix_submittals_project_date_submitted_id', ['project_id', 'date_submitted', 'id']),
+    ],
+    'change_orders': [
+        ('ix_change_orders_project_created_at_id', ['project_id', 'created_at', 'id']),
+    ],
+    'bim_issues': [
+        ('ix_bim_issues_model_status', ['model_id', 'status']),
+        ('ix_bim_issues_model_position', ['model_id', 'position_x', 'position_y', 'position_z']),
+    ],
+}
+
+
+def _inspector():
+    return sa.inspect(op.get_bind())
+
+
+def _has_table(table):
+    return _inspector().has_table(table)
+
+
+def _columns(table):
+    return {column['name'] for column in _inspector().get_columns(table)}
+
+
+def _indexes(table):
+    return {index['name'] for index in _inspector().get_indexes(table)}
+
+
+def _foreign_key_columns(table):
+    return {tuple(fk['constrained_columns']) for fk in _inspector().get_foreign_keys(table)}
+
+
+def _unique_constraints(table):
+    return {constraint['name'] for constraint in _inspector().get_unique_constraints(table)}
+
+
+def _create_tables():
+    if not _has_table('stored_blobs'):
+        op.create_table('stored_blobs',
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('path', sa.String(length=255), nullable=False),
+        sa.Column('size', sa.BigInteger(), nullable=False),
+        sa.Column('refcount', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('sha256'),
+        sa.UniqueConstraint('path')
+        )
+    if not _has_table('upload_sessions'):
+        op.create_table('upload_sessions',
+        sa.Column('id', sa.String(length=32), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('project_id', sa.Integer(), nullable=False),
+        sa.Column('target', sa.String(length=20), nullable=False),
+        sa.Column('filename', sa.String(length=255), nullable=False),
+        sa.Column('content_type', sa.String(length=100), nullable=True),
+        sa.Column('total_size', sa.BigInteger(), nullable=False),
+        sa.Column('sha256', sa.String(length=64), nullable=True),
+        sa.Column('options', sa.JSON(), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('record_id', sa.Integer(), nullable=True),
+        sa.Column('idempotency_key', sa.String(length=100), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'idempotency_key', name='uix_upload_sessions_user_idempotency_key')
+        )
+    if not _has_table('background_jobs'):
+        op.create_table('background_jobs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('queue', sa.String(length=50), nullable=False),
+        sa.Column('payload', sa.JSON(), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('unique_key', sa.String(length=150), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('max_attempts', sa.Integer(), nullable=False),
+        sa.Column('run_at', sa.DateTime(), nullable=False),
+        sa.Column('locked_by', sa.String(length=100), nullable=True),
+        sa.Column('locked_at', sa.DateTime(), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('unique_key')
+        )
+        op.create_index('ix_background_jobs_queue_status_run_at', 'background_jobs',
+                        ['queue', 'status', 'run_at'], unique=False)
+    if not _has_table('project_cost_rollups'):
+        op.create_table('project_cost_rollups',
+        sa.Column('project_id', sa.Integer(), nullable=False),
+        sa.Column('original_budget', sa.Numeric(precision=15, scale=2), nullable=False),
+        sa.Column('approved_change_orders', sa.Numeric(precision=15, scale=2), nullable=False),
+        sa.Column('pending_change_orders', sa.Numeric(precision=15, scale=2), nullable=False),
+        sa.Column('total_invoiced', sa.Numeric(precision=15, scale=2), nullable=False),
+        sa.Column('paid_invoiced', sa.Numeric(precision=15, scale=2), nullable=False),
+        sa.Column('direct_costs', sa.Numeric(precision=15, scale=2), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ),
+        sa.PrimaryKeyConstraint('project_id')
+        )
+    if not _has_table('activity_rollups'):
+        op.create_table('activity_rollups',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('entity', sa.String(length=30), nullable=False),
+        sa.Column('project_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('entity', 'project_id', 'day', name='uix_activity_rollup')
+        )
+        op.create_index('ix_activity_rollups_day_entity', 'activity_rollups', ['day', 'entity'], unique=False)
+    if not _has_table('activity_rollup_state'):
+        op.create_table('activity_rollup_state',
+        sa.Column('entity', sa.String(length=30), nullable=False),
+        sa.Column('rolled_up_through', sa.Date(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('entity')
+        )
+    if not _has_table('sync_counters'):
+        op.create_table('sync_counters',
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('value', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('name')
+        )
+    if not _has_table('sync_tombstones'):
+        op.create_table('sync_tombstones',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('entity', sa.String(length=50), nullable=False),
+        sa.Column('record_id', sa.Integer(), nullable=False),
+        sa.Column('project_id', sa.Integer(), nullable=False),
+        sa.Column('change_seq', sa.BigInteger(), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_sync_tombstones_project_change_seq', 'sync_tombstones',
+                        ['project_id', 'change_seq'], unique=False)
+
+
+def upgrade():
+    _create_tables()
+
+    for table in SYNC_TABLES:
+        if 'change_seq' not in _columns(table):
+            # The server default fills existing rows; `flask sync backfill` numbers them
+            op.add_column(table, sa.Column('change_seq', sa.BigInteger(), nullable=False,
+                                           server_default=sa.text('0')))
+
+    if 'project_id' not in _columns('punchlist_items'):
+        # Denormalised from the punchlist so items can be synced per project
+        op.add_column('punchlist_items', sa.Column('project_id', sa.Integer(), nullable=True))
+        op.execute(
+            'UPDATE punchlist_items SET project_id = '
+            '(SELECT punchlists.project_id FROM punchlists WHERE punchlists.id = punchlist_items.punchlist_id)'
+        )
+    if ('project_id',) not in _foreign_key_columns('punchlist_items'):
+        with op.batch_alter_table('punchlist_items') as batch_op:
+            batch_op.alter_column('project_id', existing_type=sa.Integer(), nullable=False)
+            batch_op.create_foreign_key('fk_punchlist_items_project_id_projects', 'projects',
+                                        ['project_id'], ['id'])
+
+    if 'derivatives' not in _columns('project_photos'):
+        op.add_column('project_photos', sa.Column('derivatives', sa.JSON(), nullable=True))
+
+    if 'client_uuid' not in _columns('daily_reports'):
+        op.add_column('daily_reports', sa.Column('client_uuid', sa.String(length=36), nullable=True))
+    if 'uix_daily_reports_created_by_client_uuid' not in _unique_constraints('daily_reports'):
+        with op.batch_alter_table('daily_reports') as batch_op:
+            batch_op.create_unique_constraint('uix_daily_reports_created_by_client_uuid',
+                                              ['created_by', 'client_uuid'])
+
+    # upload_sessions may predate its idempotency key (AUTO_MIGRATE)
+    if 'idempotency_key' not in _columns('upload_sessions'):
+        op.add_column('upload_sessions', sa.Column('idempotency_key', sa.String(length=100), nullable=True))
+    if 'uix_upload_sessions_user_idempotency_key' not in _unique_constraints('upload_sessions'):
+        with op.batch_alter_table('upload_sessions') as batch_op:
+            batch_op.create_unique_constraint('uix_upload_sessions_user_idempotency_key',
+                                              ['user_id', 'idempotency_key'])
+
+    for table, indexes in INDEXES.items():
+        existing = _indexes(table)
+        for name, columns in indexes:
+            if name not in existing:
+                op.create_index(name, table, columns, unique=False)
+
+
+def downgrade():
+    for table, indexes in INDEXES.items():
+        existing = _indexes(table)
+        for name, _ in indexes:
+            if name in existing:
+                op.drop_index(name, table_name=table)
+
+    with op.batch_alter_table('upload_sessions') as batch_op:
+        batch_op.drop_constraint('uix_upload_sessions_user_idempotency_key', type_='unique')
+        batch_op.drop_column('idempotency_key')
+    with op.batch_alter_table('daily_reports') as batch_op:
+        batch_op.drop_constraint('uix_daily_reports_created_by_client_uuid', type_='unique')
+        batch_op.drop_column('client_uuid')
+    with op.batch_alter_table('project_photos') as batch_op:
+        batch_op.drop_column('derivatives')
+    with op.batch_alter_table('punchlist_items') as batch_op:
+        # Dropping the column drops its foreign key, whatever it is named
+        batch_op.drop_column('project_id')
+    for table in SYNC_TABLES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('change_seq')
+
+    op.drop_index('ix_sync_tombstones_project_change_seq', table_name='sync_tombstones')
+    op.drop_table('sync_tombstones')
+    op.drop_table('sync_counters')
+    op.drop_table('activity_rollup_state')
+    op.drop_index('ix_activity_rollups_day_entity', table_name='activity_rollups')
+    op.drop_table('activity_rollups')
+    op.drop_table('project_cost_rollups')
+    op.drop_index('ix_background_jobs_queue_status_run_at', table_name='background_jobs')
+    op.drop_table('background_jobs')
+    op.drop_table('upload_sessions')
+    op.drop_table('stored_blobs')
@@ -1,3 +1,5 @@
+from datetime import date
+
 import pytest
 from app import create_app
 
@@ -13,4 +15,125 @@ def app():
 
 @pytest.fixture
 def client(app):
-    return app.test_client()
\ No newline at end of file
+    return app.test_client()
+
+@pytest.fixture
+def db_app():
+    """Bare Flask app bound to an in-memory SQLite database.
+
+    Useful for exercising services and models without the full
+    application factory.
+    """
+    from flask import Flask
+    from app.extensions import db, cache
+
+    app = Flask('app')
+    app.config.update({
+        'TESTING': True,
+        'SECRET_KEY': 'test',
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'CACHE_TYPE': 'SimpleCache',
+    })
+    db.init_app(app)
+    cache.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def api_client(db_app):
+    """Test client for ``db_app`` with the REST API blueprint registered"""
+    from app.api.routes import api_bp
+    db_app.register_blueprint(api_bp, url_prefix='/api')
+    return db_app.test_client()
+
+@pytest.fixture
+def make_project(db_app):
+    """Return a factory adding a flushed ``Project`` (its name doubles as its number)
+
+    Usage::
+
+        project = make_project('P1', status='planning')
+    """
+    from app.extensions import db
+    from app.models.project import Project
+
+    def make(name='P1', **fields):
+        project = Project(name=name, **{'number': name, 'status': 'active', 'start_date': date(2024, 1, 1),
+                                        **fields})
+        db.session.add(project)
+        db.session.flush()
+        return project
+    return make
+
+@pytest.fixture
+def bearer_headers(db_app):
+    """Return a function building the API ``Authorization`` header for a user"""
+    from itsdangerous import URLSafeTimedSerializer
+
+    def headers(user):
+        token = URLSafeTimedSerializer(db_app.config['SECRET_KEY']).dumps({'id': user.id})
+        return {'Authorization': f'Bearer {token}'}
+    return headers
+
+@pytest.fixture
+def project_member(db_app, make_project):
+    """Return a factory committing project 'P1' with a team member
+
+    Usage::
+
+        project, member = project_member()
+    """
+    from app.extensions import db
+    from app.models.project import ProjectTeamMember
+    from app.models.user import User
+
+    def make():
+        member = User(email='member@example.com', name='Member')
+        db.session.add(member)
+        db.session.flush()
+        project = make_project('P1')
+        db.session.add(ProjectTeamMember(project_id=project.id, user_id=member.id,
+                                         role='member', added_by=member.id))
+        db.session.commit()
+        return project, member
+    return make
+
+class QueryCounter:
+    """Collects the SQL statements executed while it is active"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        from sqlalchemy import event
+        event.listen(self.engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, *exc):
+        from sqlalchemy import event
+        event.remove(self.engine, 'before_cursor_execute', self._record)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+@pytest.fixture
+def count_queries(db_app):
+    """Return a context manager factory counting statements on db.engine
+
+    Usage::
+
+        with count_queries() as counter:
+            ...
+        assert counter.count == 2
+    """
+    from app.extensions import db
+    return lambda: QueryCounter(db.engine)
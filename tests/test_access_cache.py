@@ -0,0 +1,78 @@
+from datetime import date
+
+import pytest
+
+from app.extensions import db
+from app.models.project import Project, ProjectTeamMember
+from app.models.user import User
+from app.utils.access_cache import (LocalAccessCache, SharedAccessCache,
+                                    register_access_cache_invalidation)
+from app.utils.access_control import has_project_access
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_local_cache_evicts_least_recently_used():
+    access_cache = LocalAccessCache(max_entries=2)
+    access_cache.set(1, 10, True)
+    access_cache.set(1, 11, False)
+    assert access_cache.get(1, 10) is True
+    access_cache.set(1, 12, True)
+
+    assert len(access_cache) == 2
+    assert access_cache.get(1, 11) is None
+    assert access_cache.get(1, 10) is True
+
+
+def test_local_cache_entries_expire():
+    clock = FakeClock()
+    access_cache = LocalAccessCache(ttl=5, clock=clock)
+    access_cache.set(1, 10, False)
+    clock.now = 4.9
+    assert access_cache.get(1, 10) is False
+    clock.now = 5
+    assert access_cache.get(1, 10) is None
+
+
+@pytest.mark.parametrize('factory', [LocalAccessCache, SharedAccessCache])
+def test_generations_invalidate_by_user_project_and_globally(db_app, factory):
+    access_cache = factory()
+    access_cache.set(1, 10, True)
+    access_cache.set(2, 10, True)
+    access_cache.set(2, 20, True)
+
+    access_cache.invalidate(user_id=1)
+    assert access_cache.get(1, 10) is None
+    assert access_cache.get(2, 10) is True
+
+    access_cache.invalidate(project_id=10)
+    assert access_cache.get(2, 10) is None
+    assert access_cache.get(2, 20) is True
+
+    access_cache.invalidate()
+    assert access_cache.get(2, 20) is None
+
+
+def test_membership_changes_invalidate_cached_decisions(db_app):
+    register_access_cache_invalidation()
+    user = User(email='member@example.com', name='Member')
+    project = Project(name='P1', number='P1', status='active', start_date=date(2024, 1, 1))
+    db.session.add_all([user, project])
+    db.session.commit()
+
+    assert has_project_access(user, project.id) is False
+
+    membership = ProjectTeamMember(project_id=project.id, user_id=user.id, role='member', added_by=user.id)
+    db.session.add(membership)
+    db.session.commit()
+    assert has_project_access(user, project.id) is True
+
+    db.session.delete(membership)
+    db.session.commit()
+    assert has_project_access(user, project.id) is False
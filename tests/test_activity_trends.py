@@ -0,0 +1,47 @@
+from datetime import date, datetime, timedelta
+
+from app.extensions import db
+from app.models.engineering import RFI
+from app.models.field import DailyReport
+from app.models.reports import ActivityRollup, ActivityRollupState
+from app.utils.activity_trends import ActivityTrends, densify
+
+
+def _rfi(project, number, created_at):
+    rfi = RFI(project_id=project.id, number=number, subject='s', question='?',
+              status='open', created_at=created_at)
+    db.session.add(rfi)
+    return rfi
+
+
+def test_densify_fills_missing_days():
+    start = date(2024, 3, 1)
+    assert densify({date(2024, 3, 2): 4}, start, 3) == [0, 4, 0]
+
+
+def test_series_counts_rollup_and_today(make_project):
+    now = datetime.utcnow()
+    first, second = make_project('P1'), make_project('P2')
+    old = _rfi(first, 'RFI-1', now - timedelta(days=2))
+    _rfi(first, 'RFI-2', now - timedelta(days=2))
+    _rfi(second, 'RFI-3', now - timedelta(days=1))
+    _rfi(first, 'RFI-4', now)
+    db.session.add(DailyReport(project_id=first.id, report_number='DR-1',
+                               report_date=now.date(), created_at=now - timedelta(days=40)))
+    db.session.commit()
+
+    series = ActivityTrends(days=5).series()
+
+    assert len(series['dates']) == 5
+    assert series['dates'][-1] == now.date().strftime('%Y-%m-%d')
+    assert series['rfis'] == [0, 0, 2, 1, 1]
+    assert series['reports'] == [0] * 5
+    assert ActivityRollupState.query.count() == 3
+
+    # Past days are served from the rollup, not recounted from raw rows
+    db.session.delete(old)
+    db.session.commit()
+    assert ActivityTrends(days=5).series()['rfis'] == [0, 0, 2, 1, 1]
+    assert ActivityRollup.query.filter_by(entity='reports').count() == 1
+
+    assert ActivityTrends([second.id], days=5).series()['rfis'] == [0, 0, 0, 1, 0]
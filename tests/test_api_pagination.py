@@ -0,0 +1,58 @@
+from datetime import date
+
+import pytest
+
+from app.api.pagination import CursorError, decode_cursor, encode_cursor
+from app.extensions import db
+from app.models.engineering import RFI
+from app.models.project import Project
+from app.models.user import Role, User
+
+
+def test_cursor_round_trip_and_validation():
+    token = encode_cursor('date_submitted', date(2024, 5, 1), 42)
+    assert decode_cursor(token, RFI.date_submitted) == (date(2024, 5, 1), 42)
+
+    with pytest.raises(CursorError):
+        decode_cursor(token, RFI.created_at)
+    with pytest.raises(CursorError):
+        decode_cursor('not-a-cursor', RFI.date_submitted)
+
+
+def test_rfi_pages_cover_every_row_once(api_client, bearer_headers):
+    admin_role = Role(name='Admin', permissions=63)
+    db.session.add(admin_role)
+    db.session.flush()
+    admin = User(email='admin@example.com', name='Admin', role=admin_role)
+    project = Project(name='P1', number='P1', status='active', start_date=date(2024, 1, 1))
+    db.session.add_all([admin, project])
+    db.session.flush()
+
+    days = [date(2024, 3, 1), date(2024, 3, 1), date(2024, 3, 2), None, date(2024, 2, 28), date(2024, 3, 1)]
+    for index, day in enumerate(days):
+        rfi = RFI(project_id=project.id, number=f'RFI-{index}', subject='s', question='?')
+        db.session.add(rfi)
+        db.session.flush()
+        rfi.date_submitted = day
+    db.session.commit()
+
+    headers = bearer_headers(admin)
+
+    seen, cursor = [], None
+    while True:
+        query = {'limit': 2}
+        if cursor:
+            query['cursor'] = cursor
+        body = api_client.get(f'/api/projects/{project.id}/rfis', query_string=query, headers=headers).get_json()
+        assert body['count'] <= 2
+        seen.extend(row['number'] for row in body['data'])
+        cursor = body['next_cursor']
+        if cursor is None:
+            break
+
+    # NULL dates first, then newest date, ties broken by id descending
+    assert seen == ['RFI-3', 'RFI-2', 'RFI-5', 'RFI-1', 'RFI-0', 'RFI-4']
+
+    response = api_client.get(f'/api/projects/{project.id}/rfis',
+                              query_string={'cursor': 'garbage'}, headers=headers)
+    assert response.status_code == 400
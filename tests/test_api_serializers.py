@@ -0,0 +1,60 @@
+from datetime import date
+
+import pytest
+from flask import g
+
+from app.extensions import cache, db
+from app.models.safety import SafetyObservation
+from app.models.user import User
+
+
+@pytest.fixture
+def seed(project_member, bearer_headers):
+    """Return a factory: a project with some safety observations, and its member's API headers"""
+    def make(observations):
+        project, member = project_member()
+        for index in range(observations):
+            observer = User(email=f'observer{index}@example.com', name=f'Observer {index}')
+            db.session.add(observer)
+            db.session.flush()
+            db.session.add(SafetyObservation(project_id=project.id, title=f'Obs {index}',
+                                             description='d', category='ppe', severity='low',
+                                             location='L1', observation_date=date(2024, 2, 1 + index),
+                                             observed_by=observer.id))
+        db.session.commit()
+        return project, bearer_headers(member)
+    return make
+
+
+def _statements_for(api_client, count_queries, seed, observations):
+    project, headers = seed(observations)
+    db.session.expire_all()
+    with count_queries() as counter:
+        response = api_client.get(f'/api/projects/{project.id}/safety/observations', headers=headers)
+    assert response.status_code == 200
+    assert response.get_json()['count'] == observations
+    return counter.count, response.get_json()['data']
+
+
+def test_observation_listing_runs_constant_queries(api_client, count_queries, seed):
+    few, data = _statements_for(api_client, count_queries, seed, 1)
+    assert data[0]['observed_by'] == 'Observer 0'
+
+    db.drop_all()
+    db.create_all()
+    # The new member reuses user ID 1: forget the project list cached for the old one
+    cache.clear()
+    g.pop('visible_projects', None)
+    many, data = _statements_for(api_client, count_queries, seed, 6)
+    assert {row['observed_by'] for row in data} == {f'Observer {i}' for i in range(6)}
+    assert many == few
+
+
+def test_non_member_is_forbidden(api_client, project_member, bearer_headers):
+    project, _ = project_member()
+    outsider = User(email='outsider@example.com', name='Outsider')
+    db.session.add(outsider)
+    db.session.commit()
+
+    response = api_client.get(f'/api/projects/{project.id}/rfis', headers=bearer_headers(outsider))
+    assert response.status_code == 403
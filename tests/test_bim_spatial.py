@@ -0,0 +1,65 @@
+from datetime import date
+
+import numpy as np
+
+from app.extensions import db
+from app.models.bim import BIMIssue, BIMModel
+from app.models.project import Project
+from app.models.user import User
+from app.utils.ifc_cache import ElementCache
+
+
+def _cache(bboxes):
+    n = len(bboxes)
+    empty = np.zeros(0, dtype=np.int32)
+    return ElementCache({
+        'express_ids': np.arange(n, dtype=np.int64),
+        'global_ids': np.array([f'{i:022d}' for i in range(n)], dtype='S22'),
+        'types': np.zeros(n, dtype=np.int32),
+        'names': np.full(n, -1, dtype=np.int32),
+        'bboxes': bboxes,
+        'prop_element': empty, 'prop_set': empty, 'prop_name': empty, 'prop_value': empty,
+        'string_data': np.frombuffer(b'IFCWALL', dtype=np.uint8),
+        'string_offsets': np.array([0, 7], dtype=np.int64),
+    })
+
+
+def test_grid_matches_a_full_scan():
+    rng = np.random.default_rng(7)
+    low = rng.uniform(0, 100000, (20000, 3))
+    size = rng.uniform(10, 2000, (20000, 3))
+    size[:20] *= 100  # Elements spanning many cells
+    bboxes = np.hstack([low, low + size])
+    bboxes[3] = np.nan  # No geometry
+    cache = _cache(bboxes)
+
+    queries = [[1000, 1000, 0, 5000, 5000, 100000], [50000, 50000, 0, 52000, 60000, 40000],
+               [0, 0, 0, 200000, 200000, 200000], [-10, -10, -10, -5, -5, -5], [99000, 0, 0, 120000, 500, 500]]
+    for query in queries:
+        query = np.array(query, dtype=float)
+        overlaps = np.all(bboxes[:, :3] <= query[3:], axis=1) & np.all(bboxes[:, 3:] >= query[:3], axis=1)
+        inside = np.all(bboxes[:, :3] >= query[:3], axis=1) & np.all(bboxes[:, 3:] <= query[3:], axis=1)
+        assert np.array_equal(cache.select(bbox=query), np.flatnonzero(overlaps))
+        assert np.array_equal(cache.select(bbox=query, contained=True), np.flatnonzero(inside))
+
+
+def test_open_issue_counts_are_preloaded_in_one_query(db_app, count_queries):
+    user = User(email='bim@example.com', name='BIM')
+    project = Project(name='P1', number='P1', status='active', start_date=date(2024, 1, 1))
+    db.session.add_all([user, project])
+    db.session.flush()
+    models = [BIMModel(name=f'M{i}', model_type='architectural', project_id=project.id, user_id=user.id)
+              for i in range(3)]
+    db.session.add_all(models)
+    db.session.flush()
+    for model, statuses in zip(models, (['open', 'open', 'resolved'], ['resolved'], [])):
+        db.session.add_all(BIMIssue(model_id=model.id, title='Clash', status=status, created_by=user.id)
+                           for status in statuses)
+    db.session.commit()
+
+    models = BIMModel.query.order_by(BIMModel.id).all()
+    with count_queries() as counter:
+        BIMModel.preload_open_issue_counts(models)
+        counts = [model.open_issues_count for model in models]
+    assert counts == [2, 0, 0]
+    assert counter.count == 1
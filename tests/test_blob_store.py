@@ -0,0 +1,122 @@
+import io
+import os
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from app.extensions import db
+from app.models.base import StoredBlob
+from app.utils import blob_store
+from app.utils.file_upload import delete_file, save_file
+
+
+@pytest.fixture
+def store_app(db_app, tmp_path):
+    db_app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    blob_store.register_blob_store_listeners()
+    return db_app
+
+
+def _upload(content, name='specs.pdf'):
+    return FileStorage(stream=io.BytesIO(content), filename=name)
+
+
+def test_identical_uploads_share_one_file(store_app, tmp_path, monkeypatch):
+    first = save_file(_upload(b'spec book'))
+    db.session.commit()
+    assert first.startswith('blobs/') and first.endswith('.pdf')
+
+    writes = []
+    monkeypatch.setattr(blob_store, '_write_blob', lambda *args: writes.append(args))
+    second = save_file(_upload(b'spec book', 'copy-of-specs.pdf'))
+    db.session.commit()
+
+    assert second == first
+    assert writes == []
+    assert StoredBlob.query.one().refcount == 2
+    assert sum(len(names) for _, _, names in os.walk(tmp_path)) == 1
+
+
+def test_file_is_removed_with_its_last_reference(store_app):
+    path = save_file(_upload(b'drawing set'))
+    save_file(_upload(b'drawing set'))
+    db.session.commit()
+    absolute = blob_store.absolute_path(path)
+
+    assert delete_file(path)
+    db.session.commit()
+    assert os.path.exists(absolute)
+
+    delete_file(path)
+    db.session.rollback()
+    assert os.path.exists(absolute) and StoredBlob.query.one().refcount == 1
+
+    delete_file(path)
+    db.session.commit()
+    assert not os.path.exists(absolute)
+    assert StoredBlob.query.count() == 0
+
+
+def test_missing_blob_file_is_rewritten(store_app):
+    path = save_file(_upload(b'ifc'))
+    db.session.commit()
+    os.remove(blob_store.absolute_path(path))
+
+    assert save_file(_upload(b'ifc')) == path
+    db.session.commit()
+    with open(blob_store.absolute_path(path), 'rb') as f:
+        assert f.read() == b'ifc'
+
+
+def test_deleting_an_rfi_releases_its_attachments(store_app):
+    from datetime import date
+
+    from flask import g
+
+    from app.extensions import login_manager
+    from app.models.base import Attachment
+    from app.models.engineering import RFI
+    from app.models.project import Project
+    from app.models.user import User
+    from app.projects.engineering import engineering_bp
+
+    login_manager.init_app(store_app)
+    store_app.register_blueprint(engineering_bp, url_prefix='/projects', name='projects_engineering')
+    user = User(email='pm@example.com', name='PM')
+    project = Project(name='P1', number='P1', status='active', start_date=date(2024, 1, 1))
+    db.session.add_all([user, project])
+    db.session.flush()
+    rfi = RFI(project_id=project.id, number='RFI-001', subject='Footing', question='Depth?')
+    db.session.add(rfi)
+    db.session.flush()
+    # The same sketch is attached to the RFI and kept on another record
+    path = save_file(_upload(b'sketch', 'sketch.pdf'))
+    db.session.add(Attachment(filename='sketch.pdf', file_path=path, record_id=rfi.id, module_name='rfi',
+                              user_id=user.id))
+    kept = save_file(_upload(b'sketch', 'sketch.pdf'))
+    db.session.commit()
+
+    client = store_app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+    g.pop('_login_user', None)
+    assert client.post(f'/projects/{rfi.id}/engineering/rfis/delete').status_code == 302
+
+    assert db.session.get(RFI, rfi.id) is None and Attachment.query.count() == 0
+    assert StoredBlob.query.one().refcount == 1
+    assert os.path.exists(blob_store.absolute_path(kept))
+
+
+def test_files_saved_before_the_blob_store_still_resolve(store_app, tmp_path):
+    store_app.static_folder = str(tmp_path / 'static')
+    legacy = 'uploads/projects/1/photos/abc_site.jpg'
+    legacy_file = tmp_path / 'static' / 'uploads' / 'projects' / '1' / 'photos' / 'abc_site.jpg'
+    legacy_file.parent.mkdir(parents=True)
+    legacy_file.write_bytes(b'jpeg')
+
+    assert blob_store.absolute_path(legacy) == str(legacy_file)
+    assert blob_store.absolute_path(str(legacy_file)) == str(legacy_file)
+    assert blob_store.absolute_path('uploads/../../config.py') is None
+    assert blob_store.absolute_path('blobs/../../etc/passwd') is None
+
+    assert delete_file(legacy) and not legacy_file.exists()
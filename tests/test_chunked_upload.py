@@ -0,0 +1,155 @@
+import hashlib
+import io
+import os
+import threading
+
+import pytest
+
+from app.extensions import db
+from app.models.base import StoredBlob, UploadSession
+from app.models.bim import BIMModel
+from app.models.closeout import OperationAndMaintenanceManual
+from app.models.user import User
+from app.utils import blob_store
+from app.utils.chunked_upload import UploadError, partial_path, write_chunk
+
+PAYLOAD = os.urandom(3 * 1024 * 1024 + 17)
+
+
+@pytest.fixture
+def upload_client(api_client, db_app, tmp_path):
+    db_app.config.update(UPLOAD_FOLDER=str(tmp_path / 'uploads'), ALLOWED_EXTENSIONS={'pdf'})
+    return api_client
+
+
+@pytest.fixture
+def member(project_member, bearer_headers):
+    """ID of a project and API headers for a member of its team"""
+    project, user = project_member()
+    return project.id, bearer_headers(user)
+
+
+def _open(client, headers, project_id, **fields):
+    body = {'project_id': project_id, 'size': len(PAYLOAD), **fields}
+    response = client.post('/api/uploads', json=body, headers=headers)
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()['data']['id']
+
+
+def _put(client, headers, upload_id, start, end):
+    return client.put(f'/api/uploads/{upload_id}', data=PAYLOAD[start:end], headers={
+        **headers, 'Content-Range': f'bytes {start}-{end - 1}/{len(PAYLOAD)}'})
+
+
+def test_chunked_ifc_upload_creates_model_and_versions(upload_client, member):
+    project_id, headers = member
+    chunk = 1024 * 1024
+
+    for version in (1, 2):
+        fields = {'target': 'bim_model', 'filename': 'tower.ifc',
+                  'sha256': hashlib.sha256(PAYLOAD).hexdigest()}
+        fields['options'] = {'name': 'Tower', 'model_type': 'architectural'} if version == 1 else \
+            {'model_id': BIMModel.query.one().id}
+        upload_id = _open(upload_client, headers, project_id, **fields)
+        for start in range(0, len(PAYLOAD), chunk):
+            response = _put(upload_client, headers, upload_id, start, min(start + chunk, len(PAYLOAD)))
+            assert response.status_code == 200
+        response = upload_client.post(f'/api/uploads/{upload_id}/finalize', headers=headers)
+        assert response.status_code == 201, response.get_json()
+        assert response.get_json()['data']['status'] == 'complete'
+
+    model = BIMModel.query.one()
+    assert model.current_version.version_number == 2
+    assert model.versions[0].file_path == model.versions[1].file_path
+    with open(blob_store.absolute_path(model.current_version.file_path), 'rb') as f:
+        assert f.read() == PAYLOAD
+    assert StoredBlob.query.one().refcount == 2
+
+
+def test_resume_after_rejected_chunk_and_checksum_mismatch(upload_client, member):
+    project_id, headers = member
+    upload_id = _open(upload_client, headers, project_id, target='om_manual', filename='pump.pdf',
+                      options={'title': 'Pump O&M', 'manufacturer': 'Acme'})
+
+    assert _put(upload_client, headers, upload_id, 0, 1000).status_code == 200
+    # Chunk at the wrong offset: rejected, and the server says where to resume
+    response = _put(upload_client, headers, upload_id, 2000, 3000)
+    assert response.status_code == 409
+    assert response.headers['Upload-Offset'] == '1000'
+    assert upload_client.get(f'/api/uploads/{upload_id}', headers=headers).get_json()['data']['offset'] == 1000
+    assert upload_client.post(f'/api/uploads/{upload_id}/finalize', headers=headers).status_code == 409
+
+    assert _put(upload_client, headers, upload_id, 1000, len(PAYLOAD)).status_code == 200
+    assert upload_client.post(f'/api/uploads/{upload_id}/finalize', headers=headers).status_code == 201
+    manual = OperationAndMaintenanceManual.query.one()
+    assert (manual.title, manual.manufacturer, manual.file_size) == ('Pump O&M', 'Acme', len(PAYLOAD))
+
+    bad_id = _open(upload_client, headers, project_id, target='om_manual', filename='pump.pdf',
+                   sha256='0' * 64)
+    assert _put(upload_client, headers, bad_id, 0, len(PAYLOAD)).status_code == 200
+    assert upload_client.post(f'/api/uploads/{bad_id}/finalize', headers=headers).status_code == 422
+    assert upload_client.get(f'/api/uploads/{bad_id}', headers=headers).status_code == 404
+
+
+def test_rejects_bad_targets_and_other_users_uploads(upload_client, member, bearer_headers):
+    project_id, headers = member
+    response = upload_client.post('/api/uploads', json={'project_id': project_id, 'target': 'bim_model',
+                                                        'filename': 'model.exe', 'size': 10}, headers=headers)
+    assert response.status_code == 400
+
+    upload_id = _open(upload_client, headers, project_id, target='om_manual', filename='pump.pdf')
+    outsider = User(email='outsider@example.com', name='Outsider')
+    db.session.add(outsider)
+    db.session.commit()
+    response = upload_client.get(f'/api/uploads/{upload_id}', headers=bearer_headers(outsider))
+    assert response.status_code == 404
+
+
+def test_same_chunk_sent_twice_concurrently_is_appended_once(db_app, tmp_path):
+    db_app.config.update(UPLOAD_FOLDER=str(tmp_path / 'uploads'))
+    upload = UploadSession(id='a' * 32, total_size=2000, status='pending')
+    started, release = threading.Event(), threading.Event()
+
+    class SlowStream:
+        """The first request's body, stalled on the network after its first block"""
+        blocks = [PAYLOAD[:1000]]
+
+        def read(self, size):
+            if not self.blocks:
+                return b''
+            started.set()
+            release.wait(5)
+            return self.blocks.pop()
+
+    results = {}
+
+    def put(name, stream):
+        with db_app.app_context():
+            try:
+                results[name] = write_chunk(upload, 0, stream, 1000)
+            except UploadError as e:
+                results[name] = e.status
+
+    with db_app.app_context():
+        open(partial_path(upload), 'wb').close()
+    first = threading.Thread(target=put, args=('first', SlowStream()))
+    first.start()
+    assert started.wait(5)
+    retry = threading.Thread(target=put, args=('retry', io.BytesIO(PAYLOAD[:1000])))
+    retry.start()
+    retry.join(0.2)
+    release.set()
+    first.join(5)
+    retry.join(5)
+
+    assert results == {'first': 1000, 'retry': 409}
+    with db_app.app_context():
+        assert os.path.getsize(partial_path(upload)) == 1000
+
+
+def test_non_numeric_option_ids_are_rejected(upload_client, member):
+    project_id, headers = member
+    response = upload_client.post('/api/uploads', json={
+        'project_id': project_id, 'target': 'bim_model', 'filename': 'tower.ifc', 'size': 10,
+        'options': {'model_id': 'latest'}}, headers=headers)
+    assert response.status_code == 400
@@ -0,0 +1,101 @@
+from datetime import date
+from decimal import Decimal
+
+from app.extensions import db
+from app.models.project import Project
+from app.models.cost import (Budget, BudgetItem, ChangeOrder, DirectCost, Invoice,
+                             PotentialChangeOrder, ProjectCostRollup)
+from app.utils.cost_rollup import (compute_cost_totals, rebuild_cost_rollups,
+                                   register_cost_rollup_listeners)
+
+
+def _rollup(project_id):
+    db.session.expire_all()
+    return db.session.get(ProjectCostRollup, project_id)
+
+
+def test_listeners_keep_rollup_in_sync(make_project):
+    register_cost_rollup_listeners()
+    project = make_project('P1')
+    budget = Budget(project_id=project.id, name='Base', total_amount=Decimal('1000'))
+    db.session.add(budget)
+    db.session.flush()
+    db.session.add_all([
+        BudgetItem(budget_id=budget.id, description='Concrete', estimated_amount=Decimal('600')),
+        BudgetItem(budget_id=budget.id, description='Steel', estimated_amount=Decimal('400')),
+        Invoice(project_id=project.id, invoice_number='INV-1', amount=Decimal('250'),
+                date_issued=date(2024, 2, 1), status='paid'),
+        DirectCost(project_id=project.id, description='Crane', amount=Decimal('75'),
+                   date_incurred=date(2024, 2, 2)),
+        PotentialChangeOrder(project_id=project.id, pco_number='PCO-1', title='p',
+                             amount=Decimal('30'), status='submitted'),
+    ])
+    change_order = ChangeOrder(project_id=project.id, change_order_number='CO-1', title='co',
+                               amount=Decimal('120'), status='draft')
+    db.session.add(change_order)
+    db.session.commit()
+
+    rollup = _rollup(project.id)
+    assert rollup.original_budget == Decimal('1000')
+    assert rollup.total_invoiced == Decimal('250')
+    assert rollup.paid_invoiced == Decimal('250')
+    assert rollup.direct_costs == Decimal('75')
+    assert rollup.pending_change_orders == Decimal('30')
+    assert rollup.approved_change_orders == 0
+
+    change_order = db.session.get(ChangeOrder, change_order.id)
+    change_order.status = 'approved'
+    db.session.commit()
+    assert _rollup(project.id).approved_change_orders == Decimal('120')
+
+    # Expired attributes have no history; the project is recomputed instead
+    change_order.amount = Decimal('200')
+    db.session.commit()
+    assert _rollup(project.id).approved_change_orders == Decimal('200')
+
+    db.session.delete(db.session.get(ChangeOrder, change_order.id))
+    db.session.commit()
+    rollup = _rollup(project.id)
+    assert rollup.approved_change_orders == 0
+    expected = compute_cost_totals(db.session.connection())[project.id]
+    assert {column: getattr(rollup, column) for column in expected} == expected
+
+
+def test_rebuild_writes_rows_for_requested_projects(make_project):
+    first, second = make_project('P1'), make_project('P2')
+    db.session.add(DirectCost(project_id=first.id, description='x', amount=Decimal('10'),
+                              date_incurred=date(2024, 2, 2)))
+    db.session.commit()
+
+    assert rebuild_cost_rollups() == 1
+    assert rebuild_cost_rollups([second.id]) == 1
+    assert _rollup(first.id).direct_costs == Decimal('10')
+    assert _rollup(second.id).direct_costs == 0
+
+
+def test_row_created_concurrently_is_overwritten_with_fresh_totals(make_project, monkeypatch):
+    from sqlalchemy import delete, false
+
+    from app.utils import cost_rollup
+
+    project = make_project('P1')
+    db.session.add(DirectCost(project_id=project.id, description='x', amount=Decimal('10'),
+                              date_incurred=date(2024, 2, 2)))
+    # Stands in for a row another transaction inserted after our delete ran
+    db.session.add(ProjectCostRollup(project_id=project.id, direct_costs=Decimal('3')))
+    db.session.commit()
+    monkeypatch.setattr(cost_rollup, 'delete', lambda table: delete(table).where(false()))
+
+    assert rebuild_cost_rollups([project.id]) == 1
+    assert _rollup(project.id).direct_costs == Decimal('10')
+
+
+def test_deleting_a_project_deletes_its_rollup(make_project):
+    register_cost_rollup_listeners()
+    project = make_project('P1')
+    db.session.commit()
+    assert rebuild_cost_rollups([project.id]) == 1
+
+    db.session.delete(db.session.get(Project, project.id))
+    db.session.commit()
+    assert _rollup(project.id) is None
@@ -0,0 +1,92 @@
+from datetime import date
+
+import pytest
+
+from app.extensions import db
+from app.models.field import DailyReport, EquipmentEntry, LaborEntry, ProjectPhoto
+from app.models.project import Project
+from app.utils.daily_report_binder import binder_cache_key, iter_binder_documents, report_totals
+from app.utils.pdf_generator import pdf_photo_src
+
+
+@pytest.fixture
+def binder_app(db_app, tmp_path):
+    db_app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    db_app.add_template_filter(lambda text: text, 'nl2br')
+    db_app.add_template_global(pdf_photo_src, 'pdf_photo_src')
+    return db_app
+
+
+def _seed(days):
+    project = Project(name='Tower', number='T-1', status='active', start_date=date(2024, 1, 1))
+    db.session.add(project)
+    db.session.flush()
+    reports = []
+    for day in range(1, days + 1):
+        report = DailyReport(project_id=project.id, report_number=f'DR-{day}', report_date=date(2024, 5, day))
+        db.session.add(report)
+        db.session.flush()
+        db.session.add_all([
+            LaborEntry(daily_report_id=report.id, company='A', worker_count=day, hours_worked=8),
+            LaborEntry(daily_report_id=report.id, company='B', worker_count=2, hours_worked=4),
+            EquipmentEntry(daily_report_id=report.id, equipment_type='Crane', count=1, hours_used=6.5),
+        ])
+        reports.append(report)
+    db.session.commit()
+    return project, reports
+
+
+def test_totals_for_all_reports_in_one_query(binder_app, count_queries):
+    _, reports = _seed(3)
+    ids = [report.id for report in reports]
+
+    with count_queries() as counter:
+        totals = report_totals(ids)
+    assert counter.count == 1
+    assert totals[ids[2]] == {'total_workers': 5, 'total_man_hours': 32.0,
+                              'total_equipment': 1, 'total_equipment_hours': 6.5}
+
+
+def test_binder_documents_use_constant_queries(binder_app, count_queries):
+    project, _ = _seed(2)
+    with binder_app.test_request_context():
+        with count_queries() as few:
+            documents = list(iter_binder_documents(project, date(2024, 5, 1), date(2024, 5, 31)))
+        assert len(documents) == 3
+        assert 'DR-1' in documents[0] and 'DR-2' in documents[0]
+        assert 'Daily Report: DR-2' in documents[2]
+        assert '<style>' not in documents[1]
+
+    db.session.add(DailyReport(project_id=project.id, report_number='DR-3', report_date=date(2024, 5, 3)))
+    db.session.commit()
+    with binder_app.test_request_context():
+        with count_queries() as more:
+            list(iter_binder_documents(project, date(2024, 5, 1), date(2024, 5, 31)))
+    assert more.count == few.count
+
+
+def test_binder_key_changes_with_reports_in_range(binder_app):
+    project, reports = _seed(2)
+    start, end = date(2024, 5, 1), date(2024, 5, 31)
+    key = binder_cache_key(project.id, start, end)
+    assert key == binder_cache_key(project.id, start, end)
+    assert key != binder_cache_key(project.id, start, date(2024, 5, 1))
+
+    reports[1].report_date = date(2024, 6, 2)
+    db.session.commit()
+    assert key != binder_cache_key(project.id, start, end)
+
+
+def test_photos_are_read_from_the_private_upload_folder(binder_app, tmp_path):
+    project, reports = _seed(1)
+    medium = tmp_path / 'blobs' / 'ab' / 'cd' / 'abcd.medium.jpg'
+    medium.parent.mkdir(parents=True)
+    medium.write_bytes(b'jpeg')
+    db.session.add(ProjectPhoto(project_id=project.id, daily_report_id=reports[0].id, title='Pour',
+                                file_path='blobs/ab/cd/abcd.jpg',
+                                derivatives={'medium': 'blobs/ab/cd/abcd.medium.jpg'}))
+    db.session.commit()
+
+    with binder_app.test_request_context():
+        documents = list(iter_binder_documents(project, date(2024, 5, 1), date(2024, 5, 31)))
+    assert f'src="{medium.as_uri()}"' in documents[1]
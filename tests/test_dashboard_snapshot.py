@@ -0,0 +1,63 @@
+from decimal import Decimal
+
+import pytest
+
+from app.extensions import db
+from app.models.engineering import RFI, Submittal
+from app.models.cost import ChangeOrder
+from app.utils.dashboard_snapshot import DashboardSnapshot, register_snapshot_invalidation
+
+
+@pytest.fixture
+def projects(make_project):
+    """An active and a planning project with RFIs, a submittal and change orders"""
+    first = make_project('P1')
+    second = make_project('P2', status='planning')
+    db.session.add_all([
+        RFI(project_id=first.id, number='RFI-1', subject='a', question='?', status='open'),
+        RFI(project_id=second.id, number='RFI-2', subject='b', question='?', status='open'),
+        RFI(project_id=second.id, number='RFI-3', subject='c', question='?', status='closed'),
+        Submittal(project_id=first.id, number='S-1', title='s', status='pending'),
+        ChangeOrder(project_id=first.id, change_order_number='CO-1', title='co',
+                    amount=Decimal('1500.00'), status='approved'),
+        ChangeOrder(project_id=second.id, change_order_number='CO-2', title='co',
+                    amount=Decimal('99.00'), status='draft'),
+    ])
+    db.session.commit()
+    return first, second
+
+
+def test_snapshot_counts_all_projects(projects):
+    data = DashboardSnapshot().compute()
+
+    assert data['stats'] == {
+        'total_projects': 2,
+        'active_projects': 1,
+        'rfis_open': 2,
+        'submittals_pending': 1,
+        'punchlist_items': 0,
+        'change_order_value': 1500.0,
+    }
+    assert data['status_counts'] == [['active', 1], ['planning', 1]]
+
+
+def test_snapshot_respects_project_scope(projects):
+    first, second = projects
+    stats = DashboardSnapshot([second.id]).compute()['stats']
+
+    assert stats['total_projects'] == 1
+    assert stats['rfis_open'] == 1
+    assert stats['change_order_value'] == 0.0
+    assert DashboardSnapshot([]).compute()['stats']['total_projects'] == 0
+
+
+def test_snapshot_cache_is_invalidated_on_commit(projects):
+    register_snapshot_invalidation()
+    first, _ = projects
+    snapshot = DashboardSnapshot()
+    assert snapshot.get()['stats']['rfis_open'] == 2
+
+    db.session.add(RFI(project_id=first.id, number='RFI-4', subject='d', question='?', status='open'))
+    db.session.commit()
+
+    assert snapshot.get()['stats']['rfis_open'] == 3
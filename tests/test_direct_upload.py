@@ -0,0 +1,79 @@
+import io
+import json
+import os
+from datetime import date
+
+import pytest
+
+from app.extensions import db
+from app.models.base import UploadSession
+from app.models.field import ProjectPhoto
+from app.models.project import Project
+from app.models.user import User, UserProject
+
+JPEG = b'\xff\xd8\xff\xe0' + os.urandom(200 * 1024)
+
+
+@pytest.fixture
+def photo_client(db_app, tmp_path):
+    from app.api.mobile_routes import create_token, mobile_bp
+
+    db_app.config.update(UPLOAD_FOLDER=str(tmp_path / 'uploads'), MOBILE_UPLOAD_MAX_SIZE=1024 * 1024)
+    db_app.register_blueprint(mobile_bp, url_prefix='/api/mobile')
+    user = User(email='field@example.com', name='Field')
+    mine = Project(name='P1', number='P1', status='active', start_date=date(2024, 1, 1))
+    other = Project(name='P2', number='P2', status='active', start_date=date(2024, 1, 1))
+    db.session.add_all([user, mine, other])
+    db.session.flush()
+    db.session.add(UserProject(user_id=user.id, project_id=mine.id))
+    db.session.commit()
+    headers = {'Authorization': f'Bearer {create_token(user.id)}'}
+    return db_app.test_client(), headers, mine.id, other.id, tmp_path / 'uploads' / 'partial'
+
+
+def test_raw_upload_is_idempotent(photo_client):
+    client, headers, project_id, other_id, partial = photo_client
+    url = f'/api/mobile/upload-photo?project_id={project_id}&filename=site.jpg&title=Slab'
+    headers = {**headers, 'Idempotency-Key': 'photo-1', 'Content-Type': 'image/jpeg'}
+
+    first = client.post(url, data=JPEG, headers=headers)
+    assert first.status_code == 201, first.get_json()
+    retry = client.post(url, data=JPEG, headers=headers)
+    assert retry.status_code == 200 and retry.get_json()['duplicate']
+    assert retry.get_json()['photo_id'] == first.get_json()['photo_id']
+    photo = ProjectPhoto.query.one()
+    assert photo.title == 'Slab' and photo.file_size == len(JPEG)
+
+    assert client.post(url.replace(str(project_id), str(other_id)), data=JPEG, headers=headers).status_code == 403
+    too_big = client.post(url, data=JPEG * 6, headers={**headers, 'Idempotency-Key': 'photo-2'})
+    assert too_big.status_code == 413
+    assert client.post(url, data=b'{}', headers={**headers, 'Content-Type': 'application/json'}).status_code == 415
+    assert os.listdir(partial) == []
+
+
+def test_multipart_batch_reports_each_photo(photo_client):
+    client, headers, project_id, _, partial = photo_client
+    client.post(f'/api/mobile/upload-photo?project_id={project_id}&filename=a.jpg', data=JPEG,
+                headers={**headers, 'Idempotency-Key': 'a', 'Content-Type': 'image/jpeg'})
+
+    response = client.post('/api/mobile/upload-photo', headers=headers, data={
+        'project_id': str(project_id),
+        'metadata': json.dumps({'b': {'title': 'Rebar', 'location': 'Grid B4'}}),
+        'a': (io.BytesIO(JPEG), 'a.jpg', 'image/jpeg'),
+        'b': (io.BytesIO(JPEG[::-1]), 'b.jpg', 'image/jpeg'),
+        'c': (io.BytesIO(b'%PDF'), 'c.pdf', 'application/pdf'),
+        'd': (io.BytesIO(JPEG * 6), 'd.jpg', 'image/jpeg'),
+        'e': (io.BytesIO(JPEG[1:]), 'e.jpg', 'image/jpeg'),
+    })
+    body = response.get_json()
+    assert response.status_code == 200 and not body['success']
+    results = {result['key']: result for result in body['results']}
+    assert results['a']['duplicate'] and results['b']['success'] and not results['b']['duplicate']
+    assert 'extension' in results['c']['error']
+    # An oversized photo fails alone; the one after it is still stored
+    assert 'larger' in results['d']['error'] and results['e']['success']
+
+    assert ProjectPhoto.query.count() == 3
+    assert db.session.get(ProjectPhoto, results['b']['photo_id']).location == 'Grid B4'
+    assert UploadSession.query.filter_by(idempotency_key='b').one().status == 'complete'
+    assert os.listdir(partial) == []
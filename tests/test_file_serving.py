@@ -0,0 +1,56 @@
+import pytest
+
+from app.utils.file_serving import serve_file
+
+CONTENT = bytes(range(256)) * 64
+
+
+@pytest.fixture
+def serving_app(db_app, tmp_path):
+    path = tmp_path / 'models' / 'tower.ifc'
+    path.parent.mkdir()
+    path.write_bytes(CONTENT)
+    db_app.config['FILE_SERVE_BUFFER_SIZE'] = 1000
+    db_app.add_url_rule('/model', 'model', lambda: serve_file(str(path), etag='abc123'))
+    return db_app
+
+
+def test_full_and_conditional_responses(serving_app):
+    client = serving_app.test_client()
+    response = client.get('/model')
+    assert response.status_code == 200
+    assert response.data == CONTENT
+    assert response.headers['Content-Length'] == str(len(CONTENT))
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert response.get_etag() == ('abc123', False)
+
+    assert client.get('/model', headers={'If-None-Match': '"abc123"'}).status_code == 304
+    assert client.get('/model', headers={'If-None-Match': '"other"'}).status_code == 200
+
+
+def test_byte_ranges(serving_app):
+    client = serving_app.test_client()
+    response = client.get('/model', headers={'Range': 'bytes=1000-4999'})
+    assert response.status_code == 206
+    assert response.data == CONTENT[1000:5000]
+    assert response.headers['Content-Range'] == f'bytes 1000-4999/{len(CONTENT)}'
+
+    response = client.get('/model', headers={'Range': 'bytes=-10'})
+    assert response.status_code == 206 and response.data == CONTENT[-10:]
+
+    response = client.get('/model', headers={'Range': f'bytes={len(CONTENT)}-'})
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == f'bytes */{len(CONTENT)}'
+
+    # A stale If-Range or several ranges fall back to the whole file
+    response = client.get('/model', headers={'Range': 'bytes=0-9', 'If-Range': '"old"'})
+    assert response.status_code == 200 and response.data == CONTENT
+    assert client.get('/model', headers={'Range': 'bytes=0-9,20-29'}).status_code == 200
+
+
+def test_accel_redirect_hands_off_to_nginx(serving_app, tmp_path):
+    serving_app.config['X_ACCEL_MAPPINGS'] = f'{tmp_path}=/protected/files'
+    response = serving_app.test_client().get('/model', headers={'Range': 'bytes=0-9'})
+    assert response.status_code == 200
+    assert response.headers['X-Accel-Redirect'] == '/protected/files/models/tower.ifc'
+    assert response.data == b''
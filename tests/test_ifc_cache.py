@@ -0,0 +1,117 @@
+import os
+from datetime import date
+
+import numpy as np
+import pytest
+
+from app.extensions import db
+from app.models.bim import BIMModel, BIMModelVersion
+from app.models.project import Project
+from app.models.user import User
+from app.utils import ifc_cache
+
+IFC = """ISO-10303-21;
+HEADER;
+FILE_DESCRIPTION(('ViewDefinition [CoordinationView]'),'2;1');
+FILE_NAME('tower.ifc','2024-01-01T00:00:00',(''),(''),'','','');
+FILE_SCHEMA(('IFC4'));
+ENDSEC;
+DATA;
+#1=IFCPROJECT('0YvctVUKr0kugbFTf53O9L',$,'Tower',$,$,$,$,$,$);
+#10=IFCCARTESIANPOINT((0.,0.,0.));
+#11=IFCDIRECTION((0.,0.,1.));
+#12=IFCDIRECTION((1.,0.,0.));
+#13=IFCAXIS2PLACEMENT3D(#10,$,$);
+#14=IFCLOCALPLACEMENT($,#13);
+#15=IFCCARTESIANPOINT((0.,0.,3000.));
+#16=IFCAXIS2PLACEMENT3D(#15,$,$);
+#17=IFCLOCALPLACEMENT(#14,#16);
+#20=IFCBUILDINGSTOREY('2FOHCTCsD5Ee2OBBPAGa0E',$,'Level 1',$,$,#17,$,$,.ELEMENT.,3000.);
+#30=IFCCARTESIANPOINT((1000.,0.,0.));
+#31=IFCAXIS2PLACEMENT3D(#30,#11,#12);
+#32=IFCLOCALPLACEMENT(#17,#31);
+#33=IFCAXIS2PLACEMENT2D(#10,$);
+#34=IFCRECTANGLEPROFILEDEF(.AREA.,$,#33,4000.,200.);
+#35=IFCEXTRUDEDAREASOLID(#34,#13,#11,2800.);
+#36=IFCSHAPEREPRESENTATION($,'Body','SweptSolid',(#35));
+#37=IFCPRODUCTDEFINITIONSHAPE($,$,(#36));
+#38=IFCWALL('3cUkl32yn9qRSPvBJVyWYp',$,'Wall \\X2\\00E9\\X0\\st',$,$,#32,#37,$,.STANDARD.);
+#40=IFCCARTESIANPOINT((20000.,20000.,0.));
+#41=IFCAXIS2PLACEMENT3D(#40,$,$);
+#42=IFCLOCALPLACEMENT(#17,#41);
+#43=IFCCARTESIANPOINT((0.,0.,0.));
+#44=IFCBOUNDINGBOX(#43,1000.,1000.,250.);
+#45=IFCSHAPEREPRESENTATION($,'Box','BoundingBox',(#44));
+#46=IFCPRODUCTDEFINITIONSHAPE($,$,(#45));
+#47=IFCSLAB('1kTvXnbbzCWw8lcMd1dR4o',$,'Roof slab',$,$,#42,#46,$,.ROOF.);
+#50=IFCPROPERTYSINGLEVALUE('IsExternal',$,IFCBOOLEAN(.T.),$);
+#51=IFCPROPERTYSINGLEVALUE('FireRating',$,IFCLABEL('2HR'),$);
+#52=IFCPROPERTYSET('2hT$7b0bD0BwvE0bEJFnKz',$,'Pset_WallCommon',$,(#50,#51));
+#53=IFCRELDEFINESBYPROPERTIES('0nE3bD3$54Kw0rG5dnKDGh',$,$,$,(#38),#52);
+#54=IFCQUANTITYAREA('GrossArea',$,$,1000000.,$);
+#55=IFCELEMENTQUANTITY('3Hk0ZH0fP7yA8$EAgkT0mz',$,'Qto_SlabBaseQuantities',$,$,(#54));
+#56=IFCPROPERTYSET('1Y2jg6Bb5EaOCiCRVpXz5s',$,'Pset_SlabCommon',$,(#50));
+#57=IFCRELDEFINESBYPROPERTIES('2kYqMdXV5A2hnJ0mU4aG_l',$,$,$,(#47),#55);
+#58=IFCRELDEFINESBYPROPERTIES('0G$M2cfS10OwBoRc3Lq7Ra',$,$,$,(#47),#56);
+ENDSEC;
+END-ISO-10303-21;
+"""
+
+
+@pytest.fixture
+def ifc_path(tmp_path):
+    path = tmp_path / 'tower.ifc'
+    path.write_text(IFC, encoding='latin-1')
+    return str(path)
+
+
+def test_element_index_properties_and_bounding_boxes(db_app, ifc_path):
+    assert ifc_cache.build_element_cache(ifc_path, ifc_cache.cache_path_for(ifc_path)) == 3
+    cache = ifc_cache.get_element_cache(ifc_path)
+
+    wall = cache.summary(cache.find('3cUkl32yn9qRSPvBJVyWYp'))
+    assert (wall['express_id'], wall['type'], wall['name']) == (38, 'IFCWALL', 'Wall ést')
+    # Rectangle centred on the wall's placement, 1000 along x and on the storey at z=3000
+    assert np.allclose(wall['bbox'], [-1000, -100, 3000, 3000, 100, 5800])
+    assert cache.properties(cache.find('3cUkl32yn9qRSPvBJVyWYp')) == \
+        {'Pset_WallCommon': {'IsExternal': 'true', 'FireRating': '2HR'}}
+    assert cache.find('0000000000000000000000') is None
+
+    def global_ids(indices):
+        return sorted(cache.summary(i)['global_id'] for i in indices)
+
+    assert global_ids(cache.select(prop='IsExternal', value='true')) == \
+        ['1kTvXnbbzCWw8lcMd1dR4o', '3cUkl32yn9qRSPvBJVyWYp']
+    assert global_ids(cache.select(ifc_type='IfcSlab', pset='Qto_SlabBaseQuantities')) == ['1kTvXnbbzCWw8lcMd1dR4o']
+    assert len(cache.select(pset='Pset_Missing')) == 0
+
+    assert global_ids(cache.select(bbox=[19500, 19500, 0, 20500, 20500, 10000])) == ['1kTvXnbbzCWw8lcMd1dR4o']
+    assert len(cache.select(bbox=[19500, 19500, 0, 20500, 20500, 10000], contained=True)) == 0
+    # The storey has no geometry: its box is its placement origin
+    assert global_ids(cache.select(ifc_type='IFCBUILDINGSTOREY', bbox=[0, 0, 0, 1, 1, 3000])) == \
+        ['2FOHCTCsD5Ee2OBBPAGa0E']
+
+
+def test_new_versions_are_indexed_after_commit(db_app, tmp_path, ifc_path):
+    db_app.config['BIM_INGEST_WORKERS'] = 0
+    ifc_cache.register_ifc_cache_listeners()
+    user = User(email='bim@example.com', name='BIM')
+    project = Project(name='P1', number='P1', status='active', start_date=date(2024, 1, 1))
+    db.session.add_all([user, project])
+    db.session.flush()
+    model = BIMModel(name='Tower', model_type='architectural', project_id=project.id, user_id=user.id)
+    db.session.add(model)
+    db.session.flush()
+    db.session.add(BIMModelVersion(model_id=model.id, version_number=1, file_path=ifc_path, user_id=user.id))
+    assert not os.path.exists(ifc_cache.cache_path_for(ifc_path))
+
+    db.session.commit()
+    assert len(ifc_cache.get_element_cache(ifc_path)) == 3
+
+
+def test_failed_ingest_is_recorded(tmp_path):
+    missing = str(tmp_path / 'missing.ifc')
+    with pytest.raises(OSError):
+        ifc_cache.build_element_cache(missing, ifc_cache.cache_path_for(missing))
+    assert ifc_cache.ingest_error(missing)
+    assert ifc_cache.get_element_cache(missing) is None
@@ -0,0 +1,106 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.extensions import db
+from app.models.base import BackgroundJob
+from app.utils import job_queue
+from app.utils.job_queue import Worker, claim_jobs, enqueue, job, run_job, schedule_periodic
+
+calls = []
+
+
+@job('tests.record')
+def record(value):
+    calls.append(value)
+
+
+@job('tests.flaky', max_attempts=3)
+def flaky(failures):
+    calls.append('attempt')
+    if len(calls) <= failures:
+        raise RuntimeError('temporary outage')
+
+
+@pytest.fixture
+def jobs_app(db_app):
+    calls.clear()
+    db_app.config.update(JOB_RETRY_BASE_SECONDS=0, JOB_POLL_INTERVAL=0.01, JOB_QUEUE_CONCURRENCY='')
+    return db_app
+
+
+def test_worker_runs_queued_jobs(jobs_app):
+    enqueue('tests.record', {'value': 1})
+    enqueue('tests.record', {'value': 2}, run_at=datetime.utcnow() + timedelta(hours=1))
+    db.session.commit()
+
+    assert Worker(jobs_app, concurrency=1, schedule=False).run(burst=True) == 1
+    assert calls == [1]
+    statuses = [j.status for j in BackgroundJob.query.order_by(BackgroundJob.id)]
+    assert statuses == ['succeeded', 'queued']
+
+
+def test_failures_are_retried_then_given_up(jobs_app):
+    first = enqueue('tests.flaky', {'failures': 2})
+    db.session.commit()
+    Worker(jobs_app, concurrency=1, schedule=False).run(burst=True)
+    assert (first.status, first.attempts, first.last_error) == ('succeeded', 3, None)
+
+    calls.clear()
+    second = enqueue('tests.flaky', {'failures': 5})
+    db.session.commit()
+    Worker(jobs_app, concurrency=1, schedule=False).run(burst=True)
+    db.session.refresh(second)
+    assert (second.status, second.attempts) == ('failed', 3)
+    assert 'temporary outage' in second.last_error
+
+    jobs_app.config['JOB_RETRY_BASE_SECONDS'] = 60
+    assert job_queue.retry_delay(1) >= timedelta(seconds=48)
+    assert job_queue.retry_delay(3) >= timedelta(seconds=192)
+
+
+def test_each_job_is_claimed_once_and_expired_leases_move(jobs_app):
+    background_job = enqueue('tests.record', {'value': 'once'})
+    db.session.commit()
+
+    assert claim_jobs('worker-a', limit=5) == [background_job.id]
+    assert claim_jobs('worker-b', limit=5) == []
+
+    # worker-a stops heartbeating: its lease expires and worker-b takes over
+    background_job.locked_at = datetime.utcnow() - timedelta(hours=1)
+    db.session.commit()
+    assert claim_jobs('worker-b', limit=5) == [background_job.id]
+    run_job(background_job.id, 'worker-a')
+    assert calls == []
+    run_job(background_job.id, 'worker-b')
+    db.session.refresh(background_job)
+    assert calls == ['once'] and background_job.status == 'succeeded'
+
+
+def test_queue_concurrency_is_limited_cluster_wide(jobs_app):
+    jobs_app.config['JOB_QUEUE_CONCURRENCY'] = 'reports=1'
+    for value in range(3):
+        enqueue('tests.record', {'value': value}, queue='reports')
+    enqueue('tests.record', {'value': 'other'})
+    db.session.commit()
+
+    assert len(claim_jobs('worker-a', limit=5)) == 2  # one report and the default-queue job
+    assert claim_jobs('worker-b', limit=5) == []
+    assert claim_jobs('worker-b', queues=['default'], limit=5) == []
+
+
+def test_periodic_jobs_are_enqueued_once_per_period(jobs_app, monkeypatch):
+    now = datetime(2024, 1, 1, 12)
+    periodic = [name for name, handler in job_queue.JOB_HANDLERS.items() if handler.every]
+    assert 'maintenance.clean_temp_files' in periodic
+
+    assert schedule_periodic(now) == len(periodic)
+    # Another process: no local memory of what was scheduled, same period
+    monkeypatch.setattr(job_queue, '_scheduled', {})
+    assert schedule_periodic(now + timedelta(minutes=1)) == 0
+    assert BackgroundJob.query.count() == len(periodic)
+    assert BackgroundJob.query.filter_by(name='maintenance.collect_db_stats').count() == 1
+
+    monkeypatch.setattr(job_queue, '_scheduled', {})
+    schedule_periodic(now + timedelta(hours=6))
+    assert BackgroundJob.query.filter_by(name='maintenance.collect_db_stats').count() == 2
@@ -0,0 +1,81 @@
+import threading
+
+from app.extensions import ApplicationMonitor
+from app.utils.metrics import EndpointStats, MetricsSnapshot, RequestMetrics
+
+
+def test_percentiles_come_from_bucket_bounds():
+    stats = EndpointStats()
+    for _ in range(90):
+        stats.record('GET', 200, 0.010)
+    for _ in range(10):
+        stats.record('GET', 500, 0.800)
+
+    summary = stats.summary()
+    assert summary['count'] == 100
+    # Within one bucket (~19%) above the true value
+    assert 0.010 <= summary['p50'] < 0.012
+    assert summary['p99'] == 0.8  # capped at the observed max
+    assert summary['p95'] == summary['p99']
+    assert stats.by_status == {200: 90, 500: 10}
+    assert EndpointStats().summary()['p50'] is None
+
+
+def test_thread_shards_merge_into_one_snapshot():
+    metrics = RequestMetrics()
+
+    def worker():
+        for _ in range(500):
+            metrics.record_request('api.projects', 'GET', 200, 0.002)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    metrics.record_error('ValueError')
+
+    snapshot = metrics.snapshot()
+    assert snapshot.total == 2000
+    assert snapshot.errors == {'ValueError': 1}
+
+    merged = MetricsSnapshot().merge(snapshot).merge(snapshot)
+    assert merged.endpoints['api.projects'].count == 4000
+
+    metrics.reset()
+    assert metrics.snapshot().total == 0
+    metrics.record_request('api.projects', 'GET', 200, 0.002)
+    assert metrics.snapshot().total == 1
+
+
+def test_shards_of_exited_threads_are_folded_together():
+    metrics = RequestMetrics()
+    metrics.record_request('api.projects', 'GET', 200, 0.002)
+
+    # A thread per request, as under the development server
+    for _ in range(50):
+        thread = threading.Thread(target=metrics.record_request, args=('api.rfis', 'GET', 200, 0.002))
+        thread.start()
+        thread.join()
+
+    assert len(metrics._shards) == 1
+    snapshot = metrics.snapshot()
+    assert snapshot.total == 51 and snapshot.endpoints['api.rfis'].count == 50
+
+    metrics.reset()
+    assert metrics.snapshot().total == 0
+
+
+def test_monitor_stats_shape():
+    monitor = ApplicationMonitor()
+    monitor.record_request('dashboard.index', 'GET', 200, 0.05)
+    monitor.record_error(KeyError('x'), 'dashboard.index', 'GET', '/')
+
+    stats = monitor.get_stats()
+    assert stats['requests']['total'] == 1
+    assert stats['requests']['by_status'] == {'200': 1}
+    assert stats['latency']['dashboard.index']['p99'] == 0.05
+    assert stats['errors'][0]['type'] == 'KeyError'
+
+    monitor.reset_stats()
+    assert monitor.get_stats()['requests']['total'] == 0
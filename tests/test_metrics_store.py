@@ -0,0 +1,100 @@
+import multiprocessing
+
+from app.utils.metrics import RequestMetrics, render_prometheus
+from app.utils.metrics_store import MultiProcessMetrics, mark_process_dead, read_metrics_file, start_fresh
+
+
+def _worker(directory, requests, flushed, done):
+    metrics, store = RequestMetrics(), MultiProcessMetrics(directory)
+    for _ in range(requests):
+        metrics.record_request('api.get_projects', 'GET', 200, 0.02)
+    metrics.record_error('KeyError')
+    metrics.record_payload('mobile_api.sync_data', 'msgpack+gzip', 1000, 200)
+    store.flush(metrics)
+    flushed.release()
+    done.wait(10)
+
+
+def test_collector_merges_every_running_worker(tmp_path):
+    context = multiprocessing.get_context('fork')
+    flushed, done = context.Semaphore(0), context.Event()
+    workers = [context.Process(target=_worker, args=(str(tmp_path), count, flushed, done)) for count in (3, 5)]
+    for worker in workers:
+        worker.start()
+    for _ in workers:
+        assert flushed.acquire(timeout=10)
+
+    store = MultiProcessMetrics(str(tmp_path))
+    snapshot, count = store.collect()
+    done.set()
+    for worker in workers:
+        worker.join()
+    assert count == 2
+    stats = snapshot.endpoints['api.get_projects']
+    assert stats.count == 8
+    assert stats.by_status == {200: 8} and stats.by_method == {'GET': 8}
+    assert 0.02 <= stats.percentile(0.99) <= 0.024
+    assert snapshot.errors == {'KeyError': 2}
+    assert snapshot.payloads == {('mobile_api.sync_data', 'msgpack+gzip'): [2, 2000, 400]}
+    assert snapshot.to_dict()['payloads']['mobile_api.sync_data']['msgpack+gzip']['saved_ratio'] == 0.8
+
+
+def test_file_updates_in_place_and_resets_by_epoch(tmp_path):
+    metrics, store = RequestMetrics(), MultiProcessMetrics(str(tmp_path), flush_interval=0)
+    metrics.record_request('a', 'GET', 200, 0.001)
+    store.flush(metrics)
+    metrics.record_request('a', 'POST', 201, 0.001)
+    metrics.record_request('b' * 300, 'GET', 200, 0.001)
+    store.flush(metrics)
+
+    _, _, snapshot = read_metrics_file(store._file.path)
+    assert snapshot.endpoints['a'].by_method == {'GET': 1, 'POST': 1}
+    assert snapshot.endpoints['b' * 300].count == 1
+
+    # Another worker resets: this one's file is ignored until it starts over
+    MultiProcessMetrics(str(tmp_path)).reset()
+    assert store.collect()[1] == 0
+    store.maybe_flush(metrics)
+    snapshot, workers = store.collect()
+    assert workers == 1 and snapshot.total == 0
+
+    metrics.record_request('a', 'GET', 200, 0.001)
+    store.flush(metrics)
+    assert store.collect()[0].total == 1
+
+
+def test_prometheus_exposition():
+    metrics = RequestMetrics()
+    metrics.record_request('dash"board', 'GET', 200, 0.003)
+    metrics.record_error('KeyError')
+    metrics.record_payload('mobile_api.get_projects', 'columnar', 500, 300)
+
+    text = render_prometheus(metrics.snapshot())
+    assert '# TYPE http_request_duration_seconds histogram' in text
+    assert 'http_requests_total{endpoint="dash\\"board",status="200"} 1' in text
+    assert 'http_request_duration_seconds_bucket{endpoint="dash\\"board",le="+Inf"} 1' in text
+    assert 'http_request_duration_seconds_bucket{endpoint="dash\\"board",le="0.0005"} 0' in text
+    assert 'http_request_errors_total{type="KeyError"} 1' in text
+    assert 'http_response_sent_bytes_total{endpoint="mobile_api.get_projects",encoding="columnar"} 300' in text
+
+
+def test_files_of_exited_workers_are_dropped(tmp_path):
+    context = multiprocessing.get_context('fork')
+    flushed, done = context.Semaphore(0), context.Event()
+    done.set()
+    workers = [context.Process(target=_worker, args=(str(tmp_path), 1, flushed, done)) for _ in range(2)]
+    for worker in workers:
+        worker.start()
+        worker.join()
+
+    store = MultiProcessMetrics(str(tmp_path))
+    mark_process_dead(str(tmp_path), workers[0].pid)
+    assert len(list(tmp_path.glob('worker-*.metrics'))) == 1
+    # The other one exited without the hook; collect notices its PID is gone
+    assert store.collect()[1] == 0 and not list(tmp_path.glob('worker-*.metrics'))
+
+    metrics = RequestMetrics()
+    metrics.record_request('a', 'GET', 200, 0.001)
+    store.flush(metrics)
+    start_fresh(str(tmp_path))
+    assert store.read_epoch() == 1 and store.collect()[1] == 0
@@ -0,0 +1,25 @@
+from app.extensions import db
+from app.models.user import DeviceToken, User
+
+
+def test_device_tokens_are_registered_once_per_device(db_app):
+    from app.api.mobile_routes import mobile_bp
+
+    db_app.register_blueprint(mobile_bp, url_prefix='/api/mobile')
+    first, second = User(email='a@example.com', name='A'), User(email='b@example.com', name='B')
+    db.session.add_all([first, second])
+    db.session.commit()
+    client = db_app.test_client()
+
+    def register(user, **body):
+        return client.post('/api/mobile/register-device', headers={'X-API-Key': user.api_key}, json=body)
+
+    response = register(first, token='abc', platform='ios')
+    assert response.status_code == 200 and response.get_json()['success']
+    # The same phone signed in to another account
+    assert register(second, token='abc', platform='ios').status_code == 200
+    assert register(second, token='abc', platform='blackberry').status_code == 400
+    assert register(second, platform='ios').status_code == 400
+
+    devices = DeviceToken.query.all()
+    assert [(device.user_id, device.token, device.platform) for device in devices] == [(second.id, 'abc', 'ios')]
@@ -0,0 +1,128 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from app.extensions import db
+from app.models.base import SyncTombstone
+from app.models.engineering import RFI
+from app.models.field import DailyReport, Punchlist, PunchlistItem
+from app.models.project import Project
+from app.models.user import User, UserProject
+from app.utils.sync import purge_tombstones, register_sync_listeners
+
+
+@pytest.fixture
+def mobile(db_app):
+    from app.api.mobile_routes import create_token, mobile_bp
+
+    register_sync_listeners()
+    db_app.register_blueprint(mobile_bp, url_prefix='/api/mobile')
+    user = User(email='field@example.com', name='Field')
+    projects = [Project(name=f'P{i}', number=f'P{i}', status='active', start_date=date(2024, 1, 1))
+                for i in range(3)]
+    db.session.add_all([user, *projects])
+    db.session.flush()
+    db.session.add_all(UserProject(user_id=user.id, project_id=project.id) for project in projects[:2])
+    db.session.commit()
+
+    client = db_app.test_client()
+    headers = {'Authorization': f'Bearer {create_token(user.id)}'}
+
+    def sync(watermarks=None, limit=None):
+        response = client.post('/api/mobile/sync', headers=headers,
+                               json={'watermarks': watermarks or {}, 'limit': limit})
+        assert response.status_code == 200
+        return response.get_json()
+
+    return sync, projects
+
+
+def _report(project, number):
+    return DailyReport(project_id=project.id, report_number=number, report_date=date(2024, 3, 1))
+
+
+def test_sync_sends_only_changes_since_the_watermark(mobile):
+    sync, (mine, also_mine, other) = mobile
+    reports = [_report(mine, 'DR-1'), _report(mine, 'DR-2'), _report(other, 'DR-X')]
+    rfi = RFI(project_id=also_mine.id, number='RFI-1', subject='Footing', question='Depth?')
+    punchlist = Punchlist(project_id=mine.id, title='Level 1')
+    punchlist.items.append(PunchlistItem(description='Touch up paint'))
+    db.session.add_all([*reports, rfi, punchlist])
+    db.session.commit()
+
+    first = sync()
+    assert sorted(first['project_ids']) == [mine.id, also_mine.id]
+    assert [p['id'] for p in first['projects']] == [mine.id, also_mine.id]
+    assert [r['report_number'] for r in first['daily_reports']] == ['DR-1', 'DR-2']
+    assert first['punchlist_items'][0]['project_id'] == mine.id
+    assert first['rfis'][0]['subject'] == 'Footing' and not first['has_more']
+
+    assert sync(first['watermarks'])['daily_reports'] == []
+
+    reports[1].notes = 'Rain delay'
+    db.session.delete(rfi)
+    db.session.commit()
+    second = sync(first['watermarks'])
+    assert [(r['report_number'], r['notes']) for r in second['daily_reports']] == [('DR-2', 'Rain delay')]
+    assert second['deleted'] == {'rfis': [rfi.id]}
+    assert second['projects'] == [] and second['rfis'] == []
+
+
+def test_paging_covers_every_change_once(mobile):
+    sync, (mine, also_mine, _) = mobile
+    for i in range(7):
+        db.session.add(_report(mine if i % 2 else also_mine, f'DR-{i}'))
+        db.session.commit()
+
+    seen, watermarks, pages = [], {}, 0
+    while True:
+        page = sync(watermarks, limit=3)
+        seen += [r['report_number'] for r in page['daily_reports']]
+        watermarks, pages = page['watermarks'], pages + 1
+        if not page['has_more']:
+            break
+    assert sorted(seen) == [f'DR-{i}' for i in range(7)] and pages == 3
+
+
+def test_watermarks_older_than_purged_tombstones_are_reset(mobile):
+    sync, (mine, also_mine, _) = mobile
+    report = _report(mine, 'DR-1')
+    db.session.add_all([report, _report(mine, 'DR-2')])
+    db.session.commit()
+    stale_watermarks = sync()['watermarks']
+
+    db.session.delete(report)
+    db.session.commit()
+    watermarks = sync(stale_watermarks)['watermarks']
+    SyncTombstone.query.update({'deleted_at': datetime.utcnow() - timedelta(days=365)})
+    assert purge_tombstones() == 1
+    db.session.commit()
+
+    stale = sync(stale_watermarks)
+    assert stale['reset'] == [mine.id, also_mine.id]
+    assert [r['report_number'] for r in stale['daily_reports']] == ['DR-2']
+    assert sync(watermarks)['reset'] == []
+
+
+def test_counter_is_only_locked_for_the_commit(mobile, count_queries):
+    _, (mine, _, _) = mobile
+    with count_queries() as counter:
+        rfi = RFI(project_id=mine.id, number='RFI-1', subject='Footing', question='Depth?')
+        report = _report(mine, 'DR-1')
+        db.session.add_all([rfi, report])
+        db.session.flush()
+        rfi.subject = 'Footing depth'
+        db.session.flush()
+        before_commit = len(counter.statements)
+        db.session.commit()
+
+    # Nothing waits on the counter while the transaction does its work
+    assert not any('sync_counters' in statement for statement in counter.statements[:before_commit])
+    # Taken last: after it only the stamping of this transaction's own rows
+    locked = next(i for i, statement in enumerate(counter.statements) if 'sync_counters' in statement)
+    assert all('sync_counters' in statement or 'change_seq=?' in statement
+               for statement in counter.statements[locked:])
+    # Changed by two flushes, numbered once
+    assert abs(rfi.change_seq - report.change_seq) == 1
+    db.session.expire_all()
+    assert db.session.get(RFI, rfi.id).change_seq == rfi.change_seq > 0
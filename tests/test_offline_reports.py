@@ -0,0 +1,83 @@
+import uuid
+from datetime import date
+
+import pytest
+
+from app.extensions import db
+from app.models.field import DailyReport, EquipmentEntry, LaborEntry
+from app.models.project import Project
+from app.models.user import User, UserProject
+
+
+@pytest.fixture
+def offline(db_app):
+    from app.api.mobile_routes import create_token, mobile_bp
+
+    db_app.register_blueprint(mobile_bp, url_prefix='/api/mobile')
+    user = User(email='field@example.com', name='Field')
+    mine = Project(name='P1', number='P1', status='active', start_date=date(2024, 1, 1))
+    other = Project(name='P2', number='P2', status='active', start_date=date(2024, 1, 1))
+    db.session.add_all([user, mine, other])
+    db.session.flush()
+    db.session.add(UserProject(user_id=user.id, project_id=mine.id))
+    db.session.commit()
+
+    client = db_app.test_client()
+    headers = {'Authorization': f'Bearer {create_token(user.id)}'}
+
+    def send(reports):
+        response = client.post('/api/mobile/sync-reports', headers=headers, json={'reports': reports})
+        assert response.status_code == 200, response.get_json()
+        return response.get_json()
+
+    return send, mine.id, other.id
+
+
+def _report(project_id, day, **fields):
+    return {'client_uuid': str(uuid.uuid4()), 'project_id': project_id,
+            'report_date': f'2024-03-{day:02d}', **fields}
+
+
+def test_batch_is_validated_per_report_and_resending_is_safe(offline):
+    send, mine, other = offline
+    reports = [
+        _report(mine, 1, work_performed='Formwork', labor_entries=[
+            {'company': 'Acme Concrete', 'worker_count': 6, 'hours_worked': 48},
+            {'company': 'Sparks Electric', 'worker_count': 2, 'hours_worked': 16},
+        ], equipment_entries=[{'equipment_type': 'Crane', 'count': 1, 'hours_used': 8}]),
+        _report(mine, 2, report_number='DR-0002', is_submitted=True),
+        _report(mine, 3, report_date='yesterday'),
+        _report(other, 4),
+        _report(mine, 5, work_status='flooded'),
+    ]
+    reports.append(dict(reports[0]))
+
+    first = send(reports)
+    results = first['results']
+    assert not first['success'] and [r['success'] for r in results] == [True, True, False, False, False, True]
+    assert 'report_date' in results[2]['error'] and 'access' in results[3]['error']
+    assert results[5]['report_id'] == results[0]['report_id'] and results[5]['duplicate']
+
+    report = db.session.get(DailyReport, results[0]['report_id'])
+    assert report.report_number.startswith('P1-DR-20240301-') and report.created_by is not None
+    assert (report.labor_count, report.labor_hours, report.equipment_count) == (8, 64, 1)
+    assert report.labor_entries.count() == 2 and report.change_seq > 0
+    assert db.session.get(DailyReport, results[1]['report_id']).submitted_at is not None
+
+    again = send(reports[:2])
+    assert again['success'] and all(r['duplicate'] for r in again['results'])
+    assert [r['report_id'] for r in again['results']] == [results[0]['report_id'], results[1]['report_id']]
+    assert (DailyReport.query.count(), LaborEntry.query.count(), EquipmentEntry.query.count()) == (2, 2, 1)
+
+
+def test_large_batch_uses_a_fixed_number_of_statements(offline, count_queries):
+    send, mine, _ = offline
+    send([_report(mine, 1)])  # creates the sync counter row
+    reports = [_report(mine, 1 + i % 28, labor_entries=[{'company': 'Acme', 'worker_count': 3}],
+                       equipment_entries=[{'equipment_type': 'Lift', 'count': 1}]) for i in range(100)]
+
+    with count_queries() as counter:
+        assert send(reports)['success']
+    assert counter.count <= 10
+    assert DailyReport.query.count() == 101 and LaborEntry.query.count() == 100
+    assert len({report.change_seq for report in DailyReport.query}) == 101
@@ -0,0 +1,71 @@
+import gzip
+import json
+
+import msgpack
+import pytest
+
+from app.extensions import monitor
+from app.utils.payload_encoding import COLUMNAR_JSON, MSGPACK, compact, negotiated
+
+
+def test_lists_of_objects_become_columns():
+    rows = [
+        {'id': 1, 'status': 'open', 'updated_at': '2024-03-01T00:00:00', 'tags': [{'name': 'a'}]},
+        {'id': 2, 'status': 'open', 'updated_at': None, 'tags': []},
+        {'id': 3, 'status': 'closed', 'updated_at': '2024-03-01T00:00:01.500000+00:00', 'extra': 'x'},
+        {'id': 4, 'status': 'open', 'updated_at': '2024-03-01T00:00:02'},
+        {'id': 5},
+    ]
+    table = compact({'rows': rows, 'ids': [1, 2]})
+    assert table['ids'] == [1, 2]
+    columns = table['rows']['$columns']
+    assert table['rows']['$rows'] == 5
+    assert columns['id'] == [1, 2, 3, 4, 5]
+    assert columns['status'] == {'$dict': ['open', 'closed'], '$codes': [0, 0, 1, 0, None]}
+    assert columns['updated_at'] == {'$ts': [1709251200000, None, 1709251201500, 1709251202000, None]}
+    assert columns['tags'][0] == {'$rows': 1, '$columns': {'name': ['a']}}
+    assert columns['extra'] == [None, None, 'x', None, None]
+
+
+@pytest.fixture
+def client(db_app):
+    db_app.config['API_COMPRESS_MIN_BYTES'] = 200
+
+    @db_app.route('/reports')
+    @negotiated
+    def reports():
+        return {'reports': [{'id': i, 'status': 'submitted', 'date': '2024-03-01'} for i in range(50)]}
+
+    @db_app.route('/denied')
+    @negotiated
+    def denied():
+        return {'error': 'Unauthorized'}, 401
+
+    monitor.metrics.reset()
+    return db_app.test_client()
+
+
+def test_plain_json_is_the_default(client):
+    response = client.get('/reports')
+    assert response.mimetype == 'application/json' and 'Content-Encoding' not in response.headers
+    assert len(response.get_json()['reports']) == 50
+
+    denied = client.get('/denied', headers={'Accept-Encoding': 'gzip'})
+    assert denied.status_code == 401 and denied.get_json() == {'error': 'Unauthorized'}
+
+
+def test_compact_encodings_are_negotiated_and_measured(client):
+    response = client.get('/reports', headers={'Accept': COLUMNAR_JSON, 'Accept-Encoding': 'gzip'})
+    assert response.mimetype == COLUMNAR_JSON and response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    body = json.loads(gzip.decompress(response.data))
+    assert body['reports']['$columns']['status'] == {'$dict': ['submitted'], '$codes': [0] * 50}
+
+    response = client.get('/reports', headers={'Accept': f'{MSGPACK}, application/json;q=0.5'})
+    assert response.mimetype == MSGPACK
+    assert msgpack.unpackb(response.data)['reports']['$columns']['id'] == list(range(50))
+
+    payloads = monitor.get_stats()['payloads']['reports']
+    assert payloads['columnar+gzip']['responses'] == 1
+    assert payloads['columnar+gzip']['sent_bytes'] < payloads['msgpack']['sent_bytes']
+    assert payloads['msgpack']['saved_ratio'] > 0.5
@@ -0,0 +1,65 @@
+from datetime import datetime
+
+import pytest
+
+from app.utils import pdf_generator
+from app.utils.pdf_generator import pdf_cache_key, pdf_job_status, send_cached_pdf, submit_pdf_job
+
+TEMPLATE = 'projects/field/daily_reports/pdf_template.html'
+
+
+class FakeRenderer:
+    def __init__(self, base_url=None, static_folder=None, stylesheets=()):
+        pass
+
+    def write_pdf(self, html, target=None):
+        if 'boom' in html:
+            raise RuntimeError('layout failed')
+        with open(target, 'wb') as f:
+            f.write(b'%PDF-1.7 ' + html.encode())
+
+
+@pytest.fixture
+def pdf_app(db_app, tmp_path, monkeypatch):
+    db_app.config.update(PDF_CACHE_DIR=str(tmp_path), PDF_RENDER_WORKERS=0)
+    monkeypatch.setattr(pdf_generator, 'PDFRenderer', FakeRenderer)
+    return db_app
+
+
+def test_cache_key_tracks_record_version_and_template(pdf_app):
+    first = pdf_cache_key(TEMPLATE, 'daily-report', 1, datetime(2024, 5, 1, 9))
+    assert first == pdf_cache_key(TEMPLATE, 'daily-report', 1, datetime(2024, 5, 1, 9))
+    assert first != pdf_cache_key(TEMPLATE, 'daily-report', 1, datetime(2024, 5, 1, 10))
+    assert first != pdf_cache_key('projects/field/daily_reports/view.html', 'daily-report', 1,
+                                  datetime(2024, 5, 1, 9))
+
+
+def test_job_renders_once_and_serves_with_etag(pdf_app, tmp_path):
+    key = pdf_cache_key(TEMPLATE, 'daily-report', 1, 'v1')
+    assert pdf_job_status(key) == ('missing', None)
+
+    assert submit_pdf_job(key, '<p>report</p>') == 'ready'
+    assert (tmp_path / f'{key}.pdf').read_bytes().startswith(b'%PDF')
+    assert not (tmp_path / f'{key}.job').exists()
+
+    with pdf_app.test_request_context(headers={'If-None-Match': f'"{key}"'}):
+        assert send_cached_pdf(key, 'report.pdf').status_code == 304
+    with pdf_app.test_request_context():
+        response = send_cached_pdf(key, 'report.pdf')
+        assert response.status_code == 200
+        assert response.get_etag() == (key, False)
+
+
+def test_pending_and_failed_jobs(pdf_app, tmp_path):
+    key = pdf_cache_key(TEMPLATE, 'daily-report', 2, 'v1')
+    (tmp_path / f'{key}.job').write_text('123')
+    assert pdf_job_status(key)[0] == 'pending'
+    assert submit_pdf_job(key, '<p>ignored</p>') == 'pending'
+
+    (tmp_path / f'{key}.job').unlink()
+    assert submit_pdf_job(key, '<p>boom</p>') == 'failed'
+    assert pdf_job_status(key) == ('failed', 'RuntimeError: layout failed')
+
+    # A retry clears the error
+    assert submit_pdf_job(key, '<p>fixed</p>') == 'ready'
+    assert pdf_job_status('../../etc/passwd') == ('missing', None)
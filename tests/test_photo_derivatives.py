@@ -0,0 +1,102 @@
+import io
+import os
+
+import pytest
+from flask import g
+from PIL import Image
+
+from app.extensions import db
+from app.models.field import ProjectPhoto
+from app.utils import photo_derivatives
+from app.utils.photo_derivatives import generate_derivatives, photo_url_path, register_photo_derivative_listeners
+
+
+@pytest.fixture
+def photo_app(db_app, tmp_path):
+    db_app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    db_app.config['PHOTO_DERIVATIVE_WORKERS'] = 0
+    register_photo_derivative_listeners()
+    return db_app
+
+
+def _original(upload_folder, size=(4000, 3000)):
+    relative_path = 'blobs/ab/c1/abc1.jpg'
+    os.makedirs(os.path.join(upload_folder, os.path.dirname(relative_path)))
+    Image.new('RGB', size, 'orange').save(os.path.join(upload_folder, relative_path))
+    return relative_path
+
+
+def test_generates_sizes_next_to_original(tmp_path):
+    original = _original(str(tmp_path))
+    written = generate_derivatives(str(tmp_path), original)
+
+    assert written['thumb'] == 'blobs/ab/c1/abc1.thumb.jpg'
+    assert written['medium_webp'] == 'blobs/ab/c1/abc1.medium.webp'
+    with Image.open(tmp_path / written['thumb']) as thumb:
+        assert thumb.size == (320, 240)
+    with Image.open(tmp_path / written['medium_webp']) as medium:
+        assert medium.format == 'WEBP' and medium.size == (1280, 960)
+
+
+def test_small_originals_are_not_upscaled(tmp_path):
+    written = generate_derivatives(str(tmp_path), _original(str(tmp_path), size=(200, 100)))
+    with Image.open(tmp_path / written['medium']) as medium:
+        assert medium.size == (200, 100)
+
+
+def test_commit_records_derivatives_and_missing_files_regenerate(photo_app, make_project, tmp_path):
+    project = make_project('Tower')
+    photo = ProjectPhoto(project_id=project.id, title='Site', file_path=_original(str(tmp_path)))
+    db.session.add(photo)
+    db.session.commit()
+
+    photo = db.session.get(ProjectPhoto, photo.id)
+    assert set(photo.derivatives) == set(photo_derivatives.DERIVATIVE_SPECS)
+    assert photo_url_path(photo, 'thumb') == photo.derivatives['thumb']
+
+    os.remove(tmp_path / photo.derivatives['thumb'])
+    # Falls back to the original while the derivative is rebuilt
+    assert photo_url_path(photo, 'thumb') == photo.file_path
+    assert (tmp_path / photo.derivatives['thumb']).exists()
+
+
+def test_failed_generation_is_recorded_and_not_requeued(photo_app, make_project, tmp_path, monkeypatch):
+    project = make_project('Tower')
+    (tmp_path / 'broken.jpg').write_bytes(b'not an image')
+    photo = ProjectPhoto(project_id=project.id, title='Broken', file_path='broken.jpg')
+    db.session.add(photo)
+    db.session.commit()
+
+    photo = db.session.get(ProjectPhoto, photo.id)
+    assert set(photo.derivatives) == {photo_derivatives.FAILED_KEY}
+    queued = []
+    monkeypatch.setattr(photo_derivatives, 'queue_photo_derivatives', lambda *args: queued.append(args))
+    assert photo_url_path(photo, 'thumb') == 'broken.jpg' and queued == []
+
+
+def test_photos_are_served_only_to_project_members(photo_app, make_project, tmp_path):
+    from app.extensions import login_manager
+    from app.models.user import User, UserProject
+    from app.projects.field import field_bp
+
+    login_manager.init_app(photo_app)
+    photo_app.register_blueprint(field_bp, url_prefix='/projects', name='projects_field')
+    project = make_project('Tower')
+    member, outsider = User(email='member@example.com', name='Member'), User(email='out@example.com', name='Out')
+    db.session.add_all([member, outsider])
+    db.session.flush()
+    db.session.add(UserProject(user_id=member.id, project_id=project.id))
+    photo = ProjectPhoto(project_id=project.id, title='Site', file_path=_original(str(tmp_path)))
+    db.session.add(photo)
+    db.session.commit()
+
+    url = f'/projects/{project.id}/photos/{photo.id}/file?size=thumb'
+    for user, status in ((outsider, 403), (member, 200)):
+        client = photo_app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user.id)
+        g.pop('_login_user', None)  # requests share the fixture's app context
+        response = client.get(url)
+        assert response.status_code == status
+    with Image.open(io.BytesIO(response.data)) as thumb:
+        assert thumb.size == (320, 240)
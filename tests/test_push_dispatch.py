@@ -0,0 +1,87 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from app.utils.push_dispatch import PushDispatcher
+
+
+class _Provider(BaseHTTPRequestHandler):
+    """Push provider stand-in: records each call and answers with the next scripted status"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.calls.append((self.client_address[1], self.headers['Authorization'], body))
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+        reply = b'{}'
+        self.send_response(status)
+        if status == 429:
+            self.send_header('Retry-After', '0')
+        self.send_header('Content-Length', str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def provider():
+    server = HTTPServer(('127.0.0.1', 0), _Provider)
+    server.calls, server.statuses = [], []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def dispatcher(db_app, provider):
+    db_app.config.update(PUSH_SERVICE_URL=f'http://127.0.0.1:{provider.server_port}/push', PUSH_API_KEY='key',
+                         PUSH_BATCH_SIZE=2, PUSH_BATCH_WINDOW=0.05, PUSH_RETRY_BASE_SECONDS=0.01,
+                         PUSH_MAX_ATTEMPTS=3)
+    dispatcher = PushDispatcher(db_app)
+    yield dispatcher
+    dispatcher.stop(timeout=1)
+
+
+def test_duplicates_coalesce_and_recipients_are_batched(dispatcher, provider):
+    data = {'type': 'rfi_assigned', 'rfi_id': 7}
+    assert dispatcher.send([1, 2], 'RFI Assigned', 'RFI #7', data)
+    assert dispatcher.send([2, 3, None], 'RFI Assigned', 'RFI #7', dict(data))
+    assert dispatcher.send([4], 'CO Approved', 'CO-1', collapse_key='co-1')
+    assert dispatcher.send([5], 'CO Approved', 'CO-1 ($1,200.00)', collapse_key='co-1')
+    assert dispatcher.flush(timeout=5)
+
+    sent = sorted((body['notification']['body'], body['user_ids']) for _, _, body in provider.calls)
+    assert sent == [('CO-1 ($1,200.00)', [4, 5]), ('RFI #7', [1, 2]), ('RFI #7', [3])]
+    assert all(auth == 'Bearer key' for _, auth, _ in provider.calls)
+    # One kept-alive connection for every call
+    assert len({port for port, _, _ in provider.calls}) == 1
+
+    stats = dispatcher.stats()
+    assert (stats['queued'], stats['coalesced'], stats['requests'], stats['sent']) == (4, 2, 3, 5)
+    assert stats['latency']['count'] == 3 and stats['sent_per_second'] > 0
+
+
+def test_retries_with_backoff_then_gives_up(dispatcher, provider):
+    provider.statuses[:] = [503, 429, 200, 400, 500, 500, 500]
+    assert dispatcher.send([1], 'Safety Incident Reported', 'Fall at grid C3')
+    assert dispatcher.flush(timeout=5)
+    assert len(provider.calls) == 3 and dispatcher.stats()['sent'] == 1
+
+    assert dispatcher.send([2], 'Daily Report Submitted', 'Report for 03/01/2024')
+    assert dispatcher.send([3], 'Punchlist Item Completed', 'Touch up paint')
+    assert dispatcher.flush(timeout=5)
+
+    stats = dispatcher.stats()
+    assert (stats['retried'], stats['failed'], stats['sent']) == (4, 2, 1)
+    assert stats['responses'] == {'200': 1, '400': 1, '429': 1, '500': 3, '503': 1}
+
+
+def test_unconfigured_dispatcher_refuses_notifications(db_app):
+    assert not PushDispatcher(db_app).send([1], 'Title', 'Message')
@@ -0,0 +1,69 @@
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+from app.utils.scheduler import CronExpression, TaskScheduler
+
+
+@pytest.mark.parametrize('expression, after, expected', [
+    ('*/15 * * * *', datetime(2024, 3, 1, 10, 7, 30), datetime(2024, 3, 1, 10, 15)),
+    ('0 6 * * *', datetime(2024, 3, 1, 6, 0), datetime(2024, 3, 2, 6, 0)),
+    ('30 8 * * mon-fri', datetime(2024, 3, 1, 9, 0), datetime(2024, 3, 4, 8, 30)),  # Friday -> Monday
+    ('0 0 1 * *', datetime(2024, 12, 15), datetime(2025, 1, 1)),
+    ('0 12 13 * 5', datetime(2024, 9, 1), datetime(2024, 9, 6, 12)),  # the 13th or any Friday
+    ('@hourly', datetime(2024, 3, 1, 23, 59), datetime(2024, 3, 2, 0, 0)),
+    ('0 0 29 2 *', datetime(2024, 3, 1), datetime(2028, 2, 29)),
+])
+def test_cron_next_fire_time(expression, after, expected):
+    assert CronExpression(expression).next_after(after) == expected
+
+
+@pytest.mark.parametrize('expression', ['* * * *', '61 * * * *', '0 0 31 2 *', '*/0 * * * *'])
+def test_invalid_cron_expressions(expression):
+    with pytest.raises(ValueError):
+        CronExpression(expression).next_after(datetime(2024, 1, 1))
+
+
+def test_slow_task_does_not_delay_others_and_stats_are_kept(db_app):
+    scheduler = TaskScheduler(db_app, max_workers=2)
+    release = threading.Event()
+    fast_runs = []
+
+    scheduler.add_task(release.wait, 0.05, name='slow')
+    scheduler.add_task(lambda: fast_runs.append(time.time()), 0.05, name='fast')
+    scheduler.add_task(lambda: 1 / 0, 60, name='broken')
+    scheduler.start()
+    try:
+        deadline = time.time() + 5
+        while len(fast_runs) < 4 and time.time() < deadline:
+            time.sleep(0.01)
+        assert len(fast_runs) >= 4
+        stats = scheduler.task_stats()
+    finally:
+        release.set()
+        scheduler.stop()
+
+    assert stats['slow']['running'] and stats['slow']['skipped'] >= 1
+    assert stats['fast']['runs'] >= 4 and stats['fast']['lag']['max'] < 1
+    assert stats['broken']['failures'] == 1 and 'division' in stats['broken']['last_error']
+    assert stats['fast']['schedule'] == 'every 0.05s'
+
+
+def test_removed_tasks_stop_firing(db_app):
+    scheduler = TaskScheduler(db_app)
+    runs = []
+    scheduler.add_task(lambda: runs.append(1), 0.02, name='tick')
+    scheduler.add_cron_task(lambda: None, '0 6 * * *', name='morning')
+    scheduler.start()
+    try:
+        time.sleep(0.1)
+        assert scheduler.remove_task('tick')
+        time.sleep(0.05)
+        count = len(runs)
+        time.sleep(0.1)
+        assert len(runs) == count > 0
+        assert scheduler.task_stats()['morning']['next_run'].endswith('06:00:00')
+    finally:
+        scheduler.stop()
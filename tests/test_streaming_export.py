@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+from app.extensions import db
+from app.models.engineering import RFI
+from app.utils.streaming_export import iter_csv, iter_json_array, write_export
+
+
+def test_encoders_stream_row_by_row():
+    rows = [{'id': 1, 'name': 'a'}, {'id': 2, 'name': 'b,c'}]
+
+    chunks = list(iter_csv(iter(rows)))
+    assert chunks == ['id,name\r\n1,a\r\n', '2,"b,c"\r\n']
+    assert list(iter_csv(iter([]), ['id'])) == ['id\r\n']
+    assert json.loads(''.join(iter_json_array(iter(rows)))) == rows
+
+
+@pytest.fixture
+def rfis(project_member, make_project):
+    """Five RFIs on the member's project and one on a project they are not on"""
+    project, member = project_member()
+    other = make_project('P2')
+    for index in range(5):
+        db.session.add(RFI(project_id=project.id, number=f'RFI-{index}', subject='s', question='?'))
+    db.session.add(RFI(project_id=other.id, number='OTHER', subject='s', question='?'))
+    db.session.commit()
+    return member, project
+
+
+def test_project_export_streams_ndjson(api_client, rfis, bearer_headers):
+    member, project = rfis
+
+    response = api_client.get(f'/api/projects/{project.id}/export/rfis', headers=bearer_headers(member))
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.mimetype == 'application/x-ndjson'
+    lines = response.get_data(as_text=True).splitlines()
+    assert [json.loads(line)['number'] for line in lines] == [f'RFI-{i}' for i in range(5)]
+
+
+def test_write_export_to_csv_file(rfis, tmp_path):
+    _, project = rfis
+    output = tmp_path / 'rfis.csv'
+
+    assert write_export('rfis', str(output), 'csv', [project.id]) == 5
+    assert output.read_text().splitlines()[0].startswith('id,number,subject')
@@ -0,0 +1,98 @@
+from datetime import date
+
+from flask import g
+
+from app.extensions import db
+from app.models.project import Project, ProjectTeamMember, ProjectUser
+from app.models.user import Role, User, UserProject
+from app.utils.access_cache import register_access_cache_invalidation
+from app.utils.visible_projects import VisibleProjects, filter_visible, visible_project_ids
+
+
+def test_visible_projects_is_a_sorted_int_set():
+    visible = VisibleProjects([7, 3, 3, 11])
+    assert list(visible) == [3, 7, 11]
+    assert 7 in visible and 4 not in visible and 12 not in visible
+    assert list(VisibleProjects.frombytes(visible.tobytes())) == [3, 7, 11]
+
+
+def _projects(count):
+    projects = [Project(name=f'P{index}', number=f'P{index}', status='active', start_date=date(2024, 1, 1))
+                for index in range(count)]
+    db.session.add_all(projects)
+    return projects
+
+
+def test_union_of_memberships_resolved_once_per_request(db_app, count_queries):
+    register_access_cache_invalidation()
+    user = User(email='member@example.com', name='Member')
+    db.session.add(user)
+    team, linked, shared, hidden = _projects(4)
+    db.session.flush()
+    db.session.add_all([
+        ProjectTeamMember(project_id=team.id, user_id=user.id, role='member', added_by=user.id),
+        UserProject(project_id=linked.id, user_id=user.id),
+        ProjectUser(project_id=shared.id, user_id=user.id, role='viewer'),
+    ])
+    db.session.commit()
+    expected, hidden_id = sorted([team.id, linked.id, shared.id]), hidden.id
+    db.session.refresh(user)
+
+    with db_app.test_request_context():
+        with count_queries() as counter:
+            assert list(visible_project_ids(user)) == expected
+            visible_project_ids(user)
+        assert counter.count == 1
+
+        names = [p.name for p in filter_visible(Project.query, user, Project.id).order_by(Project.name)]
+        assert names == ['P0', 'P1', 'P2']
+
+    # A later request reads the set from the cache
+    with db_app.test_request_context():
+        with count_queries() as counter:
+            assert hidden_id not in visible_project_ids(user)
+        assert counter.count == 0
+
+        db.session.add(UserProject(project_id=hidden_id, user_id=user.id))
+        db.session.commit()
+        assert hidden_id in visible_project_ids(user)
+
+
+def test_admins_see_everything(db_app):
+    admin_role = Role(name='Admin', permissions=63)
+    admin = User(email='admin@example.com', name='Admin', role=admin_role)
+    db.session.add(admin)
+    _projects(2)
+    db.session.commit()
+
+    with db_app.test_request_context():
+        assert visible_project_ids(admin) is None
+        assert filter_visible(Project.query, admin, Project.id).count() == 2
+        assert 'visible_projects' not in g
+
+
+def test_removal_reaches_workers_with_their_own_local_access_cache(db_app):
+    from app.utils.access_cache import LocalAccessCache
+
+    register_access_cache_invalidation()
+    user = User(email='member@example.com', name='Member')
+    db.session.add(user)
+    kept, removed = _projects(2)
+    db.session.flush()
+    membership = UserProject(project_id=removed.id, user_id=user.id)
+    db.session.add_all([UserProject(project_id=kept.id, user_id=user.id), membership])
+    db.session.commit()
+    # Two workers share the app cache but each has its own local generation counters
+    worker_a, worker_b = LocalAccessCache(), LocalAccessCache()
+
+    db_app.extensions['access_cache'] = worker_a
+    with db_app.test_request_context():
+        assert list(visible_project_ids(user)) == [kept.id, removed.id]
+
+    db_app.extensions['access_cache'] = worker_b
+    db.session.delete(membership)
+    db.session.commit()
+
+    db_app.extensions['access_cache'] = worker_a
+    with db_app.test_request_context():
+        assert list(visible_project_ids(user)) == [kept.id]